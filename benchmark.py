@@ -0,0 +1,1139 @@
+#!/usr/bin/env python3
+"""
+醫療站庫存管理系統 - 效能基準測試
+
+在暫存目錄建立合成資料庫後量測各項功能，不會動到正式資料庫。
+
+用法:
+    python3 benchmark.py snapshot --rows 1000000
+    python3 benchmark.py emergency-zip --rows 1000000
+    python3 benchmark.py sync-package --rows 200000
+    python3 benchmark.py sync-format --rows 200000
+    python3 benchmark.py sync-apply --rows 100000
+    python3 benchmark.py sync-delta --rows 1000000
+    python3 benchmark.py sync-verify --rows 200000
+    python3 benchmark.py sync-ingest --rows 50000 --packages 8
+    python3 benchmark.py sync-ledger --rows 200000
+    python3 benchmark.py sync-filter --rows 200000
+    python3 benchmark.py sync-digest --rows 1000000
+    python3 benchmark.py sync-scheduler --rows 1000000
+    python3 benchmark.py sync-reconcile --rows 1000000
+    python3 benchmark.py hospital-report --rows 200000
+    python3 benchmark.py federation --rows 1000000 --packages 8
+    python3 benchmark.py station-merge --rows 2000000
+    python3 benchmark.py stocktake --rows 1000000
+    python3 benchmark.py blood-register --rows 200000
+    python3 benchmark.py expiry --rows 1000000
+    python3 benchmark.py blood-list --rows 1000000
+    python3 benchmark.py blood-compatible --rows 1000000
+"""
+
+import argparse
+import csv
+import functools
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+
+
+def load_app(workdir: Path):
+    """在暫存目錄匯入 main（main 匯入時會在工作目錄建立資料庫與日誌）"""
+    os.chdir(workdir)
+    sys.path.insert(0, str(ROOT))
+    import logging
+    import main
+    logging.getLogger().setLevel(logging.WARNING)
+    return main
+
+
+def populate(db, rows: int, station_id: str = "TC-01", items: int = 1000):
+    """填入合成庫存事件（約 100 bytes/筆）"""
+    conn = db.get_connection()
+    try:
+        conn.executemany(
+            "INSERT OR IGNORE INTO items (code, name, unit, min_stock, category) VALUES (?, ?, 'EA', 10, '其他')",
+            [(f"BENCH-{i:04d}", f"基準測試物品 {i}") for i in range(items)]
+        )
+        batch = []
+        for i in range(rows):
+            batch.append((
+                'RECEIVE' if i % 3 else 'CONSUME',
+                f"BENCH-{i % items:04d}",
+                (i % 50) + 1,
+                f"LOT-{i % 997}",
+                "2027-01-01",
+                f"benchmark row {i}",
+                station_id
+            ))
+            if len(batch) >= 50000:
+                conn.executemany("""
+                    INSERT INTO inventory_events
+                    (event_type, item_code, quantity, batch_number, expiry_date, remarks, station_id)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, batch)
+                batch = []
+        if batch:
+            conn.executemany("""
+                INSERT INTO inventory_events
+                (event_type, item_code, quantity, batch_number, expiry_date, remarks, station_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, batch)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def bench_snapshot(main, args):
+    """線上快照：不同批次大小、壓縮與完整性檢查的耗時，以及備份期間寫入延遲"""
+    db = main.db
+    populate(db, args.rows)
+    db_size = Path(main.config.DATABASE_PATH).stat().st_size
+    print(f"資料庫大小: {db_size / 1024 / 1024:.1f} MB ({args.rows} 筆事件)")
+
+    for pages, compress, verify in [
+        (-1, False, False),
+        (main.config.BACKUP_PAGES_PER_STEP, False, False),
+        (main.config.BACKUP_PAGES_PER_STEP, False, True),
+        (main.config.BACKUP_PAGES_PER_STEP, True, True),
+    ]:
+        # 背景寫入者：量測快照期間單筆寫入的最大延遲
+        stop = threading.Event()
+        latencies = []
+
+        def writer():
+            conn = db.get_connection()
+            try:
+                while not stop.is_set():
+                    t0 = time.perf_counter()
+                    conn.execute("""
+                        INSERT INTO inventory_events (event_type, item_code, quantity, station_id)
+                        VALUES ('RECEIVE', 'BENCH-0000', 1, 'TC-01')
+                    """)
+                    conn.commit()
+                    latencies.append(time.perf_counter() - t0)
+                    time.sleep(0.01)
+            finally:
+                conn.close()
+
+        t = threading.Thread(target=writer)
+        t.start()
+        dest = Path(tempfile.mkdtemp()) / "snapshot.db"
+        t0 = time.perf_counter()
+        result = db.create_snapshot(str(dest), compress=compress, verify=verify, pages_per_step=pages)
+        elapsed = time.perf_counter() - t0
+        stop.set()
+        t.join()
+
+        print(
+            f"pages/step={pages:>5} compress={str(compress):5} verify={str(verify):5} "
+            f"-> {elapsed:6.2f}s, {result['size'] / 1024 / 1024:7.1f} MB, "
+            f"寫入 {len(latencies)} 次, 最大寫入延遲 {max(latencies, default=0) * 1000:.1f} ms"
+        )
+        shutil.rmtree(dest.parent, ignore_errors=True)
+
+
+def _legacy_emergency_zip(main, workdir: Path) -> Path:
+    """舊版做法：CSV 寫入 exports/temp，ZIP 寫入 exports/ 後再讀出傳送"""
+    import zipfile
+    exports_dir = workdir / "exports" / "temp"
+    exports_dir.mkdir(parents=True, exist_ok=True)
+    zip_path = workdir / "exports" / "legacy.zip"
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        zipf.write(main.config.DATABASE_PATH, "database/medical_inventory.db")
+        conn = main.db.get_connection()
+        try:
+            for member_name, query in main.EMERGENCY_EXPORT_QUERIES:
+                cursor = conn.execute(query)
+                csv_path = exports_dir / Path(member_name).name
+                with open(csv_path, 'w', encoding='utf-8-sig', newline='') as f:
+                    writer = csv.writer(f)
+                    writer.writerow([desc[0] for desc in cursor.description])
+                    writer.writerows(tuple(row) for row in cursor.fetchall())
+                zipf.write(csv_path, member_name)
+        finally:
+            conn.close()
+    shutil.rmtree(exports_dir)
+    return zip_path
+
+
+def bench_emergency_zip(main, args):
+    """緊急備份 ZIP：舊版暫存檔流程 vs. 串流產生"""
+    db = main.db
+    populate(db, args.rows)
+    # 讓 CSV 匯出也有一定份量
+    conn = db.get_connection()
+    conn.executemany(
+        "INSERT OR IGNORE INTO items (code, name, unit, min_stock, category) VALUES (?, ?, 'EA', 10, '其他')",
+        [(f"BULK-{i:06d}", f"大量物品 {i}") for i in range(args.rows // 20)]
+    )
+    conn.commit()
+    conn.close()
+    workdir = Path.cwd()
+    db_size = Path(main.config.DATABASE_PATH).stat().st_size
+    print(f"資料庫大小: {db_size / 1024 / 1024:.1f} MB")
+
+    t0 = time.perf_counter()
+    zip_path = _legacy_emergency_zip(main, workdir)
+    with open(zip_path, 'rb') as f:
+        while f.read(1024 * 1024):
+            pass
+    legacy_elapsed = time.perf_counter() - t0
+    legacy_size = zip_path.stat().st_size
+    zip_path.unlink()
+    print(f"舊版 (暫存檔):   {legacy_elapsed:6.2f}s, ZIP {legacy_size / 1024 / 1024:6.1f} MB, 額外磁碟寫入 >= {legacy_size / 1024 / 1024:.1f} MB + CSV")
+
+    t0 = time.perf_counter()
+    snapshot = db.create_stream_snapshot()
+    snapshot_size = snapshot.stat().st_size
+    first_byte = None
+    streamed = 0
+    for block in main.iter_emergency_backup_zip(snapshot):
+        if block and first_byte is None:
+            first_byte = time.perf_counter() - t0
+        streamed += len(block)
+    stream_elapsed = time.perf_counter() - t0
+    print(f"串流 (快照檔):   {stream_elapsed:6.2f}s, ZIP {streamed / 1024 / 1024:6.1f} MB, 首位元組 {first_byte:.2f}s, "
+          f"暫存快照 {snapshot_size / 1024 / 1024:.1f} MB (已刪除: {not snapshot.exists()})")
+
+    # 記憶體峰值另外量測（tracemalloc 會拖慢 CSV 導出，不計入上面的耗時）
+    _, _, peak = _measure(lambda: [len(block) for block in main.iter_emergency_backup_zip(db.create_stream_snapshot())])
+    print(f"串流 Python 記憶體峰值: {peak:.1f} MB")
+    print(f"exports/ 內殘留檔案: {sorted(p.name for p in (workdir / 'exports').glob('*'))}")
+
+
+def _measure(func):
+    """回傳 (結果, 秒數, Python 記憶體峰值 MB)"""
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    try:
+        result = func()
+    finally:
+        elapsed = time.perf_counter() - t0
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, elapsed, peak / 1024 / 1024
+
+
+def bench_sync_package(main, args):
+    """同步封包：JSON 清單 vs. NDJSON 串流（產生與匯入的耗時及記憶體峰值）"""
+    db = main.db
+    populate(db, args.rows)
+
+    result, elapsed, peak = _measure(lambda: db.generate_sync_package("TC-01", "HOSP-001", "FULL"))
+    print(f"JSON 產生:   {elapsed:6.2f}s, 峰值 {peak:7.1f} MB, {result['changes_count']} 項變更, {result['package_size'] / 1024 / 1024:.1f} MB")
+    changes, checksum = result["changes"], result["checksum"]
+    del result
+    result, elapsed, peak = _measure(lambda: db.import_sync_package("PKG-BENCH-JSON", changes, checksum))
+    print(f"JSON 匯入:   {elapsed:6.2f}s, 峰值 {peak:7.1f} MB (不含已載入的封包), 套用 {result['changes_applied']} 項")
+    del changes
+
+    package_path = Path.cwd() / "package.ndjson"
+
+    def generate_stream():
+        with open(package_path, "wb") as f:
+            for block in db.iter_sync_package_stream("TC-01", "HOSP-001", "FULL"):
+                f.write(block)
+
+    _, elapsed, peak = _measure(generate_stream)
+    print(f"NDJSON 產生: {elapsed:6.2f}s, 峰值 {peak:7.1f} MB, {package_path.stat().st_size / 1024 / 1024:.1f} MB")
+
+    def import_stream():
+        with open(package_path, "rb") as f:
+            return db.import_sync_package_stream(f)
+
+    result, elapsed, peak = _measure(import_stream)
+    print(f"NDJSON 匯入: {elapsed:6.2f}s, 峰值 {peak:7.1f} MB, 套用 {result['changes_applied']} 項")
+
+
+def bench_sync_format(main, args):
+    """同步封包格式：JSON / NDJSON / 二進位（各壓縮方式）的大小與編碼、解碼耗時"""
+    import gzip
+    import io
+    import json
+    db = main.db
+    populate(db, args.rows)
+
+    rows = []
+
+    t0 = time.perf_counter()
+    result = db.generate_sync_package("TC-01", "HOSP-001", "FULL")
+    encoded = json.dumps(result, ensure_ascii=False).encode('utf-8')
+    encode_time = time.perf_counter() - t0
+    changes_count = result["changes_count"]
+    del result
+    t0 = time.perf_counter()
+    json.loads(encoded)
+    rows.append(("JSON (現行)", len(encoded), encode_time, time.perf_counter() - t0))
+    del encoded
+
+    t0 = time.perf_counter()
+    encoded = b"".join(db.iter_sync_package_stream("TC-01", "HOSP-001", "FULL"))
+    encode_time = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for line in io.BytesIO(encoded):
+        json.loads(line)
+    rows.append(("NDJSON", len(encoded), encode_time, time.perf_counter() - t0))
+
+    t0 = time.perf_counter()
+    compressed = gzip.compress(encoded, 6)
+    gzip_time = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for line in io.BytesIO(gzip.decompress(compressed)):
+        json.loads(line)
+    rows.append(("NDJSON gzip -6", len(compressed), encode_time + gzip_time, time.perf_counter() - t0))
+    del encoded, compressed
+
+    variants = [("none", None), ("gzip", 1), ("gzip", 6), ("gzip", 9)]
+    if main.ZSTD_AVAILABLE:
+        variants += [("zstd", 3), ("zstd", 10), ("zstd", 19)]
+    for codec, level in variants:
+        t0 = time.perf_counter()
+        encoded = b"".join(db.iter_sync_package_binary("TC-01", "HOSP-001", "FULL", codec=codec, level=level))
+        encode_time = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        reader = main.SyncBinaryReader(io.BytesIO(encoded))
+        for _ in reader:
+            pass
+        assert reader.error is None, reader.error
+        label = f"二進位 {codec}" + (f" -{level}" if level is not None else "")
+        rows.append((label, len(encoded), encode_time, time.perf_counter() - t0))
+
+    print(f"{changes_count} 項變更")
+    baseline = rows[0][1]
+    for label, size, encode_time, decode_time in rows:
+        print(f"{label:<16} {size / 1024 / 1024:8.2f} MB ({size / baseline:6.1%})  編碼 {encode_time:6.2f}s  解碼 {decode_time:6.2f}s")
+
+
+def _legacy_apply(cursor, changes):
+    """舊版做法：每筆變更動態組 SQL 逐一執行"""
+    applied = 0
+    for change in changes:
+        data = change['data']
+        try:
+            columns = ', '.join(data.keys())
+            placeholders = ', '.join(['?' for _ in data.keys()])
+            cursor.execute(f"INSERT OR REPLACE INTO {change['table']} ({columns}) VALUES ({placeholders})", list(data.values()))
+            applied += 1
+        except Exception:
+            pass
+    return applied
+
+
+def bench_sync_apply(main, args):
+    """同步變更套用：逐筆動態 SQL vs. 逐筆 SAVEPOINT vs. 分組 executemany"""
+    db = main.db
+    populate(db, args.rows)
+    conn = db.get_connection()
+    changes = list(db._iter_sync_changes(conn.cursor(), "TC-01", "DELTA", "2000-01-01", None))
+    conn.close()
+    # 匯入到另一個站點的空資料庫，避免 INSERT OR REPLACE 改為刪除再插入
+    target = main.DatabaseManager(str(Path.cwd() / "target.db"))
+    print(f"{len(changes)} 項變更")
+
+    def run(label, apply):
+        shutil.copy(target.db_path, Path.cwd() / "fresh.db")
+        conn = target.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("BEGIN")
+        t0 = time.perf_counter()
+        applied = apply(cursor)
+        conn.commit()
+        elapsed = time.perf_counter() - t0
+        conn.close()
+        shutil.copy(Path.cwd() / "fresh.db", target.db_path)
+        print(f"{label:<22} {elapsed:6.2f}s  {len(changes) / elapsed:9.0f} 筆/秒  套用 {applied}")
+
+    run("逐筆動態 SQL (舊版)", lambda cursor: _legacy_apply(cursor, changes))
+    run("逐筆 SAVEPOINT", lambda cursor: sum(db._apply_sync_change_isolated(cursor, c, []) for c in changes))
+    run("分組 executemany", lambda cursor: db._apply_sync_changes(cursor, changes, [])[0])
+
+    # 含衝突：每 1000 筆一筆違反 NOT NULL 約束，整批回滾後逐筆隔離
+    broken = [
+        {**c, 'data': {**c['data'], 'item_code': None}} if i % 1000 == 0 else c
+        for i, c in enumerate(changes)
+    ]
+    run("分組 (0.1% 衝突)", lambda cursor: db._apply_sync_changes(cursor, broken, [])[0])
+
+
+def bench_sync_delta(main, args):
+    """增量同步：依時間欄位掃描五張表 (舊版) vs. 依變更紀錄序號範圍"""
+    db = main.db
+    populate(db, args.rows)
+    conn = db.get_connection()
+    since = conn.execute("SELECT MAX(timestamp) FROM inventory_events").fetchone()[0]
+    last_seq = conn.execute("SELECT MAX(seq) FROM sync_changelog").fetchone()[0]
+    conn.execute("UPDATE sync_changelog SET changed_at = '2000-01-01'")  # 回填資料的時間點
+    conn.commit()
+    conn.close()
+    db.acknowledge_sync("TC-01", "HOSP-001", last_seq)
+
+    # 自上次同步以來：1000 筆新事件 + 100 筆設備狀態修改 + 100 筆刪除
+    time.sleep(1.1)
+    conn = db.get_connection()
+    conn.executemany("""
+        INSERT INTO inventory_events (event_type, item_code, quantity, station_id)
+        VALUES ('RECEIVE', ?, 1, 'TC-01')
+    """, [(f"BENCH-{i:04d}",) for i in range(1000)])
+    conn.executemany("UPDATE equipment SET status = 'NORMAL', power_level = ? WHERE id = 'power-1'", [(i,) for i in range(100)])
+    conn.execute("DELETE FROM inventory_events WHERE id <= 100")
+    conn.commit()
+
+    legacy_tables = {
+        'inventory_events': 'timestamp', 'blood_events': 'timestamp', 'equipment_checks': 'timestamp',
+        'surgery_records': 'created_at', 'emergency_blood_bags': 'created_at'
+    }
+
+    def legacy_delta():
+        count = 0
+        for table, timestamp_col in legacy_tables.items():
+            for _ in conn.execute(f"SELECT * FROM {table} NOT INDEXED WHERE station_id = ? AND {timestamp_col} > ?", ("TC-01", since)):
+                count += 1
+        return count
+
+    def indexed_delta():
+        count = 0
+        for table, timestamp_col in legacy_tables.items():
+            for _ in conn.execute(f"SELECT * FROM {table} WHERE station_id = ? AND {timestamp_col} > ?", ("TC-01", since)):
+                count += 1
+        return count
+
+    def changelog_delta():
+        from_seq, to_seq = db._sync_seq_range(conn.cursor(), "TC-01", "HOSP-001", "DELTA")
+        return sum(1 for _ in db._iter_sync_changes(conn.cursor(), "TC-01", "DELTA", None, None, from_seq, to_seq))
+
+    for label, func, note in [
+        ("時間欄位全表掃描 (舊版)", legacy_delta, "修改與刪除不會送出"),
+        ("(station_id, 時間) 索引", indexed_delta, "修改與刪除不會送出"),
+        ("變更紀錄序號範圍", changelog_delta, "含 100 次設備修改 (合併為 1 筆) 與 100 筆刪除"),
+    ]:
+        t0 = time.perf_counter()
+        count = func()
+        print(f"{label:<24} {(time.perf_counter() - t0) * 1000:8.1f} ms  {count:5d} 項變更  {note}")
+    conn.close()
+
+
+def bench_sync_ingest(main, args):
+    """醫院層多站點匯入：逐一匯入 (舊版) vs. 匯入管線（解析階段的平行加速）"""
+    from concurrent.futures import ProcessPoolExecutor
+
+    db = main.db
+    populate(db, args.rows)
+    package = b"".join(db.iter_sync_package_stream("TC-01", "HOSP-001", "FULL"))
+    header, body = package.split(b"\n", 1)
+    packages_dir = Path.cwd() / "packages"
+    packages_dir.mkdir()
+    files = []
+    for i in range(args.packages):
+        # 模擬各站點的封包：只改標頭的站點與封包ID（校驗碼只涵蓋變更記錄）
+        station = f"ST-{i:02d}"
+        path = packages_dir / f"{station}.ndjson"
+        path.write_bytes(header.replace(b"TC-01", station.encode()) + b"\n" + body)
+        files.append(path)
+    print(f"{args.packages} 個封包 x {len(package) / 1024 / 1024:.1f} MB, CPU 核心 {os.cpu_count()}")
+
+    target = main.DatabaseManager(str(Path.cwd() / "target.db"))
+    shutil.copy(target.db_path, Path.cwd() / "fresh.db")
+
+    def reset():
+        shutil.copy(Path.cwd() / "fresh.db", target.db_path)
+
+    t0 = time.perf_counter()
+    for path in files:
+        with open(path, "rb") as f:
+            target.import_sync_package_stream(f)
+    sequential = time.perf_counter() - t0
+    print(f"{'逐一匯入 (舊版)':<20} {sequential:7.2f}s")
+
+    parse = functools.partial(main.parse_sync_package_file, tables=main.DatabaseManager.SYNC_APPLY_TABLES)
+    parse_base = None
+    for workers in sorted({1, 2, 4, os.cpu_count() or 1}):
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(parse, [str(files[0])] * workers))  # 預先啟動工作行程
+            t0 = time.perf_counter()
+            parsed = list(pool.map(parse, [str(path) for path in files]))
+            elapsed = time.perf_counter() - t0
+        parse_base = parse_base or elapsed
+        assert all(p["error"] is None for p in parsed)
+        print(f"{'解析與校驗 ' + str(workers) + ' 行程':<20} {elapsed:7.2f}s  加速 {parse_base / elapsed:4.2f}x")
+
+    for workers in sorted({1, os.cpu_count() or 1}):
+        reset()
+        for sub in ("processing", "done", "failed"):
+            shutil.rmtree(Path.cwd() / "inbox" / sub, ignore_errors=True)
+        pipeline = main.SyncIngestPipeline(target, str(Path.cwd() / "inbox"), workers=workers)
+        t0 = time.perf_counter()
+        for path in files:
+            with open(path, "rb") as f:
+                pipeline.submit_stream(f, transfer_method="USB")
+        pipeline.shutdown()
+        elapsed = time.perf_counter() - t0
+        applied = sum(s["packages_applied"] for s in pipeline.status()["stations"].values())
+        print(f"{'匯入管線 ' + str(workers) + ' 行程':<20} {elapsed:7.2f}s  套用 {applied} 個封包")
+
+
+def bench_sync_verify(main, args):
+    """醫院層接收 JSON 封包：校驗碼重複計算 (舊版) vs. 只計算一次（cProfile 量測序列化成本）"""
+    import cProfile
+    import pstats
+
+    db = main.db
+    populate(db, args.rows)
+    conn = db.get_connection()
+    changes = list(db._iter_sync_changes(conn.cursor(), "TC-01", "DELTA", "2000-01-01", None))
+    conn.close()
+    checksum, size = db.sync_package_checksum(changes)
+    target = main.DatabaseManager(str(Path.cwd() / "target.db"))
+    shutil.copy(target.db_path, Path.cwd() / "fresh.db")
+    print(f"{len(changes)} 項變更, 標準序列化 {size / 1024 / 1024:.1f} MB")
+
+    def legacy_upload():
+        # 舊版 upload_sync_package：先驗證一次，import_sync_package 內再驗證一次
+        calculated, _ = target.sync_package_checksum(changes)
+        assert calculated == checksum
+        return target.import_sync_package("PKG-BENCH-TC-01", changes, checksum)
+
+    def upload():
+        return target.upload_sync_package("TC-01", "PKG-BENCH-TC-01", changes, checksum)
+
+    for label, func in [("重複驗證 (舊版)", legacy_upload), ("只驗證一次", upload)]:
+        profiler = cProfile.Profile()
+        t0 = time.perf_counter()
+        profiler.enable()
+        result = func()
+        profiler.disable()
+        elapsed = time.perf_counter() - t0
+        shutil.copy(Path.cwd() / "fresh.db", target.db_path)
+        stats = pstats.Stats(profiler).stats
+        dumps = [(v[0], v[3]) for (filename, _, name), v in stats.items() if name == "dumps" and filename.endswith("json/__init__.py")]
+        sha = [v[3] for (_, _, name), v in stats.items() if "sha256" in name]
+        print(f"{label:<16} 總計 {elapsed:6.2f}s  json.dumps {sum(n for n, _ in dumps)} 次 {sum(t for _, t in dumps):5.2f}s  "
+              f"sha256 {sum(sha):5.2f}s  套用 {result['changes_applied']}")
+
+
+def bench_sync_reconcile(main, args):
+    """遺失封包後的修復：全量同步封包 vs. 雜湊樹對帳（傳輸量與耗時）"""
+    import json
+    import sqlite3
+
+    db = main.db
+    populate(db, args.rows)
+    db.refresh_merkle_buckets()
+
+    # 醫院端副本，之後兩邊各自分歧（模擬遺失一個 USB 封包）
+    hospital_path = Path("hospital.db")
+    source = sqlite3.connect(db.db_path)
+    target = sqlite3.connect(hospital_path)
+    source.backup(target)
+    source.close()
+    target.close()
+    hospital = main.DatabaseManager(str(hospital_path))
+
+    conn = db.get_connection()
+    conn.executemany("""
+        INSERT INTO inventory_events (event_type, item_code, quantity, station_id)
+        VALUES ('RECEIVE', ?, 1, 'TC-01')
+    """, [(f"LOST-{i:03d}",) for i in range(200)])
+    conn.execute("UPDATE inventory_events SET quantity = quantity + 1 WHERE id % 50000 = 7")
+    conn.commit()
+    conn.close()
+
+    t0 = time.perf_counter()
+    full = db.generate_sync_package("TC-01", "HOSP-001", "FULL")
+    full_bytes = len(json.dumps(full, ensure_ascii=False, default=str).encode("utf-8"))
+    full_seconds = time.perf_counter() - t0
+
+    exchanged = {"bytes": 0, "calls": 0}
+
+    def remote(path, payload):
+        request = json.dumps(payload, ensure_ascii=False, default=str)
+        if path.endswith("/compare"):
+            payload = json.loads(request)
+            response = hospital.compare_merkle_nodes(
+                payload["table"], payload["stationId"], payload["level"],
+                {int(index): digest for index, digest in payload["nodes"].items()}
+            )
+        else:
+            response = hospital.apply_reconcile_package(json.loads(request))
+        response = json.dumps(response, ensure_ascii=False, default=str)
+        exchanged["bytes"] += len(request.encode("utf-8")) + len(response.encode("utf-8"))
+        exchanged["calls"] += 1
+        return json.loads(response)
+
+    t0 = time.perf_counter()
+    results = [db.merkle_reconcile(table, "TC-01", remote) for table in main.DatabaseManager.SYNC_CAPTURE_TABLES]
+    reconcile_seconds = time.perf_counter() - t0
+
+    print(f"{'全量同步封包':<16} {full_seconds:8.2f} s  {full_bytes / 1024 / 1024:10.2f} MB  {full['changes_count']} 筆")
+    print(f"{'雜湊樹對帳':<16} {reconcile_seconds:8.2f} s  {exchanged['bytes'] / 1024 / 1024:10.2f} MB  "
+          f"{sum(r['rows_sent'] for r in results)} 筆 / {exchanged['calls']} 次往返 / "
+          f"{sum(r['differing_buckets'] for r in results)} 個區段")
+
+
+def bench_sync_ledger(main, args):
+    """重複匯入：封包層略過、變更層布隆過濾器略過，與首次匯入比較"""
+    import io
+
+    db = main.db
+    populate(db, args.rows)
+    package = b"".join(db.iter_sync_package_stream("TC-01", "HOSP-001", "DELTA", since_seq=0))
+    overlap = b"".join(db.iter_sync_package_stream("TC-01", "HOSP-001", "DELTA", since_seq=args.rows // 2))
+    target = main.DatabaseManager(str(Path.cwd() / "target.db"))
+
+    for label, data in [("首次匯入", package), ("重複匯入（變更層略過）", package), ("重疊封包（後半段）", overlap)]:
+        t0 = time.perf_counter()
+        result = target.import_sync_package_stream(io.BytesIO(data))
+        elapsed = time.perf_counter() - t0
+        print(f"{label:<22} {elapsed:6.2f}s  套用 {result['changes_applied']:7d}  略過 {result['duplicates_skipped']:7d}")
+
+    conn = target.get_connection()
+    ledger_rows = conn.execute("SELECT COUNT(*) FROM sync_applied_changes").fetchone()[0]
+    conn.close()
+    ledger_filter = target._ledger_filter
+    probes = [os.urandom(16) for _ in range(100000)]
+    t0 = time.perf_counter()
+    false_positives = sum(1 for probe in probes if probe in ledger_filter)
+    elapsed = time.perf_counter() - t0
+    print(f"紀錄 {ledger_rows} 筆, 過濾器 {len(ledger_filter.bits) / 1024 / 1024:.1f} MB / {ledger_filter.hashes} 個雜湊, "
+          f"新變更查詢 {elapsed / len(probes) * 1e6:.1f} µs/筆, 誤判 {false_positives / len(probes):.3%}")
+
+
+def bench_sync_filter(main, args):
+    """重新同步前交換布隆過濾器：封包只送醫院尚未持有的事件（傳輸量比較）"""
+    import json
+    import sqlite3
+
+    db = main.db
+    populate(db, args.rows)
+
+    # 醫院已持有目前全部事件，之後站點再新增 5%（未送達的新資料）
+    hospital_path = Path("hospital.db")
+    source = sqlite3.connect(db.db_path)
+    target = sqlite3.connect(hospital_path)
+    source.backup(target)
+    source.close()
+    target.close()
+    hospital = main.DatabaseManager(str(hospital_path))
+    populate(db, max(1, args.rows // 20))
+
+    def size(payload):
+        return len(json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8"))
+
+    scenarios = [
+        ("確認遺失（增量從頭）", {"sync_type": "DELTA", "since_seq": 0}),
+        ("全量重新同步", {"sync_type": "FULL"}),
+    ]
+    for label, options in scenarios:
+        t0 = time.perf_counter()
+        plain = db.generate_sync_package("TC-01", "HOSP-001", **options)
+        plain_seconds = time.perf_counter() - t0
+        print(f"{label}: 未過濾 {size(plain) / 1024 / 1024:8.2f} MB  {plain['changes_count']:8d} 筆  {plain_seconds:6.2f} s")
+        for error_rate in (0.01, 0.001):
+            t0 = time.perf_counter()
+            known = hospital.build_known_filter("TC-01", error_rate=error_rate)
+            filtered = db.generate_sync_package("TC-01", "HOSP-001", known_filter=known, **options)
+            elapsed = time.perf_counter() - t0
+            sent = size(known) + size(filtered)
+            print(f"  誤判率 {error_rate:<6} 過濾器 {size(known) / 1024:8.1f} KB  封包 {size(filtered) / 1024 / 1024:8.2f} MB  "
+                  f"{filtered['changes_count']:8d} 筆 (略過 {filtered['filter_excluded']})  "
+                  f"節省 {1 - sent / size(plain):6.1%}  {elapsed:6.2f} s")
+
+
+def bench_sync_digest(main, args):
+    """資料表摘要：首次建立、少量寫入後的增量更新、一次比對的傳輸量"""
+    import json
+
+    db = main.db
+    populate(db, args.rows)
+
+    t0 = time.perf_counter()
+    db.get_sync_digests("TC-01")
+    build_seconds = time.perf_counter() - t0
+
+    conn = db.get_connection()
+    conn.execute("UPDATE inventory_events SET quantity = quantity + 1 WHERE id % 10000 = 3")
+    conn.executemany("""
+        INSERT INTO inventory_events (event_type, item_code, quantity, station_id)
+        VALUES ('RECEIVE', ?, 1, 'TC-01')
+    """, [(f"NEW-{i:03d}",) for i in range(100)])
+    conn.commit()
+    conn.close()
+
+    t0 = time.perf_counter()
+    digests = db.get_sync_digests("TC-01")
+    update_seconds = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    db.get_sync_digests("TC-01")
+    read_seconds = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    export = db.generate_sync_package("TC-01", "HOSP-001", "FULL")
+    export_bytes = len(json.dumps(export, ensure_ascii=False, default=str).encode("utf-8"))
+    export_seconds = time.perf_counter() - t0
+    digest_bytes = len(json.dumps(digests, ensure_ascii=False).encode("utf-8"))
+
+    events = digests["tables"]["inventory_events"]["row_count"]
+    print(f"首次建立（{events} 筆事件）   {build_seconds:8.2f} s")
+    print(f"寫入 {args.rows // 10000 + 100} 筆後增量更新 {update_seconds * 1000:8.1f} ms")
+    print(f"無變動時讀取           {read_seconds * 1000:8.1f} ms  回應 {digest_bytes} bytes")
+    print(f"全量匯出比對（原做法） {export_seconds:8.2f} s  {export_bytes / 1024 / 1024:.2f} MB")
+
+
+def bench_sync_scheduler(main, args):
+    """自動同步排程：大型變更紀錄上的門檻檢查成本，與突發寫入下產生的封包大小"""
+    import random
+
+    db = main.db
+    populate(db, args.rows)
+    conn = db.get_connection()
+    db.acknowledge_sync("TC-01", "HOSP-001", conn.execute("SELECT MAX(seq) FROM sync_changelog").fetchone()[0])
+    conn.close()
+    scheduler = main.SyncScheduler(db, str(Path.cwd() / "outbox"), "TC-01", "HOSP-001", max_changes=5000, max_latency_minutes=60)
+
+    t0 = time.perf_counter()
+    for _ in range(100):
+        db.get_pending_sync_stats("TC-01", "HOSP-001")
+    print(f"門檻檢查（變更紀錄 {args.rows} 筆，無待打包） {(time.perf_counter() - t0) * 10:.2f} ms/次")
+
+    # 突發寫入：每次排程檢查之間寫入 0～3000 筆；最後一段以延遲門檻送出
+    rng = random.Random(1)
+    conn = db.get_connection()
+    packages = []
+    for _ in range(40):
+        burst = rng.choice([0, 0, 20, 200, 3000])
+        conn.executemany("""
+            INSERT INTO inventory_events (event_type, item_code, quantity, station_id)
+            VALUES ('RECEIVE', ?, 1, 'TC-01')
+        """, [(f"BURST-{i % 100}",) for i in range(burst)])
+        conn.commit()
+        t0 = time.perf_counter()
+        result = scheduler.check()
+        if result["package"]:
+            packages.append((result["trigger"], result["package"]["changes_count"],
+                             result["package"]["package_size"], time.perf_counter() - t0))
+    conn.execute("UPDATE sync_changelog SET changed_at = datetime('now', '-2 hours') WHERE seq > (SELECT MAX(to_seq) FROM sync_outbox)")
+    conn.commit()
+    conn.close()
+    result = scheduler.check()
+    if result["package"]:
+        packages.append((result["trigger"], result["package"]["changes_count"], result["package"]["package_size"], 0.0))
+
+    print(f"{'觸發':<8} {'變更數':>8} {'封包大小':>12} {'產生耗時':>10}")
+    for trigger, count, size, seconds in packages:
+        print(f"{trigger:<8} {count:8d} {size / 1024:10.1f} KB {seconds * 1000:8.1f} ms")
+
+
+def bench_hospital_report(main, args):
+    """醫院日報表：匯入時增量更新彙總表的額外成本，與報表查詢（彙總表 vs. 掃描事件資料表）"""
+    import sqlite3
+
+    db = main.db
+    conn = db.get_connection()
+    blood_types = main.config.BLOOD_TYPES
+    conn.executemany("""
+        INSERT INTO blood_events (event_type, blood_type, quantity, station_id, operator)
+        VALUES (?, ?, ?, 'TC-01', 'bench')
+    """, [('RECEIVE' if i % 3 else 'CONSUME', blood_types[i % 8], (i % 4) + 1) for i in range(args.rows)])
+    conn.executemany("""
+        INSERT INTO equipment_checks (equipment_id, status, power_level, station_id, operator)
+        VALUES (?, ?, 80, 'TC-01', 'bench')
+    """, [(f"EQ-{i % 50:02d}", ('NORMAL', 'NORMAL', 'WARNING', 'ERROR')[i % 4]) for i in range(args.rows // 10)])
+    conn.commit()
+    conn.close()
+    package = db.generate_sync_package("TC-01", "HOSP-001", "FULL")
+
+    hospitals = {}
+    for label, keep_rollups in (("無彙總（原做法）", False), ("觸發器增量彙總", True)):
+        path = Path(f"hospital_{int(keep_rollups)}.db")
+        hospital = main.DatabaseManager(str(path))
+        if not keep_rollups:
+            target = sqlite3.connect(path)
+            for (name,) in target.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'trg_rollup_%'").fetchall():
+                target.execute(f"DROP TRIGGER {name}")
+            target.commit()
+            target.close()
+        t0 = time.perf_counter()
+        result = hospital.upload_sync_package("TC-01", package["package_id"], package["changes"], package["checksum"])
+        print(f"匯入 {result['changes_applied']} 筆變更 {label:<12} {time.perf_counter() - t0:8.2f} s")
+        hospitals[keep_rollups] = hospital
+
+    hospital = hospitals[True]
+    t0 = time.perf_counter()
+    for _ in range(100):
+        hospital.get_hospital_daily_report("HOSP-001")
+    print(f"日報表（彙總表）           {(time.perf_counter() - t0) * 10:8.2f} ms/次")
+
+    conn = hospital.get_connection()
+    t0 = time.perf_counter()
+    conn.execute(f"""
+        SELECT e.blood_type, SUM({main.DatabaseManager.ROLLUP_BLOOD_DELTA.format(row='e')})
+        FROM blood_events e JOIN stations s ON s.station_id = e.station_id
+        WHERE s.hospital_id = 'HOSP-001' GROUP BY e.blood_type
+    """).fetchall()
+    conn.execute("""
+        SELECT COUNT(*) FROM surgery_records r JOIN stations s ON s.station_id = r.station_id
+        WHERE s.hospital_id = 'HOSP-001' AND r.record_date = date('now') AND r.status != 'CANCELLED'
+    """).fetchall()
+    conn.execute("""
+        SELECT c.station_id, c.equipment_id, c.status, MAX(c.timestamp)
+        FROM equipment_checks c JOIN stations s ON s.station_id = c.station_id
+        WHERE s.hospital_id = 'HOSP-001' GROUP BY c.station_id, c.equipment_id
+    """).fetchall()
+    print(f"日報表（掃描事件資料表）   {(time.perf_counter() - t0) * 1000:8.2f} ms/次")
+    conn.close()
+
+
+def bench_federation(main, args):
+    """聯邦查詢：多個站點資料庫逐檔查詢 vs. 分批 ATTACH 並以工作執行緒平行查詢"""
+    import sqlite3
+
+    files = args.packages * 4
+    db = main.db
+    populate(db, max(1, args.rows // files))
+    source = sqlite3.connect(db.db_path)
+    source.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    source.close()
+    federation_path = Path("station_files")
+    federation_path.mkdir()
+    for i in range(files):
+        path = federation_path / f"ST-{i:02d}_20250101_120000.db"
+        shutil.copyfile(db.db_path, path)
+        conn = sqlite3.connect(path)
+        conn.execute("PRAGMA journal_mode=DELETE")
+        conn.execute("UPDATE blood_inventory SET station_id = ?, quantity = ?", (f"ST-{i:02d}", i))
+        conn.commit()
+        conn.close()
+
+    federation = main.StationFederation(str(federation_path))
+    t0 = time.perf_counter()
+    for path in sorted(federation_path.glob("*.db")):
+        conn = sqlite3.connect(path)
+        for required, sql in federation.QUERIES.values():
+            conn.execute(sql.format(db="main", source=0)).fetchall()
+        conn.close()
+    print(f"{files} 個站點檔案（各 {args.rows // files} 筆事件）")
+    print(f"逐檔開啟查詢             {time.perf_counter() - t0:8.2f} s")
+
+    for workers in (1, 2, 4):
+        t0 = time.perf_counter()
+        result = federation.query(workers=workers)
+        print(f"分批 ATTACH，{result['batches']} 批 / {result['workers']} 執行緒 {time.perf_counter() - t0:8.2f} s  "
+              f"低庫存 {result['results']['low_stock']['count']} 項")
+
+
+def bench_station_merge(main, args):
+    """站點合併：ATTACH + INSERT…SELECT 整批合併 vs. 逐筆 JSON 同步匯入（每秒筆數）"""
+    import sqlite3
+
+    def source_db(path: str, rows: int):
+        source = main.DatabaseManager(path)
+        populate(source, rows, station_id="TC-02")
+        conn = sqlite3.connect(path)
+        conn.execute("UPDATE blood_inventory SET station_id = 'TC-02'")
+        conn.commit()
+        conn.close()
+        return source
+
+    # 逐筆路徑以十分之一資料量量測
+    sample = max(1, args.rows // 10)
+    source = source_db("source_sample.db", sample)
+    target = main.DatabaseManager("target_sample.db")
+    t0 = time.perf_counter()
+    package = source.generate_sync_package("TC-02", "HOSP-001", "FULL")
+    target.upload_sync_package("TC-02", package["package_id"], package["changes"], package["checksum"])
+    json_seconds = time.perf_counter() - t0
+    print(f"逐筆 JSON 同步（{sample} 筆）  {json_seconds:8.2f} s  {sample / json_seconds:10.0f} 筆/s")
+
+    source_db("source.db", args.rows)
+    db = main.db
+    t0 = time.perf_counter()
+    result = db.merge_station_database("source.db", "benchmark", "TC-02")
+    merge_seconds = time.perf_counter() - t0
+    events = result["tables"]["inventory_events"]["merged"]
+    print(f"ATTACH + INSERT…SELECT（{events} 筆） {merge_seconds:8.2f} s  {events / merge_seconds:10.0f} 筆/s")
+
+
+def bench_stocktake(main, args):
+    """全站盤點：5,000 項物品批次上傳清點數量、計算差異並結案寫入調整事件"""
+    db = main.db
+    item_count = 5000
+    populate(db, args.rows, items=item_count)
+    counts = [
+        {"item_code": f"BENCH-{i:04d}", "actual_quantity": 100 + i % 7, "remarks": None}
+        for i in range(item_count)
+    ]
+
+    audit = db.start_audit("ROUTINE", "benchmark")
+    t0 = time.perf_counter()
+    for start in range(0, item_count, 500):
+        db.record_audit_counts(audit["audit_id"], counts[start:start + 500], "scanner")
+    record_seconds = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    result = db.complete_audit(audit["audit_id"], "benchmark")
+    complete_seconds = time.perf_counter() - t0
+    print(f"事件 {args.rows} 筆 / 物品 {item_count} 項")
+    print(f"上傳清點（10 批 x 500 項）   {record_seconds * 1000:8.1f} ms")
+    print(f"完成盤點（調整 {result['adjusted_items']} 項）   {complete_seconds * 1000:8.1f} ms")
+
+    audit = db.start_audit("POST_MERGE", "benchmark")
+    db.record_audit_counts(audit["audit_id"], counts, "scanner")
+    result = db.complete_audit(audit["audit_id"], "benchmark")
+    print(f"調整後再次盤點: 差異 {result['discrepancies']} 項")
+
+
+def bench_blood_register(main, args):
+    """緊急血袋登記：既有大量血袋時的單筆登記延遲、8 執行緒並行登記與批次登記"""
+    db = main.db
+    blood_types = main.config.BLOOD_TYPES
+    conn = db.get_connection()
+    conn.executemany("""
+        INSERT INTO emergency_blood_bags
+        (blood_bag_code, blood_type, product_type, collection_date, expiry_date, station_id, operator)
+        VALUES (?, ?, 'WHOLE_BLOOD', '2026-01-01', '2026-02-05', 'TC-01', 'bench')
+    """, [(f"DNO-260101-{main.DatabaseManager.BLOOD_TYPE_CODES[blood_types[i % 8]]}-{i:06d}", blood_types[i % 8])
+          for i in range(args.rows)])
+    conn.commit()
+    conn.close()
+    bag = dict(blood_type="O+", product_type="WHOLE_BLOOD", collection_date="2026-01-01", station_id="TC-01", operator="bench")
+
+    t0 = time.perf_counter()
+    for _ in range(200):
+        db.register_emergency_blood_bag(bag)
+    print(f"單筆登記（既有 {args.rows} 袋）      {(time.perf_counter() - t0) * 1000 / 200:8.2f} ms/袋")
+
+    errors = []
+
+    def worker():
+        for _ in range(50):
+            try:
+                db.register_emergency_blood_bag(bag)
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    t0 = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print(f"8 執行緒並行登記 400 袋           {time.perf_counter() - t0:8.2f} s  失敗 {len(errors)} 筆")
+
+    t0 = time.perf_counter()
+    result = db.register_emergency_blood_bags([dict(bag, blood_type=blood_types[i % 8]) for i in range(1000)])
+    print(f"批次登記 {result['registered']} 袋                 {(time.perf_counter() - t0) * 1000:8.1f} ms")
+
+
+def bench_expiry(main, args):
+    """過期清掃與即將到期查詢：部分效期索引 vs. 掃描整個資料表"""
+    from datetime import date, timedelta
+
+    db = main.db
+    populate(db, args.rows)
+    blood_types = main.config.BLOOD_TYPES
+    today = date.today()
+    conn = db.get_connection()
+    # 九成血袋為歷年已使用，其餘尚可使用、效期分散在前後 60 天
+    conn.executemany("""
+        INSERT INTO emergency_blood_bags
+        (blood_bag_code, blood_type, product_type, collection_date, expiry_date, status, station_id, operator)
+        VALUES (?, ?, 'WHOLE_BLOOD', ?, ?, ?, 'TC-01', 'bench')
+    """, [(f"BENCH-{i:07d}", blood_types[i % 8], str(today - timedelta(days=35 + i % 60)),
+           str(today + timedelta(days=i % 120 - 60)), 'AVAILABLE' if i % 10 == 0 else 'USED')
+          for i in range(args.rows // 5)])
+    conn.executemany("""
+        INSERT INTO inventory_events (event_type, item_code, quantity, batch_number, expiry_date, station_id)
+        VALUES ('RECEIVE', ?, 10, ?, ?, 'TC-01')
+    """, [(f"BENCH-{i % 1000:04d}", f"LOT-SOON-{i}", str(today + timedelta(days=i % 60 - 30))) for i in range(5000)])
+    conn.commit()
+
+    t0 = time.perf_counter()
+    conn.execute("""
+        SELECT COUNT(*) FROM emergency_blood_bags NOT INDEXED
+        WHERE status = 'AVAILABLE' AND expiry_date BETWEEN date('now') AND date('now', '+7 days')
+    """).fetchone()
+    conn.execute("""
+        SELECT item_code, batch_number, expiry_date, SUM(quantity) FROM inventory_events
+        WHERE event_type = 'RECEIVE' AND expiry_date BETWEEN date('now') AND date('now', '+7 days')
+        GROUP BY station_id, item_code, batch_number, expiry_date
+    """).fetchall()
+    print(f"掃描資料表查詢即將到期        {(time.perf_counter() - t0) * 1000:8.1f} ms")
+    conn.close()
+
+    t0 = time.perf_counter()
+    result = db.get_expiring(7)
+    print(f"效期索引查詢即將到期          {(time.perf_counter() - t0) * 1000:8.1f} ms  "
+          f"({result['counts']['blood_bags']} 袋, {result['counts']['consumable_lots']} 批)")
+
+    t0 = time.perf_counter()
+    result = db.sweep_expired()
+    print(f"過期清掃（首次）             {(time.perf_counter() - t0) * 1000:8.1f} ms  "
+          f"({result['blood_bags_expired']} 袋, {result['lots_expired']} 批)")
+    t0 = time.perf_counter()
+    db.sweep_expired()
+    print(f"過期清掃（之後每次）          {(time.perf_counter() - t0) * 1000:8.1f} ms")
+
+
+def bench_blood_list(main, args):
+    """緊急血袋清單：表格成長時，第一頁與深層頁的回應時間（keyset 分頁 vs. 原本的全部列出）"""
+    from datetime import date, timedelta
+
+    db = main.db
+    blood_types = main.config.BLOOD_TYPES
+    statuses = ('AVAILABLE', 'USED', 'USED', 'EXPIRED')
+    day0 = date(2020, 1, 1)
+    loaded = 0
+    for size in (args.rows // 100, args.rows // 10, args.rows):
+        conn = db.get_connection()
+        conn.executemany("""
+            INSERT INTO emergency_blood_bags
+            (blood_bag_code, blood_type, product_type, collection_date, expiry_date, status, station_id, operator)
+            VALUES (?, ?, 'WHOLE_BLOOD', ?, ?, ?, 'TC-01', 'bench')
+        """, [(f"BENCH-{i:08d}", blood_types[i % 8], str(day0 + timedelta(days=i % 2000)),
+               str(day0 + timedelta(days=i % 2000 + 35)), statuses[i % 4]) for i in range(loaded, size)])
+        conn.commit()
+        loaded = size
+
+        t0 = time.perf_counter()
+        for _ in range(20):
+            page = db.get_emergency_blood_bags(status="AVAILABLE", blood_type="O-", limit=50)
+        first_ms = (time.perf_counter() - t0) * 1000 / 20
+        t0 = time.perf_counter()
+        for _ in range(20):
+            db.get_emergency_blood_bags(blood_type="AB-", limit=50)
+        type_ms = (time.perf_counter() - t0) * 1000 / 20
+        for _ in range(20):
+            page = db.get_emergency_blood_bags(
+                status="AVAILABLE", blood_type="O-", limit=50, cursor_token=page["next_cursor"],
+                fields=["blood_bag_code", "expiry_date"]
+            )
+        t0 = time.perf_counter()
+        db.get_emergency_blood_bags(limit=50, cursor_token=page["next_cursor"])
+        deep_ms = (time.perf_counter() - t0) * 1000
+
+        t0 = time.perf_counter()
+        conn = db.get_connection()
+        conn.execute("SELECT * FROM emergency_blood_bags ORDER BY collection_date DESC, blood_bag_code").fetchall()
+        conn.close()
+        full_ms = (time.perf_counter() - t0) * 1000
+        print(f"{size:>9} 袋  第一頁 {first_ms:6.2f} ms  只篩血型 {type_ms:6.2f} ms  深層頁 {deep_ms:6.2f} ms  "
+              f"全部列出 {full_ms:9.1f} ms")
+
+
+def bench_blood_compatible(main, args):
+    """相容血型搜尋：記憶體矩陣 vs. 每次查詢都彙總緊急血袋；以及血袋寫入後的重新載入成本"""
+    from datetime import date, timedelta
+
+    db = main.db
+    blood_types = main.config.BLOOD_TYPES
+    products = ('WHOLE_BLOOD', 'RBC_CONCENTRATE', 'FROZEN_PLASMA')
+    statuses = ('AVAILABLE', 'USED', 'EXPIRED', 'AVAILABLE')
+    stations = [f"ST-{n:03d}" for n in range(50)]
+    today = date.today()
+    conn = db.get_connection()
+    conn.executemany(
+        "INSERT OR REPLACE INTO blood_inventory (blood_type, quantity, station_id) VALUES (?, ?, ?)",
+        [(blood_type, (n * 7 + i) % 40, station) for n, station in enumerate(stations)
+         for i, blood_type in enumerate(blood_types)]
+    )
+    conn.executemany("""
+        INSERT INTO emergency_blood_bags
+        (blood_bag_code, blood_type, product_type, collection_date, expiry_date, status, station_id, operator)
+        VALUES (?, ?, ?, ?, ?, ?, ?, 'bench')
+    """, [(f"BENCH-{i:08d}", blood_types[i % 8], products[i % 3], str(today - timedelta(days=i % 60)),
+           str(today + timedelta(days=i % 60 - 20)), statuses[i % 4], stations[i % 50]) for i in range(args.rows)])
+    conn.commit()
+    conn.close()
+
+    index = main.blood_availability
+    t0 = time.perf_counter()
+    index.snapshot()
+    load_ms = (time.perf_counter() - t0) * 1000
+
+    rounds = 10000
+    t0 = time.perf_counter()
+    for n in range(rounds):
+        result = index.search(blood_types[n % 8], min_units=10)
+    search_us = (time.perf_counter() - t0) * 1e6 / rounds
+
+    donors = index.compatible_types("AB+")
+    t0 = time.perf_counter()
+    for _ in range(5):
+        conn = db.get_connection()
+        conn.execute(f"""
+            SELECT station_id, blood_type, SUM(n) AS available FROM (
+                SELECT station_id, blood_type, quantity AS n FROM blood_inventory
+                UNION ALL
+                SELECT station_id, blood_type, COUNT(*) FROM emergency_blood_bags
+                WHERE status = 'AVAILABLE' AND expiry_date >= ?
+                  AND product_type IN ('WHOLE_BLOOD', 'RBC_CONCENTRATE')
+                GROUP BY station_id, blood_type
+            ) WHERE blood_type IN ({','.join('?' * len(donors))})
+            GROUP BY station_id, blood_type ORDER BY available DESC
+        """, (str(today), *donors)).fetchall()
+        conn.close()
+    sql_ms = (time.perf_counter() - t0) * 1000 / 5
+
+    conn = db.get_connection()
+    conn.execute("UPDATE blood_inventory SET quantity = quantity + 1 WHERE station_id = 'ST-000' AND blood_type = 'O-'")
+    conn.commit()
+    conn.close()
+    t0 = time.perf_counter()
+    index.search("O-")
+    reload_ms = (time.perf_counter() - t0) * 1000
+
+    print(f"緊急血袋 {args.rows} 袋 / {len(stations)} 站")
+    print(f"矩陣載入           {load_ms:9.1f} ms")
+    print(f"記憶體搜尋         {search_us:9.1f} µs / 次  ({len(result['stations'])} 站符合 O- ≥ 10)")
+    print(f"SQL 彙總查詢       {sql_ms:9.1f} ms / 次")
+    print(f"血袋寫入後首次搜尋 {reload_ms:9.1f} ms  (重新載入 {index.reloads} 次)")
+
+
+BENCHMARKS = {
+    "snapshot": bench_snapshot,
+    "emergency-zip": bench_emergency_zip,
+    "sync-package": bench_sync_package,
+    "sync-format": bench_sync_format,
+    "sync-apply": bench_sync_apply,
+    "sync-delta": bench_sync_delta,
+    "sync-verify": bench_sync_verify,
+    "sync-ingest": bench_sync_ingest,
+    "sync-ledger": bench_sync_ledger,
+    "sync-filter": bench_sync_filter,
+    "sync-digest": bench_sync_digest,
+    "sync-scheduler": bench_sync_scheduler,
+    "sync-reconcile": bench_sync_reconcile,
+    "hospital-report": bench_hospital_report,
+    "federation": bench_federation,
+    "station-merge": bench_station_merge,
+    "stocktake": bench_stocktake,
+    "blood-register": bench_blood_register,
+    "expiry": bench_expiry,
+    "blood-list": bench_blood_list,
+    "blood-compatible": bench_blood_compatible,
+}
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="醫療站庫存管理系統效能基準測試")
+    parser.add_argument("name", choices=sorted(BENCHMARKS), help="基準測試項目")
+    parser.add_argument("--rows", type=int, default=1000000, help="合成資料筆數")
+    parser.add_argument("--packages", type=int, default=8, help="封包數量 (sync-ingest)；federation 為站點檔案數 / 4")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="medical_bench_"))
+    try:
+        main = load_app(workdir)
+        BENCHMARKS[args.name](main, args)
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main_cli()
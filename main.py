@@ -6,9 +6,10 @@
 """
 
 import logging
+import os
 import sys
-from datetime import datetime, timedelta, time
-from typing import Optional, List, Dict, Any
+from datetime import datetime, timedelta, time, timezone
+from typing import Optional, List, Dict, Any, Tuple
 from pathlib import Path
 import sqlite3
 import json
@@ -17,12 +18,26 @@ import io
 import zipfile
 import shutil
 import hashlib
+import base64
+import math
+import struct
 import asyncio
-
-from fastapi import FastAPI, HTTPException, status, Query
+import gzip
+import tempfile
+import zlib
+import queue
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from time import perf_counter
+
+from fastapi import FastAPI, HTTPException, status, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, FileResponse, StreamingResponse, HTMLResponse
 from pydantic import BaseModel, Field, field_validator
+from starlette.background import BackgroundTask
 import uvicorn
 
 # v1.4.5新增: 緊急功能相關套件
@@ -45,6 +60,11 @@ except ImportError:
     REPORTLAB_AVAILABLE = False
     logger.warning("ReportLab not available, PDF generation will be limited")
 
+from sync_formats import (
+    ZSTD_AVAILABLE, SyncBinaryFormat, SyncBinaryReader, SyncNdjsonReader,
+    parse_sync_package_file, sync_package_checksum
+)
+
 
 # ============================================================================
 # 日誌配置
@@ -75,10 +95,71 @@ class Config:
     DATABASE_PATH = "medical_inventory.db"
     STATION_ID = "TC-01"
     DEBUG = True
+    STATION_CONFIG_PATH = "config/station_config.json"
 
     # 血型列表
     BLOOD_TYPES = ['A+', 'A-', 'B+', 'B-', 'O+', 'O-', 'AB+', 'AB-']
 
+    # 線上快照備份 (SQLite Online Backup API)
+    BACKUP_PAGES_PER_STEP = 1024   # 每批複製頁數，批次之間讓出時間給寫入端
+    BACKUP_STEP_SLEEP = 0.005      # 批次間隔 (秒)
+    BACKUP_COMPRESS_LEVEL = 6      # gzip 壓縮等級 (1-9)
+
+    # 增量備份區塊大小 (SQLite 頁面大小的整數倍，未變動的頁面會產生相同區塊)
+    BACKUP_CHUNK_SIZE = 256 * 1024
+
+    # 同步封包分段上傳（不穩定的衛星/戰術鏈路）
+    SYNC_UPLOAD_CHUNK_SIZE = 256 * 1024
+    SYNC_UPLOAD_MAX_CHUNK_SIZE = 8 * 1024 * 1024
+    SYNC_UPLOAD_SESSION_TTL_HOURS = 72   # 未完成的工作階段保留時間
+
+    def __init__(self):
+        """由 station_config.json 載入站點系統設定"""
+        self.STATION_CONFIG = self.load_station_config(self.STATION_CONFIG_PATH)
+        system = self.STATION_CONFIG.get('system', {})
+
+        # 自動備份 (v1.4.5)
+        self.BACKUP_PATH = system.get('backup_path') or 'database/backups'
+        self.AUTO_BACKUP_ENABLED = bool(system.get('auto_backup_enabled', False))
+        self.AUTO_BACKUP_INTERVAL_HOURS = float(system.get('auto_backup_interval_hours') or 4)
+        self.MAX_BACKUP_DAYS = int(system.get('max_backup_days') or 7)
+
+        # 醫院層同步封包匯入管線 (投遞目錄 + API 佇列)
+        self.SYNC_INBOX_PATH = system.get('sync_inbox_path') or 'database/sync_inbox'
+        self.SYNC_INBOX_ENABLED = bool(system.get('sync_inbox_enabled', False))
+        self.SYNC_INGEST_WORKERS = int(system.get('sync_ingest_workers') or os.cpu_count() or 1)
+
+        # 站點自動同步排程：待打包變更達筆數或延遲門檻時產生封包放入寄件匣
+        self.SYNC_SCHEDULER_ENABLED = bool(system.get('sync_scheduler_enabled', False))
+        self.SYNC_SCHEDULER_INTERVAL_SECONDS = float(system.get('sync_scheduler_interval_seconds') or 60)
+        self.SYNC_MAX_PENDING_CHANGES = int(system.get('sync_max_pending_changes') or 5000)
+        self.SYNC_MAX_LATENCY_MINUTES = float(system.get('sync_max_latency_minutes') or 60)
+        self.SYNC_OUTBOX_PATH = system.get('sync_outbox_path') or 'database/sync_outbox'
+        self.SYNC_HOSPITAL_ID = system.get('sync_hospital_id') or 'HOSP-001'
+        self.SYNC_HOSPITAL_URL = system.get('sync_hospital_url') or None
+
+        # 醫院層聯邦查詢：直接查詢站點帶回的資料庫檔案
+        self.FEDERATION_PATH = system.get('federation_path') or 'database/station_files'
+        self.FEDERATION_WORKERS = int(system.get('federation_workers') or min(4, os.cpu_count() or 1))
+
+        # 過期清掃：定期將過效期的緊急血袋與耗材批次標記為 EXPIRED
+        self.EXPIRY_SWEEP_ENABLED = bool(system.get('expiry_sweep_enabled', True))
+        self.EXPIRY_SWEEP_INTERVAL_MINUTES = float(system.get('expiry_sweep_interval_minutes') or 60)
+        self.EXPIRY_WARNING_DAYS = int(system.get('expiry_warning_days') or 7)
+
+    @staticmethod
+    def load_station_config(path: str) -> dict:
+        """讀取站點設定檔（檔案不存在或格式錯誤時回傳空設定）"""
+        config_path = Path(path)
+        if not config_path.exists():
+            return {}
+        try:
+            with open(config_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"讀取站點設定檔失敗 ({path}): {e}")
+            return {}
+
 config = Config()
 
 
@@ -175,6 +256,11 @@ class EmergencyBloodBagRequest(BaseModel):
         return v
 
 
+class EmergencyBloodBagBulkRequest(BaseModel):
+    """緊急血袋批次登記請求"""
+    bags: List[EmergencyBloodBagRequest] = Field(..., min_length=1, max_length=1000, description="血袋清單")
+
+
 class EmergencyBloodBagUseRequest(BaseModel):
     """緊急血袋使用請求 (v1.4.5)"""
     bloodBagCode: str = Field(..., description="血袋編號")
@@ -244,6 +330,51 @@ class SurgeryRecordRequest(BaseModel):
     stationId: str = Field(default="TC-01", description="站點ID")
 
 
+class AuditStartRequest(BaseModel):
+    """開始盤點請求"""
+    auditType: str = Field(default="ROUTINE", description="ROUTINE / PRE_MERGE / POST_MERGE / EMERGENCY")
+    startedBy: str = Field(..., description="啟動人", min_length=1, max_length=100)
+    stationId: Optional[str] = Field(None, description="站點ID，預設本站")
+    notes: Optional[str] = Field(None, description="備註", max_length=2000)
+
+    @field_validator('auditType')
+    @classmethod
+    def validate_audit_type(cls, v):
+        """驗證盤點類型"""
+        if v not in DatabaseManager.AUDIT_TYPES:
+            raise ValueError(f'盤點類型必須為: {", ".join(DatabaseManager.AUDIT_TYPES)}')
+        return v
+
+
+class AuditCount(BaseModel):
+    """單一物品清點數量"""
+    itemCode: str = Field(..., description="物品代碼")
+    actualQuantity: int = Field(..., ge=0, description="實際數量")
+    remarks: Optional[str] = Field(None, description="備註", max_length=500)
+
+
+class AuditRecordRequest(AuditCount):
+    """記錄單一物品盤點結果"""
+    auditId: int = Field(..., description="盤點ID")
+    auditedBy: str = Field(..., description="清點人", min_length=1, max_length=100)
+
+
+class AuditRecordBatch(BaseModel):
+    """掃描器批次上傳清點數量"""
+    auditId: int = Field(..., description="盤點ID")
+    auditedBy: str = Field(..., description="清點人", min_length=1, max_length=100)
+    counts: List[AuditCount] = Field(..., min_length=1, description="清點數量")
+    accumulate: bool = Field(default=False, description="True 時與先前的數量相加（逐件掃描），否則覆蓋")
+
+
+class AuditCompleteRequest(BaseModel):
+    """完成盤點請求"""
+    auditId: int = Field(..., description="盤點ID")
+    completedBy: str = Field(..., description="完成人", min_length=1, max_length=100)
+    autoAdjust: bool = Field(default=True, description="依差異寫入庫存調整事件")
+    notes: Optional[str] = Field(None, description="備註", max_length=2000)
+
+
 # ============================================================================
 # 聯邦架構 - 同步封包 Models (Phase 1)
 # ============================================================================
@@ -262,6 +393,19 @@ class SyncPackageGenerate(BaseModel):
     hospitalId: str = Field(..., description="所屬醫院ID")
     syncType: str = Field(default="DELTA", description="同步類型: DELTA (增量) / FULL (全量)")
     sinceTimestamp: Optional[str] = Field(None, description="增量同步起始時間 (ISO 8601 格式)")
+    sinceSeq: Optional[int] = Field(None, ge=0, description="增量同步起始變更序號，留空則由醫院最後確認的序號開始")
+    knownFilter: Optional[Dict[str, Any]] = Field(None, description="醫院端已持有事件的布隆過濾器 (/api/hospital/sync/filter 的回傳內容)")
+
+    @field_validator('sinceTimestamp')
+    @classmethod
+    def validate_since_timestamp(cls, v):
+        """驗證起始時間格式（未帶時區視為站點本地時間）"""
+        if v:
+            try:
+                datetime.fromisoformat(v.replace('Z', '+00:00'))
+            except ValueError:
+                raise ValueError('sinceTimestamp 必須為 ISO 8601 格式，例如 2024-01-01T08:00:00 或 2024-01-01T00:00:00Z')
+        return v
 
 
 class SyncPackageUpload(BaseModel):
@@ -272,6 +416,116 @@ class SyncPackageUpload(BaseModel):
     checksum: str = Field(..., description="封包校驗碼 (SHA-256)")
 
 
+class SyncFilterRequest(BaseModel):
+    """取得已持有事件的布隆過濾器"""
+    stationId: str = Field(..., description="站點ID")
+    tables: Optional[List[str]] = Field(None, description="事件表，留空為全部只新增的事件表")
+    errorRate: float = Field(default=0.01, gt=0, lt=0.5, description="誤判率（越低過濾器越大）")
+
+
+class SyncCountRequest(BaseModel):
+    """查詢站點事件筆數"""
+    stationId: str = Field(..., description="站點ID")
+    tables: Optional[List[str]] = Field(None, description="事件表，留空為全部只新增的事件表")
+
+
+class SyncPushRequest(BaseModel):
+    """站點以布隆過濾器預先交換後上傳同步封包（醫院位址為設定檔的 sync_hospital_url）"""
+    stationId: str = Field(..., description="站點ID")
+    hospitalId: str = Field(..., description="所屬醫院ID")
+    syncType: str = Field(default="DELTA", description="同步類型: DELTA (增量) / FULL (全量)")
+    errorRate: float = Field(default=0.01, gt=0, lt=0.5, description="過濾器誤判率")
+
+
+class SyncOutboxSent(BaseModel):
+    """寄件匣封包已送出"""
+    transferMethod: str = Field(..., description="轉移方式: USB / DRONE / MANUAL / NETWORK")
+
+
+class SyncAcknowledge(BaseModel):
+    """同步確認（目的端已收到並套用到某個變更序號）"""
+    stationId: str = Field(..., description="站點ID")
+    destinationId: str = Field(..., description="目的端ID (醫院ID)")
+    seq: int = Field(..., ge=0, description="已確認的變更序號 (封包的 to_seq)")
+
+
+class SyncDigestCompare(BaseModel):
+    """資料表摘要比對請求"""
+    stationId: str = Field(..., description="站點ID")
+    tables: Dict[str, Dict[str, Any]] = Field(..., description="資料表 → {row_count, digest} (GET /api/sync/digest 的 tables)")
+
+
+class SyncMerkleCompare(BaseModel):
+    """雜湊樹節點比對請求"""
+    table: str = Field(..., description="資料表名稱")
+    stationId: str = Field(..., description="站點ID")
+    level: int = Field(..., ge=0, description="樹層級 (0 為根節點)")
+    nodes: Dict[int, str] = Field(..., description="節點索引 → 雜湊 (無資料為空字串)")
+
+
+class SyncMerkleBuckets(BaseModel):
+    """取得對帳封包請求"""
+    table: str = Field(..., description="資料表名稱")
+    stationId: str = Field(..., description="站點ID")
+    buckets: List[int] = Field(..., description="不一致的主鍵區段")
+
+
+class SyncMerkleReconcile(BaseModel):
+    """與醫院進行雜湊樹對帳（對象固定為設定檔的 sync_hospital_url）"""
+    stationId: str = Field(..., description="站點ID")
+    tables: Optional[List[str]] = Field(None, description="對帳資料表，留空為全部")
+    direction: str = Field(default="push", description="push: 以本端修正對方 / pull: 由對方修正本端")
+
+
+class SyncPackageBinaryGenerate(SyncPackageGenerate):
+    """產生二進位同步封包請求（USB / 無人機實體轉移）"""
+    codec: str = Field(default="gzip", description="壓縮方式: gzip / zstd / none")
+    level: Optional[int] = Field(None, description="壓縮等級 (gzip 1-9, zstd 1-22)，留空使用預設值")
+    transferMethod: str = Field(default="USB", description="轉移方式: USB / DRONE / MANUAL / NETWORK")
+
+    @field_validator('codec')
+    @classmethod
+    def validate_codec(cls, v):
+        if v not in ('gzip', 'zstd', 'none'):
+            raise ValueError('壓縮方式必須為 gzip / zstd / none')
+        return v
+
+    @field_validator('transferMethod')
+    @classmethod
+    def validate_transfer_method(cls, v):
+        if v not in ('USB', 'DRONE', 'MANUAL', 'NETWORK'):
+            raise ValueError('轉移方式必須為 USB / DRONE / MANUAL / NETWORK')
+        return v
+
+
+class SyncUploadSessionCreate(BaseModel):
+    """建立分段上傳工作階段請求"""
+    stationId: str = Field(..., description="站點ID")
+    packageId: str = Field(..., description="封包ID")
+    packageFormat: str = Field(default="ndjson", description="封包格式: ndjson / binary / json")
+    totalSize: int = Field(..., gt=0, description="封包總大小 (bytes)")
+    checksum: str = Field(..., description="整包 SHA-256")
+    chunkSize: Optional[int] = Field(None, gt=0, description="區塊大小 (bytes)，留空使用預設值")
+
+
+class BackupRestoreRequest(BaseModel):
+    """還原增量備份快照請求"""
+    confirm: bool = Field(..., description="確認還原，必須為 true")
+
+
+class FederationQueryRequest(BaseModel):
+    """跨站點資料庫聯邦查詢"""
+    queries: Optional[List[str]] = Field(None, description="blood_by_type / low_stock / equipment_alerts，預設全部")
+    files: Optional[List[str]] = Field(None, description="聯邦目錄中的檔名，預設全部")
+
+
+class HospitalDailyReportSubmit(BaseModel):
+    """產生並儲存醫院日報表"""
+    hospitalId: str = Field(..., description="醫院ID")
+    reportDate: Optional[str] = Field(None, description="報表日期 (YYYY-MM-DD)，預設今天")
+    submittedBy: str = Field(..., description="送出人員")
+
+
 class HospitalTransferCoordinate(BaseModel):
     """醫院層院內調撥協調請求 (Phase 2)"""
     hospitalId: str = Field(..., description="醫院ID")
@@ -294,6 +548,13 @@ class DatabaseManager:
     
     def __init__(self, db_path: str):
         self.db_path = db_path
+        # 同步套用 SQL 與資料表欄位快取
+        self._sync_statements = {}
+        self._sync_columns = {}
+        self._merkle_int_keys = {}
+        # 已套用變更紀錄的布隆過濾器（首次使用時由 sync_applied_changes 建立）
+        self._ledger_filter = None
+        self._ledger_lock = threading.Lock()
         logger.info(f"初始化資料庫: {db_path}")
         self.init_database()
     
@@ -310,6 +571,9 @@ class DatabaseManager:
         cursor = conn.cursor()
         
         try:
+            # WAL 模式：讀取（含線上快照備份）與寫入互不阻擋
+            cursor.execute("PRAGMA journal_mode=WAL")
+
             # 物品主檔
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS items (
@@ -336,6 +600,7 @@ class DatabaseManager:
                     station_id TEXT NOT NULL,
                     operator TEXT DEFAULT 'SYSTEM',
                     timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    event_uid TEXT,
                     FOREIGN KEY (item_code) REFERENCES items(code)
                 )
             """)
@@ -370,7 +635,8 @@ class DatabaseManager:
                     quantity INTEGER NOT NULL,
                     station_id TEXT NOT NULL,
                     operator TEXT DEFAULT 'SYSTEM',
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    event_uid TEXT
                 )
             """)
 
@@ -391,10 +657,22 @@ class DatabaseManager:
                     usage_timestamp TIMESTAMP,
                     remarks TEXT,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    event_uid TEXT,
                     CHECK(status IN ('AVAILABLE', 'USED', 'EXPIRED', 'DISCARDED'))
                 )
             """)
 
+            # 緊急血袋序號計數器：每個 (組織, 採集日期, 血型代碼) 的最後序號
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS emergency_blood_sequences (
+                    org_code TEXT NOT NULL,
+                    code_date TEXT NOT NULL,
+                    blood_code TEXT NOT NULL,
+                    last_seq INTEGER NOT NULL,
+                    PRIMARY KEY (org_code, code_date, blood_code)
+                ) WITHOUT ROWID
+            """)
+
             # 設備主檔
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS equipment (
@@ -422,6 +700,7 @@ class DatabaseManager:
                     station_id TEXT NOT NULL,
                     operator TEXT DEFAULT 'SYSTEM',
                     timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    event_uid TEXT,
                     FOREIGN KEY (equipment_id) REFERENCES equipment(id)
                 )
             """)
@@ -446,6 +725,7 @@ class DatabaseManager:
                     archived_by TEXT,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    event_uid TEXT,
                     CHECK(status IN ('ONGOING', 'COMPLETED', 'ARCHIVED', 'CANCELLED')),
                     CHECK(patient_outcome IS NULL OR patient_outcome IN ('DISCHARGED', 'TRANSFERRED', 'DECEASED'))
                 )
@@ -566,15 +846,14 @@ class DatabaseManager:
                 ON blood_events(timestamp DESC)
             """)
 
-            # 緊急血袋索引 (v1.4.5新增)
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_emergency_blood_status
-                ON emergency_blood_bags(status, collection_date DESC)
-            """)
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_emergency_blood_type
-                ON emergency_blood_bags(blood_type, status)
-            """)
+            # 緊急血袋索引 (v1.4.5新增)：清單依 (採集日期 DESC, 血袋編號) 分頁，索引帶排序欄位
+            for name, definition in self.EMERGENCY_LIST_INDEXES.items():
+                cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'index' AND name = ?", (name,))
+                row = cursor.fetchone()
+                if row and definition not in row['sql']:
+                    # 舊版定義沒有排序欄位，重建
+                    cursor.execute(f"DROP INDEX {name}")
+                cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {definition}")
             cursor.execute("""
                 CREATE INDEX IF NOT EXISTS idx_emergency_blood_expiry
                 ON emergency_blood_bags(expiry_date)
@@ -619,6 +898,10 @@ class DatabaseManager:
                 CREATE INDEX IF NOT EXISTS idx_audit_details_audit
                 ON inventory_audit_details(audit_id)
             """)
+            cursor.execute("""
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_audit_details_item
+                ON inventory_audit_details(audit_id, item_code)
+            """)
             # ========== 索引優化結束 ==========
 
             # ========== 聯邦式架構表格 (Phase 0) ==========
@@ -744,8 +1027,54 @@ class DatabaseManager:
                 CREATE INDEX IF NOT EXISTS idx_hospital_reports_hospital
                 ON hospital_daily_reports(hospital_id)
             """)
+
+            # 同步封包分段上傳（斷線續傳）
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS sync_upload_sessions (
+                    session_id TEXT PRIMARY KEY,
+                    station_id TEXT NOT NULL,
+                    package_id TEXT NOT NULL,
+                    package_format TEXT NOT NULL,
+                    total_size INTEGER NOT NULL,
+                    chunk_size INTEGER NOT NULL,
+                    total_chunks INTEGER NOT NULL,
+                    checksum TEXT NOT NULL,
+                    status TEXT DEFAULT 'OPEN',
+                    result_json TEXT,
+                    error_message TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    completed_at TIMESTAMP,
+                    CHECK(package_format IN ('ndjson', 'binary', 'json')),
+                    CHECK(status IN ('OPEN', 'COMPLETED', 'FAILED'))
+                )
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS sync_upload_chunks (
+                    session_id TEXT NOT NULL,
+                    chunk_index INTEGER NOT NULL,
+                    size INTEGER NOT NULL,
+                    sha256 TEXT NOT NULL,
+                    data BLOB NOT NULL,
+                    received_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (session_id, chunk_index),
+                    FOREIGN KEY (session_id) REFERENCES sync_upload_sessions(session_id)
+                )
+            """)
             # ========== 聯邦式架構結束 ==========
 
+            # 同步變更紀錄 (CDC) 與觸發器
+            self._init_sync_changelog(cursor)
+
+            # 醫院彙總表與觸發器（日報表）
+            self._init_hospital_rollups(cursor)
+
+            # 效期索引（緊急血袋、耗材批次）與觸發器
+            self._init_expiry_index(cursor)
+
+            # 血袋可用量版本號（相容血型搜尋的記憶體矩陣）
+            self._init_blood_availability(cursor)
+
             # 初始化預設設備
             self._init_default_equipment(cursor)
 
@@ -769,6 +1098,256 @@ class DatabaseManager:
         finally:
             conn.close()
     
+    def _init_sync_changelog(self, cursor):
+        """
+        建立同步變更紀錄與觸發器
+
+        SYNC_CAPTURE_TABLES 中各資料表的新增、修改、刪除都由觸發器寫入 sync_changelog，
+        seq 單調遞增；增量同步只需掃描目的端最後確認序號之後的範圍。
+        首次建立時以現有資料回填，確保既有資料也能被增量同步送出。
+        """
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sync_changelog'")
+        is_new = cursor.fetchone() is None
+
+        # 觸發器定義隨版本更新：先移除再重建（也避免下方資料遷移觸發舊版觸發器）
+        for table in self.SYNC_CAPTURE_TABLES:
+            for operation in ('insert', 'update', 'delete'):
+                cursor.execute(f"DROP TRIGGER IF EXISTS trg_sync_{table}_{operation}")
+
+        migrated = self._init_event_uids(cursor)
+
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS sync_changelog (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                table_name TEXT NOT NULL,
+                row_key NOT NULL,
+                operation TEXT NOT NULL,
+                station_id TEXT,
+                changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                CHECK(operation IN ('INSERT', 'UPDATE', 'DELETE'))
+            )
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_sync_changelog_time
+            ON sync_changelog(changed_at)
+        """)
+
+        # 各目的端（醫院）已確認收到的最後序號
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS sync_acknowledgements (
+                destination_id TEXT NOT NULL,
+                station_id TEXT NOT NULL,
+                last_seq INTEGER NOT NULL DEFAULT 0,
+                acknowledged_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (destination_id, station_id)
+            )
+        """)
+
+        # 自動同步寄件匣：排程產生、等待轉移的封包
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS sync_outbox (
+                package_id TEXT PRIMARY KEY,
+                station_id TEXT NOT NULL,
+                hospital_id TEXT NOT NULL,
+                from_seq INTEGER NOT NULL,
+                to_seq INTEGER NOT NULL,
+                changes_count INTEGER NOT NULL,
+                package_size INTEGER NOT NULL,
+                checksum TEXT NOT NULL,
+                file_path TEXT NOT NULL,
+                trigger_reason TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'QUEUED',
+                transfer_method TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                sent_at TIMESTAMP,
+                CHECK(trigger_reason IN ('SIZE', 'LATENCY', 'MANUAL')),
+                CHECK(status IN ('QUEUED', 'SENT', 'ACKNOWLEDGED'))
+            )
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_sync_outbox_destination
+            ON sync_outbox(hospital_id, station_id, to_seq)
+        """)
+
+        if migrated and not is_new:
+            # 既有變更紀錄的本地 id 改為 event_uid（已刪除的資料依舊資料的規則推得）
+            for table in migrated:
+                cursor.execute(f"""
+                    UPDATE sync_changelog
+                    SET row_key = COALESCE(
+                        (SELECT event_uid FROM {table} WHERE id = sync_changelog.row_key),
+                        station_id || '-' || row_key
+                    )
+                    WHERE table_name = ?
+                """, (table,))
+
+        for table, (key_col, station_col, timestamp_col) in self.SYNC_CAPTURE_TABLES.items():
+            new_station = f"NEW.{station_col}" if station_col else "NULL"
+            old_station = f"OLD.{station_col}" if station_col else "NULL"
+
+            if is_new:
+                cursor.execute(f"""
+                    INSERT INTO sync_changelog (table_name, row_key, operation, station_id, changed_at)
+                    SELECT '{table}', {key_col}, 'INSERT', {station_col or 'NULL'},
+                           COALESCE({timestamp_col}, CURRENT_TIMESTAMP)
+                    FROM {table}
+                    ORDER BY {timestamp_col}
+                """)
+
+            if table in self.SYNC_EVENT_TABLES:
+                # 本地新增的資料由觸發器指派 event_uid；同步匯入的資料保留來源的 event_uid
+                cursor.execute(f"""
+                    CREATE TRIGGER trg_sync_{table}_insert
+                    AFTER INSERT ON {table}
+                    BEGIN
+                        UPDATE {table}
+                        SET event_uid = (SELECT node_id FROM sync_node_identity) || '-' || NEW.id
+                        WHERE NEW.event_uid IS NULL AND id = NEW.id;
+                        INSERT INTO sync_changelog (table_name, row_key, operation, station_id)
+                        VALUES ('{table}', COALESCE(NEW.event_uid, (SELECT event_uid FROM {table} WHERE id = NEW.id)),
+                                'INSERT', {new_station});
+                    END
+                """)
+                # 指派 event_uid 的更新不另記變更
+                update_when = "WHEN OLD.event_uid IS NOT NULL"
+            else:
+                cursor.execute(f"""
+                    CREATE TRIGGER trg_sync_{table}_insert
+                    AFTER INSERT ON {table}
+                    BEGIN
+                        INSERT INTO sync_changelog (table_name, row_key, operation, station_id)
+                        VALUES ('{table}', NEW.{key_col}, 'INSERT', {new_station});
+                    END
+                """)
+                update_when = ""
+            cursor.execute(f"""
+                CREATE TRIGGER trg_sync_{table}_update
+                AFTER UPDATE ON {table}
+                {update_when}
+                BEGIN
+                    INSERT INTO sync_changelog (table_name, row_key, operation, station_id)
+                    SELECT '{table}', OLD.{key_col}, 'DELETE', {old_station}
+                    WHERE OLD.{key_col} IS NOT NEW.{key_col};
+                    INSERT INTO sync_changelog (table_name, row_key, operation, station_id)
+                    VALUES ('{table}', NEW.{key_col}, 'UPDATE', {new_station});
+                END
+            """)
+            cursor.execute(f"""
+                CREATE TRIGGER trg_sync_{table}_delete
+                AFTER DELETE ON {table}
+                BEGIN
+                    INSERT INTO sync_changelog (table_name, row_key, operation, station_id)
+                    VALUES ('{table}', OLD.{key_col}, 'DELETE', {old_station});
+                END
+            """)
+
+            # 全量同步與 sinceTimestamp 查詢用
+            if station_col:
+                cursor.execute(f"""
+                    CREATE INDEX IF NOT EXISTS idx_{table}_station_time
+                    ON {table}({station_col}, {timestamp_col})
+                """)
+
+        # Merkle 對帳：雜湊樹葉節點（主鍵區段）與更新進度
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS sync_merkle_buckets (
+                table_name TEXT NOT NULL,
+                station_id TEXT NOT NULL,
+                bucket INTEGER NOT NULL,
+                row_count INTEGER NOT NULL,
+                digest TEXT NOT NULL,
+                row_sum TEXT NOT NULL DEFAULT '',
+                updated_seq INTEGER NOT NULL,
+                PRIMARY KEY (table_name, station_id, bucket)
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS sync_merkle_state (
+                name TEXT PRIMARY KEY,
+                last_seq INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        # 資料表摘要：各列雜湊相加 (mod 2^256)，與資料列順序無關，隨雜湊樹區段增量更新
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS sync_table_digests (
+                table_name TEXT NOT NULL,
+                station_id TEXT NOT NULL,
+                row_count INTEGER NOT NULL,
+                digest TEXT NOT NULL,
+                updated_seq INTEGER NOT NULL,
+                PRIMARY KEY (table_name, station_id)
+            )
+        """)
+        rebuild_merkle = bool(migrated)
+        columns = [row['name'] for row in cursor.execute("PRAGMA table_info(sync_merkle_buckets)")]
+        if 'row_sum' not in columns:
+            cursor.execute("ALTER TABLE sync_merkle_buckets ADD COLUMN row_sum TEXT NOT NULL DEFAULT ''")
+            rebuild_merkle = True
+        # 事件表依 event_uid 的來源編號分段（見 _merkle_bucket），以運算式索引範圍查詢
+        for table in self.SYNC_EVENT_TABLES:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (f"idx_{table}_merkle",))
+            if cursor.fetchone() is None:
+                cursor.execute(f"""
+                    CREATE INDEX idx_{table}_merkle ON {table}(station_id, {self.SYNC_MERKLE_ORIGIN_SEQ})
+                """)
+                rebuild_merkle = True
+        # 冪等匯入：已套用的封包與變更（變更內容 SHA-256 前 16 bytes）
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS sync_applied_packages (
+                package_id TEXT PRIMARY KEY,
+                checksum TEXT NOT NULL,
+                source_id TEXT,
+                changes_count INTEGER NOT NULL,
+                changes_applied INTEGER NOT NULL,
+                duplicates_skipped INTEGER NOT NULL DEFAULT 0,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS sync_applied_changes (
+                change_hash BLOB PRIMARY KEY
+            ) WITHOUT ROWID
+        """)
+
+        if rebuild_merkle:
+            # 主鍵改變或舊版區段缺少 row_sum，雜湊樹與資料表摘要由變更紀錄完整重建
+            cursor.execute("DELETE FROM sync_merkle_buckets")
+            cursor.execute("DELETE FROM sync_merkle_state")
+            cursor.execute("DELETE FROM sync_table_digests")
+
+    def _init_event_uids(self, cursor) -> List[str]:
+        """
+        建立節點識別與站點資料表的全域唯一 event_uid
+
+        event_uid = 建立資料的節點ID + '-' + 本地自動編號；節點ID 於資料庫建立時產生一次
+        （站點代碼加隨機後綴，兩個節點設定相同站點代碼也不會衝突）。
+        舊資料庫遷移：新增欄位並以 station_id + '-' + id 回填（各節點對同一筆舊資料得到相同值），
+        回傳遷移過的資料表。
+        """
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS sync_node_identity (
+                node_id TEXT PRIMARY KEY,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("SELECT node_id FROM sync_node_identity LIMIT 1")
+        row = cursor.fetchone()
+        if row is None:
+            self.node_id = f"{getattr(config, 'STATION_ID', 'TC-01')}.{uuid.uuid4().hex[:6]}"
+            cursor.execute("INSERT INTO sync_node_identity (node_id) VALUES (?)", (self.node_id,))
+        else:
+            self.node_id = row['node_id']
+
+        migrated = []
+        for table in self.SYNC_EVENT_TABLES:
+            columns = {column['name'] for column in cursor.execute(f"PRAGMA table_info({table})").fetchall()}
+            if 'event_uid' not in columns:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN event_uid TEXT")
+                migrated.append(table)
+            cursor.execute(f"UPDATE {table} SET event_uid = station_id || '-' || id WHERE event_uid IS NULL")
+            cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{table}_event_uid ON {table}(event_uid)")
+        return migrated
+
     def _init_default_equipment(self, cursor):
         """初始化預設設備"""
         default_equipment = [
@@ -1488,40 +2067,39 @@ class DatabaseManager:
 
     # ========== 緊急血袋管理 (v1.4.5新增) ==========
 
-    def generate_emergency_blood_code(self, blood_type: str, collection_date: str, org_code: str = "DNO") -> str:
-        """生成緊急血袋編號 {ORG}-{YYMMDD}-{BLOOD_TYPE}-{SEQ}"""
-        # 讀取血型代碼映射
-        blood_type_codes = {
-            "A+": "AP", "A-": "AN",
-            "B+": "BP", "B-": "BN",
-            "O+": "OP", "O-": "ON",
-            "AB+": "ABP", "AB-": "ABN"
-        }
-        blood_code = blood_type_codes.get(blood_type, "XX")
+    # 血型代碼（緊急血袋編號用）
+    BLOOD_TYPE_CODES = {
+        "A+": "AP", "A-": "AN",
+        "B+": "BP", "B-": "BN",
+        "O+": "OP", "O-": "ON",
+        "AB+": "ABP", "AB-": "ABN"
+    }
+    EMERGENCY_BULK_LIMIT = 1000   # 批次登記每次上限
 
-        # 解析日期為YYMMDD格式
-        from datetime import datetime
-        date_obj = datetime.strptime(collection_date, "%Y-%m-%d")
-        date_str = date_obj.strftime("%y%m%d")
+    def _allocate_blood_bag_codes(self, cursor, blood_type: str, collection_date: str, org_code: str, count: int) -> List[str]:
+        """
+        由序號計數器配置 count 個連續的緊急血袋編號 {ORG}-{YYMMDD}-{BLOOD_TYPE}-{SEQ}
 
-        # 查詢當天該血型的序號
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute("""
-                SELECT COUNT(*) as count
-                FROM emergency_blood_bags
-                WHERE blood_type = ?
-                AND collection_date = ?
-            """, (blood_type, collection_date))
-            count = cursor.fetchone()['count']
-            seq = count + 1
-
-            # 生成完整編號
-            blood_bag_code = f"{org_code}-{date_str}-{blood_code}-{seq:03d}"
-            return blood_bag_code
-        finally:
-            conn.close()
+        須在寫入交易內呼叫（BEGIN IMMEDIATE），配置與插入在同一交易，並行登記不會取得相同序號。
+        計數器第一次使用時，以既有血袋編號的最大序號為起點（GLOB 前綴可使用 blood_bag_code 的唯一索引）。
+        """
+        blood_code = self.BLOOD_TYPE_CODES.get(blood_type, "XX")
+        date_str = datetime.strptime(collection_date, "%Y-%m-%d").strftime("%y%m%d")
+        prefix = f"{org_code}-{date_str}-{blood_code}-"
+
+        cursor.execute("""
+            INSERT INTO emergency_blood_sequences (org_code, code_date, blood_code, last_seq)
+            SELECT ?, ?, ?, COALESCE(MAX(CAST(SUBSTR(blood_bag_code, ?) AS INTEGER)), 0)
+            FROM emergency_blood_bags WHERE blood_bag_code GLOB ?
+            ON CONFLICT(org_code, code_date, blood_code) DO NOTHING
+        """, (org_code, date_str, blood_code, len(prefix) + 1, prefix + '*'))
+        cursor.execute("""
+            UPDATE emergency_blood_sequences SET last_seq = last_seq + ?
+            WHERE org_code = ? AND code_date = ? AND blood_code = ?
+            RETURNING last_seq
+        """, (count, org_code, date_str, blood_code))
+        last_seq = cursor.fetchone()[0]
+        return [f"{prefix}{seq:03d}" for seq in range(last_seq - count + 1, last_seq + 1)]
 
     def calculate_expiry_date(self, collection_date: str, product_type: str) -> str:
         """計算血袋效期"""
@@ -1541,51 +2119,85 @@ class DatabaseManager:
 
     def register_emergency_blood_bag(self, data: dict) -> dict:
         """登記緊急血袋"""
+        result = self.register_emergency_blood_bags([data])
+        bag = result["bags"][0]
+        return {
+            "success": True,
+            "blood_bag_code": bag["blood_bag_code"],
+            "expiry_date": bag["expiry_date"],
+            "message": f"血袋 {bag['blood_bag_code']} 登記成功"
+        }
+
+    def register_emergency_blood_bags(self, bags: List[dict]) -> dict:
+        """
+        批次登記緊急血袋（欄位同 register_emergency_blood_bag）
+
+        同一 (組織, 採集日期, 血型) 的血袋一次配置整段序號，全部在同一個交易內插入，任一筆失敗則全部還原。
+        """
+        if not bags:
+            raise HTTPException(status_code=400, detail="沒有要登記的血袋")
+        if len(bags) > self.EMERGENCY_BULK_LIMIT:
+            raise HTTPException(status_code=400, detail=f"每次最多登記 {self.EMERGENCY_BULK_LIMIT} 袋")
+
+        groups = {}
+        for index, data in enumerate(bags):
+            try:
+                datetime.strptime(data['collection_date'], "%Y-%m-%d")
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"採集日期格式錯誤: {data['collection_date']}")
+            key = (data['blood_type'], data['collection_date'], data.get('org_code', 'DNO'))
+            groups.setdefault(key, []).append(index)
+
         conn = self.get_connection()
         cursor = conn.cursor()
 
         try:
-            # 生成血袋編號
-            blood_bag_code = self.generate_emergency_blood_code(
-                data['blood_type'],
-                data['collection_date'],
-                data.get('org_code', 'DNO')
-            )
-
-            # 計算效期
-            expiry_date = self.calculate_expiry_date(
-                data['collection_date'],
-                data['product_type']
-            )
-
-            # 插入記錄
-            cursor.execute("""
+            cursor.execute("BEGIN IMMEDIATE")
+            codes = [None] * len(bags)
+            for (blood_type, collection_date, org_code), indexes in groups.items():
+                allocated = self._allocate_blood_bag_codes(cursor, blood_type, collection_date, org_code, len(indexes))
+                for index, code in zip(indexes, allocated):
+                    codes[index] = code
+
+            rows = []
+            for code, data in zip(codes, bags):
+                rows.append((
+                    code,
+                    data['blood_type'],
+                    data['product_type'],
+                    data['collection_date'],
+                    self.calculate_expiry_date(data['collection_date'], data['product_type']),
+                    data.get('volume_ml', 250),
+                    data['station_id'],
+                    data['operator'],
+                    data.get('remarks', '')
+                ))
+            cursor.executemany("""
                 INSERT INTO emergency_blood_bags
                 (blood_bag_code, blood_type, product_type, collection_date, expiry_date,
                  volume_ml, station_id, operator, remarks)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                blood_bag_code,
-                data['blood_type'],
-                data['product_type'],
-                data['collection_date'],
-                expiry_date,
-                data.get('volume_ml', 250),
-                data['station_id'],
-                data['operator'],
-                data.get('remarks', '')
-            ))
+            """, rows)
 
             conn.commit()
-            logger.info(f"緊急血袋登記成功: {blood_bag_code}")
+            if len(rows) == 1:
+                logger.info(f"緊急血袋登記成功: {rows[0][0]}")
+            else:
+                logger.info(f"緊急血袋批次登記成功: {len(rows)} 袋 ({rows[0][0]} …)")
 
             return {
                 "success": True,
-                "blood_bag_code": blood_bag_code,
-                "expiry_date": expiry_date,
-                "message": f"血袋 {blood_bag_code} 登記成功"
+                "registered": len(rows),
+                "bags": [
+                    {"blood_bag_code": row[0], "blood_type": row[1], "product_type": row[2], "expiry_date": row[4]}
+                    for row in rows
+                ],
+                "message": f"已登記 {len(rows)} 袋血袋"
             }
 
+        except HTTPException:
+            conn.rollback()
+            raise
         except Exception as e:
             conn.rollback()
             logger.error(f"緊急血袋登記失敗: {e}")
@@ -1593,25 +2205,104 @@ class DatabaseManager:
         finally:
             conn.close()
 
-    def get_emergency_blood_bags(self, status: str = None) -> List[Dict]:
-        """取得緊急血袋清單"""
+    # 清單排序 (collection_date DESC, blood_bag_code) 的索引；依篩選條件以 INDEXED BY 指定，
+    # 讓每頁只走訪索引中緊接在游標之後的項目
+    EMERGENCY_LIST_INDEXES = {
+        "idx_emergency_blood_status": "emergency_blood_bags(status, collection_date DESC, blood_bag_code)",
+        "idx_emergency_blood_type": "emergency_blood_bags(blood_type, collection_date DESC, blood_bag_code)",
+        "idx_emergency_blood_type_status": "emergency_blood_bags(blood_type, status, collection_date DESC, blood_bag_code)",
+        "idx_emergency_blood_listing": "emergency_blood_bags(collection_date DESC, blood_bag_code)",
+    }
+    EMERGENCY_LIST_COLUMNS = (
+        'id', 'blood_bag_code', 'blood_type', 'product_type', 'collection_date', 'expiry_date', 'volume_ml',
+        'status', 'station_id', 'operator', 'patient_name', 'usage_timestamp', 'remarks', 'created_at', 'event_uid'
+    )
+    EMERGENCY_LIST_MAX = 1000
+
+    def get_emergency_blood_bags(
+        self,
+        status: Optional[str] = None,
+        blood_type: Optional[str] = None,
+        product_type: Optional[str] = None,
+        station_id: Optional[str] = None,
+        expiry_from: Optional[str] = None,
+        expiry_to: Optional[str] = None,
+        fields: Optional[List[str]] = None,
+        limit: int = 100,
+        cursor_token: Optional[str] = None
+    ) -> dict:
+        """
+        取得緊急血袋清單（依採集日期新到舊、血袋編號排序）
+
+        以 keyset 分頁：回傳的 next_cursor 為本頁最後一袋的 (採集日期, 血袋編號)，
+        下一頁從索引中該位置之後繼續讀取，不論翻到第幾頁或資料表多大，每頁成本只與 limit 有關。
+        fields 指定要回傳的欄位（預設全部）。
+        """
+        columns = list(fields or self.EMERGENCY_LIST_COLUMNS)
+        unknown = [column for column in columns if column not in self.EMERGENCY_LIST_COLUMNS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"不支援的欄位: {', '.join(unknown)}")
+        limit = max(1, min(limit, self.EMERGENCY_LIST_MAX))
+
+        if status and blood_type:
+            index = "idx_emergency_blood_type_status"
+        elif blood_type:
+            index = "idx_emergency_blood_type"
+        elif status:
+            index = "idx_emergency_blood_status"
+        else:
+            index = "idx_emergency_blood_listing"
+
+        where_clauses = []
+        params = []
+        for column, value in (('status', status), ('blood_type', blood_type),
+                              ('product_type', product_type), ('station_id', station_id)):
+            if value:
+                where_clauses.append(f"{column} = ?")
+                params.append(value)
+        if expiry_from:
+            where_clauses.append("expiry_date >= ?")
+            params.append(expiry_from)
+        if expiry_to:
+            where_clauses.append("expiry_date <= ?")
+            params.append(expiry_to)
+        if cursor_token:
+            try:
+                after_date, after_code = json.loads(base64.urlsafe_b64decode(cursor_token.encode()))
+            except (ValueError, TypeError):
+                raise HTTPException(status_code=400, detail="分頁游標無效")
+            where_clauses.append("(collection_date < ? OR (collection_date = ? AND blood_bag_code > ?))")
+            params.extend([after_date, after_date, after_code])
+        where_sql = " AND ".join(where_clauses) if where_clauses else "1=1"
+        params.append(limit + 1)
+
+        # 排序欄位一定要讀出來才能產生游標
+        select = list(dict.fromkeys(columns + ['collection_date', 'blood_bag_code']))
+
         conn = self.get_connection()
         cursor = conn.cursor()
 
         try:
-            if status:
-                cursor.execute("""
-                    SELECT * FROM emergency_blood_bags
-                    WHERE status = ?
-                    ORDER BY collection_date DESC, blood_bag_code
-                """, (status,))
-            else:
-                cursor.execute("""
-                    SELECT * FROM emergency_blood_bags
-                    ORDER BY collection_date DESC, blood_bag_code
-                """)
-
-            return [dict(row) for row in cursor.fetchall()]
+            cursor.execute(f"""
+                SELECT {", ".join(select)}
+                FROM emergency_blood_bags INDEXED BY {index}
+                WHERE {where_sql}
+                ORDER BY collection_date DESC, blood_bag_code
+                LIMIT ?
+            """, params)
+            rows = cursor.fetchall()
+
+            next_cursor = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                last = rows[-1]
+                next_cursor = base64.urlsafe_b64encode(
+                    json.dumps([last['collection_date'], last['blood_bag_code']]).encode()
+                ).decode()
+            return {
+                "bags": [{column: row[column] for column in columns} for row in rows],
+                "next_cursor": next_cursor
+            }
         finally:
             conn.close()
 
@@ -1760,27 +2451,30 @@ class DatabaseManager:
         finally:
             conn.close()
     
+    # 物品及目前庫存（庫存 = 進貨 - 消耗）
+    INVENTORY_ITEMS_QUERY = """
+        SELECT
+            i.code, i.name, i.unit, i.min_stock, i.category,
+            COALESCE(stock.current_stock, 0) as current_stock
+        FROM items i
+        LEFT JOIN (
+            SELECT item_code,
+                   SUM(CASE WHEN event_type = 'RECEIVE' THEN quantity
+                            WHEN event_type = 'CONSUME' THEN -quantity
+                            ELSE 0 END) as current_stock
+            FROM inventory_events
+            GROUP BY item_code
+        ) stock ON i.code = stock.item_code
+        ORDER BY i.category, i.name
+    """
+
     def get_inventory_items(self) -> List[Dict]:
         """取得所有物品及庫存"""
         conn = self.get_connection()
         cursor = conn.cursor()
 
         try:
-            cursor.execute("""
-                SELECT
-                    i.code, i.name, i.unit, i.min_stock, i.category,
-                    COALESCE(stock.current_stock, 0) as current_stock
-                FROM items i
-                LEFT JOIN (
-                    SELECT item_code,
-                           SUM(CASE WHEN event_type = 'RECEIVE' THEN quantity
-                                    WHEN event_type = 'CONSUME' THEN -quantity
-                                    ELSE 0 END) as current_stock
-                    FROM inventory_events
-                    GROUP BY item_code
-                ) stock ON i.code = stock.item_code
-                ORDER BY i.category, i.name
-            """)
+            cursor.execute(self.INVENTORY_ITEMS_QUERY)
             return [dict(row) for row in cursor.fetchall()]
         finally:
             conn.close()
@@ -1898,273 +2592,4452 @@ class DatabaseManager:
 
         return output.getvalue()
 
-    # ========== 聯邦架構 - 同步封包方法 (Phase 1) ==========
+    # ========== 線上快照備份 (v1.4.5) ==========
 
-    def generate_sync_package(self, station_id: str, hospital_id: str, sync_type: str = "DELTA", since_timestamp: str = None) -> dict:
-        """產生同步封包"""
-        import hashlib
-        import json
-        from datetime import datetime
+    def _backup_into(self, dst: sqlite3.Connection, pages_per_step: Optional[int] = None) -> dict:
+        """
+        以 SQLite Online Backup API 將資料庫複製到 dst
 
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        在來源連線上固定一個讀取交易 (WAL 快照)：其他連線的寫入照常進行，
+        備份不會因來源被修改而不斷重新開始，內容固定於開始當下
+        """
+        progress_info = {"total_pages": 0, "steps": 0}
 
-        try:
-            # 產生封包ID
-            now = datetime.now()
-            package_id = f"PKG-{now.strftime('%Y%m%d-%H%M%S')}-{station_id}"
-
-            # 收集變更記錄
-            changes = []
-
-            if sync_type == "DELTA" and since_timestamp:
-                # 增量同步：收集自 since_timestamp 以來的變更
-                tables_to_sync = {
-                    'inventory_events': 'timestamp',
-                    'blood_events': 'timestamp',
-                    'equipment_checks': 'timestamp',
-                    'surgery_records': 'created_at',
-                    'emergency_blood_bags': 'created_at'
-                }
+        def _progress(status_code, remaining, total):
+            progress_info["total_pages"] = total
+            progress_info["steps"] += 1
 
-                for table, timestamp_col in tables_to_sync.items():
-                    cursor.execute(f"""
-                        SELECT * FROM {table}
-                        WHERE station_id = ? AND {timestamp_col} > ?
-                        ORDER BY {timestamp_col}
-                    """, (station_id, since_timestamp))
-
-                    rows = cursor.fetchall()
-                    for row in rows:
-                        changes.append({
-                            'table': table,
-                            'operation': 'INSERT',
-                            'data': dict(row),
-                            'timestamp': row[timestamp_col]
-                        })
+        src = self.get_connection()
+        try:
+            src.execute("BEGIN")
+            src.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+            src.backup(
+                dst,
+                pages=pages_per_step or config.BACKUP_PAGES_PER_STEP,
+                progress=_progress,
+                sleep=config.BACKUP_STEP_SLEEP
+            )
+            src.rollback()
+        finally:
+            src.close()
+        return progress_info
 
-            else:
-                # 全量同步：收集所有資料
-                # 庫存物品
-                cursor.execute("SELECT * FROM items")
-                for row in cursor.fetchall():
-                    changes.append({
-                        'table': 'items',
-                        'operation': 'INSERT',
-                        'data': dict(row),
-                        'timestamp': row['updated_at'] if 'updated_at' in row.keys() else now.isoformat()
-                    })
+    def create_stream_snapshot(self) -> Path:
+        """
+        建立串流匯出用的一致性快照檔（資料庫目錄下的暫存檔，由呼叫端用完後刪除）
 
-                # 所有事件記錄（僅本站點）
-                cursor.execute("SELECT * FROM inventory_events WHERE station_id = ?", (station_id,))
-                for row in cursor.fetchall():
-                    changes.append({
-                        'table': 'inventory_events',
-                        'operation': 'INSERT',
-                        'data': dict(row),
-                        'timestamp': row['timestamp']
-                    })
+        快照寫在磁碟而非記憶體：現場設備記憶體小，記憶體快照再序列化需要約 2 倍資料庫大小的 RAM。
+        """
+        fd, path = tempfile.mkstemp(prefix=".stream_snapshot_", suffix=".db", dir=Path(self.db_path).parent)
+        os.close(fd)
+        try:
+            self.create_snapshot(path, verify=False)
+        except Exception:
+            Path(path).unlink(missing_ok=True)
+            raise
+        return Path(path)
 
-                cursor.execute("SELECT * FROM blood_events WHERE station_id = ?", (station_id,))
-                for row in cursor.fetchall():
-                    changes.append({
-                        'table': 'blood_events',
+    def create_snapshot(
+        self,
+        dest_path: str,
+        compress: bool = False,
+        verify: bool = True,
+        pages_per_step: Optional[int] = None
+    ) -> dict:
+        """
+        以 SQLite Online Backup API 建立一致性快照檔
+
+        - 分批複製頁面 (pages_per_step)，批次之間讓出時間，寫入端不被阻擋
+        - 快照固定於開始時的 WAL 讀取點，包含尚未 checkpoint 的內容
+        - verify: 完成後對快照執行 PRAGMA integrity_check
+        - compress: 以 gzip 壓縮，輸出檔名加上 .gz
+        """
+        dest = Path(dest_path)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+
+        started = datetime.now()
+        dst = sqlite3.connect(str(dest))
+        try:
+            progress_info = self._backup_into(dst, pages_per_step)
+            # 快照檔改回 rollback journal，單一檔案即可攜帶
+            dst.execute("PRAGMA journal_mode=DELETE")
+
+            integrity = None
+            if verify:
+                integrity = dst.execute("PRAGMA integrity_check").fetchone()[0]
+                if integrity != "ok":
+                    raise RuntimeError(f"快照完整性檢查失敗: {integrity}")
+        except Exception:
+            dst.close()
+            dest.unlink(missing_ok=True)
+            raise
+        dst.close()
+
+        output = dest
+        if compress:
+            output = dest.with_name(dest.name + ".gz")
+            with open(dest, "rb") as f_in, gzip.open(output, "wb", compresslevel=config.BACKUP_COMPRESS_LEVEL) as f_out:
+                shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+            dest.unlink()
+
+        duration_ms = int((datetime.now() - started).total_seconds() * 1000)
+        logger.info(
+            f"線上快照完成: {output.name} ({progress_info['total_pages']} 頁, "
+            f"{progress_info['steps']} 批, {duration_ms} ms)"
+        )
+
+        return {
+            "path": str(output),
+            "size": output.stat().st_size,
+            "compressed": compress,
+            "pages": progress_info["total_pages"],
+            "steps": progress_info["steps"],
+            "integrity": integrity,
+            "duration_ms": duration_ms
+        }
+
+    # ========== 聯邦架構 - 同步封包方法 (Phase 1) ==========
+
+    # 變更擷取 (CDC) 的資料表: (主鍵欄位, 站點欄位, 時間欄位)；站點欄位為 None 表示各站共用的主檔
+    # 由觸發器寫入 sync_changelog，增量同步依序號範圍取出
+    SYNC_CAPTURE_TABLES = {
+        'items': ('code', None, 'updated_at'),
+        'equipment': ('id', None, 'updated_at'),
+        'inventory_events': ('event_uid', 'station_id', 'timestamp'),
+        'blood_events': ('event_uid', 'station_id', 'timestamp'),
+        'equipment_checks': ('event_uid', 'station_id', 'timestamp'),
+        'surgery_records': ('event_uid', 'station_id', 'created_at'),
+        'emergency_blood_bags': ('event_uid', 'station_id', 'created_at')
+    }
+
+    # 站點資料表以全域唯一的 event_uid（建立節點ID-本地自動編號）同步，本地 id 不隨同步傳遞
+    SYNC_EVENT_TABLES = ('inventory_events', 'blood_events', 'equipment_checks', 'surgery_records', 'emergency_blood_bags')
+    # 只會新增的事件表：合併為純附加，重複的 event_uid 直接略過
+    SYNC_APPEND_ONLY_TABLES = ('inventory_events', 'blood_events', 'equipment_checks')
+
+    # 全量同步的資料表與其時間欄位（items 不分站點）
+    SYNC_FULL_TABLES = {
+        'inventory_events': 'timestamp',
+        'blood_events': 'timestamp',
+        'equipment_checks': 'timestamp',
+        'surgery_records': 'created_at'
+    }
+
+    SYNC_STREAM_FORMAT = SyncNdjsonReader.FORMAT
+    SYNC_STREAM_VERSION = SyncNdjsonReader.VERSION
+    SYNC_STREAM_BLOCK_SIZE = 64 * 1024
+    SYNC_STREAM_MAX_CONFLICTS = 100
+
+    # 允許由同步封包寫入的資料表（即封包產生端會輸出的資料表）
+    SYNC_APPLY_TABLES = tuple(SYNC_CAPTURE_TABLES)
+    SYNC_APPLY_BATCH_SIZE = 1000
+
+    def _sync_seq_range(
+        self,
+        cursor,
+        station_id: str,
+        destination_id: str,
+        sync_type: str,
+        since_seq: Optional[int] = None,
+        since_timestamp: Optional[str] = None
+    ) -> tuple:
+        """
+        計算本次封包涵蓋的變更序號範圍 (from_seq, to_seq]
+
+        to_seq 為目前讀取點的最大序號；增量同步的起點預設為目的端最後確認的序號，
+        指定 since_timestamp（網頁手動匯出）時改由變更時間過濾，不受確認序號限制。
+        """
+        cursor.execute("SELECT COALESCE(MAX(seq), 0) FROM sync_changelog")
+        to_seq = cursor.fetchone()[0]
+        if sync_type != "DELTA":
+            return 0, to_seq
+        if since_seq is None and since_timestamp:
+            since_seq = 0
+        if since_seq is None:
+            cursor.execute("""
+                SELECT last_seq FROM sync_acknowledgements
+                WHERE destination_id = ? AND station_id = ?
+            """, (destination_id, station_id))
+            row = cursor.fetchone()
+            since_seq = row['last_seq'] if row else 0
+        return since_seq, to_seq
+
+    @staticmethod
+    def _sync_since_utc(since_timestamp: Optional[str]) -> Optional[str]:
+        """
+        sinceTimestamp 轉為 sync_changelog.changed_at 的格式（CURRENT_TIMESTAMP：UTC、YYYY-MM-DD HH:MM:SS）
+
+        網頁傳入的是站點本地時間（或帶時區的 ISO 8601），直接以字串比較會差一個時區，
+        且 'T' 分隔字元永遠大於空白，同一天的變更都會被略過。
+        """
+        if not since_timestamp:
+            return None
+        since = datetime.fromisoformat(since_timestamp.replace('Z', '+00:00'))
+        return since.astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+    def _iter_sync_changes(
+        self,
+        cursor,
+        station_id: str,
+        sync_type: str,
+        since_timestamp: Optional[str],
+        now: datetime,
+        from_seq: int = 0,
+        to_seq: Optional[int] = None
+    ):
+        """依同步類型逐筆產生變更記錄（直接迭代游標，不一次載入整個資料表）"""
+        if sync_type == "DELTA":
+            # 增量同步：依變更紀錄序號範圍掃描，同一筆資料只取最後一次變更
+            # sinceTimestamp（網頁手動匯出）另以變更時間過濾
+            since_utc = self._sync_since_utc(since_timestamp)
+            lookup = cursor.connection.cursor()
+            cursor.execute("""
+                SELECT c.seq, c.table_name, c.row_key, c.operation, c.changed_at
+                FROM sync_changelog c
+                JOIN (
+                    SELECT MAX(seq) AS seq
+                    FROM sync_changelog
+                    WHERE seq > ? AND (? IS NULL OR seq <= ?)
+                      AND (station_id = ? OR station_id IS NULL)
+                      AND (? IS NULL OR changed_at > ?)
+                    GROUP BY table_name, row_key
+                ) latest ON latest.seq = c.seq
+                ORDER BY c.seq
+            """, (from_seq, to_seq, to_seq, station_id, since_utc, since_utc))
+
+            for entry in cursor:
+                table = entry['table_name']
+                key_col = self.SYNC_CAPTURE_TABLES[table][0]
+                if entry['operation'] == 'DELETE':
+                    yield {
+                        'table': table,
+                        'operation': 'DELETE',
+                        'data': {key_col: entry['row_key']},
+                        'timestamp': entry['changed_at']
+                    }
+                    continue
+
+                lookup.execute(f"SELECT * FROM {table} WHERE {key_col} = ?", (entry['row_key'],))
+                row = lookup.fetchone()
+                if row is None:
+                    continue
+                # 新增與修改都以 INSERT (INSERT OR REPLACE) 傳送，目的端尚無此筆時也能套用
+                yield {
+                    'table': table,
+                    'operation': 'INSERT',
+                    'data': dict(row),
+                    'timestamp': entry['changed_at']
+                }
+        else:
+            # 全量同步：庫存物品 + 本站點所有事件記錄
+            cursor.execute("SELECT * FROM items")
+            for row in cursor:
+                yield {
+                    'table': 'items',
+                    'operation': 'INSERT',
+                    'data': dict(row),
+                    'timestamp': row['updated_at'] if 'updated_at' in row.keys() else now.isoformat()
+                }
+
+            for table, timestamp_col in self.SYNC_FULL_TABLES.items():
+                cursor.execute(f"SELECT * FROM {table} WHERE station_id = ?", (station_id,))
+                for row in cursor:
+                    yield {
+                        'table': table,
                         'operation': 'INSERT',
                         'data': dict(row),
-                        'timestamp': row['timestamp']
-                    })
+                        'timestamp': row[timestamp_col]
+                    }
+
+    def _sync_statement(self, cursor, table: str, operation: str, columns: tuple) -> str:
+        """
+        產生（並快取）套用變更的 SQL
+
+        資料表與欄位名稱必須存在於本地結構，避免以封包內容拼接任意 SQL。
+        """
+        key = (table, operation, columns)
+        statement = self._sync_statements.get(key)
+        if statement:
+            return statement
+
+        if table not in self.SYNC_APPLY_TABLES:
+            raise ValueError(f"不允許同步的資料表: {table}")
+        known = self._sync_columns.get(table)
+        if known is None:
+            known = {row['name'] for row in cursor.connection.execute(f"PRAGMA table_info({table})")}
+            self._sync_columns[table] = known
+        unknown = [column for column in columns if column not in known]
+        if unknown:
+            raise ValueError(f"資料表 {table} 沒有欄位: {', '.join(unknown)}")
+
+        key_col = self.SYNC_CAPTURE_TABLES[table][0]
+        if operation == 'INSERT' and table in self.SYNC_EVENT_TABLES:
+            # 依 event_uid 合併：不覆蓋其他節點的資料，重複匯入不產生重複資料
+            updates = ', '.join(f"{column} = excluded.{column}" for column in columns if column != key_col)
+            if table in self.SYNC_APPEND_ONLY_TABLES or not updates:
+                conflict = "DO NOTHING"
+            else:
+                conflict = f"DO UPDATE SET {updates}"
+            statement = (
+                f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+                f"ON CONFLICT({key_col}) {conflict}"
+            )
+        elif operation == 'INSERT':
+            statement = f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        elif operation == 'UPDATE':
+            set_clause = ', '.join(f"{column} = ?" for column in columns if column != key_col)
+            statement = f"UPDATE {table} SET {set_clause} WHERE {key_col} = ?"
+        elif operation == 'DELETE':
+            statement = f"DELETE FROM {table} WHERE {key_col} = ?"
+        else:
+            raise ValueError(f"不支援的操作類型: {operation}")
+
+        self._sync_statements[key] = statement
+        return statement
+
+    @classmethod
+    def _sync_change_key(cls, change: dict) -> tuple:
+        """批次分組鍵: (資料表, 操作, 欄位)；DELETE 只用主鍵，站點資料表不含本地 id"""
+        table, operation = change['table'], change['operation']
+        if operation == 'DELETE':
+            return table, operation, ()
+        columns = tuple(change['data'].keys())
+        if table in cls.SYNC_EVENT_TABLES:
+            columns = tuple(column for column in columns if column not in ('id', 'event_uid')) + ('event_uid',)
+        return table, operation, columns
+
+    @staticmethod
+    def _event_uid(data: dict) -> Optional[str]:
+        """變更記錄的 event_uid；舊版封包沒有此欄位時以 station_id + '-' + id 推得（與資料庫遷移規則相同）"""
+        event_uid = data.get('event_uid')
+        if event_uid is None and data.get('station_id') is not None and data.get('id') is not None:
+            event_uid = f"{data['station_id']}-{data['id']}"
+        return event_uid
+
+    def _sync_params(self, table: str, operation: str, columns: tuple, data: dict) -> list:
+        if table in self.SYNC_EVENT_TABLES:
+            data = {**data, 'event_uid': self._event_uid(data)}
+        if operation == 'INSERT':
+            return [data[column] for column in columns]
+        key_col = self.SYNC_CAPTURE_TABLES[table][0]
+        if operation == 'UPDATE':
+            return [data[column] for column in columns if column != key_col] + [data.get(key_col)]
+        return [data.get(key_col)]
+
+    def _apply_sync_change(self, cursor, change: dict):
+        """套用單筆同步變更"""
+        table, operation, columns = self._sync_change_key(change)
+        cursor.execute(
+            self._sync_statement(cursor, table, operation, columns),
+            self._sync_params(table, operation, columns, change['data'])
+        )
+
+    def _apply_sync_change_isolated(self, cursor, change: dict, conflicts: List[dict]) -> bool:
+        """以 SAVEPOINT 套用單筆變更，失敗時只回滾該筆並記錄衝突（最多保留 SYNC_STREAM_MAX_CONFLICTS 筆）"""
+        cursor.execute("SAVEPOINT sync_change")
+        try:
+            self._apply_sync_change(cursor, change)
+            cursor.execute("RELEASE SAVEPOINT sync_change")
+            return True
+        except Exception as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT sync_change")
+            cursor.execute("RELEASE SAVEPOINT sync_change")
+            if len(conflicts) < self.SYNC_STREAM_MAX_CONFLICTS:
+                conflicts.append({
+                    'table': change.get('table') if isinstance(change, dict) else None,
+                    'operation': change.get('operation') if isinstance(change, dict) else None,
+                    'error': str(e),
+                    'data': change.get('data') if isinstance(change, dict) else change
+                })
+            logger.warning(f"套用變更失敗: {change.get('table') if isinstance(change, dict) else change} - {e}")
+            return False
+
+    def _apply_sync_batch(self, cursor, key: tuple, batch: List[dict], conflicts: List[dict]) -> List[bool]:
+        """以 executemany 套用一批同鍵變更；失敗時回滾整批並逐筆重試以隔離衝突。回傳各筆是否成功"""
+        if len(batch) > 1:
+            table, operation, columns = key
+            cursor.execute("SAVEPOINT sync_batch")
+            try:
+                cursor.executemany(
+                    self._sync_statement(cursor, table, operation, columns),
+                    [self._sync_params(table, operation, columns, change['data']) for change in batch]
+                )
+                cursor.execute("RELEASE SAVEPOINT sync_batch")
+                return [True] * len(batch)
+            except Exception:
+                cursor.execute("ROLLBACK TO SAVEPOINT sync_batch")
+                cursor.execute("RELEASE SAVEPOINT sync_batch")
+
+        return [self._apply_sync_change_isolated(cursor, change, conflicts) for change in batch]
+
+    def _apply_sync_changes(self, cursor, changes, conflicts: List[dict], ledger: Optional[dict] = None) -> tuple:
+        """
+        批次套用同步變更，回傳 (成功筆數, 衝突筆數)
+
+        連續且 (資料表, 操作, 欄位) 相同的變更合併為一批（最多 SYNC_APPLY_BATCH_SIZE 筆），
+        以預先產生的 SQL 執行 executemany。須在交易內呼叫（SAVEPOINT 才不會自行提交）。
+
+        傳入 ledger (dict) 時啟用已套用變更紀錄：已套用過的變更略過並計入 ledger['duplicates']，
+        成功套用的變更寫入 sync_applied_changes（衝突的變更不記錄，下次匯入會重試）。
+        DELETE 也列入紀錄（雜湊含刪除時間），舊封包中的刪除不會在資料重新新增後再次套用。
+        """
+        applied = failed = 0
+        batch = []
+        batch_hashes = []
+        batch_key = None
+        if ledger is not None:
+            ledger.setdefault('duplicates', 0)
+            ledger_filter = self._sync_ledger_filter(cursor)
+            recorded = []
+
+        def flush():
+            nonlocal applied, failed
+            results = self._apply_sync_batch(cursor, batch_key, batch, conflicts)
+            ok = sum(results)
+            applied, failed = applied + ok, failed + len(results) - ok
+            if ledger is not None:
+                recorded.extend(
+                    change_hash for change_hash, success in zip(batch_hashes, results) if success and change_hash
+                )
+
+        for change in changes:
+            try:
+                key = self._sync_change_key(change)
+            except (KeyError, TypeError, AttributeError):
+                key = None
+
+            change_hash = None
+            if ledger is not None and key is not None:
+                change_hash = self._sync_change_hash(change)
+                if change_hash in ledger_filter and self._sync_change_applied(cursor, change_hash):
+                    ledger['duplicates'] += 1
+                    continue
+
+            if batch and (key != batch_key or len(batch) >= self.SYNC_APPLY_BATCH_SIZE):
+                flush()
+                batch = []
+                batch_hashes = []
+
+            if key is None:
+                # 格式不正確的記錄：單筆套用以記錄衝突
+                if self._apply_sync_change_isolated(cursor, change, conflicts):
+                    applied += 1
+                else:
+                    failed += 1
+                continue
+
+            batch_key = key
+            batch.append(change)
+            batch_hashes.append(change_hash)
+
+        if batch:
+            flush()
+
+        if ledger is not None and recorded:
+            cursor.executemany(
+                "INSERT OR IGNORE INTO sync_applied_changes (change_hash) VALUES (?)",
+                [(change_hash,) for change_hash in recorded]
+            )
+            # 交易若回滾，過濾器多出的項目只會造成多一次精確查詢
+            ledger_filter.update(recorded)
+
+        return applied, failed
+
+    # ========== 已套用變更紀錄（冪等匯入）(v1.4.5) ==========
+
+    SYNC_LEDGER_ERROR_RATE = 0.001     # 布隆過濾器誤判率
+    SYNC_LEDGER_MIN_CAPACITY = 100000
+
+    @staticmethod
+    def _sync_change_hash(change: dict) -> bytes:
+        """
+        變更內容雜湊（資料表、操作、資料的標準序列化 SHA-256 前 16 bytes）
+
+        INSERT / UPDATE 不含封包層的 timestamp：各封包格式對同一筆變更填入的時間不同；
+        資料列本身的 updated_at / 事件 event_uid 已足以區分不同版本。
+        DELETE 只帶主鍵，改以刪除時間（變更紀錄的 changed_at）區分同一筆資料的多次刪除。
+        """
+        content = [change['table'], change['operation'], change['data']]
+        if change['operation'] == 'DELETE':
+            content.append(change.get('timestamp'))
+        content = json.dumps(content, ensure_ascii=False, sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(content.encode('utf-8')).digest()[:16]
+
+    def _sync_ledger_filter(self, cursor) -> "BloomFilter":
+        """
+        已套用變更的布隆過濾器：大多數新變更不需查詢資料表即可判定未套用
+
+        首次使用時由 sync_applied_changes 建立；筆數超過容量時以兩倍容量重建，維持誤判率。
+        """
+        with self._ledger_lock:
+            ledger_filter = self._ledger_filter
+            if ledger_filter is None or ledger_filter.count > ledger_filter.capacity:
+                count = cursor.connection.execute("SELECT COUNT(*) FROM sync_applied_changes").fetchone()[0]
+                ledger_filter = BloomFilter(max(self.SYNC_LEDGER_MIN_CAPACITY, count * 2), self.SYNC_LEDGER_ERROR_RATE)
+                ledger_filter.update(
+                    row[0] for row in cursor.connection.execute("SELECT change_hash FROM sync_applied_changes")
+                )
+                self._ledger_filter = ledger_filter
+            return ledger_filter
+
+    @staticmethod
+    def _sync_change_applied(cursor, change_hash: bytes) -> bool:
+        return cursor.connection.execute(
+            "SELECT 1 FROM sync_applied_changes WHERE change_hash = ?", (change_hash,)
+        ).fetchone() is not None
+
+    @staticmethod
+    def _applied_sync_package(cursor, package_id: str) -> Optional[dict]:
+        """封包ID已匯入過時回傳其紀錄"""
+        cursor.execute("SELECT * FROM sync_applied_packages WHERE package_id = ?", (package_id,))
+        row = cursor.fetchone()
+        return dict(row) if row else None
+
+    def _duplicate_sync_package(self, cursor, package_id: str, checksum: str) -> Optional[dict]:
+        """
+        封包重複匯入檢查（所有匯入路徑共用，須在套用交易內呼叫）
+
+        相同封包ID與校驗碼已匯入過時回傳略過結果；封包ID相同但校驗碼不同表示ID重複使用，拒絕匯入。
+        """
+        applied = self._applied_sync_package(cursor, package_id)
+        if applied is None:
+            return None
+        if applied['checksum'] != checksum:
+            raise HTTPException(
+                status_code=409,
+                detail=f"封包ID {package_id} 已於 {applied['applied_at']} 以不同內容匯入，拒絕覆蓋"
+            )
+        return self._duplicate_package_result(package_id, applied)
+
+    @staticmethod
+    def _record_applied_package(
+        cursor, package_id: str, checksum: str, source_id: Optional[str],
+        changes_count: int, changes_applied: int, duplicates_skipped: int
+    ):
+        cursor.execute("""
+            INSERT INTO sync_applied_packages
+            (package_id, checksum, source_id, changes_count, changes_applied, duplicates_skipped)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (package_id, checksum, source_id, changes_count, changes_applied, duplicates_skipped))
+
+    @staticmethod
+    def _duplicate_package_result(package_id: str, applied: dict) -> dict:
+        return {
+            "success": True,
+            "package_id": package_id,
+            "duplicate_package": True,
+            "changes_applied": 0,
+            "duplicates_skipped": applied['changes_count'],
+            "conflicts_detected": 0,
+            "conflicts": [],
+            "first_applied_at": applied['applied_at'],
+            "message": f"封包已於 {applied['applied_at']} 匯入，略過"
+        }
+
+    def _record_sync_package(
+        self,
+        cursor,
+        package_id: str,
+        package_type: str,
+        source_id: str,
+        hospital_id: str,
+        transfer_method: str,
+        package_size: Optional[int],
+        checksum: str,
+        changes_count: int,
+        status: str
+    ):
+        """
+        記錄封包到 sync_packages（站點 → 醫院）
+
+        封包ID不可重複，已存在時直接失敗；唯一例外是本節點產生的封包在本機匯入（相同校驗碼），只更新為已套用。
+        """
+        on_conflict = ""
+        if status == 'APPLIED':
+            on_conflict = """
+                ON CONFLICT(package_id) DO UPDATE SET status = excluded.status, processed_at = excluded.processed_at
+                WHERE sync_packages.checksum = excluded.checksum
+            """
+        cursor.execute(f"""
+            INSERT INTO sync_packages (
+                package_id, package_type, source_type, source_id,
+                destination_type, destination_id, hospital_id,
+                transfer_method, package_size, checksum, changes_count, status,
+                processed_at
+            )
+            VALUES (?, ?, 'STATION', ?, 'HOSPITAL', ?, ?, ?, ?, ?, ?, ?,
+                    CASE WHEN ? = 'APPLIED' THEN CURRENT_TIMESTAMP END)
+            {on_conflict}
+        """, (
+            package_id, package_type if package_type in ('DELTA', 'FULL') else 'DELTA', source_id,
+            hospital_id, hospital_id,
+            transfer_method, package_size, checksum, changes_count, status,
+            status
+        ))
+
+    SYNC_PACKAGE_ID_PATTERN = re.compile(r"^PKG-\d{8}-\d{6}-(?:[0-9a-f]{8}-)?(.+)$")
+
+    @staticmethod
+    def new_sync_package_id(station_id: str) -> str:
+        """封包ID: PKG-YYYYMMDD-HHMMSS-{隨機 8 碼}-{station_id}（同一秒內產生多個封包也不重複）"""
+        return f"PKG-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.urandom(4).hex()}-{station_id}"
+
+    @classmethod
+    def sync_package_source(cls, package_id: str) -> str:
+        """由封包ID取得來源站點（相容沒有隨機碼的舊版ID）"""
+        match = cls.SYNC_PACKAGE_ID_PATTERN.match(package_id)
+        return match.group(1) if match else 'UNKNOWN'
+
+    def generate_sync_package(
+        self,
+        station_id: str,
+        hospital_id: str,
+        sync_type: str = "DELTA",
+        since_timestamp: str = None,
+        since_seq: Optional[int] = None,
+        known_filter: Optional[dict] = None
+    ) -> dict:
+        """
+        產生同步封包（JSON 格式，供網頁下載/複製；大型封包請改用 iter_sync_package_stream）
+
+        known_filter 為醫院端已持有事件的布隆過濾器 (build_known_filter)，判定已存在的事件不放入封包；
+        另回傳產生當下的事件筆數 row_counts，供上傳後檢查是否有誤判漏送。
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            # 產生封包ID
+            now = datetime.now()
+            package_id = self.new_sync_package_id(station_id)
+
+            # 收集變更記錄（固定讀取點）
+            cursor.execute("BEGIN")
+            from_seq, to_seq = self._sync_seq_range(cursor, station_id, hospital_id, sync_type, since_seq, since_timestamp)
+            changes = self._iter_sync_changes(cursor, station_id, sync_type, since_timestamp, now, from_seq, to_seq)
+            filter_stats = {}
+            if known_filter:
+                changes = self._exclude_known_changes(changes, known_filter, filter_stats)
+            changes = list(changes)
+            if known_filter:
+                filter_stats["row_counts"] = self.count_station_rows(cursor, station_id, known_filter['tables'])
+            conn.commit()
+
+            # 計算校驗碼
+            checksum, package_size = self.sync_package_checksum(changes)
+
+            # 記錄封包到資料庫
+            self._record_sync_package(
+                cursor, package_id, sync_type, station_id, hospital_id,
+                'MANUAL', package_size, checksum, len(changes), 'PENDING'
+            )
+
+            conn.commit()
+
+            return {
+                "success": True,
+                "package_id": package_id,
+                "package_type": sync_type,
+                "package_size": package_size,
+                "checksum": checksum,
+                "from_seq": from_seq,
+                "to_seq": to_seq,
+                "changes_count": len(changes),
+                **filter_stats,
+                "changes": changes,
+                "message": f"同步封包已產生，包含 {len(changes)} 項變更"
+            }
+
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"產生同步封包失敗: {e}")
+            raise
+        finally:
+            conn.close()
+
+    def iter_sync_package_stream(
+        self,
+        station_id: str,
+        hospital_id: str,
+        sync_type: str = "DELTA",
+        since_timestamp: str = None,
+        since_seq: Optional[int] = None,
+        known_filter: Optional[dict] = None
+    ):
+        """
+        以 NDJSON 串流產生同步封包（記憶體用量固定，與變更筆數無關）
+
+        格式（每行一個 JSON 物件）:
+            第 1 行    標頭: format / version / package_id / package_type / station_id / hospital_id
+            中間各行   變更記錄: table / operation / data / timestamp
+            最後一行   結尾: trailer=true / changes_count / package_size / checksum
+
+        checksum 為所有變更行（含換行字元）原始位元組的 SHA-256，
+        邊產生邊計算；匯入端以同樣方式邊讀邊驗證。
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            now = datetime.now()
+            package_id = self.new_sync_package_id(station_id)
+
+            # 固定讀取點：各資料表取自同一時間點，且不阻擋寫入 (WAL)
+            cursor.execute("BEGIN")
+            from_seq, to_seq = self._sync_seq_range(cursor, station_id, hospital_id, sync_type, since_seq, since_timestamp)
+            changes = self._iter_sync_changes(cursor, station_id, sync_type, since_timestamp, now, from_seq, to_seq)
+            filter_stats = {}
+            if known_filter:
+                changes = self._exclude_known_changes(changes, known_filter, filter_stats)
+
+            header = {
+                "format": self.SYNC_STREAM_FORMAT,
+                "version": self.SYNC_STREAM_VERSION,
+                "package_id": package_id,
+                "package_type": sync_type,
+                "station_id": station_id,
+                "hospital_id": hospital_id,
+                "since_timestamp": since_timestamp if sync_type == "DELTA" else None,
+                "from_seq": from_seq,
+                "to_seq": to_seq,
+                "created_at": now.isoformat(),
+                "hash_algorithm": "sha256"
+            }
+            yield (json.dumps(header, ensure_ascii=False) + "\n").encode('utf-8')
+
+            digest = hashlib.sha256()
+            changes_count = 0
+            package_size = 0
+            buffer = bytearray()
+
+            for change in changes:
+                line = (json.dumps(change, ensure_ascii=False, sort_keys=True, separators=(',', ':')) + "\n").encode('utf-8')
+                digest.update(line)
+                buffer += line
+                changes_count += 1
+                package_size += len(line)
+                if len(buffer) >= self.SYNC_STREAM_BLOCK_SIZE:
+                    yield bytes(buffer)
+                    buffer.clear()
+
+            if buffer:
+                yield bytes(buffer)
+
+            checksum = digest.hexdigest()
+            trailer = {
+                "trailer": True,
+                "package_id": package_id,
+                "changes_count": changes_count,
+                "package_size": package_size,
+                "checksum": checksum,
+                **filter_stats
+            }
+
+            # 結束讀取交易後再記錄封包
+            conn.commit()
+            self._record_sync_package(
+                cursor, package_id, sync_type, station_id, hospital_id,
+                'NETWORK', package_size, checksum, changes_count, 'PENDING'
+            )
+            conn.commit()
+            logger.info(f"同步封包已串流產生: {package_id} ({changes_count} 項變更, {package_size} bytes)")
+
+            yield (json.dumps(trailer, ensure_ascii=False) + "\n").encode('utf-8')
+
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"串流產生同步封包失敗: {e}")
+            raise
+        finally:
+            conn.close()
+
+    @staticmethod
+    def sync_package_checksum(changes: List[dict]) -> Tuple[str, int]:
+        """JSON 同步封包校驗碼（見 sync_formats.sync_package_checksum）"""
+        return sync_package_checksum(changes)
+
+    def import_sync_package(
+        self,
+        package_id: str,
+        changes: List[dict],
+        checksum: str,
+        verified: bool = False,
+        source_id: Optional[str] = None
+    ) -> dict:
+        """
+        匯入同步封包
+
+        verified=True 表示呼叫端已用 sync_package_checksum 驗證過校驗碼，
+        不再重複序列化整個變更清單（大型封包的主要 CPU 成本）。
+        同一封包重複匯入時直接略過；與已匯入封包重疊的變更也會略過，另計為 duplicates_skipped。
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            # 驗證校驗碼
+            calculated_checksum = checksum if verified else self.sync_package_checksum(changes)[0]
+
+            if calculated_checksum != checksum:
+                return {
+                    "success": False,
+                    "package_id": package_id,
+                    "changes_applied": 0,
+                    "error": "校驗碼不符，封包可能已損毀",
+                    "message": "校驗碼不符，封包可能已損毀",
+                    "expected": checksum,
+                    "actual": calculated_checksum
+                }
+
+            # 套用變更
+            cursor.execute("BEGIN")
+            duplicate = self._duplicate_sync_package(cursor, package_id, checksum)
+            if duplicate:
+                conn.rollback()
+                return duplicate
+
+            conflicts = []
+            ledger = {}
+            changes_applied, conflicts_detected = self._apply_sync_changes(cursor, changes, conflicts, ledger)
+
+            # 記錄封包處理狀態（來源站點由封包ID取得，見 new_sync_package_id）
+            if not source_id:
+                source_id = self.sync_package_source(package_id)
+            self._record_sync_package(
+                cursor, package_id, 'DELTA', source_id, 'HOSP-001',
+                'USB', None, checksum, len(changes), 'APPLIED'
+            )
+            self._record_applied_package(
+                cursor, package_id, checksum, source_id, len(changes), changes_applied, ledger['duplicates']
+            )
+
+            conn.commit()
+
+            return {
+                "success": True,
+                "package_id": package_id,
+                "changes_applied": changes_applied,
+                "duplicates_skipped": ledger['duplicates'],
+                "conflicts_detected": conflicts_detected,
+                "conflicts": conflicts,
+                "message": f"同步完成，已套用 {changes_applied} 項變更"
+            }
+
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"匯入同步封包失敗: {e}")
+            raise
+        finally:
+            conn.close()
+
+    def import_sync_package_stream(self, stream) -> dict:
+        """
+        匯入 NDJSON 串流同步封包（見 iter_sync_package_stream）
+
+        逐行讀取、邊讀邊計算校驗碼並套用變更，整個封包在單一交易內；
+        結尾的筆數或校驗碼不符時整批回滾，不會留下半套用的資料。
+        校驗碼在結尾才知道：封包ID已匯入過時只讀完串流驗證校驗碼，不套用變更。
+        """
+        reader = SyncNdjsonReader(stream)
+        header = reader.header
+        package_id = header["package_id"]
+
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute("BEGIN")
+            conflicts = []
+            ledger = {'duplicates': 0}
+            changes_applied = conflicts_detected = 0
+            if self._applied_sync_package(cursor, package_id) is None:
+                changes_applied, conflicts_detected = self._apply_sync_changes(cursor, reader, conflicts, ledger)
+            else:
+                for _ in reader:
+                    pass
+
+            if reader.error:
+                conn.rollback()
+                return {
+                    "success": False,
+                    "package_id": package_id,
+                    "changes_applied": 0,
+                    "error": reader.error,
+                    "message": reader.error,
+                    "expected": reader.trailer.get("checksum") if reader.trailer else None,
+                    "actual": reader.checksum
+                }
+
+            duplicate = self._duplicate_sync_package(cursor, package_id, reader.checksum)
+            if duplicate:
+                conn.rollback()
+                return duplicate
+
+            self._record_sync_package(
+                cursor, package_id, header.get("package_type"),
+                header.get("station_id") or 'UNKNOWN', header.get("hospital_id") or 'HOSP-001',
+                'NETWORK', reader.trailer.get("package_size"), reader.checksum, reader.changes_count, 'APPLIED'
+            )
+            self._record_applied_package(
+                cursor, package_id, reader.checksum, header.get("station_id"),
+                reader.changes_count, changes_applied, ledger['duplicates']
+            )
+            conn.commit()
+
+            return {
+                "success": True,
+                "package_id": package_id,
+                "source_station_id": header.get("station_id"),
+                "changes_applied": changes_applied,
+                "duplicates_skipped": ledger['duplicates'],
+                "conflicts_detected": conflicts_detected,
+                "conflicts": conflicts,
+                "message": f"同步完成，已套用 {changes_applied} 項變更"
+            }
+
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"匯入同步封包失敗: {e}")
+            raise
+        finally:
+            conn.close()
+
+    def iter_sync_package_binary(
+        self,
+        station_id: str,
+        hospital_id: str,
+        sync_type: str = "DELTA",
+        since_timestamp: str = None,
+        since_seq: Optional[int] = None,
+        codec: str = "gzip",
+        level: Optional[int] = None,
+        transfer_method: str = "USB",
+        known_filter: Optional[dict] = None
+    ):
+        """
+        以精簡二進位格式串流產生同步封包（見 SyncBinaryFormat）
+
+        欄位名稱只在標頭出現一次，各筆記錄依欄位順序編碼後整體壓縮，
+        適合 USB / 無人機等以檔案大小為主要成本的轉移方式。
+        """
+        compressor = SyncBinaryFormat.compressor(codec, level)
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            now = datetime.now()
+            package_id = self.new_sync_package_id(station_id)
+
+            # 固定讀取點：各資料表取自同一時間點，且不阻擋寫入 (WAL)
+            cursor.execute("BEGIN")
+            from_seq, to_seq = self._sync_seq_range(cursor, station_id, hospital_id, sync_type, since_seq, since_timestamp)
+            changes = self._iter_sync_changes(cursor, station_id, sync_type, since_timestamp, now, from_seq, to_seq)
+            if known_filter:
+                changes = self._exclude_known_changes(changes, known_filter, {})
+
+            if sync_type == "DELTA":
+                table_timestamps = {table: spec[2] for table, spec in self.SYNC_CAPTURE_TABLES.items()}
+            else:
+                table_timestamps = {'items': 'updated_at', **self.SYNC_FULL_TABLES}
+
+            tables = []
+            table_index = {}
+            for table, timestamp_col in table_timestamps.items():
+                columns = [row['name'] for row in cursor.execute(f"PRAGMA table_info({table})")]
+                key_col = self.SYNC_CAPTURE_TABLES[table][0]
+                table_index[table] = (len(tables) + 1, columns, key_col)
+                tables.append({"name": table, "columns": columns, "key_column": key_col, "timestamp_column": timestamp_col})
+
+            header = json.dumps({
+                "package_id": package_id,
+                "package_type": sync_type,
+                "station_id": station_id,
+                "hospital_id": hospital_id,
+                "since_timestamp": since_timestamp if sync_type == "DELTA" else None,
+                "from_seq": from_seq,
+                "to_seq": to_seq,
+                "created_at": now.isoformat(),
+                "tables": tables
+            }, ensure_ascii=False).encode('utf-8')
+
+            buffer = bytearray()
+            SyncBinaryFormat.write_varint(buffer, len(header))
+            buffer += header
+            yield SyncBinaryFormat.MAGIC + bytes([SyncBinaryFormat.VERSION, SyncBinaryFormat.CODECS[codec]])
+
+            digest = hashlib.sha256()
+            changes_count = 0
+            raw_size = len(buffer)
+            package_size = len(SyncBinaryFormat.MAGIC) + 2
+            header_end = len(buffer)
+
+            for change in changes:
+                index, columns, key_col = table_index[change['table']]
+                data = change['data']
+                SyncBinaryFormat.write_varint(buffer, index)
+                buffer.append(SyncBinaryFormat.OPERATIONS[change['operation']])
+                if change['operation'] == 'DELETE':
+                    # 刪除只需主鍵與刪除時間（已套用變更紀錄以刪除時間區分多次刪除）
+                    SyncBinaryFormat.encode_value(buffer, data[key_col])
+                    SyncBinaryFormat.encode_value(buffer, change['timestamp'])
+                else:
+                    for column in columns:
+                        SyncBinaryFormat.encode_value(buffer, data[column])
+                changes_count += 1
+
+                if len(buffer) >= self.SYNC_STREAM_BLOCK_SIZE:
+                    digest.update(memoryview(buffer)[header_end:])
+                    raw_size += len(buffer) - header_end
+                    block = compressor.compress(bytes(buffer))
+                    buffer.clear()
+                    header_end = 0
+                    if block:
+                        package_size += len(block)
+                        yield block
+
+            digest.update(memoryview(buffer)[header_end:])
+            raw_size += len(buffer) - header_end
+            buffer.append(0)
+            SyncBinaryFormat.write_varint(buffer, changes_count)
+            buffer += digest.digest()
+            block = compressor.compress(bytes(buffer)) + compressor.flush()
+            package_size += len(block)
+            checksum = digest.hexdigest()
+
+            # 結束讀取交易後再記錄封包
+            conn.commit()
+            self._record_sync_package(
+                cursor, package_id, sync_type, station_id, hospital_id,
+                transfer_method, package_size, checksum, changes_count, 'PENDING'
+            )
+            conn.commit()
+            logger.info(
+                f"二進位同步封包已產生: {package_id} ({changes_count} 項變更, "
+                f"{raw_size} → {package_size} bytes, {codec})"
+            )
+
+            yield block
+
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"產生二進位同步封包失敗: {e}")
+            raise
+        finally:
+            conn.close()
+
+    def import_sync_package_binary(self, stream, transfer_method: str = "USB") -> dict:
+        """
+        匯入二進位同步封包（見 SyncBinaryFormat）
+
+        逐筆解碼並套用於單一交易；結束標記的筆數或校驗碼不符時整批回滾。
+        封包ID已匯入過時只解碼驗證校驗碼，不套用變更。
+        """
+        reader = SyncBinaryReader(stream)
+        header = reader.header
+        package_id = header["package_id"]
+
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute("BEGIN")
+            conflicts = []
+            ledger = {'duplicates': 0}
+            changes_applied = conflicts_detected = 0
+            if self._applied_sync_package(cursor, package_id) is None:
+                changes_applied, conflicts_detected = self._apply_sync_changes(cursor, reader, conflicts, ledger)
+            else:
+                for _ in reader:
+                    pass
+
+            if reader.error:
+                conn.rollback()
+                return {
+                    "success": False,
+                    "package_id": package_id,
+                    "changes_applied": 0,
+                    "error": reader.error,
+                    "message": reader.error
+                }
+
+            duplicate = self._duplicate_sync_package(cursor, package_id, reader.checksum)
+            if duplicate:
+                conn.rollback()
+                return duplicate
+
+            self._record_sync_package(
+                cursor, package_id, header.get("package_type"),
+                header.get("station_id") or 'UNKNOWN', header.get("hospital_id") or 'HOSP-001',
+                transfer_method, None, reader.checksum, reader.changes_count, 'APPLIED'
+            )
+            self._record_applied_package(
+                cursor, package_id, reader.checksum, header.get("station_id"),
+                reader.changes_count, changes_applied, ledger['duplicates']
+            )
+            conn.commit()
+
+            return {
+                "success": True,
+                "package_id": package_id,
+                "source_station_id": header.get("station_id"),
+                "codec": reader.codec,
+                "changes_applied": changes_applied,
+                "duplicates_skipped": ledger['duplicates'],
+                "conflicts_detected": conflicts_detected,
+                "conflicts": conflicts,
+                "message": f"同步完成，已套用 {changes_applied} 項變更"
+            }
+
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"匯入二進位同步封包失敗: {e}")
+            raise
+        finally:
+            conn.close()
+
+    def import_verified_sync_package(self, package: dict, transfer_method: str = "USB") -> dict:
+        """
+        套用已解析並驗證過的同步封包（見 parse_sync_package_file / SyncIngestPipeline）
+
+        校驗碼與格式已在工作行程驗證，這裡只負責寫入，並更新來源站點的同步狀態。
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute("BEGIN")
+            duplicate = self._duplicate_sync_package(cursor, package['package_id'], package['checksum'])
+            if duplicate:
+                conn.rollback()
+                return duplicate
+
+            conflicts = []
+            ledger = {}
+            changes_applied, conflicts_detected = self._apply_sync_changes(cursor, package['changes'], conflicts, ledger)
+
+            self._record_sync_package(
+                cursor, package['package_id'], package.get('package_type'),
+                package.get('station_id') or 'UNKNOWN', package.get('hospital_id') or 'HOSP-001',
+                transfer_method, package.get('package_size'), package['checksum'],
+                len(package['changes']), 'APPLIED'
+            )
+            self._record_applied_package(
+                cursor, package['package_id'], package['checksum'], package.get('station_id'),
+                len(package['changes']), changes_applied, ledger['duplicates']
+            )
+            conn.commit()
+
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"匯入同步封包失敗: {e}")
+            raise
+        finally:
+            conn.close()
+
+        if package.get('station_id'):
+            self._mark_station_synced(package['station_id'])
+
+        return {
+            "success": True,
+            "package_id": package['package_id'],
+            "source_station_id": package.get('station_id'),
+            "changes_applied": changes_applied,
+            "duplicates_skipped": ledger['duplicates'],
+            "conflicts_detected": conflicts_detected,
+            "conflicts": conflicts,
+            "message": f"同步完成，已套用 {changes_applied} 項變更"
+        }
+
+    def upload_sync_package(self, station_id: str, package_id: str, changes: List[dict], checksum: str) -> dict:
+        """醫院層接收站點同步上傳"""
+        # 驗證校驗碼（只計算一次，匯入時不再重算）
+        calculated_checksum, _ = self.sync_package_checksum(changes)
+
+        if calculated_checksum != checksum:
+            return {
+                "success": False,
+                "error": "校驗碼不符",
+                "expected": checksum,
+                "actual": calculated_checksum
+            }
+
+        # 匯入變更（複用 import_sync_package 邏輯）
+        result = self.import_sync_package(package_id, changes, checksum, verified=True, source_id=station_id)
+
+        if result['success']:
+            self._mark_station_synced(station_id)
+
+        return {
+            **result,
+            "station_id": station_id,
+            "response_package_id": f"PKG-RESPONSE-{package_id}"
+        }
+
+    def _mark_station_synced(self, station_id: str):
+        """更新站點同步狀態"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                UPDATE stations
+                SET last_sync_at = CURRENT_TIMESTAMP,
+                    sync_status = 'SYNCED'
+                WHERE station_id = ?
+            """, (station_id,))
+            if cursor.rowcount == 0:
+                logger.warning(f"站點 {station_id} 尚未登記於 stations，同步資料已匯入但無法更新同步狀態，請登記站點")
+            conn.commit()
+        except Exception as e:
+            logger.warning(f"更新站點同步狀態失敗: {e}")
+        finally:
+            conn.close()
+
+    def acknowledge_sync(self, station_id: str, destination_id: str, seq: int) -> dict:
+        """
+        記錄目的端已確認收到的變更序號
+
+        下次增量同步從此序號之後開始；序號只會前進，重複或較舊的確認不影響。
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute("SELECT COALESCE(MAX(seq), 0) FROM sync_changelog")
+            max_seq = cursor.fetchone()[0]
+            if seq < 0 or seq > max_seq:
+                raise HTTPException(status_code=400, detail=f"序號超出範圍 (0-{max_seq})")
+
+            cursor.execute("""
+                INSERT INTO sync_acknowledgements (destination_id, station_id, last_seq)
+                VALUES (?, ?, ?)
+                ON CONFLICT(destination_id, station_id) DO UPDATE SET
+                    last_seq = MAX(last_seq, excluded.last_seq),
+                    acknowledged_at = CURRENT_TIMESTAMP
+            """, (destination_id, station_id, seq))
+            cursor.execute("""
+                SELECT last_seq FROM sync_acknowledgements
+                WHERE destination_id = ? AND station_id = ?
+            """, (destination_id, station_id))
+            last_seq = cursor.fetchone()['last_seq']
+
+            # 寄件匣中已涵蓋於確認序號的封包
+            cursor.execute("""
+                UPDATE sync_outbox SET status = 'ACKNOWLEDGED'
+                WHERE hospital_id = ? AND station_id = ? AND to_seq <= ? AND status != 'ACKNOWLEDGED'
+            """, (destination_id, station_id, last_seq))
+
+            cursor.execute("""
+                SELECT COUNT(*) FROM sync_changelog
+                WHERE seq > ? AND (station_id = ? OR station_id IS NULL)
+            """, (last_seq, station_id))
+            pending = cursor.fetchone()[0]
+
+            conn.commit()
+
+            return {
+                "success": True,
+                "station_id": station_id,
+                "destination_id": destination_id,
+                "last_seq": last_seq,
+                "latest_seq": max_seq,
+                "pending_changes": pending
+            }
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"記錄同步確認失敗: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+        finally:
+            conn.close()
+
+    # ========== 站點合併引擎 (v1.4.5) ==========
+
+    # 合併資料表（依相依順序）；事件表依賴代碼對照，選了事件表時一併合併主檔
+    MERGE_TABLES = (
+        'items', 'inventory_events', 'blood_inventory', 'blood_events',
+        'emergency_blood_bags', 'equipment', 'equipment_checks', 'surgery_records'
+    )
+    MERGE_DEPENDENCIES = {'inventory_events': 'items', 'equipment_checks': 'equipment'}
+    MERGE_CONFLICT_SAMPLE = 100   # 回應中列出的衝突筆數上限
+
+    def _merge_columns(self, cursor, table: str) -> List[str]:
+        """來源與目標都有的欄位（不含本地自動編號 id）"""
+        source = [row[1] for row in cursor.execute(f"PRAGMA src.table_info({table})").fetchall()]
+        target = {row[1] for row in cursor.execute(f"PRAGMA main.table_info({table})").fetchall()}
+        return [column for column in source if column in target and column != 'id']
+
+    def _merge_copy(self, cursor, table: str, overrides: dict, joins: str = "", where: str = "",
+                    conflict: str = "ON CONFLICT(event_uid) DO NOTHING", params: Optional[dict] = None) -> int:
+        """
+        以一個 INSERT…SELECT 複製來源資料表（overrides 為重新對應的欄位運算式）
+
+        預設只略過 event_uid 已存在（已同步過）的事件；其他唯一鍵衝突須事先以對照表改名，
+        不可被 DO NOTHING 吞掉而悄悄少合併資料。
+        事件表的 event_uid 一律由 overrides 給定，不需逐筆觸發器指派；
+        同步變更紀錄改為插入後整批寫入：逐筆的 CDC 觸發器在同一交易內暫時移除、結束前重建，
+        交易失敗時隨之還原。
+        """
+        columns = self._merge_columns(cursor, table)
+        columns += [column for column in overrides if column not in columns]
+        select = ", ".join(overrides.get(column, f"s.{column}") for column in columns)
+
+        trigger_sql = None
+        if table in self.SYNC_EVENT_TABLES and 'event_uid' in overrides:
+            row = cursor.execute(
+                "SELECT sql FROM main.sqlite_master WHERE type = 'trigger' AND name = ?", (f"trg_sync_{table}_insert",)
+            ).fetchone()
+            if row:
+                trigger_sql = row[0]
+                last_id = cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM main.{table}").fetchone()[0]
+                cursor.execute(f"DROP TRIGGER main.trg_sync_{table}_insert")
+
+        cursor.execute(f"""
+            INSERT INTO main.{table} ({", ".join(columns)})
+            SELECT {select} FROM src.{table} s {joins}
+            WHERE {where or '1'}
+            ORDER BY s.rowid
+            {conflict}
+        """, params or {})
+        inserted = cursor.rowcount
+
+        if trigger_sql:
+            station_col = self.SYNC_CAPTURE_TABLES[table][1]
+            cursor.execute(f"""
+                INSERT INTO sync_changelog (table_name, row_key, operation, station_id)
+                SELECT '{table}', event_uid, 'INSERT', {station_col}
+                FROM main.{table} WHERE id > ? ORDER BY id
+            """, (last_id,))
+            cursor.execute(trigger_sql)
+        return inserted
+
+    def merge_station_database(
+        self,
+        source_path: str,
+        merged_by: str,
+        source_station_id: Optional[str] = None,
+        merge_type: str = "FULL_MERGE",
+        tables: Optional[List[str]] = None,
+        notes: Optional[str] = None
+    ) -> dict:
+        """
+        將撤收站點的資料庫檔案合併進本站（ATTACH + 集合式 INSERT…SELECT）
+
+        衝突處理依 STATION_MERGE_GUIDE.md：
+        - 物品：相同代碼相同名稱視為同一物品；名稱不同則來源改為 {代碼}-M
+        - 事件與緊急血袋：站點改為本站，event_uid 保留（已同步過的資料不重複）
+        - 緊急血袋編號衝突（不同站點以相同組織代碼同日登記）：來源血袋編號加上來源站後綴
+        - 血袋庫存：同血型數量相加
+        - 設備：ID 已存在時加上來源站前綴 (power-1 → TC02-power-1)
+        - 手術記錄：全部保留並註記來源站，記錄編號衝突時加上來源站後綴；耗材明細隨手術記錄搬移
+        全部在同一個交易內完成，結果記錄於 station_merge_history。
+        """
+        if merge_type not in ('FULL_MERGE', 'PARTIAL_MERGE', 'IMPORT_BACKUP'):
+            raise HTTPException(status_code=400, detail="合併類型必須為 FULL_MERGE / PARTIAL_MERGE / IMPORT_BACKUP")
+        selected = set(tables or self.MERGE_TABLES)
+        unknown = selected - set(self.MERGE_TABLES)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"不支援合併的資料表: {', '.join(sorted(unknown))}")
+        selected |= {self.MERGE_DEPENDENCIES[table] for table in selected if table in self.MERGE_DEPENDENCIES}
+        if not Path(source_path).is_file():
+            raise HTTPException(status_code=404, detail=f"找不到來源資料庫: {source_path}")
+
+        started = perf_counter()
+        target_station_id = config.STATION_ID
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute("PRAGMA temp_store = MEMORY")
+            cursor.execute("PRAGMA cache_size = -65536")
+            try:
+                cursor.execute("ATTACH DATABASE ? AS src", (str(source_path),))
+                source_tables = {row[0] for row in cursor.execute(
+                    "SELECT name FROM src.sqlite_master WHERE type = 'table'"
+                ).fetchall()}
+            except sqlite3.DatabaseError as e:
+                raise HTTPException(status_code=400, detail=f"無法讀取來源資料庫: {e}")
+
+            if not source_station_id and 'blood_inventory' in source_tables:
+                row = cursor.execute("SELECT station_id FROM src.blood_inventory LIMIT 1").fetchone()
+                source_station_id = row[0] if row else None
+            if not source_station_id:
+                raise HTTPException(status_code=400, detail="無法判斷來源站點，請指定 source_station_id")
+            if source_station_id == target_station_id:
+                raise HTTPException(status_code=400, detail="來源站點與本站相同")
+
+            cursor.execute("""
+                SELECT id, merged_at FROM station_merge_history
+                WHERE source_station_id = ? AND target_station_id = ? AND merge_type != 'PARTIAL_MERGE'
+            """, (source_station_id, target_station_id))
+            previous = cursor.fetchone()
+            if previous:
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"站點 {source_station_id} 已於 {previous['merged_at']} 合併 (合併ID {previous['id']})"
+                )
+
+            prefix = source_station_id.replace('-', '')
+            params = {"source": source_station_id, "target": target_station_id, "prefix": prefix}
+            summary = {}
+            conflicts = {"items": [], "emergency_blood_bags": [], "equipment": [], "surgery_records": []}
+            skipped = sorted(table for table in selected if table not in source_tables)
+
+            def source_uid(table: str) -> str:
+                # 舊版資料庫沒有 event_uid：與遷移規則相同，以 站點 + '-' + id 推得
+                columns = self._merge_columns(cursor, table)
+                return "COALESCE(s.event_uid, s.station_id || '-' || s.id)" if 'event_uid' in columns \
+                    else "s.station_id || '-' || s.id"
+
+            def count_source(table: str, where: str = "1") -> int:
+                return cursor.execute(f"SELECT COUNT(*) FROM src.{table} s WHERE {where}", params).fetchone()[0]
+
+            # 代碼對照表（暫存表，只存在於此連線）
+            cursor.execute("CREATE TEMP TABLE merge_item_map (src_code TEXT PRIMARY KEY, dst_code TEXT NOT NULL, renamed INTEGER)")
+            cursor.execute("CREATE TEMP TABLE merge_equipment_map (src_id TEXT PRIMARY KEY, dst_id TEXT NOT NULL, renamed INTEGER)")
+            cursor.execute("CREATE TEMP TABLE merge_surgery_map (src_id INTEGER PRIMARY KEY, record_number TEXT NOT NULL, renamed INTEGER)")
+            cursor.execute("CREATE TEMP TABLE merge_blood_bag_map (src_id INTEGER PRIMARY KEY, blood_bag_code TEXT NOT NULL, renamed INTEGER)")
+
+            if 'items' in selected and 'items' in source_tables:
+                cursor.execute("""
+                    INSERT INTO temp.merge_item_map (src_code, dst_code, renamed)
+                    SELECT s.code,
+                           CASE WHEN t.code IS NULL OR t.name = s.name THEN s.code
+                                WHEN NOT EXISTS (SELECT 1 FROM main.items WHERE code = s.code || '-M')
+                                     AND NOT EXISTS (SELECT 1 FROM src.items WHERE code = s.code || '-M')
+                                THEN s.code || '-M'
+                                ELSE s.code || '-M-' || :prefix END,
+                           t.code IS NOT NULL AND t.name != s.name
+                    FROM src.items s LEFT JOIN main.items t ON t.code = s.code
+                """, params)
+                inserted = self._merge_copy(
+                    cursor, 'items', {"code": "m.dst_code"},
+                    joins="JOIN temp.merge_item_map m ON m.src_code = s.code",
+                    conflict="ON CONFLICT(code) DO NOTHING"
+                )
+                summary['items'] = {"source": count_source('items'), "merged": inserted}
+                conflicts['items'] = [
+                    {"type": "item_code", "original": row[0], "renamed": row[1], "reason": "代碼衝突，自動重新命名"}
+                    for row in cursor.execute(
+                        "SELECT src_code, dst_code FROM temp.merge_item_map WHERE renamed ORDER BY src_code"
+                    ).fetchall()
+                ]
+
+            if 'inventory_events' in selected and 'inventory_events' in source_tables:
+                inserted = self._merge_copy(
+                    cursor, 'inventory_events',
+                    {"item_code": "COALESCE(m.dst_code, s.item_code)", "station_id": ":target",
+                     "event_uid": source_uid('inventory_events')},
+                    joins="LEFT JOIN temp.merge_item_map m ON m.src_code = s.item_code",
+                    where="s.station_id = :source", params=params
+                )
+                summary['inventory_events'] = {"source": count_source('inventory_events', "s.station_id = :source"), "merged": inserted}
+
+            if 'blood_inventory' in selected and 'blood_inventory' in source_tables:
+                cursor.execute("""
+                    INSERT INTO main.blood_inventory (blood_type, quantity, station_id)
+                    SELECT blood_type, SUM(quantity), :target FROM src.blood_inventory
+                    WHERE station_id = :source
+                    GROUP BY blood_type
+                    ON CONFLICT(blood_type, station_id) DO UPDATE SET
+                        quantity = quantity + excluded.quantity, last_updated = CURRENT_TIMESTAMP
+                """, params)
+                merged = cursor.rowcount
+                units = cursor.execute(
+                    "SELECT COALESCE(SUM(quantity), 0) FROM src.blood_inventory WHERE station_id = :source", params
+                ).fetchone()[0]
+                summary['blood_inventory'] = {
+                    "source": count_source('blood_inventory', "s.station_id = :source"), "merged": merged, "units": units
+                }
+
+            if 'blood_events' in selected and 'blood_events' in source_tables:
+                inserted = self._merge_copy(
+                    cursor, 'blood_events', {"station_id": ":target", "event_uid": source_uid('blood_events')},
+                    where="s.station_id = :source", params=params
+                )
+                summary['blood_events'] = {"source": count_source('blood_events', "s.station_id = :source"), "merged": inserted}
+
+            if 'emergency_blood_bags' in selected and 'emergency_blood_bags' in source_tables:
+                # 血袋編號由 (組織, 採集日期, 血型) 序號產生、不含站點，兩站使用相同組織代碼時會重複
+                uid = source_uid('emergency_blood_bags')
+                cursor.execute(f"""
+                    INSERT INTO temp.merge_blood_bag_map (src_id, blood_bag_code, renamed)
+                    SELECT s.id,
+                           CASE WHEN t.id IS NULL THEN s.blood_bag_code ELSE s.blood_bag_code || '-' || :prefix END,
+                           t.id IS NOT NULL
+                    FROM src.emergency_blood_bags s
+                    LEFT JOIN main.emergency_blood_bags t ON t.blood_bag_code = s.blood_bag_code
+                    WHERE s.station_id = :source
+                      AND NOT EXISTS (SELECT 1 FROM main.emergency_blood_bags u WHERE u.event_uid = {uid})
+                """, params)
+                inserted = self._merge_copy(
+                    cursor, 'emergency_blood_bags',
+                    {"blood_bag_code": "m.blood_bag_code", "station_id": ":target", "event_uid": uid},
+                    joins="JOIN temp.merge_blood_bag_map m ON m.src_id = s.id", params=params
+                )
+                if inserted:
+                    # 序號計數器下次使用時由現有最大編號重新起算，不會配置到合併進來的編號
+                    cursor.execute("DELETE FROM emergency_blood_sequences")
+                summary['emergency_blood_bags'] = {
+                    "source": count_source('emergency_blood_bags', "s.station_id = :source"), "merged": inserted
+                }
+                conflicts['emergency_blood_bags'] = [
+                    {"type": "blood_bag_code", "original": row[0], "renamed": row[1], "reason": "血袋編號衝突，加上來源站後綴"}
+                    for row in cursor.execute("""
+                        SELECT s.blood_bag_code, m.blood_bag_code FROM temp.merge_blood_bag_map m
+                        JOIN src.emergency_blood_bags s ON s.id = m.src_id
+                        WHERE m.renamed ORDER BY m.src_id
+                    """).fetchall()
+                ]
+
+            if 'equipment' in selected and 'equipment' in source_tables:
+                cursor.execute("""
+                    INSERT INTO temp.merge_equipment_map (src_id, dst_id, renamed)
+                    SELECT s.id, CASE WHEN t.id IS NULL THEN s.id ELSE :prefix || '-' || s.id END, t.id IS NOT NULL
+                    FROM src.equipment s LEFT JOIN main.equipment t ON t.id = s.id
+                """, params)
+                inserted = self._merge_copy(
+                    cursor, 'equipment', {"id": "m.dst_id"},
+                    joins="JOIN temp.merge_equipment_map m ON m.src_id = s.id",
+                    conflict="ON CONFLICT(id) DO NOTHING"
+                )
+                summary['equipment'] = {"source": count_source('equipment'), "merged": inserted}
+                conflicts['equipment'] = [
+                    {"type": "equipment_id", "original": row[0], "renamed": row[1], "reason": "設備ID衝突，加上來源站前綴"}
+                    for row in cursor.execute(
+                        "SELECT src_id, dst_id FROM temp.merge_equipment_map WHERE renamed ORDER BY src_id"
+                    ).fetchall()
+                ]
+
+            if 'equipment_checks' in selected and 'equipment_checks' in source_tables:
+                inserted = self._merge_copy(
+                    cursor, 'equipment_checks',
+                    {"equipment_id": "COALESCE(m.dst_id, s.equipment_id)", "station_id": ":target",
+                     "event_uid": source_uid('equipment_checks')},
+                    joins="LEFT JOIN temp.merge_equipment_map m ON m.src_id = s.equipment_id",
+                    where="s.station_id = :source", params=params
+                )
+                summary['equipment_checks'] = {"source": count_source('equipment_checks', "s.station_id = :source"), "merged": inserted}
+
+            if 'surgery_records' in selected and 'surgery_records' in source_tables:
+                uid = source_uid('surgery_records')
+                cursor.execute(f"""
+                    INSERT INTO temp.merge_surgery_map (src_id, record_number, renamed)
+                    SELECT s.id,
+                           CASE WHEN t.id IS NULL THEN s.record_number ELSE s.record_number || '-' || :prefix END,
+                           t.id IS NOT NULL
+                    FROM src.surgery_records s LEFT JOIN main.surgery_records t ON t.record_number = s.record_number
+                    WHERE s.station_id = :source
+                      AND NOT EXISTS (SELECT 1 FROM main.surgery_records u WHERE u.event_uid = {uid})
+                """, params)
+                inserted = self._merge_copy(
+                    cursor, 'surgery_records',
+                    {"record_number": "m.record_number", "station_id": ":target", "event_uid": uid,
+                     "remarks": "TRIM(COALESCE(s.remarks, '') || ' [合併自 ' || :source || ']')"},
+                    joins="JOIN temp.merge_surgery_map m ON m.src_id = s.id", params=params
+                )
+                consumptions = 0
+                if 'surgery_consumptions' in source_tables:
+                    cursor.execute("""
+                        INSERT INTO main.surgery_consumptions (surgery_id, item_code, item_name, quantity, unit)
+                        SELECT r.id, COALESCE(im.dst_code, c.item_code), c.item_name, c.quantity, c.unit
+                        FROM src.surgery_consumptions c
+                        JOIN temp.merge_surgery_map m ON m.src_id = c.surgery_id
+                        JOIN main.surgery_records r ON r.record_number = m.record_number
+                        LEFT JOIN temp.merge_item_map im ON im.src_code = c.item_code
+                        ORDER BY c.id
+                    """)
+                    consumptions = cursor.rowcount
+                summary['surgery_records'] = {
+                    "source": count_source('surgery_records', "s.station_id = :source"),
+                    "merged": inserted, "consumptions": consumptions
+                }
+                conflicts['surgery_records'] = [
+                    {"type": "record_number", "original": row[0], "renamed": row[1], "reason": "記錄編號衝突，加上來源站後綴"}
+                    for row in cursor.execute("""
+                        SELECT s.record_number, m.record_number FROM temp.merge_surgery_map m
+                        JOIN src.surgery_records s ON s.id = m.src_id
+                        WHERE m.renamed ORDER BY m.src_id
+                    """).fetchall()
+                ]
+
+            counts = {
+                "items_merged": summary.get('items', {}).get('merged', 0),
+                "blood_merged": summary.get('blood_inventory', {}).get('units', 0)
+                                + summary.get('emergency_blood_bags', {}).get('merged', 0),
+                "equipment_merged": summary.get('equipment', {}).get('merged', 0),
+                "surgery_records_merged": summary.get('surgery_records', {}).get('merged', 0),
+            }
+            cursor.execute("""
+                INSERT INTO station_merge_history (
+                    source_station_id, target_station_id, merge_type, items_merged, blood_merged,
+                    equipment_merged, surgery_records_merged, merge_notes, merged_by
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                source_station_id, target_station_id, merge_type, counts['items_merged'], counts['blood_merged'],
+                counts['equipment_merged'], counts['surgery_records_merged'], notes, merged_by
+            ))
+            merge_id = cursor.lastrowid
+            conn.commit()
+
+            conflict_list = [conflict for table_conflicts in conflicts.values() for conflict in table_conflicts]
+            duration_ms = int((perf_counter() - started) * 1000)
+            logger.info(
+                f"站點合併完成: {source_station_id} → {target_station_id} "
+                f"({sum(t['merged'] for t in summary.values())} 筆, {len(conflict_list)} 項衝突, {duration_ms} ms)"
+            )
+            return {
+                "success": True,
+                "merge_id": merge_id,
+                "source_station_id": source_station_id,
+                "target_station_id": target_station_id,
+                "merge_type": merge_type,
+                "summary": {**counts, "items_conflicts": len(conflicts['items'])},
+                "tables": summary,
+                "skipped_tables": skipped,
+                "conflicts": conflict_list[:self.MERGE_CONFLICT_SAMPLE],
+                "conflicts_total": len(conflict_list),
+                "duration_ms": duration_ms,
+                "message": "合併完成，請檢查衝突項目" if conflict_list else "合併完成"
+            }
+
+        except HTTPException:
+            conn.rollback()
+            raise
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"站點合併失敗: {e}")
+            raise
+        finally:
+            conn.close()
+
+    def get_merge_history(self, limit: int = 10) -> dict:
+        """查詢站點合併歷史"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute("""
+                SELECT id AS merge_id, source_station_id, target_station_id, merge_type,
+                       items_merged, blood_merged, equipment_merged, surgery_records_merged,
+                       merge_notes, merged_by, merged_at
+                FROM station_merge_history
+                ORDER BY merged_at DESC, id DESC
+                LIMIT ?
+            """, (limit,))
+            merges = [dict(row) for row in cursor.fetchall()]
+            return {"merges": merges, "count": len(merges)}
+        finally:
+            conn.close()
+
+    # ========== 盤點引擎 (v1.4.5) ==========
+
+    AUDIT_TYPES = ('ROUTINE', 'PRE_MERGE', 'POST_MERGE', 'EMERGENCY')
+
+    # 盤點物品於該站點的系統庫存（庫存 = 進貨 - 消耗），以 idx_inventory_events_item 逐物品彙總
+    AUDIT_STOCK_SQL = """
+        SELECT d.item_code,
+               COALESCE(SUM(CASE WHEN e.event_type = 'RECEIVE' THEN e.quantity
+                                 WHEN e.event_type = 'CONSUME' THEN -e.quantity
+                                 ELSE 0 END), 0) AS system_quantity
+        FROM {codes} d
+        LEFT JOIN inventory_events e INDEXED BY idx_inventory_events_item
+               ON e.item_code = d.item_code AND e.station_id = :station_id
+        GROUP BY d.item_code
+    """
+
+    def _get_audit(self, cursor, audit_id: int, require_open: bool = False) -> sqlite3.Row:
+        cursor.execute("SELECT * FROM inventory_audit WHERE id = ?", (audit_id,))
+        audit = cursor.fetchone()
+        if not audit:
+            raise HTTPException(status_code=404, detail=f"盤點 {audit_id} 不存在")
+        if require_open and audit['status'] != 'IN_PROGRESS':
+            raise HTTPException(status_code=409, detail=f"盤點 {audit['audit_number']} 已{audit['status']}")
+        return audit
+
+    def start_audit(
+        self,
+        audit_type: str,
+        started_by: str,
+        station_id: Optional[str] = None,
+        notes: Optional[str] = None
+    ) -> dict:
+        """開始盤點，編號 AUDIT-{YYMMDD}-{SEQ}；同一站點同時只能有一個進行中的盤點"""
+        if audit_type not in self.AUDIT_TYPES:
+            raise HTTPException(status_code=400, detail=f"盤點類型必須為: {', '.join(self.AUDIT_TYPES)}")
+        station_id = station_id or config.STATION_ID
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute("""
+                SELECT audit_number FROM inventory_audit
+                WHERE station_id = ? AND status = 'IN_PROGRESS'
+            """, (station_id,))
+            running = cursor.fetchone()
+            if running:
+                raise HTTPException(status_code=409, detail=f"站點 {station_id} 已有進行中的盤點 {running['audit_number']}")
+
+            prefix = f"AUDIT-{datetime.now().strftime('%y%m%d')}-"
+            cursor.execute("""
+                SELECT COALESCE(MAX(CAST(SUBSTR(audit_number, ?) AS INTEGER)), 0)
+                FROM inventory_audit WHERE audit_number LIKE ?
+            """, (len(prefix) + 1, prefix + '%'))
+            audit_number = f"{prefix}{cursor.fetchone()[0] + 1:03d}"
+
+            cursor.execute("SELECT COUNT(*) FROM items")
+            total_items = cursor.fetchone()[0]
+            cursor.execute("""
+                INSERT INTO inventory_audit (audit_number, audit_type, station_id, started_by, total_items, notes)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (audit_number, audit_type, station_id, started_by, total_items, notes))
+            audit_id = cursor.lastrowid
+            conn.commit()
+            logger.info(f"盤點已啟動: {audit_number} ({audit_type}, {station_id})")
+
+            return {
+                "success": True,
+                "audit_number": audit_number,
+                "audit_id": audit_id,
+                "station_id": station_id,
+                "total_items": total_items,
+                "message": "盤點已啟動，請逐項清點"
+            }
+
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def record_audit_counts(self, audit_id: int, counts: List[dict], audited_by: str, accumulate: bool = False) -> dict:
+        """
+        批次記錄清點數量（counts 為 {item_code, actual_quantity, remarks}）
+
+        整批以 json_each 展開，與物品主檔及系統庫存一次 JOIN 後 upsert 到盤點明細；
+        同一物品重複上傳時覆蓋前次數量，accumulate=True 則相加（逐件掃描）。
+        不存在的物品代碼列於 unknown_items，不影響其餘項目。
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            audit = self._get_audit(cursor, audit_id, require_open=True)
+            params = {
+                "audit_id": audit_id,
+                "station_id": audit['station_id'],
+                "audited_by": audited_by,
+                "counts": json.dumps(counts, ensure_ascii=False)
+            }
+
+            # 同一批內重複的物品：取最後一筆（累加模式則加總），備註取最後一筆
+            cursor.execute(f"""
+                CREATE TEMP TABLE audit_batch AS
+                SELECT item_code, {'SUM(actual_quantity)' if accumulate else 'actual_quantity'} AS actual_quantity,
+                       remarks, MAX(seq) AS seq
+                FROM (
+                    SELECT json_extract(value, '$.item_code') AS item_code,
+                           json_extract(value, '$.actual_quantity') AS actual_quantity,
+                           json_extract(value, '$.remarks') AS remarks,
+                           key AS seq
+                    FROM json_each(:counts)
+                )
+                GROUP BY item_code
+            """, params)
+
+            actual = "inventory_audit_details.actual_quantity + excluded.actual_quantity" if accumulate \
+                else "excluded.actual_quantity"
+            cursor.execute(f"""
+                INSERT INTO inventory_audit_details (
+                    audit_id, item_code, item_name, system_quantity, actual_quantity, discrepancy, remarks, audited_by
+                )
+                SELECT :audit_id, i.code, i.name, s.system_quantity, b.actual_quantity,
+                       b.actual_quantity - s.system_quantity, b.remarks, :audited_by
+                FROM temp.audit_batch b
+                JOIN items i ON i.code = b.item_code
+                JOIN ({self.AUDIT_STOCK_SQL.format(codes='temp.audit_batch')}) s ON s.item_code = b.item_code
+                WHERE 1
+                ON CONFLICT(audit_id, item_code) DO UPDATE SET
+                    system_quantity = excluded.system_quantity,
+                    actual_quantity = {actual},
+                    discrepancy = {actual} - excluded.system_quantity,
+                    remarks = COALESCE(excluded.remarks, inventory_audit_details.remarks),
+                    audited_by = excluded.audited_by,
+                    audited_at = CURRENT_TIMESTAMP
+            """, params)
+
+            cursor.execute("""
+                SELECT d.item_code, d.item_name, d.system_quantity, d.actual_quantity, d.discrepancy
+                FROM temp.audit_batch b JOIN inventory_audit_details d
+                  ON d.audit_id = :audit_id AND d.item_code = b.item_code
+                ORDER BY b.seq
+            """, params)
+            recorded = [dict(row) for row in cursor.fetchall()]
+            cursor.execute("""
+                SELECT b.item_code FROM temp.audit_batch b
+                LEFT JOIN items i ON i.code = b.item_code
+                WHERE i.code IS NULL ORDER BY b.seq
+            """)
+            unknown = [row[0] for row in cursor.fetchall()]
+            cursor.execute("DROP TABLE temp.audit_batch")
+            conn.commit()
+
+            discrepancies = sum(1 for row in recorded if row['discrepancy'])
+            message = f"已記錄 {len(recorded)} 項，{discrepancies} 項有差異"
+            if unknown:
+                message += f"，{len(unknown)} 項物品代碼不存在"
+            return {
+                "success": True,
+                "audit_id": audit_id,
+                "audit_number": audit['audit_number'],
+                "recorded": len(recorded),
+                "discrepancies": discrepancies,
+                "items": recorded,
+                "unknown_items": unknown,
+                "message": message
+            }
+
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def complete_audit(
+        self,
+        audit_id: int,
+        completed_by: str,
+        auto_adjust: bool = True,
+        notes: Optional[str] = None
+    ) -> dict:
+        """
+        完成盤點
+
+        在同一個交易內：以一次 JOIN 依目前系統庫存重新計算所有明細的差異（盤點期間的進貨/消耗一併反映），
+        auto_adjust 時以一個 INSERT…SELECT 寫入調整事件（差異 > 0 為 RECEIVE，< 0 為 CONSUME），
+        並結案盤點。任一步驟失敗時全部還原。
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            audit = self._get_audit(cursor, audit_id, require_open=True)
+            params = {"audit_id": audit_id, "station_id": audit['station_id']}
+
+            cursor.execute(f"""
+                UPDATE inventory_audit_details
+                SET system_quantity = s.system_quantity,
+                    discrepancy = inventory_audit_details.actual_quantity - s.system_quantity
+                FROM ({self.AUDIT_STOCK_SQL.format(
+                    codes='(SELECT item_code FROM inventory_audit_details WHERE audit_id = :audit_id)'
+                )}) s
+                WHERE inventory_audit_details.audit_id = :audit_id
+                  AND inventory_audit_details.item_code = s.item_code
+            """, params)
+
+            cursor.execute("""
+                SELECT COUNT(*) AS counted,
+                       COALESCE(SUM(discrepancy != 0), 0) AS discrepancies,
+                       COALESCE(SUM(discrepancy), 0) AS net_adjustment
+                FROM inventory_audit_details WHERE audit_id = :audit_id
+            """, params)
+            totals = cursor.fetchone()
+
+            adjusted = 0
+            if auto_adjust:
+                cursor.execute("""
+                    INSERT INTO inventory_events (event_type, item_code, quantity, remarks, station_id, operator)
+                    SELECT CASE WHEN discrepancy > 0 THEN 'RECEIVE' ELSE 'CONSUME' END,
+                           item_code, ABS(discrepancy), :remarks, :station_id, :operator
+                    FROM inventory_audit_details
+                    WHERE audit_id = :audit_id AND discrepancy != 0
+                    ORDER BY id
+                """, {**params, "remarks": f"盤點調整 {audit['audit_number']}", "operator": completed_by})
+                adjusted = cursor.rowcount
+
+            cursor.execute("""
+                UPDATE inventory_audit
+                SET status = 'COMPLETED', completed_by = ?, completed_at = CURRENT_TIMESTAMP,
+                    total_items = ?, discrepancies = ?, notes = COALESCE(?, notes)
+                WHERE id = ?
+            """, (completed_by, totals['counted'], totals['discrepancies'], notes, audit_id))
+            conn.commit()
+            logger.info(
+                f"盤點完成: {audit['audit_number']} ({totals['counted']} 項, "
+                f"{totals['discrepancies']} 項差異, 調整 {adjusted} 項)"
+            )
+
+            return {
+                "success": True,
+                "audit_number": audit['audit_number'],
+                "total_items": totals['counted'],
+                "uncounted_items": max(audit['total_items'] - totals['counted'], 0),
+                "discrepancies": totals['discrepancies'],
+                "net_adjustment": totals['net_adjustment'],
+                "adjusted_items": adjusted,
+                "message": "盤點完成，庫存已調整" if adjusted else "盤點完成"
+            }
+
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def cancel_audit(self, audit_id: int, cancelled_by: str, notes: Optional[str] = None) -> dict:
+        """取消進行中的盤點（不調整庫存，明細保留）"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            audit = self._get_audit(cursor, audit_id, require_open=True)
+            cursor.execute("""
+                UPDATE inventory_audit
+                SET status = 'CANCELLED', completed_by = ?, completed_at = CURRENT_TIMESTAMP, notes = COALESCE(?, notes)
+                WHERE id = ?
+            """, (cancelled_by, notes, audit_id))
+            conn.commit()
+            logger.info(f"盤點已取消: {audit['audit_number']}")
+            return {"success": True, "audit_number": audit['audit_number'], "message": "盤點已取消"}
+
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def get_audit(self, audit_id: int, discrepancies_only: bool = False) -> dict:
+        """查詢盤點與明細"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            audit = dict(self._get_audit(cursor, audit_id))
+            cursor.execute(f"""
+                SELECT item_code, item_name, system_quantity, actual_quantity, discrepancy,
+                       remarks, audited_by, audited_at
+                FROM inventory_audit_details
+                WHERE audit_id = ? {'AND discrepancy != 0' if discrepancies_only else ''}
+                ORDER BY item_code
+            """, (audit_id,))
+            audit['details'] = [dict(row) for row in cursor.fetchall()]
+            return audit
+        finally:
+            conn.close()
+
+    def list_audits(self, status: Optional[str] = None, station_id: Optional[str] = None, limit: int = 10) -> dict:
+        """查詢盤點記錄"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            where_clauses = []
+            params = []
+            if status:
+                where_clauses.append("status = ?")
+                params.append(status)
+            if station_id:
+                where_clauses.append("station_id = ?")
+                params.append(station_id)
+            where_sql = " AND ".join(where_clauses) if where_clauses else "1=1"
+            params.append(limit)
+
+            cursor.execute(f"""
+                SELECT id AS audit_id, audit_number, audit_type, status, station_id, total_items, discrepancies,
+                       started_by, started_at, completed_by, completed_at, notes
+                FROM inventory_audit
+                WHERE {where_sql}
+                ORDER BY started_at DESC, id DESC
+                LIMIT ?
+            """, params)
+            audits = [dict(row) for row in cursor.fetchall()]
+            return {"audits": audits, "count": len(audits)}
+        finally:
+            conn.close()
+
+    # ========== 效期追蹤與過期清掃 (v1.4.5) ==========
+
+    # 耗材批次 = 進貨事件的 (站點, 物品, 批號, 效期)
+    EXPIRY_LOT_SQL = """
+        INSERT INTO expiry_lots (station_id, item_code, batch_number, expiry_date, received_quantity, status)
+        SELECT {row}.station_id, {row}.item_code, COALESCE({row}.batch_number, ''), {row}.expiry_date, {sign}{row}.quantity,
+               CASE WHEN {row}.expiry_date < date('now', 'localtime') THEN 'EXPIRED' ELSE 'ACTIVE' END
+        WHERE {row}.event_type = 'RECEIVE' AND COALESCE({row}.expiry_date, '') != ''
+        ON CONFLICT(station_id, item_code, batch_number, expiry_date) DO UPDATE SET
+            received_quantity = received_quantity + excluded.received_quantity;
+    """
+
+    def _init_expiry_index(self, cursor):
+        """
+        建立效期索引與維護觸發器
+
+        緊急血袋：部分索引 idx_emergency_blood_available_expiry 只收錄 AVAILABLE 血袋，
+        清掃與即將到期查詢只走訪尚可使用的血袋，不含歷年已使用/過期的血袋。
+        耗材批次：進貨事件（本地或同步匯入）由觸發器彙總到 expiry_lots，依效期建立部分索引。
+        首次建立時以現有進貨事件回填。
+        """
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'expiry_lots'")
+        is_new = cursor.fetchone() is None
+
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_emergency_blood_available_expiry
+            ON emergency_blood_bags(expiry_date) WHERE status = 'AVAILABLE'
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS expiry_lots (
+                station_id TEXT NOT NULL,
+                item_code TEXT NOT NULL,
+                batch_number TEXT NOT NULL,
+                expiry_date TEXT NOT NULL,
+                received_quantity INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL DEFAULT 'ACTIVE',
+                PRIMARY KEY (station_id, item_code, batch_number, expiry_date),
+                CHECK(status IN ('ACTIVE', 'EXPIRED'))
+            ) WITHOUT ROWID
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_expiry_lots_active
+            ON expiry_lots(expiry_date) WHERE status = 'ACTIVE'
+        """)
+
+        if is_new:
+            cursor.execute("""
+                INSERT INTO expiry_lots (station_id, item_code, batch_number, expiry_date, received_quantity, status)
+                SELECT station_id, item_code, COALESCE(batch_number, ''), expiry_date, SUM(quantity),
+                       CASE WHEN expiry_date < ? THEN 'EXPIRED' ELSE 'ACTIVE' END
+                FROM inventory_events
+                WHERE event_type = 'RECEIVE' AND COALESCE(expiry_date, '') != ''
+                GROUP BY station_id, item_code, COALESCE(batch_number, ''), expiry_date
+            """, (datetime.now().strftime('%Y-%m-%d'),))
+
+        cleanup = """
+            DELETE FROM expiry_lots
+            WHERE station_id = OLD.station_id AND item_code = OLD.item_code
+              AND batch_number = COALESCE(OLD.batch_number, '') AND expiry_date = OLD.expiry_date
+              AND received_quantity <= 0;
+        """
+        triggers = {
+            "insert": ("AFTER INSERT ON inventory_events", self.EXPIRY_LOT_SQL.format(row="NEW", sign="")),
+            "delete": ("AFTER DELETE ON inventory_events", self.EXPIRY_LOT_SQL.format(row="OLD", sign="-") + cleanup),
+            "update": (
+                "AFTER UPDATE OF event_type, item_code, quantity, batch_number, expiry_date, station_id ON inventory_events",
+                self.EXPIRY_LOT_SQL.format(row="OLD", sign="-") + cleanup + self.EXPIRY_LOT_SQL.format(row="NEW", sign="")
+            ),
+        }
+        for name, (event, body) in triggers.items():
+            cursor.execute(f"DROP TRIGGER IF EXISTS trg_expiry_inventory_events_{name}")
+            cursor.execute(f"CREATE TRIGGER trg_expiry_inventory_events_{name} {event} BEGIN {body} END")
+
+    def sweep_expired(self, today: Optional[str] = None) -> dict:
+        """
+        將已過效期（效期早於今天）的 AVAILABLE 緊急血袋標記為 EXPIRED，耗材批次標記為 EXPIRED
+
+        兩個 UPDATE 都只走訪部分索引中效期早於今天的項目；血袋狀態變更照常觸發同步與彙總觸發器。
+        """
+        today = today or datetime.now().strftime('%Y-%m-%d')
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute("""
+                UPDATE emergency_blood_bags INDEXED BY idx_emergency_blood_available_expiry SET status = 'EXPIRED'
+                WHERE status = 'AVAILABLE' AND expiry_date < ?
+                RETURNING blood_bag_code
+            """, (today,))
+            bags = sorted(row[0] for row in cursor.fetchall())
+            cursor.execute("""
+                UPDATE expiry_lots INDEXED BY idx_expiry_lots_active SET status = 'EXPIRED'
+                WHERE status = 'ACTIVE' AND expiry_date < ?
+            """, (today,))
+            lots = cursor.rowcount
+            conn.commit()
+
+            if bags or lots:
+                logger.info(f"過期清掃: {len(bags)} 袋緊急血袋、{lots} 個耗材批次已標記為過期")
+            return {
+                "success": True,
+                "as_of": today,
+                "blood_bags_expired": len(bags),
+                "blood_bag_codes": bags,
+                "lots_expired": lots
+            }
+
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"過期清掃失敗: {e}")
+            raise
+        finally:
+            conn.close()
+
+    def get_expiring(self, within_days: int = 7, station_id: Optional[str] = None, today: Optional[str] = None) -> dict:
+        """
+        查詢 within_days 天內到期的緊急血袋與耗材批次（今天到期者包含在內）
+
+        只做效期範圍查詢（部分索引），不掃描整個資料表。消耗事件不記錄批號，
+        耗材批次只列出進貨數量（received_quantity），不是剩餘數量。
+        """
+        today = today or datetime.now().strftime('%Y-%m-%d')
+        until = (datetime.strptime(today, '%Y-%m-%d') + timedelta(days=within_days)).strftime('%Y-%m-%d')
+        params = {"today": today, "until": until, "station_id": station_id}
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute("""
+                SELECT blood_bag_code, blood_type, product_type, collection_date, expiry_date,
+                       volume_ml, station_id,
+                       CAST(julianday(expiry_date) - julianday(:today) AS INTEGER) AS days_left
+                FROM emergency_blood_bags INDEXED BY idx_emergency_blood_available_expiry
+                WHERE status = 'AVAILABLE' AND expiry_date BETWEEN :today AND :until
+                  AND (:station_id IS NULL OR station_id = :station_id)
+                ORDER BY expiry_date, blood_bag_code
+            """, params)
+            bags = [dict(row) for row in cursor.fetchall()]
+
+            cursor.execute("""
+                SELECT l.station_id, l.item_code, i.name AS item_name, i.unit,
+                       NULLIF(l.batch_number, '') AS batch_number, l.expiry_date, l.received_quantity,
+                       CAST(julianday(l.expiry_date) - julianday(:today) AS INTEGER) AS days_left
+                FROM expiry_lots l INDEXED BY idx_expiry_lots_active
+                LEFT JOIN items i ON i.code = l.item_code
+                WHERE l.status = 'ACTIVE' AND l.expiry_date BETWEEN :today AND :until
+                  AND (:station_id IS NULL OR l.station_id = :station_id)
+                ORDER BY l.expiry_date, l.item_code
+            """, params)
+            lots = [dict(row) for row in cursor.fetchall()]
+
+            return {
+                "as_of": today,
+                "within_days": within_days,
+                "until": until,
+                "blood_bags": bags,
+                "consumable_lots": lots,
+                "counts": {"blood_bags": len(bags), "consumable_lots": len(lots)}
+            }
+        finally:
+            conn.close()
+
+    # ========== 血袋可用量版本 (v1.4.5) ==========
+
+    def _init_blood_availability(self, cursor):
+        """
+        建立血袋可用量版本號與觸發器
+
+        血袋庫存與血袋彙總表（同步匯入的血袋事件）的寫入遞增 units_version，
+        緊急血袋的寫入遞增 bags_version；BloodAvailabilityIndex 只重新載入版本號改變的那一部分。
+        """
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS blood_availability_version (
+                id INTEGER PRIMARY KEY CHECK(id = 1),
+                units_version INTEGER NOT NULL DEFAULT 0,
+                bags_version INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        cursor.execute("INSERT OR IGNORE INTO blood_availability_version (id) VALUES (1)")
+
+        events = {
+            "blood_inventory": ("INSERT", "DELETE", "UPDATE OF quantity, blood_type, station_id"),
+            "rollup_blood_stock": ("INSERT", "DELETE", "UPDATE OF quantity"),
+            "emergency_blood_bags": (
+                "INSERT", "DELETE", "UPDATE OF status, blood_type, product_type, expiry_date, station_id"
+            ),
+        }
+        for table, operations in events.items():
+            column = "bags_version" if table == "emergency_blood_bags" else "units_version"
+            for operation in operations:
+                name = f"trg_availability_{table}_{operation.split()[0].lower()}"
+                cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+                cursor.execute(f"""
+                    CREATE TRIGGER {name} AFTER {operation} ON {table}
+                    BEGIN UPDATE blood_availability_version SET {column} = {column} + 1 WHERE id = 1; END
+                """)
+
+    # ========== 醫院彙總（日報表）(v1.4.5) ==========
+
+    # 血袋事件對庫存的增減
+    ROLLUP_BLOOD_DELTA = """CASE {row}.event_type
+        WHEN 'RECEIVE' THEN {row}.quantity WHEN 'TRANSFER_IN' THEN {row}.quantity
+        WHEN 'CONSUME' THEN -{row}.quantity WHEN 'TRANSFER_OUT' THEN -{row}.quantity
+        ELSE 0 END"""
+    BLOOD_SHORTAGE_UNITS = 5    # 醫院各血型（含緊急血袋）低於此數量列為短缺
+
+    def _init_hospital_rollups(self, cursor):
+        """
+        建立醫院彙總表與維護觸發器
+
+        血袋事件、緊急血袋、手術記錄、設備檢查不論本地寫入或同步匯入（upload_sync_package 等），
+        都由觸發器更新所屬站點的彙總列；日報表依 stations 對應醫院加總，
+        成本與站點數、血型數成正比，與事件筆數無關。首次建立時以現有資料回填。
+        """
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'rollup_blood_stock'")
+        is_new = cursor.fetchone() is None
+
+        for name in [row[0] for row in cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'trg_rollup_%'"
+        ).fetchall()]:
+            cursor.execute(f"DROP TRIGGER {name}")
+
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS rollup_blood_stock (
+                station_id TEXT NOT NULL,
+                blood_type TEXT NOT NULL,
+                quantity INTEGER NOT NULL DEFAULT 0,
+                emergency_available INTEGER NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (station_id, blood_type)
+            ) WITHOUT ROWID
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS rollup_daily_activity (
+                station_id TEXT NOT NULL,
+                activity_date DATE NOT NULL,
+                surgeries_performed INTEGER NOT NULL DEFAULT 0,
+                blood_units_in INTEGER NOT NULL DEFAULT 0,
+                blood_units_out INTEGER NOT NULL DEFAULT 0,
+                equipment_checks INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (station_id, activity_date)
+            ) WITHOUT ROWID
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS rollup_equipment_status (
+                station_id TEXT NOT NULL,
+                equipment_id TEXT NOT NULL,
+                status TEXT NOT NULL,
+                power_level INTEGER,
+                checked_at TIMESTAMP,
+                PRIMARY KEY (station_id, equipment_id)
+            ) WITHOUT ROWID
+        """)
+
+        new_delta = self.ROLLUP_BLOOD_DELTA.format(row="NEW")
+        old_delta = self.ROLLUP_BLOOD_DELTA.format(row="OLD")
+
+        if is_new:
+            cursor.execute(f"""
+                INSERT INTO rollup_blood_stock (station_id, blood_type, quantity)
+                SELECT station_id, blood_type, SUM({self.ROLLUP_BLOOD_DELTA.format(row='blood_events')})
+                FROM blood_events GROUP BY station_id, blood_type
+            """)
+            cursor.execute("""
+                INSERT INTO rollup_blood_stock (station_id, blood_type, emergency_available)
+                SELECT station_id, blood_type, COUNT(*) FROM emergency_blood_bags
+                WHERE status = 'AVAILABLE' GROUP BY station_id, blood_type
+                ON CONFLICT(station_id, blood_type) DO UPDATE SET emergency_available = excluded.emergency_available
+            """)
+            cursor.execute(f"""
+                INSERT INTO rollup_daily_activity (station_id, activity_date, blood_units_in, blood_units_out)
+                SELECT station_id, date(timestamp),
+                       SUM(MAX({self.ROLLUP_BLOOD_DELTA.format(row='blood_events')}, 0)),
+                       SUM(MAX(-({self.ROLLUP_BLOOD_DELTA.format(row='blood_events')}), 0))
+                FROM blood_events GROUP BY station_id, date(timestamp)
+            """)
+            cursor.execute("""
+                INSERT INTO rollup_daily_activity (station_id, activity_date, surgeries_performed)
+                SELECT station_id, record_date, COUNT(*) FROM surgery_records
+                WHERE status != 'CANCELLED' GROUP BY station_id, record_date
+                ON CONFLICT(station_id, activity_date) DO UPDATE SET surgeries_performed = excluded.surgeries_performed
+            """)
+            cursor.execute("""
+                INSERT INTO rollup_daily_activity (station_id, activity_date, equipment_checks)
+                SELECT station_id, date(timestamp), COUNT(*) FROM equipment_checks
+                GROUP BY station_id, date(timestamp)
+                ON CONFLICT(station_id, activity_date) DO UPDATE SET equipment_checks = excluded.equipment_checks
+            """)
+            cursor.execute("""
+                INSERT INTO rollup_equipment_status (station_id, equipment_id, status, power_level, checked_at)
+                SELECT station_id, equipment_id, status, power_level, MAX(timestamp)
+                FROM equipment_checks GROUP BY station_id, equipment_id
+            """)
+
+        def blood_event_sql(row: str, delta: str, sign: str) -> str:
+            return f"""
+                INSERT INTO rollup_blood_stock (station_id, blood_type, quantity)
+                VALUES ({row}.station_id, {row}.blood_type, {sign}({delta}))
+                ON CONFLICT(station_id, blood_type) DO UPDATE SET
+                    quantity = quantity + excluded.quantity, updated_at = CURRENT_TIMESTAMP;
+                INSERT INTO rollup_daily_activity (station_id, activity_date, blood_units_in, blood_units_out)
+                VALUES ({row}.station_id, COALESCE(date({row}.timestamp), date('now')),
+                        {sign}MAX({delta}, 0), {sign}MAX(-({delta}), 0))
+                ON CONFLICT(station_id, activity_date) DO UPDATE SET
+                    blood_units_in = blood_units_in + excluded.blood_units_in,
+                    blood_units_out = blood_units_out + excluded.blood_units_out;
+            """
+
+        def emergency_bag_sql(row: str, sign: str) -> str:
+            return f"""
+                INSERT INTO rollup_blood_stock (station_id, blood_type, emergency_available)
+                SELECT {row}.station_id, {row}.blood_type, {sign}1 WHERE {row}.status = 'AVAILABLE'
+                ON CONFLICT(station_id, blood_type) DO UPDATE SET
+                    emergency_available = emergency_available + excluded.emergency_available,
+                    updated_at = CURRENT_TIMESTAMP;
+            """
+
+        def surgery_sql(row: str, sign: str) -> str:
+            return f"""
+                INSERT INTO rollup_daily_activity (station_id, activity_date, surgeries_performed)
+                SELECT {row}.station_id, {row}.record_date, {sign}1 WHERE {row}.status != 'CANCELLED'
+                ON CONFLICT(station_id, activity_date) DO UPDATE SET
+                    surgeries_performed = surgeries_performed + excluded.surgeries_performed;
+            """
+
+        triggers = {
+            "blood_events_insert": ("AFTER INSERT ON blood_events", blood_event_sql("NEW", new_delta, "")),
+            "blood_events_delete": ("AFTER DELETE ON blood_events", blood_event_sql("OLD", old_delta, "-")),
+            "blood_events_update": (
+                "AFTER UPDATE OF event_type, blood_type, quantity, station_id, timestamp ON blood_events",
+                blood_event_sql("OLD", old_delta, "-") + blood_event_sql("NEW", new_delta, "")
+            ),
+            "emergency_blood_bags_insert": ("AFTER INSERT ON emergency_blood_bags", emergency_bag_sql("NEW", "")),
+            "emergency_blood_bags_delete": ("AFTER DELETE ON emergency_blood_bags", emergency_bag_sql("OLD", "-")),
+            "emergency_blood_bags_update": (
+                "AFTER UPDATE OF status, blood_type, station_id ON emergency_blood_bags",
+                emergency_bag_sql("OLD", "-") + emergency_bag_sql("NEW", "")
+            ),
+            "surgery_records_insert": ("AFTER INSERT ON surgery_records", surgery_sql("NEW", "")),
+            "surgery_records_delete": ("AFTER DELETE ON surgery_records", surgery_sql("OLD", "-")),
+            "surgery_records_update": (
+                "AFTER UPDATE OF status, record_date, station_id ON surgery_records",
+                surgery_sql("OLD", "-") + surgery_sql("NEW", "")
+            ),
+            # 設備狀態保留各站點每台設備最新的檢查（晚到的舊檢查不覆蓋）
+            "equipment_checks_insert": ("AFTER INSERT ON equipment_checks", """
+                INSERT INTO rollup_equipment_status (station_id, equipment_id, status, power_level, checked_at)
+                VALUES (NEW.station_id, NEW.equipment_id, NEW.status, NEW.power_level,
+                        COALESCE(NEW.timestamp, CURRENT_TIMESTAMP))
+                ON CONFLICT(station_id, equipment_id) DO UPDATE SET
+                    status = excluded.status, power_level = excluded.power_level, checked_at = excluded.checked_at
+                WHERE excluded.checked_at >= COALESCE(rollup_equipment_status.checked_at, '');
+                INSERT INTO rollup_daily_activity (station_id, activity_date, equipment_checks)
+                VALUES (NEW.station_id, COALESCE(date(NEW.timestamp), date('now')), 1)
+                ON CONFLICT(station_id, activity_date) DO UPDATE SET equipment_checks = equipment_checks + 1;
+            """),
+            "equipment_checks_delete": ("AFTER DELETE ON equipment_checks", """
+                UPDATE rollup_daily_activity SET equipment_checks = equipment_checks - 1
+                WHERE station_id = OLD.station_id AND activity_date = COALESCE(date(OLD.timestamp), date('now'));
+            """),
+        }
+        for name, (event, body) in triggers.items():
+            cursor.execute(f"CREATE TRIGGER trg_rollup_{name} {event} BEGIN {body} END")
+
+    def get_hospital_daily_report(self, hospital_id: str, report_date: Optional[str] = None) -> dict:
+        """
+        由彙總表產生醫院日報表（欄位對應 hospital_daily_reports）
+
+        只讀取該醫院各站點的彙總列，不掃描事件資料表。尚未登記於 stations 的站點
+        （同步匯入時無從得知所屬醫院）不計入任何醫院的合計，僅列於 unregistered_stations 提醒登記。
+        """
+        report_date = report_date or datetime.now().strftime('%Y-%m-%d')
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute("SELECT hospital_id FROM hospitals WHERE hospital_id = ?", (hospital_id,))
+            if not cursor.fetchone():
+                raise HTTPException(status_code=404, detail=f"醫院 {hospital_id} 不存在")
+
+            cursor.execute("""
+                SELECT COUNT(*) AS total,
+                       COALESCE(SUM(operational_status = 'ACTIVE'), 0) AS operational,
+                       COALESCE(SUM(operational_status = 'OFFLINE'), 0) AS offline
+                FROM stations WHERE hospital_id = ?
+            """, (hospital_id,))
+            stations = cursor.fetchone()
+
+            cursor.execute("""
+                SELECT r.station_id FROM (
+                    SELECT station_id FROM rollup_blood_stock
+                    UNION SELECT station_id FROM rollup_daily_activity
+                    UNION SELECT station_id FROM rollup_equipment_status
+                ) r
+                LEFT JOIN stations s ON s.station_id = r.station_id
+                WHERE s.station_id IS NULL
+                ORDER BY r.station_id
+            """)
+            unregistered = [row[0] for row in cursor.fetchall()]
+
+            blood_inventory = {
+                blood_type: {"quantity": 0, "emergency_available": 0} for blood_type in config.BLOOD_TYPES
+            }
+            cursor.execute("""
+                SELECT r.blood_type, SUM(r.quantity) AS quantity, SUM(r.emergency_available) AS emergency_available
+                FROM rollup_blood_stock r JOIN stations s ON s.station_id = r.station_id
+                WHERE s.hospital_id = ?
+                GROUP BY r.blood_type
+            """, (hospital_id,))
+            for row in cursor.fetchall():
+                blood_inventory[row['blood_type']] = {
+                    "quantity": row['quantity'], "emergency_available": row['emergency_available']
+                }
+            critical_shortages = [
+                {"blood_type": blood_type, "available": stock["quantity"] + stock["emergency_available"],
+                 "threshold": self.BLOOD_SHORTAGE_UNITS}
+                for blood_type, stock in blood_inventory.items()
+                if stock["quantity"] + stock["emergency_available"] < self.BLOOD_SHORTAGE_UNITS
+            ]
+
+            cursor.execute("""
+                SELECT COALESCE(SUM(r.surgeries_performed), 0) AS surgeries,
+                       COALESCE(SUM(r.blood_units_in), 0) AS blood_in,
+                       COALESCE(SUM(r.blood_units_out), 0) AS blood_out,
+                       COALESCE(SUM(r.equipment_checks), 0) AS checks
+                FROM rollup_daily_activity r JOIN stations s ON s.station_id = r.station_id
+                WHERE s.hospital_id = ? AND r.activity_date = ?
+            """, (hospital_id, report_date))
+            activity = cursor.fetchone()
+
+            cursor.execute("""
+                SELECT r.station_id, r.equipment_id, r.status, r.power_level, r.checked_at
+                FROM rollup_equipment_status r JOIN stations s ON s.station_id = r.station_id
+                WHERE s.hospital_id = ?
+            """, (hospital_id,))
+            equipment = [dict(row) for row in cursor.fetchall()]
+            status_counts = {}
+            for check in equipment:
+                status_counts[check['status']] = status_counts.get(check['status'], 0) + 1
+            equipment_alerts = [check for check in equipment if check['status'] in ('WARNING', 'ERROR')]
+
+            return {
+                "hospital_id": hospital_id,
+                "report_date": report_date,
+                "total_stations": stations['total'],
+                "operational_stations": stations['operational'],
+                "offline_stations": stations['offline'],
+                "unregistered_stations": unregistered,
+                "surgeries_performed": activity['surgeries'],
+                "blood_units_in": activity['blood_in'],
+                "blood_units_out": activity['blood_out'],
+                "equipment_checks": activity['checks'],
+                "blood_inventory": blood_inventory,
+                "critical_shortages": critical_shortages,
+                "equipment_status": {"by_status": status_counts, "alerts": equipment_alerts}
+            }
+        finally:
+            conn.close()
+
+    def save_hospital_daily_report(self, hospital_id: str, submitted_by: str, report_date: Optional[str] = None) -> dict:
+        """將彙總產生的日報表寫入 hospital_daily_reports（同一天重複送出時覆蓋）"""
+        report = self.get_hospital_daily_report(hospital_id, report_date)
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            report_id = f"RPT-{hospital_id}-{report['report_date'].replace('-', '')}"
+            cursor.execute("""
+                INSERT INTO hospital_daily_reports (
+                    report_id, hospital_id, report_date, total_stations, operational_stations,
+                    offline_stations, surgeries_performed, blood_inventory_json,
+                    critical_shortages_json, equipment_status_json, alerts_json, submitted_by
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(hospital_id, report_date) DO UPDATE SET
+                    total_stations = excluded.total_stations,
+                    operational_stations = excluded.operational_stations,
+                    offline_stations = excluded.offline_stations,
+                    surgeries_performed = excluded.surgeries_performed,
+                    blood_inventory_json = excluded.blood_inventory_json,
+                    critical_shortages_json = excluded.critical_shortages_json,
+                    equipment_status_json = excluded.equipment_status_json,
+                    alerts_json = excluded.alerts_json,
+                    submitted_by = excluded.submitted_by,
+                    submitted_at = CURRENT_TIMESTAMP,
+                    received_by_central = FALSE,
+                    received_at = NULL
+            """, (
+                report_id, hospital_id, report['report_date'], report['total_stations'],
+                report['operational_stations'], report['offline_stations'], report['surgeries_performed'],
+                json.dumps(report['blood_inventory'], ensure_ascii=False),
+                json.dumps(report['critical_shortages'], ensure_ascii=False),
+                json.dumps(report['equipment_status']['by_status'], ensure_ascii=False),
+                json.dumps(report['equipment_status']['alerts'] + [
+                    {"station_id": station_id, "status": "UNREGISTERED"} for station_id in report['unregistered_stations']
+                ], ensure_ascii=False),
+                submitted_by
+            ))
+            conn.commit()
+            logger.info(f"醫院日報表已產生: {report_id}")
+            return {"success": True, "report_id": report_id, **report}
+
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"產生醫院日報表失敗: {e}")
+            raise
+        finally:
+            conn.close()
+
+    # ========== 自動同步寄件匣 (v1.4.5) ==========
+
+    def get_pending_sync_stats(self, station_id: str, hospital_id: str) -> dict:
+        """
+        尚未打包的變更：醫院確認序號與寄件匣最後一個封包 to_seq 之後的變更筆數與最舊變更時間
+
+        供 SyncScheduler 判斷大小與延遲門檻（變更紀錄以序號主鍵範圍查詢，成本與待打包筆數成正比）。
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT MAX(
+                    COALESCE((SELECT last_seq FROM sync_acknowledgements
+                              WHERE destination_id = ? AND station_id = ?), 0),
+                    COALESCE((SELECT MAX(to_seq) FROM sync_outbox
+                              WHERE hospital_id = ? AND station_id = ?), 0)
+                )
+            """, (hospital_id, station_id, hospital_id, station_id))
+            since_seq = cursor.fetchone()[0]
+
+            cursor.execute("""
+                SELECT COUNT(*) AS pending,
+                       MIN(changed_at) AS oldest,
+                       (julianday('now') - julianday(MIN(changed_at))) * 86400 AS age
+                FROM sync_changelog
+                WHERE seq > ? AND (station_id = ? OR station_id IS NULL)
+            """, (since_seq, station_id))
+            row = cursor.fetchone()
+
+            return {
+                "station_id": station_id,
+                "hospital_id": hospital_id,
+                "since_seq": since_seq,
+                "pending_changes": row['pending'],
+                "oldest_pending_at": row['oldest'],
+                "oldest_age_seconds": round(row['age'] or 0, 1)
+            }
+        finally:
+            conn.close()
+
+    def record_outbox_package(self, header: dict, trailer: dict, file_path: str, trigger_reason: str) -> dict:
+        """將已寫入寄件匣的封包登記為待送出 (QUEUED)"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute("""
+                INSERT INTO sync_outbox (
+                    package_id, station_id, hospital_id, from_seq, to_seq,
+                    changes_count, package_size, checksum, file_path, trigger_reason
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                header['package_id'], header['station_id'], header['hospital_id'],
+                header['from_seq'], header['to_seq'], trailer['changes_count'],
+                os.path.getsize(file_path), trailer['checksum'], file_path, trigger_reason
+            ))
+            conn.commit()
+            return self._outbox_package(cursor, header['package_id'])
+
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"登記寄件匣封包失敗: {e}")
+            raise
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _outbox_package(cursor, package_id: str) -> Optional[dict]:
+        cursor.execute("SELECT * FROM sync_outbox WHERE package_id = ?", (package_id,))
+        row = cursor.fetchone()
+        return dict(row) if row else None
+
+    def get_outbox_package(self, package_id: str) -> Optional[dict]:
+        conn = self.get_connection()
+        try:
+            return self._outbox_package(conn.cursor(), package_id)
+        finally:
+            conn.close()
+
+    def list_sync_outbox(self, station_id: Optional[str] = None, status: Optional[str] = None, limit: int = 100) -> List[dict]:
+        """列出寄件匣封包（待送出的依產生順序，送出時請由最舊的開始）"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            query = "SELECT * FROM sync_outbox WHERE 1=1"
+            params = []
+            if station_id:
+                query += " AND station_id = ?"
+                params.append(station_id)
+            if status:
+                query += " AND status = ?"
+                params.append(status)
+            query += " ORDER BY to_seq LIMIT ?"
+            params.append(limit)
+            cursor.execute(query, params)
+            return [dict(row) for row in cursor.fetchall()]
+        finally:
+            conn.close()
+
+    def mark_outbox_sent(self, package_id: str, transfer_method: str) -> dict:
+        """標記寄件匣封包已由某種轉移方式送出（同步更新 sync_packages）"""
+        if transfer_method not in ('USB', 'DRONE', 'MANUAL', 'NETWORK'):
+            raise HTTPException(status_code=400, detail="轉移方式必須為 USB / DRONE / MANUAL / NETWORK")
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            package = self._outbox_package(cursor, package_id)
+            if not package:
+                raise HTTPException(status_code=404, detail=f"寄件匣找不到封包: {package_id}")
+            if package['status'] == 'QUEUED':
+                cursor.execute("""
+                    UPDATE sync_outbox
+                    SET status = 'SENT', transfer_method = ?, sent_at = CURRENT_TIMESTAMP
+                    WHERE package_id = ?
+                """, (transfer_method, package_id))
+                cursor.execute("""
+                    UPDATE sync_packages
+                    SET status = 'UPLOADED', transfer_method = ?, uploaded_at = CURRENT_TIMESTAMP
+                    WHERE package_id = ?
+                """, (transfer_method, package_id))
+                conn.commit()
+            return self._outbox_package(cursor, package_id)
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"標記寄件匣封包失敗: {e}")
+            raise
+        finally:
+            conn.close()
+
+    # ========== Merkle 對帳 (v1.4.5) ==========
+
+    # 雜湊樹：葉節點為主鍵區段（整數主鍵每 256 筆一段；文字主鍵依雜湊分 256 段）
+    # 第 level 層的節點 i 涵蓋 bucket [i * FANOUT^(DEPTH-level), (i+1) * FANOUT^(DEPTH-level))
+    SYNC_MERKLE_BUCKET_SIZE = 256
+    SYNC_MERKLE_TEXT_BUCKETS = 256
+    SYNC_MERKLE_FANOUT = 16
+    SYNC_MERKLE_DEPTH = 6
+    # event_uid 結尾的來源節點本地編號（各節點相同），事件表依此範圍分段
+    SYNC_MERKLE_ORIGIN_SEQ = "CAST(substr(event_uid, length(rtrim(event_uid, '0123456789')) + 1) AS INTEGER)"
+
+    def _merkle_bucket(self, table: str, key) -> int:
+        """主鍵所屬區段：整數主鍵與事件表依範圍，其他文字主鍵依雜湊"""
+        if isinstance(key, int):
+            return key // self.SYNC_MERKLE_BUCKET_SIZE
+        if table in self.SYNC_EVENT_TABLES:
+            key = str(key)
+            return int(key[len(key.rstrip('0123456789')):] or 0) // self.SYNC_MERKLE_BUCKET_SIZE
+        return int.from_bytes(hashlib.sha256(str(key).encode('utf-8')).digest()[:4], 'big') % self.SYNC_MERKLE_TEXT_BUCKETS
+
+    def _merkle_integer_key(self, cursor, table: str) -> bool:
+        key_col = self.SYNC_CAPTURE_TABLES[table][0]
+        if table not in self._merkle_int_keys:
+            columns = cursor.connection.execute(f"PRAGMA table_info({table})").fetchall()
+            self._merkle_int_keys[table] = any(
+                row['name'] == key_col and row['type'].upper() == 'INTEGER' for row in columns
+            )
+        return self._merkle_int_keys[table]
+
+    @staticmethod
+    def _merkle_row_digest(row: dict) -> bytes:
+        return hashlib.sha256(
+            json.dumps(row, ensure_ascii=False, sort_keys=True, separators=(',', ':'), default=str).encode('utf-8')
+        ).digest()
+
+    def _merkle_bucket_rows(self, cursor, table: str, station_id: str, buckets) -> Dict[int, List[dict]]:
+        """取出指定區段內的資料列（依主鍵排序；站點資料表不含各節點不同的本地 id）"""
+        key_col, station_col, _ = self.SYNC_CAPTURE_TABLES[table]
+        local_id = 'id' if table in self.SYNC_EVENT_TABLES else None
+        buckets = set(buckets)
+        result = {bucket: [] for bucket in buckets}
+        station_filter = f" AND {station_col} = ?" if station_col else ""
+        station_params = (station_id,) if station_col else ()
+
+        if table in self.SYNC_EVENT_TABLES or self._merkle_integer_key(cursor, table):
+            # 整數主鍵與事件表：逐段範圍查詢
+            size = self.SYNC_MERKLE_BUCKET_SIZE
+            range_col = self.SYNC_MERKLE_ORIGIN_SEQ if table in self.SYNC_EVENT_TABLES else key_col
+            for bucket in sorted(buckets):
+                cursor.execute(f"""
+                    SELECT * FROM {table}
+                    WHERE {range_col} >= ? AND {range_col} < ?{station_filter}
+                    ORDER BY {key_col}
+                """, (bucket * size, (bucket + 1) * size) + station_params)
+                result[bucket] = [{k: row[k] for k in row.keys() if k != local_id} for row in cursor.fetchall()]
+        else:
+            # 文字主鍵（主檔）：區段在 SQLite 內判斷，只取出指定區段的資料列
+            cursor.connection.create_function(
+                "sync_merkle_bucket", 1, lambda key: self._merkle_bucket(table, key), deterministic=True
+            )
+            cursor.execute(f"""
+                SELECT * FROM {table}
+                WHERE 1 = 1{station_filter} AND sync_merkle_bucket({key_col}) IN ({','.join('?' * len(buckets))})
+                ORDER BY {key_col}
+            """, station_params + tuple(buckets))
+            for row in cursor:
+                result[self._merkle_bucket(table, row[key_col])].append({k: row[k] for k in row.keys() if k != local_id})
+        return result
+
+    def refresh_merkle_buckets(self) -> dict:
+        """
+        依變更紀錄增量更新雜湊樹葉節點與資料表摘要
+
+        只重新計算上次更新後有變動的區段；首次呼叫時變更紀錄涵蓋全部資料，等同完整建立。
+        資料表摘要加上區段新舊 row_sum 的差值，不必重新掃描整個資料表。
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute("SELECT last_seq FROM sync_merkle_state WHERE name = 'buckets'")
+            row = cursor.fetchone()
+            last_seq = row['last_seq'] if row else 0
+
+            cursor.execute("""
+                SELECT DISTINCT table_name, COALESCE(station_id, '') AS station_id, row_key
+                FROM sync_changelog WHERE seq > ?
+            """, (last_seq,))
+            dirty = {}
+            for entry in cursor.fetchall():
+                bucket = self._merkle_bucket(entry['table_name'], entry['row_key'])
+                dirty.setdefault((entry['table_name'], entry['station_id']), set()).add(bucket)
+
+            cursor.execute("SELECT COALESCE(MAX(seq), 0) FROM sync_changelog")
+            to_seq = cursor.fetchone()[0]
+
+            buckets_updated = 0
+            for (table, station_id), buckets in dirty.items():
+                rows_by_bucket = self._merkle_bucket_rows(cursor, table, station_id, buckets)
+                old_sums = {}
+                cursor.execute("""
+                    SELECT bucket, row_count, row_sum FROM sync_merkle_buckets
+                    WHERE table_name = ? AND station_id = ?
+                """, (table, station_id))
+                for row in cursor.fetchall():
+                    if row['bucket'] in buckets:
+                        old_sums[row['bucket']] = (row['row_count'], int(row['row_sum'] or '0', 16))
+
+                count_delta = 0
+                sum_delta = 0
+                for bucket, rows in rows_by_bucket.items():
+                    old_count, old_sum = old_sums.get(bucket, (0, 0))
+                    if not rows:
+                        cursor.execute("""
+                            DELETE FROM sync_merkle_buckets
+                            WHERE table_name = ? AND station_id = ? AND bucket = ?
+                        """, (table, station_id, bucket))
+                        count_delta -= old_count
+                        sum_delta -= old_sum
+                        continue
+                    digest = hashlib.sha256()
+                    row_sum = 0
+                    for data in rows:
+                        row_digest = self._merkle_row_digest(data)
+                        digest.update(row_digest)
+                        row_sum += int.from_bytes(row_digest, 'big')
+                    row_sum %= self.SYNC_DIGEST_MODULUS
+                    cursor.execute("""
+                        INSERT OR REPLACE INTO sync_merkle_buckets
+                        (table_name, station_id, bucket, row_count, digest, row_sum, updated_seq)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """, (table, station_id, bucket, len(rows), digest.hexdigest(), f"{row_sum:064x}", to_seq))
+                    count_delta += len(rows) - old_count
+                    sum_delta += row_sum - old_sum
+                    buckets_updated += 1
+
+                self._update_table_digest(cursor, table, station_id, count_delta, sum_delta, to_seq)
+
+            cursor.execute("""
+                INSERT OR REPLACE INTO sync_merkle_state (name, last_seq) VALUES ('buckets', ?)
+            """, (to_seq,))
+            conn.commit()
+
+            return {"from_seq": last_seq, "to_seq": to_seq, "buckets_updated": buckets_updated}
+
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"更新雜湊樹失敗: {e}")
+            raise
+        finally:
+            conn.close()
+
+    def _merkle_node_digests(self, cursor, table: str, station_id: str, level: int, indexes) -> Dict[int, str]:
+        """計算指定層節點的雜湊（節點內無資料時為空字串）"""
+        span = self.SYNC_MERKLE_FANOUT ** (self.SYNC_MERKLE_DEPTH - level)
+        digests = {}
+        for index in indexes:
+            cursor.execute("""
+                SELECT bucket, digest FROM sync_merkle_buckets
+                WHERE table_name = ? AND station_id = ? AND bucket >= ? AND bucket < ?
+                ORDER BY bucket
+            """, (table, station_id, index * span, (index + 1) * span))
+            rows = cursor.fetchall()
+            if not rows:
+                digests[index] = ""
+                continue
+            digest = hashlib.sha256()
+            for row in rows:
+                digest.update(row['bucket'].to_bytes(8, 'big') + bytes.fromhex(row['digest']))
+            digests[index] = digest.hexdigest()
+        return digests
+
+    def _merkle_scope(self, table: str, station_id: str) -> str:
+        if table not in self.SYNC_CAPTURE_TABLES:
+            raise HTTPException(status_code=400, detail=f"不支援對帳的資料表: {table}")
+        # 各站共用的主檔不分站點
+        return station_id if self.SYNC_CAPTURE_TABLES[table][1] else ''
+
+    def get_merkle_nodes(self, table: str, station_id: str, level: int, indexes: List[int]) -> dict:
+        """取得雜湊樹節點（先依變更紀錄更新葉節點）"""
+        scope = self._merkle_scope(table, station_id)
+        if not 0 <= level <= self.SYNC_MERKLE_DEPTH:
+            raise HTTPException(status_code=400, detail=f"層級必須介於 0 與 {self.SYNC_MERKLE_DEPTH}")
+        self.refresh_merkle_buckets()
+
+        conn = self.get_connection()
+        try:
+            return {
+                "table": table,
+                "station_id": station_id,
+                "level": level,
+                "depth": self.SYNC_MERKLE_DEPTH,
+                "fanout": self.SYNC_MERKLE_FANOUT,
+                "nodes": self._merkle_node_digests(conn.cursor(), table, scope, level, indexes)
+            }
+        finally:
+            conn.close()
+
+    def compare_merkle_nodes(self, table: str, station_id: str, level: int, remote_nodes: Dict[int, str]) -> dict:
+        """
+        比對對方送來的節點雜湊，回傳不一致的節點
+
+        對方依此只展開不一致節點的子節點進入下一層，
+        到葉節點層 (level == depth) 時回傳的即為需要重送的主鍵區段。
+        """
+        result = self.get_merkle_nodes(table, station_id, level, list(remote_nodes))
+        differing = sorted(index for index, digest in remote_nodes.items() if result["nodes"][index] != digest)
+        return {
+            "table": table,
+            "station_id": station_id,
+            "level": level,
+            "depth": self.SYNC_MERKLE_DEPTH,
+            "differing": differing
+        }
+
+    def build_reconcile_package(self, table: str, station_id: str, buckets: List[int]) -> dict:
+        """產生指定區段的對帳封包：區段內全部資料列（接收端以此取代同區段的資料）"""
+        scope = self._merkle_scope(table, station_id)
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN")
+            rows_by_bucket = self._merkle_bucket_rows(cursor, table, scope, buckets)
+            changes = [
+                {'table': table, 'operation': 'INSERT', 'data': data, 'timestamp': None}
+                for bucket in sorted(rows_by_bucket) for data in rows_by_bucket[bucket]
+            ]
+            return {
+                "table": table,
+                "station_id": station_id,
+                "buckets": sorted(rows_by_bucket),
+                "changes_count": len(changes),
+                "changes": changes
+            }
+        finally:
+            conn.close()
+
+    def apply_reconcile_package(self, package: dict) -> dict:
+        """
+        套用對帳封包：刪除區段內對方沒有的資料列，再寫入對方的資料列
+
+        區段內的資料會與來源完全一致（由來源端決定正確內容）。
+        """
+        table = package['table']
+        scope = self._merkle_scope(table, package['station_id'])
+        key_col, station_col, _ = self.SYNC_CAPTURE_TABLES[table]
+        incoming = {change['data'][key_col]: self._merkle_row_digest(change['data']) for change in package['changes']}
+
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN")
+            local = self._merkle_bucket_rows(cursor, table, scope, package['buckets'])
+            # 對方沒有或內容不同的資料列先刪除（只新增的事件表合併時不覆蓋既有資料）
+            stale = [
+                data[key_col] for rows in local.values() for data in rows
+                if incoming.get(data[key_col]) != self._merkle_row_digest(data)
+            ]
+            deletes = [
+                {'table': table, 'operation': 'DELETE', 'data': {key_col: key}, 'timestamp': None}
+                for key in stale
+            ]
+            conflicts = []
+            changes_applied, conflicts_detected = self._apply_sync_changes(
+                cursor, deletes + package['changes'], conflicts
+            )
+            conn.commit()
+            return {
+                "success": conflicts_detected == 0,
+                "table": table,
+                "buckets": len(package['buckets']),
+                "rows_deleted": len(stale),
+                "rows_written": len(package['changes']),
+                "changes_applied": changes_applied,
+                "conflicts_detected": conflicts_detected,
+                "conflicts": conflicts
+            }
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"套用對帳封包失敗: {e}")
+            raise
+        finally:
+            conn.close()
+
+    def merkle_reconcile(self, table: str, station_id: str, remote, push: bool = True) -> dict:
+        """
+        與對方逐層比對雜湊樹，只傳送不一致區段的資料
+
+        remote(path, payload) 呼叫對方的 /api/sync/merkle/* 端點並回傳 JSON。
+        push=True 以本端資料修正對方；push=False 向對方取回資料修正本端。
+        每層只展開不一致節點的子節點，傳輸量與差異大小成正比，與資料庫大小無關。
+        """
+        scope = self._merkle_scope(table, station_id)
+        self.refresh_merkle_buckets()
+        stats = {"rounds": 0, "nodes_compared": 0}
+
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            candidates = [0]
+            for level in range(self.SYNC_MERKLE_DEPTH + 1):
+                local = self._merkle_node_digests(cursor, table, scope, level, candidates)
+                response = remote("/api/sync/merkle/compare", {
+                    "table": table, "stationId": station_id, "level": level,
+                    "nodes": {str(index): digest for index, digest in local.items()}
+                })
+                stats["rounds"] += 1
+                stats["nodes_compared"] += len(candidates)
+                differing = response["differing"]
+                if not differing or level == self.SYNC_MERKLE_DEPTH:
+                    break
+                candidates = [
+                    index * self.SYNC_MERKLE_FANOUT + child
+                    for index in differing for child in range(self.SYNC_MERKLE_FANOUT)
+                ]
+        finally:
+            conn.close()
+
+        buckets = differing if level == self.SYNC_MERKLE_DEPTH else []
+        result = {**stats, "table": table, "station_id": station_id, "differing_buckets": len(buckets)}
+        if not buckets:
+            return {**result, "in_sync": True, "rows_sent": 0}
+
+        if push:
+            package = self.build_reconcile_package(table, station_id, buckets)
+            applied = remote("/api/sync/merkle/apply", package)
+        else:
+            package = remote("/api/sync/merkle/package", {"table": table, "stationId": station_id, "buckets": buckets})
+            applied = self.apply_reconcile_package(package)
+        return {
+            **result,
+            "in_sync": False,
+            "rows_sent": package["changes_count"],
+            "rows_deleted": applied.get("rows_deleted", 0),
+            "conflicts_detected": applied.get("conflicts_detected", 0)
+        }
+
+    # ========== 資料表摘要 (v1.4.5) ==========
+
+    # 各列雜湊 (SHA-256) 相加 mod 2^256：與資料列順序無關，重複的資料列也不會互相抵銷（XOR 會）
+    SYNC_DIGEST_MODULUS = 1 << 256
+
+    def _update_table_digest(self, cursor, table: str, station_id: str, count_delta: int, sum_delta: int, seq: int):
+        """將區段變動的差值加到資料表摘要"""
+        cursor.execute("""
+            SELECT row_count, digest FROM sync_table_digests WHERE table_name = ? AND station_id = ?
+        """, (table, station_id))
+        row = cursor.fetchone()
+        row_count = (row['row_count'] if row else 0) + count_delta
+        digest = ((int(row['digest'], 16) if row else 0) + sum_delta) % self.SYNC_DIGEST_MODULUS
+        cursor.execute("""
+            INSERT OR REPLACE INTO sync_table_digests (table_name, station_id, row_count, digest, updated_seq)
+            VALUES (?, ?, ?, ?, ?)
+        """, (table, station_id, row_count, f"{digest:064x}", seq))
+
+    def get_sync_digests(self, station_id: str, tables: Optional[List[str]] = None) -> dict:
+        """
+        取得各資料表的摘要（先依變更紀錄更新）
+
+        兩端摘要相同即資料相同；不同時再以增量同步或雜湊樹對帳處理該資料表。
+        資料表沒有資料時摘要為全 0。
+        """
+        tables = list(tables or self.SYNC_CAPTURE_TABLES)
+        scopes = {table: self._merkle_scope(table, station_id) for table in tables}
+        refreshed = self.refresh_merkle_buckets()
+
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            digests = {}
+            for table, scope in scopes.items():
+                cursor.execute("""
+                    SELECT row_count, digest FROM sync_table_digests WHERE table_name = ? AND station_id = ?
+                """, (table, scope))
+                row = cursor.fetchone()
+                digests[table] = {
+                    "row_count": row['row_count'] if row else 0,
+                    "digest": row['digest'] if row else "0" * 64
+                }
+            return {"station_id": station_id, "seq": refreshed["to_seq"], "tables": digests}
+        finally:
+            conn.close()
+
+    def compare_sync_digests(self, station_id: str, remote_tables: Dict[str, dict]) -> dict:
+        """比對對方送來的資料表摘要，回傳不一致的資料表"""
+        local = self.get_sync_digests(station_id, list(remote_tables))
+        differing = [
+            table for table, remote in remote_tables.items()
+            if local["tables"][table]["digest"] != remote.get("digest")
+            or local["tables"][table]["row_count"] != remote.get("row_count")
+        ]
+        return {"station_id": station_id, "seq": local["seq"], "differing": differing, "tables": local["tables"]}
+
+    def digest_reconcile(self, station_id: str, remote, tables: Optional[List[str]] = None, push: bool = True) -> dict:
+        """
+        先以一次請求比對資料表摘要，只對不一致的資料表進行雜湊樹對帳
+
+        remote 同 merkle_reconcile，另需支援 /api/sync/digest/compare。
+        """
+        local = self.get_sync_digests(station_id, tables)
+        compared = remote("/api/sync/digest/compare", {"stationId": station_id, "tables": local["tables"]})
+        results = []
+        for table in local["tables"]:
+            if table in compared["differing"]:
+                results.append(self.merkle_reconcile(table, station_id, remote, push))
+            else:
+                results.append({
+                    "table": table, "station_id": station_id, "rounds": 0, "nodes_compared": 0,
+                    "differing_buckets": 0, "in_sync": True, "rows_sent": 0
+                })
+        return {"station_id": station_id, "differing": compared["differing"], "tables": results}
+
+    # ========== 布隆過濾器預先交換 (v1.4.5) ==========
+
+    SYNC_FILTER_ERROR_RATE = 0.01
+
+    def _filter_tables(self, tables: Optional[List[str]] = None) -> List[str]:
+        """預先交換只適用於只新增的事件表（事件一旦存在內容就不會再變）"""
+        tables = list(tables or self.SYNC_APPEND_ONLY_TABLES)
+        invalid = [table for table in tables if table not in self.SYNC_APPEND_ONLY_TABLES]
+        if invalid:
+            raise HTTPException(
+                status_code=400,
+                detail=f"預先交換只支援 {' / '.join(self.SYNC_APPEND_ONLY_TABLES)}: {', '.join(invalid)}"
+            )
+        return tables
+
+    def count_station_rows(self, cursor, station_id: str, tables: Optional[List[str]] = None) -> Dict[str, int]:
+        """各事件表中屬於該站點的筆數"""
+        counts = {}
+        for table in self._filter_tables(tables):
+            cursor.execute(f"SELECT COUNT(*) FROM {table} WHERE station_id = ?", (station_id,))
+            counts[table] = cursor.fetchone()[0]
+        return counts
+
+    def get_station_row_counts(self, station_id: str, tables: Optional[List[str]] = None) -> dict:
+        """醫院端：查詢已持有的站點事件筆數（上傳後檢查過濾器是否誤判漏送）"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            return {"station_id": station_id, "row_counts": self.count_station_rows(cursor, station_id, tables)}
+        finally:
+            conn.close()
+
+    def build_known_filter(
+        self,
+        station_id: str,
+        tables: Optional[List[str]] = None,
+        error_rate: Optional[float] = None,
+        seed: Optional[int] = None
+    ) -> dict:
+        """
+        醫院端：產生已持有的站點事件 (event_uid) 布隆過濾器
+
+        站點產生封包時略過過濾器判定已存在的事件，重新同步時不必重傳醫院已有的資料。
+        每次使用新的隨機 seed，被誤判而未送出的事件下次幾乎不會再被誤判。
+        """
+        tables = self._filter_tables(tables)
+        error_rate = error_rate or self.SYNC_FILTER_ERROR_RATE
+        if seed is None:
+            seed = int.from_bytes(os.urandom(8), 'big')
+
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            # 筆數與過濾器內容取自同一快照
+            cursor.execute("BEGIN")
+            counts = self.count_station_rows(cursor, station_id, tables)
+            bloom = BloomFilter(max(1, sum(counts.values())), error_rate, seed)
+            for table in tables:
+                cursor.execute(f"SELECT event_uid FROM {table} WHERE station_id = ?", (station_id,))
+                bloom.update(f"{table}:{row[0]}" for row in cursor)
+            conn.commit()
+
+            exported = bloom.export()
+            return {
+                "station_id": station_id,
+                "tables": tables,
+                "row_counts": counts,
+                "filter_bytes": len(bloom.bits),
+                "filter": exported
+            }
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"產生已持有事件過濾器失敗: {e}")
+            raise
+        finally:
+            conn.close()
+
+    def _exclude_known_changes(self, changes, known_filter: dict, stats: dict):
+        """略過過濾器判定醫院已持有的事件新增，略過筆數記錄於 stats['filter_excluded']"""
+        try:
+            bloom = BloomFilter.from_export(known_filter['filter'])
+            tables = set(self._filter_tables(known_filter['tables']))
+        except (KeyError, TypeError, ValueError) as e:
+            raise HTTPException(status_code=400, detail=f"已持有事件過濾器格式錯誤: {e}")
+
+        def iterate():
+            stats["filter_excluded"] = 0
+            for change in changes:
+                if (change['operation'] == 'INSERT' and change['table'] in tables
+                        and f"{change['table']}:{change['data'].get('event_uid')}" in bloom):
+                    stats["filter_excluded"] += 1
+                    continue
+                yield change
+
+        return iterate()
+
+    def sync_push_with_filter(
+        self,
+        station_id: str,
+        hospital_id: str,
+        remote,
+        sync_type: str = "DELTA",
+        error_rate: Optional[float] = None
+    ) -> dict:
+        """
+        站點端：以布隆過濾器預先交換後上傳同步封包
+
+        1. 向醫院取得已持有事件的過濾器
+        2. 產生封包時略過醫院已持有的事件
+        3. 上傳封包
+        4. 比對醫院筆數與封包產生當下的站點筆數，不符（過濾器誤判漏送）的事件表以 Merkle 對帳補齊
+        5. 確認變更序號
+
+        remote(path, payload) 呼叫醫院端點並回傳 JSON（見 http_json_remote）。
+        """
+        known = remote("/api/hospital/sync/filter", {
+            "stationId": station_id,
+            "errorRate": error_rate or self.SYNC_FILTER_ERROR_RATE
+        })
+        package = self.generate_sync_package(station_id, hospital_id, sync_type, known_filter=known)
+        uploaded = remote("/api/hospital/sync/upload", {
+            "stationId": station_id,
+            "packageId": package['package_id'],
+            "changes": package['changes'],
+            "checksum": package['checksum']
+        })
+        if not uploaded.get('success'):
+            return {"success": False, "package_id": package['package_id'], "error": uploaded.get('error')}
+
+        hospital_counts = remote("/api/hospital/sync/counts", {
+            "stationId": station_id,
+            "tables": known['tables']
+        })["row_counts"]
+        reconciled = [
+            self.merkle_reconcile(table, station_id, remote, push=True)
+            for table in known['tables']
+            if hospital_counts.get(table) != package['row_counts'][table]
+        ]
+        self.acknowledge_sync(station_id, hospital_id, package['to_seq'])
+
+        return {
+            "success": True,
+            "package_id": package['package_id'],
+            "changes_sent": package['changes_count'],
+            "filter_excluded": package['filter_excluded'],
+            "filter_bytes": known['filter_bytes'],
+            "package_size": package['package_size'],
+            "changes_applied": uploaded.get('changes_applied', 0),
+            "reconciled_tables": [result['table'] for result in reconciled],
+            "rows_reconciled": sum(result['rows_sent'] for result in reconciled),
+            "to_seq": package['to_seq']
+        }
+
+    # ========== 同步封包分段續傳 (v1.4.5) ==========
+
+    SYNC_UPLOAD_FORMATS = ('ndjson', 'binary', 'json')
+
+    def create_upload_session(
+        self,
+        station_id: str,
+        package_id: str,
+        package_format: str,
+        total_size: int,
+        checksum: str,
+        chunk_size: Optional[int] = None
+    ) -> dict:
+        """建立分段上傳工作階段（順便清除過期的未完成工作階段）"""
+        chunk_size = chunk_size or config.SYNC_UPLOAD_CHUNK_SIZE
+        if package_format not in self.SYNC_UPLOAD_FORMATS:
+            raise HTTPException(status_code=400, detail=f"封包格式必須為 {' / '.join(self.SYNC_UPLOAD_FORMATS)}")
+        if not 0 < chunk_size <= config.SYNC_UPLOAD_MAX_CHUNK_SIZE:
+            raise HTTPException(status_code=400, detail=f"區塊大小必須介於 1 與 {config.SYNC_UPLOAD_MAX_CHUNK_SIZE} bytes")
+        if total_size <= 0:
+            raise HTTPException(status_code=400, detail="封包大小必須大於 0")
+
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            expired = (f"-{config.SYNC_UPLOAD_SESSION_TTL_HOURS} hours",)
+            cursor.execute("""
+                DELETE FROM sync_upload_chunks WHERE session_id IN (
+                    SELECT session_id FROM sync_upload_sessions
+                    WHERE status = 'OPEN' AND updated_at < datetime('now', ?)
+                )
+            """, expired)
+            cursor.execute("""
+                DELETE FROM sync_upload_sessions
+                WHERE status = 'OPEN' AND updated_at < datetime('now', ?)
+            """, expired)
+
+            session_id = f"UPL-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.urandom(4).hex()}"
+            total_chunks = -(-total_size // chunk_size)
+
+            cursor.execute("""
+                INSERT INTO sync_upload_sessions (
+                    session_id, station_id, package_id, package_format,
+                    total_size, chunk_size, total_chunks, checksum
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (session_id, station_id, package_id, package_format, total_size, chunk_size, total_chunks, checksum.lower()))
+
+            conn.commit()
+            logger.info(f"分段上傳工作階段已建立: {session_id} ({package_id}, {total_chunks} 個區塊)")
+
+            return {
+                "success": True,
+                "session_id": session_id,
+                "package_id": package_id,
+                "chunk_size": chunk_size,
+                "total_chunks": total_chunks
+            }
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"建立分段上傳工作階段失敗: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+        finally:
+            conn.close()
+
+    def _get_upload_session(self, cursor, session_id: str) -> sqlite3.Row:
+        cursor.execute("SELECT * FROM sync_upload_sessions WHERE session_id = ?", (session_id,))
+        session = cursor.fetchone()
+        if not session:
+            raise HTTPException(status_code=404, detail=f"找不到上傳工作階段: {session_id}")
+        return session
+
+    @staticmethod
+    def _missing_chunks(cursor, session: sqlite3.Row) -> List[int]:
+        cursor.execute("SELECT chunk_index FROM sync_upload_chunks WHERE session_id = ?", (session['session_id'],))
+        received = {row['chunk_index'] for row in cursor.fetchall()}
+        return [i for i in range(session['total_chunks']) if i not in received]
+
+    def store_upload_chunk(self, session_id: str, chunk_index: int, data: bytes, chunk_checksum: str) -> dict:
+        """
+        儲存單一區塊
+
+        區塊可依任意順序上傳，各自以 SHA-256 驗證；
+        重送已收到且內容相同的區塊視為成功（斷線後可安全重試）。
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            session = self._get_upload_session(cursor, session_id)
+            if session['status'] != 'OPEN':
+                raise HTTPException(status_code=409, detail=f"工作階段狀態為 {session['status']}，不再接受區塊")
+            if not 0 <= chunk_index < session['total_chunks']:
+                raise HTTPException(status_code=400, detail=f"區塊序號超出範圍 (0-{session['total_chunks'] - 1})")
+
+            expected_size = session['chunk_size']
+            if chunk_index == session['total_chunks'] - 1:
+                expected_size = session['total_size'] - session['chunk_size'] * chunk_index
+            if len(data) != expected_size:
+                raise HTTPException(status_code=400, detail=f"區塊大小不符: 應為 {expected_size} bytes，收到 {len(data)} bytes")
+
+            actual_checksum = hashlib.sha256(data).hexdigest()
+            if actual_checksum != chunk_checksum.lower():
+                raise HTTPException(status_code=422, detail=f"區塊 {chunk_index} 校驗碼不符，請重送此區塊")
+
+            cursor.execute("""
+                INSERT OR REPLACE INTO sync_upload_chunks (session_id, chunk_index, size, sha256, data)
+                VALUES (?, ?, ?, ?, ?)
+            """, (session_id, chunk_index, len(data), actual_checksum, data))
+            cursor.execute("""
+                UPDATE sync_upload_sessions SET updated_at = CURRENT_TIMESTAMP WHERE session_id = ?
+            """, (session_id,))
+
+            missing = self._missing_chunks(cursor, session)
+            conn.commit()
+
+            return {
+                "success": True,
+                "session_id": session_id,
+                "chunk_index": chunk_index,
+                "received_chunks": session['total_chunks'] - len(missing),
+                "total_chunks": session['total_chunks'],
+                "complete": not missing
+            }
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"儲存上傳區塊失敗: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+        finally:
+            conn.close()
+
+    def get_upload_session_status(self, session_id: str) -> dict:
+        """查詢工作階段進度與缺少的區塊（斷線後據此續傳）"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            session = self._get_upload_session(cursor, session_id)
+            missing = self._missing_chunks(cursor, session) if session['status'] == 'OPEN' else []
+            return {
+                "session_id": session_id,
+                "station_id": session['station_id'],
+                "package_id": session['package_id'],
+                "package_format": session['package_format'],
+                "status": session['status'],
+                "total_size": session['total_size'],
+                "chunk_size": session['chunk_size'],
+                "total_chunks": session['total_chunks'],
+                "received_chunks": session['total_chunks'] - len(missing),
+                "missing_chunks": missing,
+                "created_at": session['created_at'],
+                "updated_at": session['updated_at'],
+                "error_message": session['error_message'],
+                "result": json.loads(session['result_json']) if session['result_json'] else None
+            }
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"查詢上傳工作階段失敗: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+        finally:
+            conn.close()
 
-                cursor.execute("SELECT * FROM equipment_checks WHERE station_id = ?", (station_id,))
-                for row in cursor.fetchall():
-                    changes.append({
-                        'table': 'equipment_checks',
-                        'operation': 'INSERT',
-                        'data': dict(row),
-                        'timestamp': row['timestamp']
-                    })
+    def complete_upload_session(self, session_id: str) -> dict:
+        """
+        組合所有區塊、驗證整包 SHA-256 後匯入
 
-                cursor.execute("SELECT * FROM surgery_records WHERE station_id = ?", (station_id,))
-                for row in cursor.fetchall():
-                    changes.append({
-                        'table': 'surgery_records',
-                        'operation': 'INSERT',
-                        'data': dict(row),
-                        'timestamp': row['created_at']
-                    })
+        區塊依序由資料庫讀出寫入暫存檔（大封包落地，不佔記憶體），
+        整包校驗碼相符才依格式匯入；已完成的工作階段重複呼叫會回傳原結果。
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
 
-            # 計算校驗碼
-            package_content = json.dumps(changes, ensure_ascii=False, sort_keys=True)
-            checksum = hashlib.sha256(package_content.encode('utf-8')).hexdigest()
-            package_size = len(package_content.encode('utf-8'))
+        try:
+            session = self._get_upload_session(cursor, session_id)
+            if session['status'] == 'COMPLETED':
+                return json.loads(session['result_json'])
 
-            # 記錄封包到資料庫
-            cursor.execute("""
-                INSERT INTO sync_packages (
-                    package_id, package_type, source_type, source_id,
-                    destination_type, destination_id, hospital_id,
-                    transfer_method, package_size, checksum, changes_count, status
+            missing = self._missing_chunks(cursor, session)
+            if missing:
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"尚缺 {len(missing)} 個區塊: {missing[:20]}{' ...' if len(missing) > 20 else ''}"
                 )
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+
+            with tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024) as package:
+                digest = hashlib.sha256()
+                for chunk_index in range(session['total_chunks']):
+                    cursor.execute("""
+                        SELECT data FROM sync_upload_chunks WHERE session_id = ? AND chunk_index = ?
+                    """, (session_id, chunk_index))
+                    data = cursor.fetchone()['data']
+                    digest.update(data)
+                    package.write(data)
+
+                if digest.hexdigest() != session['checksum']:
+                    # 各區塊皆已通過驗證，整包不符表示宣告的校驗碼或區塊序號有誤
+                    error = "整包校驗碼不符，請確認封包內容與區塊序號"
+                    cursor.execute("""
+                        UPDATE sync_upload_sessions
+                        SET status = 'FAILED', error_message = ?, updated_at = CURRENT_TIMESTAMP
+                        WHERE session_id = ?
+                    """, (error, session_id))
+                    conn.commit()
+                    return {"success": False, "session_id": session_id, "changes_applied": 0, "error": error, "message": error}
+
+                package.seek(0)
+                if session['package_format'] == 'ndjson':
+                    result = self.import_sync_package_stream(package)
+                elif session['package_format'] == 'binary':
+                    result = self.import_sync_package_binary(package, transfer_method='NETWORK')
+                else:
+                    body = json.load(package)
+                    result = self.import_sync_package(session['package_id'], body['changes'], body['checksum'])
+
+            if result['success']:
+                self._mark_station_synced(session['station_id'])
+                result = {
+                    **result,
+                    "session_id": session_id,
+                    "station_id": session['station_id'],
+                    "response_package_id": f"PKG-RESPONSE-{result['package_id']}"
+                }
+                # 匯入成功後即可釋放區塊空間
+                cursor.execute("DELETE FROM sync_upload_chunks WHERE session_id = ?", (session_id,))
+
+            cursor.execute("""
+                UPDATE sync_upload_sessions
+                SET status = ?, result_json = ?, error_message = ?,
+                    updated_at = CURRENT_TIMESTAMP, completed_at = CURRENT_TIMESTAMP
+                WHERE session_id = ?
             """, (
-                package_id, sync_type, 'STATION', station_id,
-                'HOSPITAL', hospital_id, hospital_id,
-                'PENDING', package_size, checksum, len(changes), 'PENDING'
+                'COMPLETED' if result['success'] else 'FAILED',
+                json.dumps(result, ensure_ascii=False, default=str),
+                result.get('error'),
+                session_id
             ))
-
             conn.commit()
+            logger.info(f"分段上傳已完成: {session_id} ({result.get('changes_applied', 0)} 項變更)")
+            return result
 
-            return {
-                "success": True,
-                "package_id": package_id,
-                "package_type": sync_type,
-                "package_size": package_size,
-                "checksum": checksum,
-                "changes_count": len(changes),
-                "changes": changes,
-                "message": f"同步封包已產生，包含 {len(changes)} 項變更"
-            }
-
+        except HTTPException:
+            raise
+        except (ValueError, KeyError) as e:
+            conn.rollback()
+            raise HTTPException(status_code=400, detail=f"封包格式錯誤: {str(e)}")
         except Exception as e:
             conn.rollback()
-            logger.error(f"產生同步封包失敗: {e}")
-            raise
+            logger.error(f"完成分段上傳失敗: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
         finally:
             conn.close()
 
-    def import_sync_package(self, package_id: str, changes: List[dict], checksum: str) -> dict:
-        """匯入同步封包"""
-        import hashlib
-        import json
 
-        conn = self.get_connection()
-        cursor = conn.cursor()
 
-        try:
-            # 驗證校驗碼
-            package_content = json.dumps(changes, ensure_ascii=False, sort_keys=True)
-            calculated_checksum = hashlib.sha256(package_content.encode('utf-8')).hexdigest()
+# ============================================================================
+# 布隆過濾器 (v1.4.5)
+# ============================================================================
 
-            if calculated_checksum != checksum:
-                return {
-                    "success": False,
-                    "error": "校驗碼不符，封包可能已損毀",
-                    "expected": checksum,
-                    "actual": calculated_checksum
-                }
+class BloomFilter:
+    """
+    布隆過濾器：以固定記憶體判斷元素「一定不存在」或「可能存在」
 
-            # 套用變更
-            changes_applied = 0
-            conflicts = []
+    不會誤判為不存在；誤判為存在的機率依容量與 error_rate 設定，
+    超過容量後誤判率上升，呼叫端應以較大容量重建。
+    位置以 BLAKE2b（salt 為 seed）雙重雜湊產生，不同 seed 的誤判彼此獨立。
+    """
 
-            for change in changes:
-                table = change['table']
-                operation = change['operation']
-                data = change['data']
+    def __init__(self, capacity: int, error_rate: float = 0.001, seed: int = 0):
+        self.capacity = max(1, int(capacity))
+        self.error_rate = error_rate
+        self.seed = seed
+        self.size = max(64, int(math.ceil(-self.capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.hashes = max(1, int(round(self.size / self.capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+        self._salt = seed.to_bytes(16, 'big')
+
+    def _positions(self, item):
+        if isinstance(item, str):
+            item = item.encode('utf-8')
+        digest = hashlib.blake2b(item, digest_size=16, salt=self._salt).digest()
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:], 'big') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def update(self, items):
+        for item in items:
+            self.add(item)
 
-                try:
-                    if operation == 'INSERT':
-                        # 建立 INSERT 語句
-                        columns = ', '.join(data.keys())
-                        placeholders = ', '.join(['?' for _ in data.keys()])
-                        query = f"INSERT OR REPLACE INTO {table} ({columns}) VALUES ({placeholders})"
-                        cursor.execute(query, list(data.values()))
-                        changes_applied += 1
-
-                    elif operation == 'UPDATE':
-                        # 建立 UPDATE 語句（暫時簡化實作）
-                        set_clause = ', '.join([f"{k} = ?" for k in data.keys() if k != 'id'])
-                        query = f"UPDATE {table} SET {set_clause} WHERE id = ?"
-                        values = [v for k, v in data.items() if k != 'id'] + [data.get('id')]
-                        cursor.execute(query, values)
-                        changes_applied += 1
-
-                    elif operation == 'DELETE':
-                        # 建立 DELETE 語句
-                        cursor.execute(f"DELETE FROM {table} WHERE id = ?", (data.get('id'),))
-                        changes_applied += 1
+    def __contains__(self, item) -> bool:
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
 
-                except Exception as e:
-                    conflicts.append({
-                        'table': table,
-                        'operation': operation,
-                        'error': str(e),
-                        'data': data
-                    })
-                    logger.warning(f"套用變更失敗: {table} - {e}")
-
-            # 記錄封包處理狀態
-            cursor.execute("""
-                INSERT OR REPLACE INTO sync_packages (
-                    package_id, package_type, source_type, source_id,
-                    destination_type, destination_id, hospital_id,
-                    transfer_method, checksum, changes_count, status, processed_at
-                )
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-            """, (
-                package_id, 'IMPORT', 'EXTERNAL', 'UNKNOWN',
-                'STATION', 'LOCAL', 'HOSP-001',
-                'USB', checksum, len(changes), 'APPLIED'
-            ))
+    def __len__(self) -> int:
+        return self.count
 
-            conn.commit()
+    def export(self) -> dict:
+        """序列化為可用 JSON 傳送的格式（位元陣列以 base64 編碼）"""
+        return {
+            "capacity": self.capacity,
+            "error_rate": self.error_rate,
+            "seed": self.seed,
+            "size": self.size,
+            "hashes": self.hashes,
+            "count": self.count,
+            "bits": base64.b64encode(bytes(self.bits)).decode('ascii')
+        }
+
+    @classmethod
+    def from_export(cls, data: dict) -> "BloomFilter":
+        """由 export() 的內容還原"""
+        bloom = cls(data['capacity'], data['error_rate'], data['seed'])
+        bits = base64.b64decode(data['bits'])
+        if bloom.size != data['size'] or bloom.hashes != data['hashes'] or len(bits) != len(bloom.bits):
+            raise ValueError("布隆過濾器參數不一致")
+        bloom.bits = bytearray(bits)
+        bloom.count = data['count']
+        return bloom
+
+
+# ============================================================================
+# 醫院層同步封包匯入管線 (v1.4.5)
+# ============================================================================
+
+class SyncIngestPipeline:
+    """
+    醫院層多站點同步封包匯入管線
+
+    車隊帶回多個站點的 USB 封包時，解析、驗證與校驗碼計算（CPU 密集）
+    在多個工作行程平行執行，結果依提交順序交給單一寫入執行緒套用：
+    SQLite 同時只允許一個寫入者，依序寫入也保證同一站點的封包按順序套用。
+
+    封包來源:
+        投遞目錄 (inbox_path)：複製完成（大小不再變動）的檔案自動匯入
+        API 佇列：POST /api/hospital/sync/ingest
+    處理中的檔案在 processing/，完成後移到 done/ 或 failed/。
+    """
 
+    POLL_INTERVAL = 2.0                              # 投遞目錄輪詢間隔 (秒)
+    MAX_JOBS = 500                                   # 保留的工作紀錄筆數
+    IGNORED_SUFFIXES = ('.part', '.tmp', '.partial')  # 複製中的暫存檔
+
+    def __init__(self, db_manager: "DatabaseManager", inbox_path: str, workers: int = None):
+        self.db = db_manager
+        self.inbox = Path(inbox_path)
+        self.workers = workers or config.SYNC_INGEST_WORKERS
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._jobs = OrderedDict()
+        self._stations = {}
+        self._pool = None
+        self._writer = None
+        self._watcher = None
+        self._stop = threading.Event()
+        self._sizes = {}
+
+    def _dir(self, name: str) -> Path:
+        path = self.inbox / name
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def start(self, watch: bool = True):
+        """啟動工作行程與寫入執行緒；watch=True 時同時監看投遞目錄"""
+        with self._lock:
+            if self._pool is None:
+                self._stop.clear()
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+                self._writer = threading.Thread(target=self._write_loop, name="sync-ingest-writer", daemon=True)
+                self._writer.start()
+            if watch and self._watcher is None:
+                # 上次中斷時處理到一半的檔案放回投遞目錄重新匯入
+                for path in sorted(self._dir("processing").iterdir()):
+                    path.rename(self.inbox / path.name)
+                self._watcher = threading.Thread(target=self._watch_loop, name="sync-ingest-watcher", daemon=True)
+                self._watcher.start()
+
+    def shutdown(self):
+        """停止監看，等待已提交的封包寫入完成"""
+        with self._lock:
+            if self._pool is None:
+                return
+            self._stop.set()
+            self._queue.put(None)
+            writer, watcher, pool = self._writer, self._watcher, self._pool
+            self._pool = self._writer = self._watcher = None
+        if watcher:
+            watcher.join()
+        writer.join()
+        pool.shutdown()
+
+    def submit_file(self, path: Path, source: str = "api", transfer_method: str = "NETWORK") -> dict:
+        """將 processing/ 中的封包檔案交給工作行程解析，並排入寫入佇列"""
+        self.start(watch=False)
+        job = {
+            "job_id": uuid.uuid4().hex[:12],
+            "source": source,
+            "file": path.name,
+            "transfer_method": transfer_method,
+            "status": "PARSING",
+            "station_id": None,
+            "package_id": None,
+            "format": None,
+            "changes_count": None,
+            "changes_applied": 0,
+            "conflicts_detected": 0,
+            "parse_seconds": None,
+            "apply_seconds": None,
+            "error": None,
+            "submitted_at": datetime.now().isoformat(),
+            "finished_at": None
+        }
+        # 提交與排入佇列在同一鎖內，寫入順序即提交順序
+        with self._lock:
+            future = self._pool.submit(parse_sync_package_file, str(path), self.db.SYNC_APPLY_TABLES)
+            self._jobs[job["job_id"]] = job
+            while len(self._jobs) > self.MAX_JOBS:
+                self._jobs.popitem(last=False)
+            self._queue.put((job, future, path))
+        future.add_done_callback(lambda f: self._on_parsed(job, f))
+        return dict(job)
+
+    def submit_stream(self, stream, source: str = "api", transfer_method: str = "NETWORK") -> dict:
+        """將上傳內容寫入 processing/ 後提交"""
+        path = self._dir("processing") / f"upload_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.pkg"
+        with open(path, 'wb') as f:
+            shutil.copyfileobj(stream, f, DatabaseManager.SYNC_STREAM_BLOCK_SIZE)
+        return self.submit_file(path, source, transfer_method)
+
+    def _station(self, station_id: str) -> dict:
+        return self._stations.setdefault(station_id or 'UNKNOWN', {
+            "packages_parsed": 0,
+            "packages_applied": 0,
+            "packages_failed": 0,
+            "changes_applied": 0,
+            "last_package_id": None,
+            "last_applied_at": None,
+            "last_error": None
+        })
+
+    def _on_parsed(self, job: dict, future):
+        if not future.cancelled() and future.exception() is None:
+            self._mark_parsed(job, future.result())
+
+    def _mark_parsed(self, job: dict, parsed: dict):
+        with self._lock:
+            if job["status"] == "PARSING":
+                job.update({
+                    "status": "PARSED",
+                    "station_id": parsed.get("station_id"),
+                    "package_id": parsed.get("package_id"),
+                    "format": parsed.get("format"),
+                    "changes_count": parsed.get("changes_count"),
+                    "parse_seconds": parsed.get("parse_seconds")
+                })
+                self._station(parsed.get("station_id"))["packages_parsed"] += 1
+
+    def _write_loop(self):
+        """單一寫入者：依提交順序套用解析結果"""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            job, future, path = item
+            try:
+                parsed = future.result()
+            except Exception as e:
+                parsed = {"error": f"封包無法解析: {e}"}
+            self._apply(job, parsed, path)
+
+    def _apply(self, job: dict, parsed: dict, path: Path):
+        self._mark_parsed(job, parsed)
+        with self._lock:
+            job["status"] = "APPLYING"
+        error = parsed.get("error")
+        result = None
+        started = perf_counter()
+        if error is None:
+            try:
+                result = self.db.import_verified_sync_package(parsed, job["transfer_method"])
+            except Exception as e:
+                error = str(e)
+
+        with self._lock:
+            station = self._station(parsed.get("station_id"))
+            job.update({
+                "station_id": parsed.get("station_id"),
+                "package_id": parsed.get("package_id"),
+                "apply_seconds": round(perf_counter() - started, 3),
+                "finished_at": datetime.now().isoformat()
+            })
+            if error is None:
+                job.update({
+                    "status": "APPLIED",
+                    "changes_applied": result["changes_applied"],
+                    "conflicts_detected": result["conflicts_detected"]
+                })
+                station["packages_applied"] += 1
+                station["changes_applied"] += result["changes_applied"]
+                station["last_package_id"] = parsed.get("package_id")
+                station["last_applied_at"] = job["finished_at"]
+            else:
+                job.update({"status": "FAILED", "error": error})
+                station["packages_failed"] += 1
+                station["last_error"] = error
+
+        if error is None:
+            logger.info(f"同步封包已匯入: {job['file']} ({parsed.get('station_id')}, {result['changes_applied']} 項變更)")
+        else:
+            logger.error(f"同步封包匯入失敗: {job['file']} - {error}")
+        try:
+            path.rename(self._dir("done" if error is None else "failed") / path.name)
+        except OSError as e:
+            logger.warning(f"移動封包檔案失敗 ({path}): {e}")
+
+    def _watch_loop(self):
+        """輪詢投遞目錄：檔案大小連續兩次相同才視為複製完成"""
+        while not self._stop.is_set():
+            try:
+                seen = {}
+                for path in sorted(self.inbox.iterdir(), key=lambda p: (p.stat().st_mtime, p.name)):
+                    if not path.is_file() or path.name.startswith('.') or path.suffix in self.IGNORED_SUFFIXES:
+                        continue
+                    size = path.stat().st_size
+                    seen[path.name] = size
+                    if size == 0 or self._sizes.get(path.name) != size:
+                        continue
+                    target = self._dir("processing") / path.name
+                    if target.exists():
+                        target = target.with_name(f"{uuid.uuid4().hex[:8]}_{path.name}")
+                    path.rename(target)
+                    seen.pop(path.name)
+                    self.submit_file(target, source="inbox", transfer_method="USB")
+                self._sizes = seen
+            except Exception as e:
+                logger.error(f"監看投遞目錄錯誤: {e}")
+            self._stop.wait(self.POLL_INTERVAL)
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def status(self) -> dict:
+        """各站點進度與佇列狀態"""
+        with self._lock:
+            jobs = list(self._jobs.values())
             return {
-                "success": True,
-                "package_id": package_id,
-                "changes_applied": changes_applied,
-                "conflicts_detected": len(conflicts),
-                "conflicts": conflicts,
-                "message": f"同步完成，已套用 {changes_applied} 項變更"
+                "running": self._pool is not None,
+                "watching": self._watcher is not None,
+                "inbox_path": str(self.inbox),
+                "workers": self.workers,
+                "pending": sum(1 for job in jobs if job["status"] in ("PARSING", "PARSED", "APPLYING")),
+                "stations": {station_id: dict(progress) for station_id, progress in sorted(self._stations.items())},
+                "recent_jobs": [dict(job) for job in jobs[-50:]]
             }
 
-        except Exception as e:
-            conn.rollback()
-            logger.error(f"匯入同步封包失敗: {e}")
-            raise
+
+# ============================================================================
+# 站點自動同步排程 (v1.4.5)
+# ============================================================================
+
+class SyncScheduler:
+    """
+    站點自動同步排程 - 依待打包變更量與延遲自動產生 DELTA 封包
+
+    定期檢查醫院確認序號與寄件匣最後一個封包之後的變更：
+    筆數達 max_changes（大小門檻）或最舊的變更超過 max_latency_minutes（延遲門檻）時，
+    產生 NDJSON 封包寫入寄件匣 (outbox_path)，等待任一可用的轉移方式送出：
+        NETWORK：設定 hospital_url 時由排程送到醫院匯入管線，連線失敗則留在寄件匣下次重試
+        USB / DRONE / MANUAL：下載後標記已送出 (POST /api/station/sync/outbox/{id}/sent)
+    醫院確認 (/api/station/sync/ack) 涵蓋的封包標記為 ACKNOWLEDGED。
+    """
+
+    def __init__(
+        self,
+        db_manager: "DatabaseManager",
+        outbox_path: str,
+        station_id: str,
+        hospital_id: str,
+        max_changes: int = None,
+        max_latency_minutes: float = None,
+        hospital_url: Optional[str] = None
+    ):
+        self.db = db_manager
+        self.outbox = Path(outbox_path)
+        self.station_id = station_id
+        self.hospital_id = hospital_id
+        self.max_changes = max_changes or config.SYNC_MAX_PENDING_CHANGES
+        self.max_latency_minutes = max_latency_minutes or config.SYNC_MAX_LATENCY_MINUTES
+        self.hospital_url = hospital_url
+        self._lock = threading.Lock()
+
+    def thresholds(self) -> dict:
+        return {
+            "max_pending_changes": self.max_changes,
+            "max_latency_minutes": self.max_latency_minutes,
+            "hospital_url": self.hospital_url
+        }
+
+    def check(self) -> dict:
+        """檢查門檻，超過時產生封包；回傳待打包狀態與觸發原因"""
+        with self._lock:
+            pending = self.db.get_pending_sync_stats(self.station_id, self.hospital_id)
+            trigger = None
+            if pending["pending_changes"] >= self.max_changes:
+                trigger = "SIZE"
+            elif pending["pending_changes"] and pending["oldest_age_seconds"] >= self.max_latency_minutes * 60:
+                trigger = "LATENCY"
+            package = self._emit(pending["since_seq"], trigger) if trigger else None
+        return {**pending, "trigger": trigger, "package": package}
+
+    def flush(self) -> Optional[dict]:
+        """不論門檻，立即將待打包的變更產生封包（無變更時回傳 None）"""
+        with self._lock:
+            pending = self.db.get_pending_sync_stats(self.station_id, self.hospital_id)
+            if not pending["pending_changes"]:
+                return None
+            return self._emit(pending["since_seq"], "MANUAL")
+
+    def _emit(self, since_seq: int, trigger: str) -> dict:
+        """串流寫入寄件匣（先寫 .part 再更名，傳送端不會讀到寫到一半的檔案）"""
+        self.outbox.mkdir(parents=True, exist_ok=True)
+        stream = self.db.iter_sync_package_stream(self.station_id, self.hospital_id, "DELTA", since_seq=since_seq)
+        header_line = next(stream)
+        header = json.loads(header_line)
+        path = self.outbox / f"{header['package_id']}.ndjson"
+        partial = path.with_name(path.name + ".part")
+        with open(partial, 'wb') as f:
+            f.write(header_line)
+            block = b""
+            for block in stream:
+                f.write(block)
+        os.replace(partial, path)
+
+        trailer = json.loads(block)
+        package = self.db.record_outbox_package(header, trailer, str(path), trigger)
+        logger.info(
+            f"自動同步封包已放入寄件匣: {package['package_id']} "
+            f"({package['changes_count']} 項變更, {package['package_size']} bytes, 觸發: {trigger})"
+        )
+        return package
+
+    def deliver(self) -> List[dict]:
+        """有網路時依序送出待送出的封包；任一封包失敗即停止（保持順序），留待下次"""
+        if not self.hospital_url:
+            return []
+        import urllib.request
+
+        delivered = []
+        for package in self.db.list_sync_outbox(self.station_id, "QUEUED"):
+            try:
+                with open(package["file_path"], 'rb') as f:
+                    request = urllib.request.Request(
+                        self.hospital_url.rstrip('/') + "/api/hospital/sync/ingest?transfer_method=NETWORK",
+                        data=f.read(),
+                        headers={"Content-Type": "application/x-ndjson"},
+                        method="POST"
+                    )
+                with urllib.request.urlopen(request, timeout=120) as response:
+                    job = json.loads(response.read())
+            except Exception as e:
+                logger.warning(f"寄件匣封包網路送出失敗，保留待下次或改用其他轉移方式: {package['package_id']} ({e})")
+                break
+            delivered.append({**self.db.mark_outbox_sent(package["package_id"], "NETWORK"), "job_id": job.get("job_id")})
+        return delivered
+
+    def run_once(self) -> dict:
+        result = self.check()
+        result["delivered"] = self.deliver()
+        return result
+
+
+# ============================================================================
+# 醫院層聯邦查詢 (v1.4.5)
+# ============================================================================
+
+class StationFederation:
+    """
+    醫院層聯邦查詢：直接查詢各站點帶回的資料庫檔案（快速備份 .db），不必先合併成一個檔案
+
+    站點檔案以唯讀 URI (mode=ro) ATTACH 到記憶體連線，每個連線最多附加 ATTACH_BATCH 個
+    （SQLite 預設上限 10）。各批次在工作執行緒中以 UNION ALL 執行同一個彙總查詢
+    （sqlite3 執行查詢期間釋放 GIL），各批次結果再於呼叫端合併。
+    缺少查詢所需資料表的舊版檔案略過該查詢，無法開啟的檔案記錄錯誤，不影響其他檔案。
+    """
+
+    ATTACH_BATCH = 10
+    SQLITE_HEADER = b"SQLite format 3\x00"
+
+    # 查詢名稱 -> (所需資料表, 單一檔案的查詢；{db} 為附加別名，{source} 為檔案序號)
+    QUERIES = {
+        "blood_by_type": ({"blood_inventory"}, """
+            SELECT {source} AS source, station_id, blood_type, SUM(quantity) AS quantity
+            FROM {db}.blood_inventory
+            GROUP BY station_id, blood_type
+        """),
+        "low_stock": ({"items", "inventory_events"}, """
+            SELECT {source} AS source, i.code, i.name, i.unit, i.category, i.min_stock,
+                   COALESCE(stock.current_stock, 0) AS current_stock
+            FROM {db}.items i
+            LEFT JOIN (
+                SELECT item_code,
+                       SUM(CASE WHEN event_type = 'RECEIVE' THEN quantity
+                                WHEN event_type = 'CONSUME' THEN -quantity
+                                ELSE 0 END) AS current_stock
+                FROM {db}.inventory_events
+                GROUP BY item_code
+            ) stock ON i.code = stock.item_code
+            WHERE COALESCE(stock.current_stock, 0) < i.min_stock
+        """),
+        "equipment_alerts": ({"equipment"}, """
+            SELECT {source} AS source, id AS equipment_id, name, category, status,
+                   power_level, last_check, remarks
+            FROM {db}.equipment
+            WHERE status IN ('WARNING', 'ERROR')
+        """),
+    }
+
+    def __init__(self, path: str, workers: int = None):
+        self.path = Path(path)
+        self.workers = workers or config.FEDERATION_WORKERS
+
+    def list_files(self) -> List[dict]:
+        """列出聯邦目錄中的站點資料庫檔案"""
+        if not self.path.exists():
+            return []
+        return [
+            {
+                "file": file.name,
+                "size": file.stat().st_size,
+                "modified_at": datetime.fromtimestamp(file.stat().st_mtime).isoformat()
+            }
+            for file in sorted(self.path.glob("*.db"))
+        ]
+
+    def add_file(self, source, filename: str) -> dict:
+        """存入站點帶回的資料庫檔案（先寫 .part 再更名；只接受 SQLite 檔案）"""
+        name = Path(filename).name
+        if not name or name != filename or not name.endswith(".db"):
+            raise HTTPException(status_code=400, detail="檔名必須為 .db 且不可包含路徑")
+        if source.read(len(self.SQLITE_HEADER)) != self.SQLITE_HEADER:
+            raise HTTPException(status_code=400, detail="不是 SQLite 資料庫檔案")
+        source.seek(0)
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        target = self.path / name
+        partial = target.with_name(name + ".part")
+        with open(partial, "wb") as f:
+            shutil.copyfileobj(source, f, 1024 * 1024)
+        os.replace(partial, target)
+        logger.info(f"聯邦查詢已加入站點資料庫: {name} ({target.stat().st_size} bytes)")
+        return {"file": name, "size": target.stat().st_size}
+
+    def _resolve(self, files: Optional[List[str]]) -> List[Path]:
+        if not files:
+            return sorted(self.path.glob("*.db")) if self.path.exists() else []
+        paths = []
+        for name in files:
+            if Path(name).name != name:
+                raise HTTPException(status_code=400, detail=f"檔名不可包含路徑: {name}")
+            path = self.path / name
+            if not path.is_file():
+                raise HTTPException(status_code=404, detail=f"找不到站點資料庫: {name}")
+            paths.append(path)
+        return paths
+
+    def _run_batch(self, batch: List[Tuple[int, Path]], names: List[str]) -> dict:
+        """於工作執行緒中附加一批檔案並執行各查詢（連線只在此執行緒使用）"""
+        conn = sqlite3.connect(":memory:", uri=True)
+        conn.row_factory = sqlite3.Row
+        sources = {}
+        rows = {name: [] for name in names}
+        try:
+            conn.execute("PRAGMA query_only = ON")
+            attached = []
+            for source, path in batch:
+                alias = f"s{source}"
+                try:
+                    conn.execute(f"ATTACH DATABASE ? AS {alias}", (path.resolve().as_uri() + "?mode=ro",))
+                    tables = {row[0] for row in conn.execute(
+                        f"SELECT name FROM {alias}.sqlite_master WHERE type = 'table'"
+                    )}
+                    station = None
+                    if "blood_inventory" in tables:
+                        station = conn.execute(f"SELECT station_id FROM {alias}.blood_inventory LIMIT 1").fetchone()
+                    sources[source] = {
+                        "file": path.name,
+                        "station_id": station[0] if station else path.stem,
+                        "status": "OK",
+                        "skipped": [name for name in names if not self.QUERIES[name][0] <= tables]
+                    }
+                    attached.append((source, alias, tables))
+                except sqlite3.DatabaseError as e:
+                    sources[source] = {"file": path.name, "station_id": None, "status": "ERROR", "error": str(e)}
+                    try:
+                        conn.execute(f"DETACH DATABASE {alias}")
+                    except sqlite3.Error:
+                        pass
+
+            for name in names:
+                required, sql = self.QUERIES[name]
+                parts = [
+                    f"SELECT * FROM ({sql.format(db=alias, source=source)})"
+                    for source, alias, tables in attached if required <= tables
+                ]
+                if parts:
+                    rows[name] = [dict(row) for row in conn.execute(" UNION ALL ".join(parts))]
+            return {"sources": sources, "rows": rows}
         finally:
             conn.close()
 
-    def upload_sync_package(self, station_id: str, package_id: str, changes: List[dict], checksum: str) -> dict:
-        """醫院層接收站點同步上傳"""
-        import hashlib
-        import json
+    @staticmethod
+    def _merge_blood_by_type(rows: List[dict], sources: dict) -> dict:
+        totals = {blood_type: 0 for blood_type in config.BLOOD_TYPES}
+        by_station = {}
+        for row in rows:
+            totals[row["blood_type"]] = totals.get(row["blood_type"], 0) + (row["quantity"] or 0)
+            station = by_station.setdefault(row["station_id"], {})
+            station[row["blood_type"]] = station.get(row["blood_type"], 0) + (row["quantity"] or 0)
+        return {"totals": totals, "total_units": sum(totals.values()), "by_station": by_station}
+
+    @staticmethod
+    def _merge_low_stock(rows: List[dict], sources: dict) -> dict:
+        items = []
+        for row in rows:
+            source = sources[row.pop("source")]
+            items.append({"station_id": source["station_id"], "file": source["file"], **row,
+                          "shortage": row["min_stock"] - row["current_stock"]})
+        items.sort(key=lambda item: item["shortage"], reverse=True)
+        return {"count": len(items), "items": items}
+
+    @staticmethod
+    def _merge_equipment_alerts(rows: List[dict], sources: dict) -> dict:
+        alerts = []
+        by_status = {}
+        for row in rows:
+            source = sources[row.pop("source")]
+            alerts.append({"station_id": source["station_id"], "file": source["file"], **row})
+            by_status[row["status"]] = by_status.get(row["status"], 0) + 1
+        return {"count": len(alerts), "by_status": by_status, "alerts": alerts}
+
+    def query(self, queries: Optional[List[str]] = None, files: Optional[List[str]] = None, workers: int = None) -> dict:
+        """
+        對聯邦目錄中的站點資料庫執行彙總查詢
+
+        queries: blood_by_type / low_stock / equipment_alerts（預設全部）
+        files: 聯邦目錄中的檔名（預設全部 .db）
+        """
+        started = perf_counter()
+        names = list(queries or self.QUERIES)
+        unknown = [name for name in names if name not in self.QUERIES]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"不支援的聯邦查詢: {', '.join(unknown)}")
+
+        paths = self._resolve(files)
+        indexed = list(enumerate(paths))
+        batches = [indexed[i:i + self.ATTACH_BATCH] for i in range(0, len(indexed), self.ATTACH_BATCH)]
+        workers = max(1, min(workers or self.workers, len(batches) or 1))
+
+        sources = {}
+        rows = {name: [] for name in names}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for result in executor.map(lambda batch: self._run_batch(batch, names), batches):
+                sources.update(result["sources"])
+                for name in names:
+                    rows[name].extend(result["rows"][name])
+
+        merge = {
+            "blood_by_type": self._merge_blood_by_type,
+            "low_stock": self._merge_low_stock,
+            "equipment_alerts": self._merge_equipment_alerts,
+        }
+        return {
+            "files": len(paths),
+            "batches": len(batches),
+            "workers": workers,
+            "stations": [sources[source] for source in sorted(sources)],
+            "results": {name: merge[name](rows[name], sources) for name in names},
+            "duration_ms": int((perf_counter() - started) * 1000)
+        }
 
-        # 驗證校驗碼
-        package_content = json.dumps(changes, ensure_ascii=False, sort_keys=True)
-        calculated_checksum = hashlib.sha256(package_content.encode('utf-8')).hexdigest()
 
-        if calculated_checksum != checksum:
-            return {
-                "success": False,
-                "error": "校驗碼不符",
-                "expected": checksum,
-                "actual": calculated_checksum
+# ============================================================================
+# 血型相容可用量索引
+# ============================================================================
+
+class BloodAvailabilityIndex:
+    """
+    各站點、各血型可用血量的記憶體矩陣，供相容血型搜尋
+
+    可用量 = 血袋庫存（blood_inventory；沒有庫存列的站點改用同步血袋事件彙總的 rollup_blood_stock）
+    + 未過期的 AVAILABLE 緊急血袋（依血品類型分開計數）。
+    每次血袋寫入（本地、同步匯入或合併）都由觸發器遞增 blood_availability_version。
+    查詢時先讀常駐唯讀連線的 PRAGMA data_version（其他連線沒有提交時不讀任何資料頁），
+    再比對版本號：血袋庫存改變只重新讀取數百列的庫存表，緊急血袋改變或跨日（效期）才重新計數血袋，
+    其餘查詢只在記憶體中排序。
+    """
+
+    # 紅血球 ABO 相容性（受血者 → 供血者，依建議使用順序：同型優先，O 型最後以保留萬能供血）
+    RBC_ABO = {"O": ["O"], "A": ["A", "O"], "B": ["B", "O"], "AB": ["AB", "A", "B", "O"]}
+    # 血漿 ABO 相容性與紅血球相反：AB 血漿可給任何人，最後才用
+    PLASMA_ABO = {"O": ["O", "A", "B", "AB"], "A": ["A", "AB"], "B": ["B", "AB"], "AB": ["AB"]}
+    # 產品 → (計入的緊急血袋血品類型, 是否計入血袋庫存單位, 相容性)
+    PRODUCTS = {
+        "RBC": (("WHOLE_BLOOD", "RBC_CONCENTRATE"), True, "rbc"),
+        "FROZEN_PLASMA": (("FROZEN_PLASMA",), False, "plasma"),
+    }
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._conn = None
+        self._lock = threading.Lock()
+        self._data_version = None
+        self._units_version = None
+        self._bags_version = None
+        self._day = None
+        self._units = {}
+        self._bags = {}
+        self._matrix = {}
+        self.reloads = 0
+
+    @classmethod
+    def compatible_types(cls, recipient: str, product: str = "RBC") -> List[str]:
+        """受血者可接受的血型，依建議使用順序"""
+        abo, rh = recipient[:-1], recipient[-1]
+        if cls.PRODUCTS[product][2] == "rbc":
+            # Rh 陰性受血者只能輸 Rh 陰性紅血球
+            return [donor + sign for donor in cls.RBC_ABO[abo] for sign in ((rh,) if rh == "-" else ("+", "-"))]
+        # 血漿不需考慮 Rh
+        return [donor + sign for donor in cls.PLASMA_ABO[abo] for sign in (rh, "-" if rh == "+" else "+")]
+
+    def _refresh(self):
+        """其他連線有提交時比對版本號，只重新載入改變的部分；跨日時重新計數緊急血袋（效期）"""
+        today = datetime.now().strftime('%Y-%m-%d')
+        with self._lock:
+            if self._conn is None:
+                self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if data_version == self._data_version and today == self._day:
+                return
+            self._data_version = data_version
+            units_version, bags_version = self._conn.execute(
+                "SELECT units_version, bags_version FROM blood_availability_version WHERE id = 1"
+            ).fetchone()
+            reload_units = units_version != self._units_version
+            reload_bags = bags_version != self._bags_version or today != self._day
+            if not reload_units and not reload_bags:
+                return
+
+            if reload_units:
+                units = {}
+                for station_id, blood_type, quantity in self._conn.execute("""
+                    SELECT station_id, blood_type, quantity FROM blood_inventory
+                    UNION ALL
+                    SELECT station_id, blood_type, quantity FROM rollup_blood_stock r
+                    WHERE NOT EXISTS (SELECT 1 FROM blood_inventory b WHERE b.station_id = r.station_id)
+                """):
+                    if quantity and quantity > 0:
+                        units[(station_id, blood_type)] = units.get((station_id, blood_type), 0) + quantity
+                self._units = units
+                self._units_version = units_version
+            if reload_bags:
+                bags = {}
+                for station_id, blood_type, product_type, count in self._conn.execute("""
+                    SELECT station_id, blood_type, product_type, COUNT(*)
+                    FROM emergency_blood_bags INDEXED BY idx_emergency_blood_available_expiry
+                    WHERE status = 'AVAILABLE' AND expiry_date >= ?
+                    GROUP BY station_id, blood_type, product_type
+                """, (today,)):
+                    bags.setdefault((station_id, blood_type), {})[product_type] = count
+                self._bags = bags
+                self._bags_version = bags_version
+                self._day = today
+
+            # 依產品預先算好 (庫存單位, 緊急血袋數)，查詢時不必再加總
+            matrix = {product: {} for product in self.PRODUCTS}
+            for station_id, blood_type in self._units.keys() | self._bags.keys():
+                bags = self._bags.get((station_id, blood_type), {})
+                for product, (bag_products, count_units, _) in self.PRODUCTS.items():
+                    units = self._units.get((station_id, blood_type), 0) if count_units else 0
+                    bag_count = sum(bags.get(product_type, 0) for product_type in bag_products)
+                    if units + bag_count > 0:
+                        matrix[product].setdefault(station_id, {})[blood_type] = (units, bag_count)
+            self._matrix = matrix
+            self.reloads += 1
+
+    def snapshot(self) -> dict:
+        """目前的矩陣（產品 → 站點 → 血型 → (庫存單位, 緊急血袋數)）"""
+        self._refresh()
+        return self._matrix
+
+    def search(self, recipient: str, min_units: int = 1, product: str = "RBC", station_id: Optional[str] = None) -> dict:
+        """
+        依相容性排序可供應受血者的來源
+
+        sources：每個 (站點, 血型) 一列，依血型建議順序、再依可用量排序。
+        stations：各站點相容血量合計，只列出達 min_units 的站點；
+        同型血即足夠的站點排前面（不必動用其他血型），其次依合計量排序。
+        """
+        if recipient not in config.BLOOD_TYPES:
+            raise HTTPException(status_code=400, detail=f"血型必須為以下之一: {', '.join(config.BLOOD_TYPES)}")
+        if product not in self.PRODUCTS:
+            raise HTTPException(status_code=400, detail=f"血品必須為以下之一: {', '.join(self.PRODUCTS)}")
+        donors = self.compatible_types(recipient, product)
+        matrix = self.snapshot()[product]
+
+        sources = []
+        stations = {}
+        for station, types in matrix.items():
+            if station_id and station != station_id:
+                continue
+            for rank, donor in enumerate(donors):
+                entry = types.get(donor)
+                if entry is None:
+                    continue
+                units, bags = entry
+                sources.append({
+                    "stationId": station, "bloodType": donor, "rank": rank,
+                    "units": units, "emergencyBags": bags, "available": units + bags
+                })
+                total = stations.setdefault(station, {"stationId": station, "available": 0, "sameType": 0})
+                total["available"] += units + bags
+                if donor == recipient:
+                    total["sameType"] += units + bags
+
+        sources.sort(key=lambda source: (source["rank"], -source["available"], source["stationId"]))
+        ranked = sorted(
+            (total for total in stations.values() if total["available"] >= min_units),
+            key=lambda total: (total["sameType"] < min_units, -total["available"], total["stationId"])
+        )
+        return {
+            "recipient": recipient,
+            "product": product,
+            "compatibleTypes": donors,
+            "minUnits": min_units,
+            "totalAvailable": sum(source["available"] for source in sources),
+            "stations": ranked,
+            "sources": sources,
+            "version": {"units": self._units_version, "bags": self._bags_version}
+        }
+
+
+# ============================================================================
+# 增量備份 (v1.4.5)
+# ============================================================================
+
+class IncrementalBackupStore:
+    """
+    增量備份儲存區 - 以內容定址區塊保存資料庫快照
+
+    目錄結構 (backup_path):
+        chunks/ab/abcdef...   zlib 壓縮的區塊，檔名為未壓縮內容的 SHA-256
+        snapshots/{id}.json   快照清單：依序列出組成資料庫的區塊
+
+    線上快照是逐頁複製，區塊大小為頁面大小的整數倍，
+    因此兩次快照之間未變動的頁面會得到相同區塊，只需儲存一次。
+    """
+
+    def __init__(self, root: str, chunk_size: int = None):
+        self.root = Path(root)
+        self.chunk_size = chunk_size or config.BACKUP_CHUNK_SIZE
+        self.chunks_dir = self.root / "chunks"
+        self.snapshots_dir = self.root / "snapshots"
+
+    def _chunk_path(self, digest: str) -> Path:
+        return self.chunks_dir / digest[:2] / digest
+
+    def _manifest_path(self, snapshot_id: str) -> Path:
+        return self.snapshots_dir / f"{snapshot_id}.json"
+
+    def create_backup(self, db_manager: "DatabaseManager") -> dict:
+        """建立快照並只寫入新區塊"""
+        self.snapshots_dir.mkdir(parents=True, exist_ok=True)
+        self.chunks_dir.mkdir(parents=True, exist_ok=True)
+
+        now = datetime.now()
+        snapshot_id = now.strftime("%Y%m%d_%H%M%S")
+        suffix = 1
+        while self._manifest_path(snapshot_id).exists():
+            suffix += 1
+            snapshot_id = f"{now.strftime('%Y%m%d_%H%M%S')}_{suffix}"
+
+        tmp_dir = Path(tempfile.mkdtemp(prefix="backup_", dir=str(self.root)))
+        try:
+            snapshot = db_manager.create_snapshot(str(tmp_dir / "snapshot.db"))
+
+            chunks = []
+            new_chunks = 0
+            new_bytes = 0
+            file_hash = hashlib.sha256()
+            with open(snapshot['path'], "rb") as f:
+                while True:
+                    block = f.read(self.chunk_size)
+                    if not block:
+                        break
+                    file_hash.update(block)
+                    digest = hashlib.sha256(block).hexdigest()
+                    chunks.append(digest)
+
+                    chunk_path = self._chunk_path(digest)
+                    if not chunk_path.exists():
+                        chunk_path.parent.mkdir(exist_ok=True)
+                        data = zlib.compress(block, config.BACKUP_COMPRESS_LEVEL)
+                        tmp_chunk = tmp_dir / digest
+                        tmp_chunk.write_bytes(data)
+                        os.replace(tmp_chunk, chunk_path)
+                        new_chunks += 1
+                        new_bytes += len(data)
+
+            manifest = {
+                "snapshot_id": snapshot_id,
+                "created_at": now.isoformat(),
+                "station_id": config.STATION_ID,
+                "version": config.VERSION,
+                "db_size": snapshot['size'],
+                "sha256": file_hash.hexdigest(),
+                "chunk_size": self.chunk_size,
+                "chunks": chunks,
+                "new_chunks": new_chunks,
+                "new_bytes": new_bytes
             }
+            tmp_manifest = tmp_dir / "manifest.json"
+            tmp_manifest.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+            os.replace(tmp_manifest, self._manifest_path(snapshot_id))
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
 
-        # 匯入變更（複用 import_sync_package 邏輯）
-        result = self.import_sync_package(package_id, changes, checksum)
+        logger.info(
+            f"增量備份完成: {snapshot_id} ({len(chunks)} 區塊, 新增 {new_chunks} 區塊 / {new_bytes} bytes)"
+        )
+        summary = {key: value for key, value in manifest.items() if key != "chunks"}
+        return {**summary, "total_chunks": len(chunks)}
+
+    def load_manifest(self, snapshot_id: str) -> dict:
+        """讀取快照清單"""
+        if not snapshot_id or "/" in snapshot_id or "\\" in snapshot_id or snapshot_id.startswith("."):
+            raise ValueError(f"無效的快照ID: {snapshot_id}")
+        manifest_path = self._manifest_path(snapshot_id)
+        if not manifest_path.exists():
+            raise FileNotFoundError(f"快照 {snapshot_id} 不存在")
+        return json.loads(manifest_path.read_text(encoding="utf-8"))
+
+    def list_snapshots(self) -> List[Dict]:
+        """列出所有保留中的快照（新到舊）"""
+        if not self.snapshots_dir.exists():
+            return []
+        snapshots = []
+        for manifest_path in sorted(self.snapshots_dir.glob("*.json"), reverse=True):
+            try:
+                manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+            except (OSError, ValueError) as e:
+                logger.warning(f"略過無法讀取的快照清單 {manifest_path.name}: {e}")
+                continue
+            snapshots.append({
+                "snapshot_id": manifest["snapshot_id"],
+                "created_at": manifest["created_at"],
+                "db_size": manifest["db_size"],
+                "total_chunks": len(manifest["chunks"]),
+                "new_chunks": manifest.get("new_chunks", 0),
+                "new_bytes": manifest.get("new_bytes", 0)
+            })
+        return snapshots
+
+    def storage_stats(self) -> dict:
+        """儲存區使用量：實際佔用 vs. 若每次都存完整檔案的大小"""
+        snapshots = self.list_snapshots()
+        stored_bytes = sum(p.stat().st_size for p in self.chunks_dir.glob("*/*")) if self.chunks_dir.exists() else 0
+        return {
+            "snapshots": len(snapshots),
+            "stored_bytes": stored_bytes,
+            "logical_bytes": sum(s["db_size"] for s in snapshots)
+        }
 
-        if result['success']:
-            # 更新站點同步狀態
-            conn = self.get_connection()
-            cursor = conn.cursor()
+    def enforce_retention(self, max_days: int) -> dict:
+        """刪除超過保留天數的快照，並回收不再被引用的區塊"""
+        cutoff = datetime.now() - timedelta(days=max_days)
+        removed_snapshots = 0
+
+        if self.snapshots_dir.exists():
+            for manifest_path in self.snapshots_dir.glob("*.json"):
+                try:
+                    manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+                    created_at = datetime.fromisoformat(manifest["created_at"])
+                except (OSError, ValueError, KeyError):
+                    continue
+                if created_at < cutoff:
+                    manifest_path.unlink()
+                    removed_snapshots += 1
+
+        # 回收未被任何保留中快照引用的區塊
+        referenced = set()
+        for manifest_path in self.snapshots_dir.glob("*.json") if self.snapshots_dir.exists() else []:
             try:
-                cursor.execute("""
-                    UPDATE stations
-                    SET last_sync_at = CURRENT_TIMESTAMP,
-                        sync_status = 'SYNCED'
-                    WHERE station_id = ?
-                """, (station_id,))
-                conn.commit()
-            except Exception as e:
-                logger.warning(f"更新站點同步狀態失敗: {e}")
-            finally:
-                conn.close()
+                referenced.update(json.loads(manifest_path.read_text(encoding="utf-8"))["chunks"])
+            except (OSError, ValueError, KeyError):
+                # 清單無法讀取時不回收任何區塊，避免誤刪
+                logger.warning(f"快照清單 {manifest_path.name} 無法讀取，略過區塊回收")
+                return {"removed_snapshots": removed_snapshots, "removed_chunks": 0}
+
+        removed_chunks = 0
+        if self.chunks_dir.exists():
+            for chunk_path in self.chunks_dir.glob("*/*"):
+                if chunk_path.name not in referenced:
+                    chunk_path.unlink()
+                    removed_chunks += 1
+
+        if removed_snapshots or removed_chunks:
+            logger.info(f"備份保留政策: 刪除 {removed_snapshots} 個快照、{removed_chunks} 個區塊")
+        return {"removed_snapshots": removed_snapshots, "removed_chunks": removed_chunks}
+
+    def restore(self, snapshot_id: str, dest_path: str, verify: bool = True) -> dict:
+        """將指定時間點的快照還原為資料庫檔案"""
+        manifest = self.load_manifest(snapshot_id)
+        dest = Path(dest_path)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+
+        file_hash = hashlib.sha256()
+        try:
+            with open(dest, "wb") as f:
+                for digest in manifest["chunks"]:
+                    chunk_path = self._chunk_path(digest)
+                    if not chunk_path.exists():
+                        raise RuntimeError(f"快照 {snapshot_id} 缺少區塊 {digest}")
+                    block = zlib.decompress(chunk_path.read_bytes())
+                    if hashlib.sha256(block).hexdigest() != digest:
+                        raise RuntimeError(f"區塊 {digest} 內容損毀")
+                    file_hash.update(block)
+                    f.write(block)
+
+            if file_hash.hexdigest() != manifest["sha256"]:
+                raise RuntimeError(f"快照 {snapshot_id} 還原後校驗碼不符")
+
+            integrity = None
+            if verify:
+                conn = sqlite3.connect(str(dest))
+                try:
+                    integrity = conn.execute("PRAGMA integrity_check").fetchone()[0]
+                finally:
+                    conn.close()
+                if integrity != "ok":
+                    raise RuntimeError(f"還原資料庫完整性檢查失敗: {integrity}")
+        except Exception:
+            dest.unlink(missing_ok=True)
+            raise
 
+        logger.info(f"快照已還原: {snapshot_id} -> {dest}")
         return {
-            **result,
-            "station_id": station_id,
-            "response_package_id": f"PKG-RESPONSE-{package_id}"
+            "snapshot_id": snapshot_id,
+            "created_at": manifest["created_at"],
+            "path": str(dest),
+            "size": dest.stat().st_size,
+            "sha256": manifest["sha256"],
+            "integrity": integrity
         }
 
 
@@ -2186,7 +7059,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-db = DatabaseManager(config.DATABASE_PATH)
+# 以 python main.py 啟動時，spawn / forkserver 的同步匯入工作行程會以 __mp_main__ 重新執行本檔；
+# 工作行程只使用 sync_formats，不開啟資料庫也不建立背景服務
+if __name__ != "__mp_main__":
+    db = DatabaseManager(config.DATABASE_PATH)
+    backup_store = IncrementalBackupStore(config.BACKUP_PATH)
+    sync_ingest = SyncIngestPipeline(db, config.SYNC_INBOX_PATH)
+    sync_scheduler = SyncScheduler(
+        db, config.SYNC_OUTBOX_PATH, config.STATION_ID, config.SYNC_HOSPITAL_ID,
+        hospital_url=config.SYNC_HOSPITAL_URL
+    )
+    federation = StationFederation(config.FEDERATION_PATH)
+    blood_availability = BloodAvailabilityIndex(config.DATABASE_PATH)
 
 
 # ========== 背景任務：每日設備重置 (v1.4.5) ==========
@@ -2219,6 +7103,48 @@ async def daily_equipment_reset():
             await asyncio.sleep(3600)
 
 
+# ========== 背景任務：定期增量備份 (v1.4.5) ==========
+
+async def scheduled_backup():
+    """依 station_config.json 定期建立增量備份並執行保留政策"""
+    interval_seconds = config.AUTO_BACKUP_INTERVAL_HOURS * 3600
+    while True:
+        try:
+            await asyncio.sleep(interval_seconds)
+
+            result = await asyncio.to_thread(backup_store.create_backup, db)
+            await asyncio.to_thread(backup_store.enforce_retention, config.MAX_BACKUP_DAYS)
+            logger.info(f"✓ 定期備份已執行: {result['snapshot_id']} (新增 {result['new_bytes']} bytes)")
+
+        except Exception as e:
+            logger.error(f"定期備份任務錯誤: {e}")
+
+
+# ========== 背景任務：自動同步排程 (v1.4.5) ==========
+
+async def scheduled_sync():
+    """依 station_config.json 的門檻定期檢查待打包變更，產生封包並嘗試以網路送出"""
+    while True:
+        try:
+            await asyncio.sleep(config.SYNC_SCHEDULER_INTERVAL_SECONDS)
+            await asyncio.to_thread(sync_scheduler.run_once)
+
+        except Exception as e:
+            logger.error(f"自動同步排程錯誤: {e}")
+
+
+# ========== 背景任務：過期清掃 (v1.4.5) ==========
+
+async def scheduled_expiry_sweep():
+    """啟動時及每隔 expiry_sweep_interval_minutes 將過效期的緊急血袋與耗材批次標記為 EXPIRED"""
+    while True:
+        try:
+            await asyncio.to_thread(db.sweep_expired)
+        except Exception as e:
+            logger.error(f"過期清掃任務錯誤: {e}")
+        await asyncio.sleep(config.EXPIRY_SWEEP_INTERVAL_MINUTES * 60)
+
+
 @app.on_event("startup")
 async def startup_event():
     """應用啟動時執行"""
@@ -2226,6 +7152,40 @@ async def startup_event():
     asyncio.create_task(daily_equipment_reset())
     logger.info("✓ 每日設備重置背景任務已啟動 (07:00am)")
 
+    # 啟動定期增量備份背景任務
+    if config.AUTO_BACKUP_ENABLED:
+        asyncio.create_task(scheduled_backup())
+        logger.info(
+            f"✓ 定期備份背景任務已啟動 (每 {config.AUTO_BACKUP_INTERVAL_HOURS:g} 小時, "
+            f"保留 {config.MAX_BACKUP_DAYS} 天, 路徑 {config.BACKUP_PATH})"
+        )
+
+    # 啟動站點自動同步排程
+    if config.SYNC_SCHEDULER_ENABLED:
+        asyncio.create_task(scheduled_sync())
+        logger.info(
+            f"✓ 自動同步排程已啟動 (每 {config.SYNC_SCHEDULER_INTERVAL_SECONDS:g} 秒檢查, "
+            f"{config.SYNC_MAX_PENDING_CHANGES} 筆或 {config.SYNC_MAX_LATENCY_MINUTES:g} 分鐘, "
+            f"寄件匣 {config.SYNC_OUTBOX_PATH})"
+        )
+
+    # 啟動過期清掃
+    if config.EXPIRY_SWEEP_ENABLED:
+        asyncio.create_task(scheduled_expiry_sweep())
+        logger.info(f"✓ 過期清掃背景任務已啟動 (每 {config.EXPIRY_SWEEP_INTERVAL_MINUTES:g} 分鐘)")
+
+    # 啟動醫院層同步封包投遞目錄監看
+    if config.SYNC_INBOX_ENABLED:
+        sync_ingest.start(watch=True)
+        logger.info(f"✓ 同步封包匯入管線已啟動 (投遞目錄 {config.SYNC_INBOX_PATH}, {sync_ingest.workers} 個工作行程)")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """應用關閉時執行"""
+    # 等待已提交的同步封包寫入完成
+    await asyncio.to_thread(sync_ingest.shutdown)
+
 
 # ============================================================================
 # API 端點
@@ -2498,20 +7458,63 @@ async def register_emergency_blood_bag(request: EmergencyBloodBagRequest):
             'remarks': request.remarks or ''
         }
         return db.register_emergency_blood_bag(data)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"緊急血袋登記失敗: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/blood/emergency/register/bulk")
+async def register_emergency_blood_bags(request: EmergencyBloodBagBulkRequest):
+    """批次登記緊急血袋（整批同一交易，序號依血型與採集日期整段配置）"""
+    return db.register_emergency_blood_bags([
+        {
+            'blood_type': bag.bloodType,
+            'product_type': bag.productType,
+            'collection_date': bag.collectionDate,
+            'volume_ml': bag.volumeMl,
+            'station_id': bag.stationId,
+            'operator': bag.operator,
+            'org_code': bag.orgCode,
+            'remarks': bag.remarks or ''
+        }
+        for bag in request.bags
+    ])
+
+
 @app.get("/api/blood/emergency/list")
-async def get_emergency_blood_bags(status: Optional[str] = Query(None, description="狀態篩選 (AVAILABLE/USED/EXPIRED/DISCARDED)")):
-    """取得緊急血袋清單"""
+async def get_emergency_blood_bags(
+    status: Optional[str] = Query(None, description="狀態篩選 (AVAILABLE/USED/EXPIRED/DISCARDED)"),
+    blood_type: Optional[str] = Query(None, description="血型篩選"),
+    product_type: Optional[str] = Query(None, description="血品類型篩選"),
+    station_id: Optional[str] = Query(None, description="站點篩選"),
+    expiry_from: Optional[str] = Query(None, description="效期起 (YYYY-MM-DD)"),
+    expiry_to: Optional[str] = Query(None, description="效期迄 (YYYY-MM-DD)"),
+    fields: Optional[str] = Query(None, description="回傳欄位，以逗號分隔，預設全部"),
+    limit: int = Query(100, ge=1, le=DatabaseManager.EMERGENCY_LIST_MAX, description="每頁筆數"),
+    cursor: Optional[str] = Query(None, description="分頁游標（上一頁回傳的 nextCursor）")
+):
+    """
+    取得緊急血袋清單（篩選 + keyset 分頁）
+
+    count 為本頁回傳的血袋數（不是符合條件的總數；計算總數需掃描全部符合的血袋）。
+    是否還有下一頁請看 hasMore / nextCursor。
+    """
     try:
-        bags = db.get_emergency_blood_bags(status)
+        result = db.get_emergency_blood_bags(
+            status, blood_type, product_type, station_id, expiry_from, expiry_to,
+            [field.strip() for field in fields.split(",") if field.strip()] if fields else None,
+            limit, cursor
+        )
         return {
-            "bloodBags": bags,
-            "count": len(bags)
+            "bloodBags": result["bags"],
+            "count": len(result["bags"]),
+            "nextCursor": result["next_cursor"],
+            "hasMore": result["next_cursor"] is not None
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"取得緊急血袋清單失敗: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -2734,6 +7737,20 @@ async def get_blood_batch_label(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/blood/compatible")
+async def search_compatible_blood(
+    recipient: str = Query(..., description="受血者血型 (A+/A-/B+/B-/O+/O-/AB+/AB-)"),
+    min_units: int = Query(1, ge=1, description="站點至少需有的相容血量"),
+    product: str = Query("RBC", description="RBC（血袋庫存 + 全血/紅血球緊急血袋）/ FROZEN_PLASMA"),
+    station_id: Optional[str] = Query(None, description="只查詢指定站點")
+):
+    """跨站點搜尋受血者可用的相容血（依相容性與可用量排序）"""
+    # 查詢字串中未編碼的 '+' 會被解碼成空白 (AB+ → "AB ")
+    if recipient.endswith(' '):
+        recipient = recipient.rstrip() + '+'
+    return blood_availability.search(recipient, min_units, product, station_id)
+
+
 @app.post("/api/blood/transfer")
 async def transfer_blood(request: BloodTransferRequest):
     """血袋併站轉移 - 從來源站點轉移血袋到目標站點"""
@@ -3074,17 +8091,109 @@ async def export_inventory_events_csv(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# ========== 盤點 API (v1.4.5) ==========
+
+@app.post("/api/inventory/audit/start")
+async def start_inventory_audit(request: AuditStartRequest):
+    """開始盤點（ROUTINE / PRE_MERGE / POST_MERGE / EMERGENCY）"""
+    return db.start_audit(request.auditType, request.startedBy, request.stationId, request.notes)
+
+
+@app.post("/api/inventory/audit/record")
+async def record_inventory_audit(request: AuditRecordRequest):
+    """記錄單一物品盤點結果"""
+    result = db.record_audit_counts(
+        request.auditId,
+        [{"item_code": request.itemCode, "actual_quantity": request.actualQuantity, "remarks": request.remarks}],
+        request.auditedBy
+    )
+    if result["unknown_items"]:
+        raise HTTPException(status_code=404, detail=f"物品代碼 {request.itemCode} 不存在")
+    item = result["items"][0]
+    return {"success": True, **item, "message": f"已記錄，差異 {item['discrepancy']:+d}"}
+
+
+@app.post("/api/inventory/audit/record/batch")
+async def record_inventory_audit_batch(request: AuditRecordBatch):
+    """掃描器批次上傳清點數量（一次 JOIN 計算整批差異）"""
+    counts = [
+        {"item_code": count.itemCode, "actual_quantity": count.actualQuantity, "remarks": count.remarks}
+        for count in request.counts
+    ]
+    return await asyncio.to_thread(db.record_audit_counts, request.auditId, counts, request.auditedBy, request.accumulate)
+
+
+@app.post("/api/inventory/audit/complete")
+async def complete_inventory_audit(request: AuditCompleteRequest):
+    """完成盤點，依差異寫入調整事件"""
+    return await asyncio.to_thread(
+        db.complete_audit, request.auditId, request.completedBy, request.autoAdjust, request.notes
+    )
+
+
+@app.post("/api/inventory/audit/{audit_id}/cancel")
+async def cancel_inventory_audit(
+    audit_id: int,
+    cancelled_by: str = Query(..., description="取消人"),
+    notes: Optional[str] = Query(None, description="備註")
+):
+    """取消進行中的盤點"""
+    return db.cancel_audit(audit_id, cancelled_by, notes)
+
+
+@app.get("/api/inventory/audit/list")
+async def list_inventory_audits(
+    status: Optional[str] = Query(None, description="IN_PROGRESS / COMPLETED / CANCELLED"),
+    station_id: Optional[str] = Query(None, description="站點ID"),
+    limit: int = Query(10, ge=1, le=500, description="筆數")
+):
+    """查詢盤點記錄"""
+    return db.list_audits(status, station_id, limit)
+
+
+@app.get("/api/inventory/audit/{audit_id}")
+async def get_inventory_audit(
+    audit_id: int,
+    discrepancies_only: bool = Query(False, description="只列出有差異的項目")
+):
+    """查詢盤點明細"""
+    return db.get_audit(audit_id, discrepancies_only)
+
+
+# ========== 效期 API (v1.4.5) ==========
+
+@app.get("/api/expiring")
+async def get_expiring(
+    within_days: Optional[int] = Query(None, ge=0, le=3650, description="幾天內到期，預設 expiry_warning_days"),
+    station_id: Optional[str] = Query(None, description="站點ID，預設全部")
+):
+    """查詢即將到期的緊急血袋與耗材批次"""
+    days = config.EXPIRY_WARNING_DAYS if within_days is None else within_days
+    return db.get_expiring(days, station_id)
+
+
+@app.post("/api/expiring/sweep")
+async def sweep_expired():
+    """立即執行過期清掃（背景任務也會定期執行）"""
+    return await asyncio.to_thread(db.sweep_expired)
+
+
 # ============================================================================
 # 緊急功能 API (v1.4.5新增)
 # ============================================================================
 
 @app.get("/api/emergency/quick-backup")
-async def emergency_quick_backup():
+async def emergency_quick_backup(
+    compress: bool = Query(False, description="以 gzip 壓縮快照"),
+    verify: bool = Query(True, description="備份後執行 integrity_check")
+):
     """
-    緊急快速備份 - 直接下載資料庫檔案
+    緊急快速備份 - 下載資料庫一致性快照
 
     戰時緊急撤離使用：最快速的資料保全方式
+    以 SQLite Online Backup API 分批複製，不會取得寫入中的半套資料，也包含 WAL 內容
     """
+    tmp_dir = None
     try:
         db_path = Path(config.DATABASE_PATH)
 
@@ -3095,100 +8204,182 @@ async def emergency_quick_backup():
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"{config.STATION_ID}_{timestamp}.db"
 
-        logger.info(f"緊急快速備份: {filename}")
+        tmp_dir = Path(tempfile.mkdtemp(prefix="quick_backup_"))
+        snapshot = await asyncio.to_thread(
+            db.create_snapshot, str(tmp_dir / filename), compress, verify
+        )
+        snapshot_path = Path(snapshot['path'])
+
+        logger.info(f"緊急快速備份: {snapshot_path.name} ({snapshot['size']} bytes, {snapshot['duration_ms']} ms)")
 
         return FileResponse(
-            path=str(db_path),
-            media_type="application/octet-stream",
-            filename=filename
+            path=str(snapshot_path),
+            media_type="application/gzip" if compress else "application/octet-stream",
+            filename=snapshot_path.name,
+            headers={
+                "X-Integrity-Check": snapshot['integrity'] or "skipped",
+                "X-Snapshot-Duration-Ms": str(snapshot['duration_ms'])
+            },
+            background=BackgroundTask(shutil.rmtree, tmp_dir, ignore_errors=True)
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
         logger.error(f"快速備份失敗: {e}")
         raise HTTPException(status_code=500, detail=f"備份失敗: {str(e)}")
 
 
-@app.get("/api/emergency/download-all")
-async def emergency_download_all():
+class _ZipStreamBuffer(io.RawIOBase):
     """
-    緊急完整備份 - 生成包含所有資料的ZIP包
+    供 zipfile 寫入的不可定位輸出緩衝區
 
-    包含內容：
-    - database/: 完整資料庫
-    - exports/: CSV + JSON 分類資料
-    - config/: 站點設定檔
-    - README.txt: 使用說明
-    - manifest.json: 檔案清單與檢查碼
+    zipfile 偵測到輸出不可 seek 時改用 data descriptor，
+    因此可邊壓縮邊把已完成的位元組交給 HTTP 回應，不需先寫成檔案
     """
-    try:
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        zip_filename = f"emergency_backup_{config.STATION_ID}_{timestamp}.zip"
-        zip_path = Path("exports") / zip_filename
 
-        # 確保exports目錄存在
-        zip_path.parent.mkdir(exist_ok=True)
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
 
-        logger.info(f"開始生成完整備份包: {zip_filename}")
+    def writable(self) -> bool:
+        return True
 
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            # 1. 加入資料庫
-            db_path = Path(config.DATABASE_PATH)
-            if db_path.exists():
-                zipf.write(db_path, f"database/{db_path.name}")
-                logger.info("✓ 資料庫已加入")
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
 
-            # 2. 導出CSV資料
-            exports_dir = Path("exports/temp")
-            exports_dir.mkdir(exist_ok=True, parents=True)
+    def tell(self) -> int:
+        return self._position
 
-            # 初始化變數
-            inventory_data = []
-            blood_data = []
-            equipment = []
+    def drain(self) -> bytes:
+        """取出目前累積的輸出"""
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
 
-            try:
-                # 導出庫存清單
-                inventory_data = db.get_inventory_items()
-                if inventory_data:
-                    csv_path = exports_dir / "inventory.csv"
-                    with open(csv_path, 'w', encoding='utf-8-sig', newline='') as f:
-                        writer = csv.DictWriter(f, fieldnames=inventory_data[0].keys())
-                        writer.writeheader()
-                        writer.writerows([dict(item) for item in inventory_data])
-                    zipf.write(csv_path, "exports/inventory.csv")
-                    logger.info("✓ 庫存清單已導出")
-
-                # 導出血袋庫存
-                blood_data = db.get_blood_inventory()
-                if blood_data:
-                    csv_path = exports_dir / "blood_inventory.csv"
-                    with open(csv_path, 'w', encoding='utf-8-sig', newline='') as f:
-                        writer = csv.DictWriter(f, fieldnames=['blood_type', 'quantity', 'station_id'])
-                        writer.writeheader()
-                        writer.writerows([dict(b) for b in blood_data])
-                    zipf.write(csv_path, "exports/blood_inventory.csv")
-                    logger.info("✓ 血袋庫存已導出")
-
-                # 導出設備清單
-                conn = db.get_connection()
-                cursor = conn.cursor()
-                equipment = cursor.execute("SELECT * FROM equipment").fetchall()
-                if equipment:
-                    csv_path = exports_dir / "equipment.csv"
-                    with open(csv_path, 'w', encoding='utf-8-sig', newline='') as f:
-                        writer = csv.DictWriter(f, fieldnames=[desc[0] for desc in cursor.description])
-                        writer.writeheader()
-                        writer.writerows([dict(zip([desc[0] for desc in cursor.description], row)) for row in equipment])
-                    zipf.write(csv_path, "exports/equipment.csv")
-                    logger.info("✓ 設備清單已導出")
 
-            except Exception as e:
-                logger.warning(f"部分資料導出失敗: {e}")
+# 緊急備份 ZIP 內的 CSV 匯出 (成員名稱, 查詢)
+EMERGENCY_EXPORT_QUERIES = [
+    ("exports/inventory.csv", DatabaseManager.INVENTORY_ITEMS_QUERY),
+    ("exports/blood_inventory.csv", """
+        SELECT blood_type, quantity, station_id, last_updated
+        FROM blood_inventory
+        ORDER BY station_id, blood_type
+    """),
+    ("exports/equipment.csv", "SELECT * FROM equipment"),
+]
+
+EMERGENCY_STREAM_BLOCK_SIZE = 1024 * 1024  # 資料庫成員每次寫入的位元組數
+EMERGENCY_CSV_ROWS_PER_BLOCK = 1000        # CSV 每累積幾筆送出一次
+MANIFEST_PARALLEL_HASH_MIN_SIZE = 4 * 1024 * 1024  # 超過此大小的成員改由背景執行緒計算雜湊
+
+
+class _MemberHasher:
+    """
+    邊寫入 ZIP 成員邊計算 SHA-256（單次走訪，不重新讀取）
+
+    大型成員的雜湊交給專屬的單一背景執行緒依序計算，
+    hashlib 與 zlib 處理大區塊時都會釋放 GIL，因此雜湊與壓縮可並行
+    """
+
+    def __init__(self, parallel: bool = False):
+        self._hash = hashlib.sha256()
+        self._executor = ThreadPoolExecutor(max_workers=1) if parallel else None
+        self.size = 0
+
+    def update(self, data) -> None:
+        self.size += len(data)
+        if self._executor is None:
+            self._hash.update(data)
+        else:
+            # 單一工作執行緒保證區塊依提交順序計算
+            self._executor.submit(self._hash.update, data)
+
+    def hexdigest(self) -> str:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        return self._hash.hexdigest()
+
+
+def iter_emergency_backup_zip(snapshot_path: Path):
+    """
+    逐段產生緊急備份 ZIP
+
+    資料庫與 CSV 全部來自同一個快照檔（一致的時間點，見 create_stream_snapshot），
+    資料庫成員由快照檔分塊讀出、CSV 由快照游標分批導出，邊壓縮邊輸出，記憶體用量固定；
+    快照檔於串流結束（含中斷）時刪除，也不會在 exports/ 留下 ZIP
+    """
+    buffer = _ZipStreamBuffer()
+    statistics = {}
+    hashers = {}
+    snapshot = sqlite3.connect(f"file:{snapshot_path}?mode=ro", uri=True, check_same_thread=False)
+    snapshot.row_factory = sqlite3.Row
+    try:
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zipf:
+            # 1. 加入資料庫快照
+            size = snapshot_path.stat().st_size
+            db_member = f"database/{Path(config.DATABASE_PATH).name}"
+            hasher = hashers[db_member] = _MemberHasher(parallel=size >= MANIFEST_PARALLEL_HASH_MIN_SIZE)
+            with open(snapshot_path, 'rb') as source, \
+                    zipf.open(db_member, 'w', force_zip64=size >= zipfile.ZIP64_LIMIT) as member:
+                while True:
+                    block = source.read(EMERGENCY_STREAM_BLOCK_SIZE)
+                    if not block:
+                        break
+                    hasher.update(block)
+                    member.write(block)
+                    yield buffer.drain()
+            hasher.hexdigest()
+            logger.info("✓ 資料庫快照已加入")
+
+            # 2. 直接由快照游標導出 CSV
+            for member_name, query in EMERGENCY_EXPORT_QUERIES:
+                try:
+                    cursor = snapshot.execute(query)
+                    columns = [desc[0] for desc in cursor.description]
+                    row_count = 0
+                    hasher = hashers[member_name] = _MemberHasher()
+                    with zipf.open(member_name, 'w') as member:
+                        text = io.StringIO()
+                        writer = csv.writer(text)
+                        text.write('\ufeff')
+                        writer.writerow(columns)
+                        while True:
+                            rows = cursor.fetchmany(EMERGENCY_CSV_ROWS_PER_BLOCK)
+                            if not rows:
+                                break
+                            writer.writerows(tuple(row) for row in rows)
+                            row_count += len(rows)
+                            block = text.getvalue().encode('utf-8')
+                            hasher.update(block)
+                            member.write(block)
+                            text.seek(0)
+                            text.truncate()
+                            yield buffer.drain()
+                        block = text.getvalue().encode('utf-8')
+                        hasher.update(block)
+                        member.write(block)
+                    statistics[member_name] = row_count
+                    yield buffer.drain()
+                    logger.info(f"✓ {member_name} 已導出 ({row_count} 筆)")
+                except Exception as e:
+                    logger.warning(f"部分資料導出失敗 ({member_name}): {e}")
 
             # 3. 加入配置文件
-            config_path = Path("config/station_config.json")
+            config_path = Path(config.STATION_CONFIG_PATH)
             if config_path.exists():
-                zipf.write(config_path, "config/station_config.json")
+                config_bytes = config_path.read_bytes()
+                hashers["config/station_config.json"] = _MemberHasher()
+                hashers["config/station_config.json"].update(config_bytes)
+                zipf.writestr("config/station_config.json", config_bytes)
+                yield buffer.drain()
                 logger.info("✓ 配置文件已加入")
 
             # 4. 生成README
@@ -3223,6 +8414,10 @@ manifest.json      檔案清單與檢查碼
 3. 重新部署:
    參考config/station_config.json設定新系統
 
+4. 驗證備份完整性:
+   python3 main.py verify-backup <本ZIP檔>
+   (依 manifest.json 的 SHA-256 逐一比對)
+
 緊急聯絡:
 -----------------------
 如有問題請聯繫系統管理員
@@ -3232,7 +8427,10 @@ manifest.json      檔案清單與檢查碼
 請妥善保管並定期更新
 ==============================================
 """
-            zipf.writestr("README.txt", readme_content.encode('utf-8'))
+            readme_bytes = readme_content.encode('utf-8')
+            hashers["README.txt"] = _MemberHasher()
+            hashers["README.txt"].update(readme_bytes)
+            zipf.writestr("README.txt", readme_bytes)
             logger.info("✓ README已生成")
 
             # 5. 生成manifest
@@ -3240,35 +8438,141 @@ manifest.json      檔案清單與檢查碼
                 "backup_time": datetime.now().isoformat(),
                 "station_id": config.STATION_ID,
                 "version": config.VERSION,
+                "hash_algorithm": "sha256",
                 "files": {},
                 "statistics": {
-                    "total_items": len(inventory_data) if inventory_data else 0,
-                    "total_blood_types": len(blood_data) if blood_data else 0,
-                    "total_equipment": len(equipment) if equipment else 0
+                    "total_items": statistics.get("exports/inventory.csv", 0),
+                    "total_blood_types": statistics.get("exports/blood_inventory.csv", 0),
+                    "total_equipment": statistics.get("exports/equipment.csv", 0)
                 }
             }
 
-            # 計算檔案檢查碼
             for item in zipf.filelist:
-                if item.filename != "manifest.json":
-                    manifest["files"][item.filename] = {
-                        "size": item.file_size,
-                        "compressed_size": item.compress_size
-                    }
+                manifest["files"][item.filename] = {
+                    "size": item.file_size,
+                    "compressed_size": item.compress_size,
+                    "sha256": hashers[item.filename].hexdigest()
+                }
 
             zipf.writestr("manifest.json", json.dumps(manifest, ensure_ascii=False, indent=2))
             logger.info("✓ Manifest已生成")
 
-        # 清理臨時目錄
-        if exports_dir.exists():
-            shutil.rmtree(exports_dir)
+        # 寫出中央目錄
+        yield buffer.drain()
+        logger.info("完整備份包串流完成")
 
-        logger.info(f"完整備份包生成成功: {zip_filename}")
+    finally:
+        # 串流中斷時也要結束背景雜湊執行緒
+        for hasher in hashers.values():
+            hasher.hexdigest()
+        snapshot.close()
+        snapshot_path.unlink(missing_ok=True)
+
+
+def _verify_archive_member(zipf: zipfile.ZipFile, name: str, expected: dict) -> dict:
+    """串流讀取單一成員並比對大小與 SHA-256"""
+    sha256 = hashlib.sha256()
+    size = 0
+    with zipf.open(name) as member:
+        while True:
+            block = member.read(EMERGENCY_STREAM_BLOCK_SIZE)
+            if not block:
+                break
+            sha256.update(block)
+            size += len(block)
+
+    actual = sha256.hexdigest()
+    if size != expected.get("size"):
+        status_text = "SIZE_MISMATCH"
+    elif actual != expected["sha256"]:
+        status_text = "CHECKSUM_MISMATCH"
+    else:
+        status_text = "OK"
+    return {"status": status_text, "size": size, "sha256": actual}
+
+
+def verify_backup_archive(source, max_workers: int = 4) -> dict:
+    """
+    依 manifest.json 驗證緊急備份 ZIP
 
-        return FileResponse(
-            path=str(zip_path),
+    各成員於工作執行緒中平行解壓並計算 SHA-256；
+    source 可為檔案路徑或可定位的檔案物件
+    """
+    started = datetime.now()
+    with zipfile.ZipFile(source) as zipf:
+        try:
+            manifest = json.loads(zipf.read("manifest.json"))
+        except KeyError:
+            return {"valid": False, "error": "備份包缺少 manifest.json", "members": {}}
+
+        expected_files = manifest.get("files", {})
+        archive_names = set(zipf.namelist()) - {"manifest.json"}
+        results = {}
+        to_check = []
+
+        for name, expected in expected_files.items():
+            if name not in archive_names:
+                results[name] = {"status": "MISSING"}
+            elif not expected.get("sha256"):
+                results[name] = {"status": "NO_CHECKSUM"}
+            else:
+                to_check.append((name, expected))
+
+        for name in archive_names - set(expected_files):
+            results[name] = {"status": "UNLISTED"}
+
+        # 大成員先送出，讓平行計算更平均
+        to_check.sort(key=lambda pair: pair[1].get("size", 0), reverse=True)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                name: executor.submit(_verify_archive_member, zipf, name, expected)
+                for name, expected in to_check
+            }
+            for name, future in futures.items():
+                try:
+                    results[name] = future.result()
+                except (zipfile.BadZipFile, zlib.error, OSError) as e:
+                    results[name] = {"status": "CORRUPT", "error": str(e)}
+
+    failed = {name: r for name, r in results.items() if r["status"] != "OK"}
+    return {
+        "valid": not failed,
+        "station_id": manifest.get("station_id"),
+        "backup_time": manifest.get("backup_time"),
+        "checked": len(to_check),
+        "failed": len(failed),
+        "members": results,
+        "duration_ms": int((datetime.now() - started).total_seconds() * 1000)
+    }
+
+
+@app.get("/api/emergency/download-all")
+async def emergency_download_all():
+    """
+    緊急完整備份 - 串流產生包含所有資料的ZIP包
+
+    包含內容：
+    - database/: 完整資料庫（一致性快照）
+    - exports/: CSV 分類資料
+    - config/: 站點設定檔
+    - README.txt: 使用說明
+    - manifest.json: 檔案清單與檢查碼
+
+    ZIP 由資料庫目錄下的一致性快照檔邊產生邊傳送，記憶體用量固定；快照檔傳送完即刪除，也不會在 exports/ 累積
+    """
+    try:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        zip_filename = f"emergency_backup_{config.STATION_ID}_{timestamp}.zip"
+
+        logger.info(f"開始串流完整備份包: {zip_filename}")
+
+        # 快照在回應開始前完成，失敗時仍可回傳 500
+        snapshot_path = await asyncio.to_thread(db.create_stream_snapshot)
+
+        return StreamingResponse(
+            iter_emergency_backup_zip(snapshot_path),
             media_type="application/zip",
-            filename=zip_filename
+            headers={"Content-Disposition": f"attachment; filename={zip_filename}"}
         )
 
     except Exception as e:
@@ -3276,6 +8580,91 @@ manifest.json      檔案清單與檢查碼
         raise HTTPException(status_code=500, detail=f"備份失敗: {str(e)}")
 
 
+@app.post("/api/emergency/verify-backup")
+async def verify_emergency_backup(request: Request):
+    """
+    驗證緊急備份 ZIP
+
+    請求本文直接放 ZIP 檔內容 (Content-Type: application/zip)，
+    依 manifest.json 的 SHA-256 逐一比對成員
+    """
+    try:
+        with tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024) as archive:
+            async for block in request.stream():
+                archive.write(block)
+            archive.seek(0)
+            result = await asyncio.to_thread(verify_backup_archive, archive)
+        logger.info(f"備份包驗證: {'通過' if result['valid'] else '失敗'} ({result.get('checked', 0)} 個成員)")
+        return result
+    except zipfile.BadZipFile as e:
+        raise HTTPException(status_code=400, detail=f"不是有效的ZIP檔: {str(e)}")
+    except Exception as e:
+        logger.error(f"備份包驗證失敗: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# ========== 增量備份 API (v1.4.5) ==========
+
+@app.get("/api/backup/snapshots")
+async def list_backup_snapshots():
+    """列出保留中的增量備份快照（可還原的時間點）"""
+    try:
+        snapshots = backup_store.list_snapshots()
+        return {
+            "snapshots": snapshots,
+            "count": len(snapshots),
+            "storage": backup_store.storage_stats(),
+            "auto_backup_enabled": config.AUTO_BACKUP_ENABLED,
+            "interval_hours": config.AUTO_BACKUP_INTERVAL_HOURS,
+            "max_backup_days": config.MAX_BACKUP_DAYS
+        }
+    except Exception as e:
+        logger.error(f"取得備份快照清單失敗: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/backup/snapshots")
+async def create_backup_snapshot():
+    """立即建立一次增量備份並執行保留政策"""
+    try:
+        result = await asyncio.to_thread(backup_store.create_backup, db)
+        retention = await asyncio.to_thread(backup_store.enforce_retention, config.MAX_BACKUP_DAYS)
+        return {"success": True, **result, "retention": retention}
+    except Exception as e:
+        logger.error(f"建立增量備份失敗: {e}")
+        raise HTTPException(status_code=500, detail=f"備份失敗: {str(e)}")
+
+
+@app.post("/api/backup/snapshots/{snapshot_id}/restore")
+async def restore_backup_snapshot(snapshot_id: str, request: BackupRestoreRequest):
+    """
+    還原指定時間點的快照並下載資料庫檔案
+
+    不會覆蓋使用中的資料庫；請停止服務後以下載的檔案取代 medical_inventory.db。
+    還原不可經由 GET 觸發（連結預取、爬蟲或快取的網址），且必須明確帶入 confirm=true。
+    """
+    if not request.confirm:
+        raise HTTPException(status_code=400, detail="還原快照需確認 (confirm: true)")
+    tmp_dir = Path(tempfile.mkdtemp(prefix="restore_"))
+    try:
+        filename = f"{config.STATION_ID}_restore_{snapshot_id}.db"
+        result = await asyncio.to_thread(backup_store.restore, snapshot_id, str(tmp_dir / filename))
+        return FileResponse(
+            path=result['path'],
+            media_type="application/octet-stream",
+            filename=filename,
+            headers={"X-Integrity-Check": result['integrity'] or "skipped"},
+            background=BackgroundTask(shutil.rmtree, tmp_dir, ignore_errors=True)
+        )
+    except (ValueError, FileNotFoundError) as e:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        logger.error(f"還原快照失敗: {e}")
+        raise HTTPException(status_code=500, detail=f"還原失敗: {str(e)}")
+
+
 @app.get("/api/emergency/info")
 async def get_emergency_info():
     """取得緊急資訊（用於QR Code掃描後顯示）"""
@@ -3552,94 +8941,352 @@ async def view_emergency_info():
         return HTMLResponse(content=html_content)
 
     except Exception as e:
-        logger.error(f"顯示緊急資訊頁面失敗: {e}")
+        logger.error(f"顯示緊急資訊頁面失敗: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/emergency/qr-code")
+async def emergency_qr_code(request: Request):
+    """
+    生成緊急QR Code - 掃描後跳轉到資訊頁面
+
+    QR Code內容為URL，掃描後可直接在手機上查看:
+    - 站點代碼
+    - 關鍵物資統計
+    - 血袋庫存統計
+    - 設備狀態
+    """
+    try:
+        # 獲取請求的主機名稱（支持手機掃描）
+        # 優先使用環境變數，否則使用請求的 Host header
+        host = config.BASE_URL if hasattr(config, 'BASE_URL') and config.BASE_URL else request.headers.get("host", "localhost:8000")
+        protocol = "https" if request.url.scheme == "https" else "http"
+        qr_url = f"{protocol}://{host}/emergency/view"
+
+        # 生成QR Code
+        qr = qrcode.QRCode(
+            version=1,
+            error_correction=qrcode.constants.ERROR_CORRECT_H,
+            box_size=10,
+            border=4,
+        )
+        qr.add_data(qr_url)
+        qr.make(fit=True)
+
+        # 生成圖片
+        img = qr.make_image(fill_color="black", back_color="white")
+
+        # 保存到BytesIO
+        img_io = BytesIO()
+        img.save(img_io, 'PNG')
+        img_io.seek(0)
+
+        logger.info("緊急QR Code已生成")
+
+        # 返回圖片
+        return StreamingResponse(
+            img_io,
+            media_type="image/png",
+            headers={"Content-Disposition": f"inline; filename=emergency_qr_{config.STATION_ID}.png"}
+        )
+
+    except Exception as e:
+        logger.error(f"QR Code生成失敗: {e}")
+        raise HTTPException(status_code=500, detail=f"QR Code生成失敗: {str(e)}")
+
+
+# ========== 聯邦架構 - 同步封包 API (Phase 1 & 2) ==========
+
+@app.post("/api/station/sync/generate")
+async def generate_station_sync_package(request: SyncPackageGenerate):
+    """
+    【站點層】產生同步封包
+
+    站點產生包含所有變更的同步封包，可用於:
+    - 網路上傳到醫院層
+    - 匯出為檔案供 USB 實體轉移
+
+    參數:
+    - stationId: 站點ID (e.g., TC-01)
+    - hospitalId: 所屬醫院ID (e.g., HOSP-001)
+    - syncType: DELTA (增量) 或 FULL (全量)
+    - sinceTimestamp: 增量同步起始時間 (可選)
+    - sinceSeq: 增量同步起始變更序號 (可選，預設為醫院最後確認的序號)
+
+    返回:
+    - package_id: 封包ID
+    - checksum: SHA-256 校驗碼
+    - from_seq / to_seq: 封包涵蓋的變更序號範圍，醫院套用後以 to_seq 呼叫 /api/station/sync/ack
+    - changes: 變更記錄清單
+    """
+    try:
+        result = db.generate_sync_package(
+            station_id=request.stationId,
+            hospital_id=request.hospitalId,
+            sync_type=request.syncType,
+            since_timestamp=request.sinceTimestamp,
+            since_seq=request.sinceSeq,
+            known_filter=request.knownFilter
+        )
+        logger.info(f"同步封包已產生: {result['package_id']} ({result['changes_count']} 項變更)")
+        return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"產生同步封包失敗: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/station/sync/generate/stream")
+async def generate_station_sync_package_stream(request: SyncPackageGenerate):
+    """
+    【站點層】以 NDJSON 串流產生同步封包
+
+    與 /api/station/sync/generate 相同的變更內容，但直接由資料庫游標逐行輸出，
+    不在記憶體中組出完整封包，適合繁忙站點的全量同步。
+
+    格式: 第一行標頭、每行一筆變更、最後一行結尾（含筆數與 SHA-256 校驗碼）
+    匯入: POST 原始內容到 /api/station/sync/import/stream
+    """
+    try:
+        stream = db.iter_sync_package_stream(
+            station_id=request.stationId,
+            hospital_id=request.hospitalId,
+            sync_type=request.syncType,
+            since_timestamp=request.sinceTimestamp,
+            since_seq=request.sinceSeq,
+            known_filter=request.knownFilter
+        )
+        # 先取出標頭，封包ID可用於下載檔名；查詢錯誤也能在回應開始前回報
+        header_line = await asyncio.to_thread(next, stream)
+        package_id = json.loads(header_line)["package_id"]
+
+        def iter_package():
+            yield header_line
+            yield from stream
+
+        return StreamingResponse(
+            iter_package(),
+            media_type="application/x-ndjson",
+            headers={"Content-Disposition": f"attachment; filename={package_id}.ndjson"}
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"串流產生同步封包失敗: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/station/sync/import/stream")
+async def import_station_sync_package_stream(request: Request):
+    """
+    【站點層】匯入 NDJSON 串流同步封包
+
+    請求內容為 /api/station/sync/generate/stream 產生的原始 NDJSON。
+    逐行驗證校驗碼並套用；筆數或校驗碼不符時整批回滾。
+    """
+    try:
+        # 超過 16 MB 的封包轉存暫存檔，記憶體用量固定
+        with tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024) as package:
+            async for block in request.stream():
+                package.write(block)
+            package.seek(0)
+            result = await asyncio.to_thread(db.import_sync_package_stream, package)
+        logger.info(f"串流同步封包已匯入: {result['package_id']} ({result['changes_applied']} 項變更)")
+        return result
+    except (ValueError, KeyError) as e:
+        raise HTTPException(status_code=400, detail=f"封包格式錯誤: {str(e)}")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"匯入同步封包失敗: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/station/sync/generate/binary")
+async def generate_station_sync_package_binary(request: SyncPackageBinaryGenerate):
+    """
+    【站點層】產生精簡二進位同步封包（.msync）
+
+    欄位名稱只在標頭列出一次，記錄依欄位順序編碼後以 gzip 或 zstd 壓縮，
+    供 USB / 無人機實體轉移。匯入: POST 檔案內容到 /api/station/sync/import/binary
+
+    參數: 同 /api/station/sync/generate，另加
+    - codec: gzip (預設) / zstd (需安裝 zstandard) / none
+    - level: 壓縮等級
+    - transferMethod: USB (預設) / DRONE / MANUAL / NETWORK
+    """
+    try:
+        stream = db.iter_sync_package_binary(
+            station_id=request.stationId,
+            hospital_id=request.hospitalId,
+            sync_type=request.syncType,
+            since_timestamp=request.sinceTimestamp,
+            since_seq=request.sinceSeq,
+            codec=request.codec,
+            level=request.level,
+            transfer_method=request.transferMethod,
+            known_filter=request.knownFilter
+        )
+        # 先取出檔頭，設定錯誤（例如未安裝 zstandard）能在回應開始前回報
+        prelude = await asyncio.to_thread(next, stream)
+
+        def iter_package():
+            yield prelude
+            yield from stream
+
+        filename = f"sync_{request.stationId}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.msync"
+        return StreamingResponse(
+            iter_package(),
+            media_type="application/octet-stream",
+            headers={"Content-Disposition": f"attachment; filename={filename}"}
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"產生二進位同步封包失敗: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.get("/api/emergency/qr-code")
-async def emergency_qr_code(request: Request):
+@app.post("/api/station/sync/import/binary")
+async def import_station_sync_package_binary(
+    request: Request,
+    transfer_method: str = Query("USB", description="轉移方式: USB / DRONE / MANUAL / NETWORK")
+):
     """
-    生成緊急QR Code - 掃描後跳轉到資訊頁面
+    【站點層】匯入二進位同步封包（.msync）
 
-    QR Code內容為URL，掃描後可直接在手機上查看:
-    - 站點代碼
-    - 關鍵物資統計
-    - 血袋庫存統計
-    - 設備狀態
+    請求內容為 /api/station/sync/generate/binary 產生的檔案。
+    逐筆驗證並套用；筆數或校驗碼不符時整批回滾。
     """
+    if transfer_method not in ('USB', 'DRONE', 'MANUAL', 'NETWORK'):
+        raise HTTPException(status_code=400, detail="轉移方式必須為 USB / DRONE / MANUAL / NETWORK")
     try:
-        # 獲取請求的主機名稱（支持手機掃描）
-        # 優先使用環境變數，否則使用請求的 Host header
-        host = config.BASE_URL if hasattr(config, 'BASE_URL') and config.BASE_URL else request.headers.get("host", "localhost:8000")
-        protocol = "https" if request.url.scheme == "https" else "http"
-        qr_url = f"{protocol}://{host}/emergency/view"
+        with tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024) as package:
+            async for block in request.stream():
+                package.write(block)
+            package.seek(0)
+            result = await asyncio.to_thread(db.import_sync_package_binary, package, transfer_method)
+        logger.info(f"二進位同步封包已匯入: {result['package_id']} ({result['changes_applied']} 項變更)")
+        return result
+    except (ValueError, KeyError) as e:
+        raise HTTPException(status_code=400, detail=f"封包格式錯誤: {str(e)}")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"匯入二進位同步封包失敗: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
 
-        # 生成QR Code
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_H,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(qr_url)
-        qr.make(fit=True)
 
-        # 生成圖片
-        img = qr.make_image(fill_color="black", back_color="white")
+@app.post("/api/station/sync/ack")
+async def acknowledge_station_sync(request: SyncAcknowledge):
+    """
+    【站點層】確認目的端已套用到某個變更序號
 
-        # 保存到BytesIO
-        img_io = BytesIO()
-        img.save(img_io, 'PNG')
-        img_io.seek(0)
+    醫院成功匯入封包後，以封包的 to_seq 呼叫；
+    之後的增量封包只包含此序號之後的變更（含修改與刪除）。
+    """
+    result = db.acknowledge_sync(request.stationId, request.destinationId, request.seq)
+    logger.info(f"同步確認: {request.stationId} → {request.destinationId} 至序號 {result['last_seq']}")
+    return result
 
-        logger.info("緊急QR Code已生成")
 
-        # 返回圖片
-        return StreamingResponse(
-            img_io,
-            media_type="image/png",
-            headers={"Content-Disposition": f"inline; filename=emergency_qr_{config.STATION_ID}.png"}
-        )
+@app.get("/api/station/sync/outbox")
+async def get_station_sync_outbox(
+    status: Optional[str] = Query(None, description="QUEUED / SENT / ACKNOWLEDGED"),
+    limit: int = Query(100, ge=1, le=1000)
+):
+    """
+    【站點層】自動同步寄件匣
+
+    回傳寄件匣封包、待打包變更（筆數、最舊變更時間）與 station_config.json 設定的門檻。
+    """
+    packages = db.list_sync_outbox(config.STATION_ID, status, limit)
+    pending = db.get_pending_sync_stats(config.STATION_ID, config.SYNC_HOSPITAL_ID)
+    return {
+        "scheduler_enabled": config.SYNC_SCHEDULER_ENABLED,
+        "thresholds": sync_scheduler.thresholds(),
+        "pending": pending,
+        "count": len(packages),
+        "packages": packages
+    }
+
 
+@app.post("/api/station/sync/outbox/flush")
+async def flush_station_sync_outbox():
+    """【站點層】不論門檻，立即將待打包的變更產生封包放入寄件匣"""
+    try:
+        package = await asyncio.to_thread(sync_scheduler.flush)
     except Exception as e:
-        logger.error(f"QR Code生成失敗: {e}")
-        raise HTTPException(status_code=500, detail=f"QR Code生成失敗: {str(e)}")
+        logger.error(f"寄件匣產生封包失敗: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"success": True, "package": package, "message": "沒有待打包的變更" if package is None else "封包已放入寄件匣"}
 
 
-# ========== 聯邦架構 - 同步封包 API (Phase 1 & 2) ==========
+@app.get("/api/station/sync/outbox/{package_id}/download")
+async def download_station_sync_outbox(package_id: str):
+    """【站點層】下載寄件匣封包（USB / 無人機轉移）；送出後請標記 /sent"""
+    package = db.get_outbox_package(package_id)
+    if not package or not Path(package["file_path"]).exists():
+        raise HTTPException(status_code=404, detail=f"寄件匣找不到封包: {package_id}")
+    return FileResponse(package["file_path"], media_type="application/x-ndjson", filename=f"{package_id}.ndjson")
 
-@app.post("/api/station/sync/generate")
-async def generate_station_sync_package(request: SyncPackageGenerate):
-    """
-    【站點層】產生同步封包
 
-    站點產生包含所有變更的同步封包，可用於:
-    - 網路上傳到醫院層
-    - 匯出為檔案供 USB 實體轉移
+@app.post("/api/station/sync/outbox/{package_id}/sent")
+async def mark_station_sync_outbox_sent(package_id: str, request: SyncOutboxSent):
+    """【站點層】標記寄件匣封包已送出（醫院確認後自動標記 ACKNOWLEDGED）"""
+    return db.mark_outbox_sent(package_id, request.transferMethod)
 
-    參數:
-    - stationId: 站點ID (e.g., TC-01)
-    - hospitalId: 所屬醫院ID (e.g., HOSP-001)
-    - syncType: DELTA (增量) 或 FULL (全量)
-    - sinceTimestamp: 增量同步起始時間 (可選)
 
-    返回:
-    - package_id: 封包ID
-    - checksum: SHA-256 校驗碼
-    - changes: 變更記錄清單
+@app.post("/api/station/merge/import")
+async def import_station_merge(
+    request: Request,
+    merged_by: str = Query(..., description="執行人"),
+    source_station_id: Optional[str] = Query(None, description="來源站點ID，預設由來源資料庫判斷"),
+    merge_type: str = Query("FULL_MERGE", description="FULL_MERGE / PARTIAL_MERGE / IMPORT_BACKUP"),
+    tables: Optional[str] = Query(None, description="PARTIAL_MERGE 的資料表，以逗號分隔"),
+    notes: Optional[str] = Query(None, description="備註")
+):
+    """
+    【站點層】匯入撤收站點的資料庫進行合併
+
+    請求本文直接放來源站的資料庫檔案（/api/emergency/quick-backup 下載的 .db 或 .db.gz）。
+    以 ATTACH + INSERT…SELECT 在單一交易內整批合併，衝突處理見 STATION_MERGE_GUIDE.md。
     """
+    tmp_dir = Path(tempfile.mkdtemp(prefix="station_merge_"))
     try:
-        result = db.generate_sync_package(
-            station_id=request.stationId,
-            hospital_id=request.hospitalId,
-            sync_type=request.syncType,
-            since_timestamp=request.sinceTimestamp
+        source_path = tmp_dir / "source.db"
+        with open(source_path, "wb") as f:
+            async for block in request.stream():
+                f.write(block)
+        with open(source_path, "rb") as f:
+            compressed = f.read(2) == b"\x1f\x8b"
+        if compressed:
+            raw_path = tmp_dir / "source.db.gz"
+            source_path.rename(raw_path)
+            with gzip.open(raw_path, "rb") as src, open(source_path, "wb") as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            raw_path.unlink()
+
+        return await asyncio.to_thread(
+            db.merge_station_database, str(source_path), merged_by, source_station_id, merge_type,
+            [table.strip() for table in tables.split(",") if table.strip()] if tables else None, notes
         )
-        logger.info(f"同步封包已產生: {result['package_id']} ({result['changes_count']} 項變更)")
-        return result
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"產生同步封包失敗: {e}")
+        logger.error(f"站點合併失敗: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+@app.get("/api/station/merge/history")
+async def get_station_merge_history(limit: int = Query(10, ge=1, le=500, description="筆數")):
+    """【站點層】查詢站點合併歷史"""
+    return db.get_merge_history(limit)
 
 
 @app.post("/api/station/sync/import")
@@ -3662,11 +9309,13 @@ async def import_station_sync_package(request: SyncPackageUpload):
     try:
         result = db.import_sync_package(
             package_id=request.packageId,
-            changes=request.changes,
+            changes=[change.model_dump() for change in request.changes],
             checksum=request.checksum
         )
         logger.info(f"同步封包已匯入: {request.packageId} ({result['changes_applied']} 項變更)")
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"匯入同步封包失敗: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -3693,16 +9342,378 @@ async def upload_hospital_sync(request: SyncPackageUpload):
         result = db.upload_sync_package(
             station_id=request.stationId,
             package_id=request.packageId,
-            changes=request.changes,
+            changes=[change.model_dump() for change in request.changes],
             checksum=request.checksum
         )
         logger.info(f"醫院層已接收同步: {request.stationId} - {request.packageId}")
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"醫院層接收同步失敗: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/hospital/sync/upload/sessions")
+async def create_hospital_sync_upload_session(request: SyncUploadSessionCreate):
+    """
+    【醫院層】建立分段上傳工作階段（斷線續傳）
+
+    適用於衛星或戰術等不穩定鏈路：封包切成固定大小區塊分別上傳，
+    每個區塊各自校驗，損毀或中斷只需重送該區塊。
+
+    流程:
+    1. POST 本端點，取得 session_id 與 total_chunks
+    2. PUT /api/hospital/sync/upload/sessions/{session_id}/chunks/{index}
+       （內容為區塊原始位元組，標頭 X-Chunk-SHA256 為該區塊的 SHA-256，可任意順序）
+    3. 斷線後 GET /api/hospital/sync/upload/sessions/{session_id} 查詢 missing_chunks 續傳
+    4. POST /api/hospital/sync/upload/sessions/{session_id}/complete 組合、驗證並匯入
+    """
+    result = await asyncio.to_thread(
+        db.create_upload_session,
+        station_id=request.stationId,
+        package_id=request.packageId,
+        package_format=request.packageFormat,
+        total_size=request.totalSize,
+        checksum=request.checksum,
+        chunk_size=request.chunkSize
+    )
+    return result
+
+
+@app.put("/api/hospital/sync/upload/sessions/{session_id}/chunks/{chunk_index}")
+async def upload_hospital_sync_chunk(session_id: str, chunk_index: int, request: Request):
+    """【醫院層】上傳單一區塊（標頭 X-Chunk-SHA256 為區塊校驗碼）"""
+    chunk_checksum = request.headers.get("X-Chunk-SHA256")
+    if not chunk_checksum:
+        raise HTTPException(status_code=400, detail="缺少 X-Chunk-SHA256 標頭")
+    data = await request.body()
+    return await asyncio.to_thread(db.store_upload_chunk, session_id, chunk_index, data, chunk_checksum)
+
+
+@app.get("/api/hospital/sync/upload/sessions/{session_id}")
+async def get_hospital_sync_upload_session(session_id: str):
+    """【醫院層】查詢分段上傳進度與缺少的區塊"""
+    return await asyncio.to_thread(db.get_upload_session_status, session_id)
+
+
+@app.post("/api/hospital/sync/upload/sessions/{session_id}/complete")
+async def complete_hospital_sync_upload_session(session_id: str):
+    """
+    【醫院層】完成分段上傳
+
+    所有區塊到齊後組合封包、驗證整包 SHA-256，再依格式匯入並更新站點同步狀態。
+    重複呼叫已完成的工作階段會回傳相同結果。
+    """
+    result = await asyncio.to_thread(db.complete_upload_session, session_id)
+    if result.get('success'):
+        logger.info(f"醫院層已接收分段同步: {result.get('station_id')} - {result.get('package_id')}")
+    return result
+
+
+@app.post("/api/hospital/sync/ingest")
+async def ingest_hospital_sync_package(
+    request: Request,
+    transfer_method: str = Query("NETWORK", description="轉移方式: USB / DRONE / MANUAL / NETWORK")
+):
+    """
+    【醫院層】排入同步封包匯入管線
+
+    請求內容為任一格式的原始封包（二進位 .msync / NDJSON / JSON 上傳內容），立即回傳工作ID；
+    解析與校驗在工作行程平行進行，再依提交順序寫入。
+    進度: GET /api/hospital/sync/ingest/status 或 /api/hospital/sync/ingest/jobs/{job_id}
+    USB 封包也可直接複製到投遞目錄 (station_config.json system.sync_inbox_path)。
+    """
+    if transfer_method not in ('USB', 'DRONE', 'MANUAL', 'NETWORK'):
+        raise HTTPException(status_code=400, detail="轉移方式必須為 USB / DRONE / MANUAL / NETWORK")
+    try:
+        with tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024) as package:
+            async for block in request.stream():
+                package.write(block)
+            package.seek(0)
+            job = await asyncio.to_thread(sync_ingest.submit_stream, package, "api", transfer_method)
+        logger.info(f"同步封包已排入匯入管線: {job['job_id']}")
+        return job
+    except Exception as e:
+        logger.error(f"同步封包排入匯入管線失敗: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/hospital/sync/ingest/status")
+async def get_hospital_sync_ingest_status():
+    """【醫院層】匯入管線狀態：各站點進度、待處理數量與最近的工作"""
+    return sync_ingest.status()
+
+
+@app.get("/api/hospital/sync/ingest/jobs/{job_id}")
+async def get_hospital_sync_ingest_job(job_id: str):
+    """【醫院層】查詢匯入工作狀態 (PARSING / PARSED / APPLYING / APPLIED / FAILED)"""
+    job = sync_ingest.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"找不到匯入工作: {job_id}")
+    return job
+
+
+# ========== Merkle 對帳 API (v1.4.5) ==========
+
+def http_json_remote(base_url: str, timeout: float = 120):
+    """建立呼叫對方 JSON API 的函式 (供 merkle_reconcile 使用)"""
+    import urllib.request
+
+    def call(path: str, payload: dict) -> dict:
+        request = urllib.request.Request(
+            base_url.rstrip('/') + path,
+            data=json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8'),
+            headers={"Content-Type": "application/json"},
+            method="POST"
+        )
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read())
+
+    return call
+
+
+def configured_hospital_remote(timeout: float = 120):
+    """
+    呼叫設定檔 sync_hospital_url 的 JSON API
+
+    API 不接受呼叫端指定的對方位址：伺服器會把同步資料 POST 到該位址，
+    任意位址等同讓呼叫端把庫存與病患資料送到任何主機（SSRF）。
+    """
+    if not config.SYNC_HOSPITAL_URL:
+        raise HTTPException(status_code=400, detail="尚未設定醫院位址 (station_config.json system.sync_hospital_url)")
+    return http_json_remote(config.SYNC_HOSPITAL_URL, timeout)
+
+
+@app.get("/api/sync/digest")
+async def get_sync_digest(
+    station_id: str = Query(..., description="站點ID"),
+    tables: Optional[str] = Query(None, description="資料表，以逗號分隔，留空為全部同步資料表")
+):
+    """
+    取得各資料表的摘要（與資料列順序無關，隨每次寫入與匯入增量更新）
+
+    兩端比對摘要與筆數即可確認資料是否一致；只有不一致的資料表才需要增量同步或對帳。
+    """
+    table_list = [t.strip() for t in tables.split(',') if t.strip()] if tables else None
+    return await asyncio.to_thread(db.get_sync_digests, station_id, table_list)
+
+
+@app.post("/api/sync/digest/compare")
+async def compare_sync_digest(request: SyncDigestCompare):
+    """比對資料表摘要，回傳不一致的資料表"""
+    return await asyncio.to_thread(db.compare_sync_digests, request.stationId, request.tables)
+
+
+@app.get("/api/sync/merkle/nodes")
+async def get_sync_merkle_nodes(
+    table: str = Query(..., description="資料表名稱"),
+    station_id: str = Query(..., description="站點ID"),
+    level: int = Query(0, ge=0, description="樹層級 (0 為根節點)"),
+    indexes: str = Query("0", description="節點索引，以逗號分隔")
+):
+    """取得雜湊樹節點雜湊（除錯與監控用）"""
+    try:
+        index_list = [int(i) for i in indexes.split(',') if i.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="節點索引必須為整數")
+    return await asyncio.to_thread(db.get_merkle_nodes, table, station_id, level, index_list)
+
+
+@app.post("/api/sync/merkle/compare")
+async def compare_sync_merkle_nodes(request: SyncMerkleCompare):
+    """
+    比對雜湊樹節點
+
+    對方送出某一層的節點雜湊，回傳不一致的節點索引；
+    對方只展開這些節點的子節點進入下一層，直到葉節點（主鍵區段）。
+    """
+    return await asyncio.to_thread(db.compare_merkle_nodes, request.table, request.stationId, request.level, request.nodes)
+
+
+@app.post("/api/sync/merkle/package")
+async def get_sync_merkle_package(request: SyncMerkleBuckets):
+    """取得指定主鍵區段的對帳封包（區段內全部資料列）"""
+    try:
+        return await asyncio.to_thread(db.build_reconcile_package, request.table, request.stationId, request.buckets)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"產生對帳封包失敗: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/sync/merkle/apply")
+async def apply_sync_merkle_package(package: Dict[str, Any]):
+    """套用對帳封包：以封包內容取代相同主鍵區段的資料"""
+    try:
+        result = await asyncio.to_thread(db.apply_reconcile_package, package)
+        logger.info(f"對帳封包已套用: {result['table']} ({result['buckets']} 個區段, 寫入 {result['rows_written']} 筆, 刪除 {result['rows_deleted']} 筆)")
+        return result
+    except HTTPException:
+        raise
+    except (KeyError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"封包格式錯誤: {str(e)}")
+    except Exception as e:
+        logger.error(f"套用對帳封包失敗: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/sync/merkle/reconcile")
+async def reconcile_sync_merkle(request: SyncMerkleReconcile):
+    """
+    與醫院進行雜湊樹對帳（遺失 USB 封包後的修復，取代全量同步）
+
+    逐層比對雜湊樹找出不一致的主鍵區段，只傳送這些區段的資料。
+    對象為設定檔的 sync_hospital_url；對其他節點對帳請使用 CLI `reconcile`。
+    """
+    if request.direction not in ('push', 'pull'):
+        raise HTTPException(status_code=400, detail="direction 必須為 push 或 pull")
+    remote = configured_hospital_remote()
+    try:
+        # 先比對資料表摘要，只對不一致的資料表逐層比對
+        results = (await asyncio.to_thread(
+            db.digest_reconcile, request.stationId, remote, request.tables, request.direction == 'push'
+        ))["tables"]
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"雜湊樹對帳失敗: {e}")
+        raise HTTPException(status_code=502, detail=f"雜湊樹對帳失敗: {str(e)}")
+    logger.info(f"雜湊樹對帳完成: {request.stationId} ↔ {config.SYNC_HOSPITAL_URL} ({sum(r['rows_sent'] for r in results)} 筆)")
+    return {"success": True, "tables": results}
+
+
+@app.post("/api/hospital/sync/filter")
+async def get_hospital_sync_filter(request: SyncFilterRequest):
+    """
+    【醫院層】取得已持有的站點事件布隆過濾器
+
+    站點將回傳內容放入 knownFilter 產生封包，略過醫院已持有的事件。
+    errorRate 越低過濾器越大、誤判漏送越少；漏送由上傳後的筆數檢查與 Merkle 對帳補齊。
+    """
+    try:
+        return await asyncio.to_thread(
+            db.build_known_filter, request.stationId, request.tables, request.errorRate
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"產生已持有事件過濾器失敗: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/hospital/sync/counts")
+async def get_hospital_sync_counts(request: SyncCountRequest):
+    """【醫院層】查詢已持有的站點事件筆數"""
+    try:
+        return db.get_station_row_counts(request.stationId, request.tables)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"查詢站點事件筆數失敗: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/station/sync/push")
+async def push_station_sync(request: SyncPushRequest):
+    """
+    【站點層】以布隆過濾器預先交換後上傳同步封包
+
+    先向醫院取得已持有事件的過濾器，封包只包含醫院尚未持有的變更；
+    上傳後比對事件筆數，過濾器誤判漏送的事件以 Merkle 對帳補齊。
+    醫院位址固定為設定檔的 sync_hospital_url（見 configured_hospital_remote）。
+    """
+    remote = configured_hospital_remote()
+    try:
+        result = await asyncio.to_thread(
+            db.sync_push_with_filter, request.stationId, request.hospitalId,
+            remote, request.syncType, request.errorRate
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"預先交換同步失敗: {e}")
+        raise HTTPException(status_code=502, detail=f"預先交換同步失敗: {str(e)}")
+    if result["success"]:
+        logger.info(
+            f"預先交換同步完成: {request.stationId} → {config.SYNC_HOSPITAL_URL} "
+            f"(送出 {result['changes_sent']} 項, 略過 {result['filter_excluded']} 項)"
+        )
+    return result
+
+
+@app.get("/api/hospital/reports/daily")
+async def get_hospital_daily_report(
+    hospital_id: str = Query(..., description="醫院ID"),
+    date: Optional[str] = Query(None, description="報表日期 (YYYY-MM-DD)，預設今天")
+):
+    """
+    【醫院層】醫院日報表
+
+    血袋庫存、短缺、設備警示與當日手術數，由同步匯入時增量更新的彙總表產生，
+    不掃描各站點的事件資料。
+    """
+    return db.get_hospital_daily_report(hospital_id, date)
+
+
+@app.post("/api/hospital/reports/daily")
+async def submit_hospital_daily_report(request: HospitalDailyReportSubmit):
+    """【醫院層】產生日報表並寫入 hospital_daily_reports（向中央回報用）"""
+    try:
+        return db.save_hospital_daily_report(request.hospitalId, request.submittedBy, request.reportDate)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/hospital/federation/files")
+async def list_federation_files():
+    """【醫院層】列出聯邦目錄中站點帶回的資料庫檔案"""
+    return {"path": str(federation.path), "files": federation.list_files()}
+
+
+@app.post("/api/hospital/federation/files")
+async def upload_federation_file(request: Request, filename: str = Query(..., description="檔名 (e.g., TC-01_20250101_120000.db)")):
+    """
+    【醫院層】存入站點帶回的資料庫檔案
+
+    請求本文直接放 /api/emergency/quick-backup 下載的 .db 檔案內容；
+    也可直接複製到聯邦目錄 (station_config.json system.federation_path)。
+    """
+    try:
+        with tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024) as upload:
+            async for block in request.stream():
+                upload.write(block)
+            upload.seek(0)
+            return await asyncio.to_thread(federation.add_file, upload, filename)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"存入站點資料庫失敗: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/hospital/federation/query")
+async def query_federation(request: FederationQueryRequest):
+    """
+    【醫院層】跨站點資料庫聯邦查詢
+
+    以唯讀方式分批 ATTACH 各站點資料庫，在工作執行緒平行查詢後合併：
+    - blood_by_type: 各血型總量與各站點明細
+    - low_stock: 各站點低於安全庫存的物品
+    - equipment_alerts: 各站點 WARNING / ERROR 的設備
+    """
+    try:
+        return await asyncio.to_thread(federation.query, request.queries, request.files)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"聯邦查詢失敗: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.post("/api/hospital/transfer/coordinate")
 async def coordinate_hospital_transfer(request: HospitalTransferCoordinate):
     """
@@ -3752,7 +9763,106 @@ async def coordinate_hospital_transfer(request: HospitalTransferCoordinate):
 # 啟動
 # ============================================================================
 
+def run_cli(argv: List[str]) -> int:
+    """維運指令 (python3 main.py <指令> ...)"""
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="main.py", description="醫療站庫存管理系統維運指令")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("backup-now", help="立即建立增量備份")
+    subparsers.add_parser("list-backups", help="列出保留中的增量備份快照")
+
+    sub = subparsers.add_parser("restore-backup", help="將增量備份快照還原為資料庫檔案")
+    sub.add_argument("snapshot_id", help="快照ID (見 list-backups)")
+    sub.add_argument("dest", help="輸出資料庫路徑")
+
+    sub = subparsers.add_parser("verify-backup", help="依 manifest.json 驗證緊急備份 ZIP")
+    sub.add_argument("archive", help="緊急備份 ZIP 路徑")
+
+    sub = subparsers.add_parser("reconcile", help="與遠端進行雜湊樹對帳，只傳送不一致的資料")
+    sub.add_argument("remote_url", help="對方服務位址 (e.g., http://hospital:8000)")
+    sub.add_argument("--station-id", default=config.STATION_ID, help="站點ID")
+    sub.add_argument("--table", action="append", help="對帳資料表 (可重複)，預設為全部")
+    sub.add_argument("--pull", action="store_true", help="由對方修正本端（預設以本端修正對方）")
+
+    sub = subparsers.add_parser("push", help="以布隆過濾器預先交換後上傳同步封包")
+    sub.add_argument("hospital_url", help="醫院服務位址 (e.g., http://hospital:8000)")
+    sub.add_argument("--hospital-id", required=True, help="所屬醫院ID")
+    sub.add_argument("--station-id", default=config.STATION_ID, help="站點ID")
+    sub.add_argument("--full", action="store_true", help="全量同步（預設為增量）")
+    sub.add_argument("--error-rate", type=float, default=DatabaseManager.SYNC_FILTER_ERROR_RATE, help="過濾器誤判率")
+
+    subparsers.add_parser("sweep-expired", help="將過效期的緊急血袋與耗材批次標記為過期")
+
+    sub = subparsers.add_parser("merge", help="合併撤收站點的資料庫檔案到本站")
+    sub.add_argument("source_db", help="來源站資料庫檔案")
+    sub.add_argument("--merged-by", required=True, help="執行人")
+    sub.add_argument("--source-station-id", default=None, help="來源站點ID，預設由來源資料庫判斷")
+    sub.add_argument("--type", dest="merge_type", default="FULL_MERGE",
+                     choices=["FULL_MERGE", "PARTIAL_MERGE", "IMPORT_BACKUP"], help="合併類型")
+    sub.add_argument("--table", action="append", choices=DatabaseManager.MERGE_TABLES, help="合併資料表 (可重複)，預設全部")
+    sub.add_argument("--notes", default=None, help="備註")
+
+    sub = subparsers.add_parser("federate", help="跨站點資料庫聯邦查詢（不先合併）")
+    sub.add_argument("files", nargs="*", help="聯邦目錄中的檔名，預設全部")
+    sub.add_argument("--query", action="append", choices=sorted(StationFederation.QUERIES), help="查詢項目 (可重複)，預設全部")
+    sub.add_argument("--path", default=config.FEDERATION_PATH, help="聯邦目錄")
+    sub.add_argument("--workers", type=int, default=None, help="工作執行緒數")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "backup-now":
+        result = backup_store.create_backup(db)
+        backup_store.enforce_retention(config.MAX_BACKUP_DAYS)
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    elif args.command == "list-backups":
+        for snapshot in backup_store.list_snapshots():
+            print(f"{snapshot['snapshot_id']}  {snapshot['created_at']}  {snapshot['db_size']} bytes  (+{snapshot['new_bytes']} bytes)")
+    elif args.command == "restore-backup":
+        result = backup_store.restore(args.snapshot_id, args.dest)
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    elif args.command == "verify-backup":
+        result = verify_backup_archive(args.archive)
+        for name, member in sorted(result["members"].items()):
+            print(f"{member['status']:<18} {name}")
+        print(f"{'通過' if result['valid'] else '失敗'}: 檢查 {result.get('checked', 0)} 個成員, {result.get('failed', 0)} 個異常")
+        return 0 if result["valid"] else 1
+    elif args.command == "reconcile":
+        remote = http_json_remote(args.remote_url)
+        for result in db.digest_reconcile(args.station_id, remote, args.table, push=not args.pull)["tables"]:
+            table = result["table"]
+            status = "一致" if result["in_sync"] else f"{result['differing_buckets']} 個區段不一致，傳送 {result['rows_sent']} 筆"
+            print(f"{table:<22} {result['rounds']} 輪 / 比對 {result['nodes_compared']} 個節點: {status}")
+    elif args.command == "push":
+        result = db.sync_push_with_filter(
+            args.station_id, args.hospital_id, http_json_remote(args.hospital_url),
+            "FULL" if args.full else "DELTA", args.error_rate
+        )
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return 0 if result["success"] else 1
+    elif args.command == "sweep-expired":
+        result = db.sweep_expired()
+        print(f"已標記過期: 緊急血袋 {result['blood_bags_expired']} 袋、耗材批次 {result['lots_expired']} 個")
+    elif args.command == "merge":
+        try:
+            result = db.merge_station_database(
+                args.source_db, args.merged_by, args.source_station_id, args.merge_type, args.table, args.notes
+            )
+        except HTTPException as e:
+            print(f"合併失敗: {e.detail}")
+            return 1
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    elif args.command == "federate":
+        result = StationFederation(args.path, args.workers).query(args.query, args.files or None)
+        print(json.dumps(result, ensure_ascii=False, indent=2, default=str))
+    return 0
+
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(run_cli(sys.argv[1:]))
+
     print("=" * 70)
     print(f"🏥 醫療站庫存管理系統 API v{config.VERSION}")
     print("=" * 70)
@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+醫療站庫存管理系統 - 同步封包格式
+版本: v1.4.5
+
+二進位 (MSYN) 與 NDJSON 同步封包的編碼/解碼，以及同步匯入管線工作行程使用的解析函式。
+本模組只依賴標準函式庫（zstandard 為選用），匯入時不載入設定、不開啟資料庫：
+以 spawn / forkserver 啟動的工作行程只需匯入本模組。
+"""
+
+import hashlib
+import json
+import os
+import struct
+import zlib
+from pathlib import Path
+from time import perf_counter
+from typing import List, Optional, Tuple
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+
+def sync_package_checksum(changes: List[dict]) -> Tuple[str, int]:
+    """JSON 同步封包校驗碼：變更清單標準序列化 (sort_keys) 的 SHA-256，回傳 (校驗碼, 位元組數)"""
+    package_content = json.dumps(changes, ensure_ascii=False, sort_keys=True).encode('utf-8')
+    return hashlib.sha256(package_content).hexdigest(), len(package_content)
+
+
+# ============================================================================
+# 同步封包二進位格式 (v1.4.5)
+# ============================================================================
+
+class SyncBinaryFormat:
+    """
+    精簡二進位同步封包（USB / 無人機實體轉移用）
+
+    檔案結構:
+        "MSYN" | 格式版本 (1 byte) | 壓縮方式 (1 byte) | 壓縮內容
+
+    壓縮內容（解壓後）:
+        標頭長度 (varint) | 標頭 JSON：封包資訊 + 各資料表欄位清單
+        記錄 * N：資料表序號 (varint, 從 1 起) | 操作 (1 byte) | 欄位值（依欄位清單順序，不重複欄位名稱；
+                  DELETE 為主鍵與刪除時間，版本 1 只有主鍵）
+        結束標記 0 | 變更筆數 (varint) | 記錄區 SHA-256 (32 bytes)
+
+    欄位值: 型別 (1 byte) + 內容；整數為 zigzag varint，文字/二進位為長度 + 位元組，浮點數為 8 bytes
+    """
+
+    MAGIC = b"MSYN"
+    VERSION = 2
+    SUPPORTED_VERSIONS = (1, 2)
+    CODECS = {"none": 0, "gzip": 1, "zstd": 2}
+    DEFAULT_LEVELS = {"none": 0, "gzip": 6, "zstd": 10}
+    OPERATIONS = {"INSERT": 1, "UPDATE": 2, "DELETE": 3}
+
+    TYPE_NULL = 0
+    TYPE_INT = 1
+    TYPE_FLOAT = 2
+    TYPE_TEXT = 3
+    TYPE_BLOB = 4
+
+    _FLOAT = struct.Struct("<d")
+
+    @staticmethod
+    def write_varint(buffer: bytearray, value: int):
+        """寫入無號 varint"""
+        while value > 0x7F:
+            buffer.append((value & 0x7F) | 0x80)
+            value >>= 7
+        buffer.append(value)
+
+    @classmethod
+    def encode_value(cls, buffer: bytearray, value):
+        """依型別寫入單一欄位值"""
+        if value is None:
+            buffer.append(cls.TYPE_NULL)
+        elif isinstance(value, int):
+            buffer.append(cls.TYPE_INT)
+            cls.write_varint(buffer, value * 2 if value >= 0 else -value * 2 - 1)
+        elif isinstance(value, float):
+            buffer.append(cls.TYPE_FLOAT)
+            buffer += cls._FLOAT.pack(value)
+        elif isinstance(value, str):
+            data = value.encode('utf-8')
+            buffer.append(cls.TYPE_TEXT)
+            cls.write_varint(buffer, len(data))
+            buffer += data
+        elif isinstance(value, (bytes, bytearray, memoryview)):
+            buffer.append(cls.TYPE_BLOB)
+            cls.write_varint(buffer, len(value))
+            buffer += value
+        else:
+            raise TypeError(f"不支援的欄位型別: {type(value).__name__}")
+
+    @classmethod
+    def compressor(cls, codec: str, level: Optional[int] = None):
+        """建立串流壓縮器（具 compress / flush 方法）"""
+        if codec not in cls.CODECS:
+            raise ValueError(f"不支援的壓縮方式: {codec}")
+        level = cls.DEFAULT_LEVELS[codec] if level is None else level
+        if codec == "gzip":
+            return zlib.compressobj(level, zlib.DEFLATED, 31)
+        if codec == "zstd":
+            if not ZSTD_AVAILABLE:
+                raise ValueError("未安裝 zstandard 套件，無法使用 zstd 壓縮")
+            return zstandard.ZstdCompressor(level=level).compressobj()
+        return _NullCodec()
+
+    @classmethod
+    def decompressor(cls, codec_id: int):
+        """依檔頭的壓縮方式建立串流解壓器"""
+        if codec_id == cls.CODECS["gzip"]:
+            return zlib.decompressobj(31)
+        if codec_id == cls.CODECS["zstd"]:
+            if not ZSTD_AVAILABLE:
+                raise ValueError("未安裝 zstandard 套件，無法解壓 zstd 封包")
+            return zstandard.ZstdDecompressor().decompressobj()
+        if codec_id == cls.CODECS["none"]:
+            return _NullCodec()
+        raise ValueError(f"不支援的壓縮方式代碼: {codec_id}")
+
+
+class _NullCodec:
+    """不壓縮時的壓縮器/解壓器"""
+
+    def compress(self, data: bytes) -> bytes:
+        return bytes(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        return data
+
+    def flush(self) -> bytes:
+        return b""
+
+
+class SyncBinaryReader:
+    """
+    逐筆解碼二進位同步封包（記憶體用量固定）
+
+    迭代產生與 JSON 封包相同結構的變更記錄；迭代結束後
+    error 為 None 表示筆數與校驗碼皆相符，否則為錯誤說明。
+    """
+
+    READ_SIZE = 64 * 1024
+
+    def __init__(self, stream):
+        self.stream = stream
+        prelude = stream.read(len(SyncBinaryFormat.MAGIC) + 2)
+        if len(prelude) < len(SyncBinaryFormat.MAGIC) + 2 or not prelude.startswith(SyncBinaryFormat.MAGIC):
+            raise ValueError("不是二進位同步封包")
+        version, codec_id = prelude[-2], prelude[-1]
+        if version not in SyncBinaryFormat.SUPPORTED_VERSIONS:
+            raise ValueError(f"不支援的封包版本: {version}")
+        self.version = version
+        self.codec = next((name for name, code in SyncBinaryFormat.CODECS.items() if code == codec_id), None)
+        self._decompressor = SyncBinaryFormat.decompressor(codec_id)
+        self._buffer = b""
+        self._pos = 0
+        self._eof = False
+        self.changes_count = 0
+        self.checksum = None
+        self.error = None
+        # 記錄區雜湊：緩衝區被切掉前，先把已讀取的部分計入
+        self._digest = None
+        self._hash_from = 0
+
+        try:
+            header_size = self._read_varint()
+            self.header = json.loads(self._read(header_size))
+        except (EOFError, zlib.error) as e:
+            raise ValueError(f"封包標頭無法讀取: {e}")
+        self.tables = [
+            (t["name"], t["columns"], t.get("key_column", "id"), t.get("timestamp_column"))
+            for t in self.header["tables"]
+        ]
+
+    def _fill(self, size: int):
+        """確保緩衝區至少有 size 個未讀位元組"""
+        while len(self._buffer) - self._pos < size:
+            if self._eof:
+                raise EOFError("封包不完整")
+            compressed = self.stream.read(self.READ_SIZE)
+            if compressed:
+                data = self._decompressor.decompress(compressed)
+            else:
+                self._eof = True
+                data = self._decompressor.flush()
+            if self._digest is not None:
+                self._digest.update(self._buffer[self._hash_from:self._pos])
+                self._hash_from = 0
+            self._buffer = self._buffer[self._pos:] + data
+            self._pos = 0
+
+    def _read(self, size: int) -> bytes:
+        self._fill(size)
+        data = self._buffer[self._pos:self._pos + size]
+        self._pos += size
+        return data
+
+    def _read_varint(self) -> int:
+        result = 0
+        shift = 0
+        while True:
+            if self._pos >= len(self._buffer):
+                self._fill(1)
+            byte = self._buffer[self._pos]
+            self._pos += 1
+            result |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return result
+            shift += 7
+
+    def _read_value(self):
+        if self._pos >= len(self._buffer):
+            self._fill(1)
+        value_type = self._buffer[self._pos]
+        self._pos += 1
+        if value_type == SyncBinaryFormat.TYPE_NULL:
+            return None
+        if value_type == SyncBinaryFormat.TYPE_INT:
+            value = self._read_varint()
+            return value >> 1 if not value & 1 else -((value + 1) >> 1)
+        if value_type == SyncBinaryFormat.TYPE_FLOAT:
+            return SyncBinaryFormat._FLOAT.unpack(self._read(8))[0]
+        if value_type == SyncBinaryFormat.TYPE_TEXT:
+            return self._read(self._read_varint()).decode('utf-8')
+        if value_type == SyncBinaryFormat.TYPE_BLOB:
+            return self._read(self._read_varint())
+        raise ValueError(f"未知的欄位型別: {value_type}")
+
+    def __iter__(self):
+        operations = {code: name for name, code in SyncBinaryFormat.OPERATIONS.items()}
+        created_at = self.header.get("created_at")
+        self._digest = hashlib.sha256()
+        self._hash_from = self._pos
+
+        try:
+            while True:
+                table_index = self._read_varint()
+                if table_index == 0:
+                    # 結束標記本身不計入雜湊
+                    self._digest.update(self._buffer[self._hash_from:self._pos - 1])
+                    digest = self._digest.digest()
+                    self.checksum = digest.hex()
+                    self._digest = None
+                    break
+                table, columns, key_col, timestamp_col = self.tables[table_index - 1]
+                operation = operations[self._read(1)[0]]
+                if operation == 'DELETE':
+                    data = {key_col: self._read_value()}
+                    timestamp = self._read_value() if self.version >= 2 else created_at
+                else:
+                    data = {column: self._read_value() for column in columns}
+                    timestamp = data.get(timestamp_col) or created_at
+                self.changes_count += 1
+                yield {
+                    'table': table,
+                    'operation': operation,
+                    'data': data,
+                    'timestamp': timestamp
+                }
+
+            expected_count = self._read_varint()
+            expected_digest = self._read(32)
+        except EOFError:
+            self.error = "封包不完整（缺少結束標記）"
+            return
+        except (zlib.error, IndexError, KeyError, ValueError, UnicodeDecodeError) as e:
+            self.error = f"封包內容損毀: {e}"
+            return
+
+        if expected_count != self.changes_count:
+            self.error = f"變更筆數不符: 結束標記 {expected_count}，實際 {self.changes_count}"
+        elif expected_digest != digest:
+            self.error = "校驗碼不符，封包可能已損毀"
+
+
+class SyncNdjsonReader:
+    """
+    逐行解析 NDJSON 串流同步封包（記憶體用量固定）
+
+    迭代產生變更記錄並計算校驗碼；迭代結束後
+    error 為 None 表示結尾記錄的筆數與校驗碼皆相符，否則為錯誤說明。
+    """
+
+    FORMAT = "medical-sync-ndjson"
+    VERSION = 1
+
+    def __init__(self, stream):
+        self.stream = stream
+        header_line = stream.readline()
+        try:
+            header = json.loads(header_line)
+        except ValueError:
+            raise ValueError("封包標頭不是有效的 JSON")
+        if not isinstance(header, dict) or header.get("format") != self.FORMAT:
+            raise ValueError("不是 NDJSON 同步封包")
+        if header.get("version") != self.VERSION:
+            raise ValueError(f"不支援的封包版本: {header.get('version')}")
+        self.header = header
+        self.trailer = None
+        self.changes_count = 0
+        self.checksum = None
+        self.error = None
+        self._digest = hashlib.sha256()
+
+    def __iter__(self):
+        for line in self.stream:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record.get("trailer"):
+                self.trailer = record
+                break
+            self._digest.update(line)
+            self.changes_count += 1
+            yield record
+
+        self.checksum = self._digest.hexdigest()
+        if self.trailer is None:
+            self.error = "封包不完整（缺少結尾記錄）"
+        elif self.trailer.get("changes_count") != self.changes_count:
+            self.error = f"變更筆數不符: 結尾記錄 {self.trailer.get('changes_count')}，實際 {self.changes_count}"
+        elif self.trailer.get("checksum") != self.checksum:
+            self.error = "校驗碼不符，封包可能已損毀"
+
+
+# ============================================================================
+# 同步封包解析（SyncIngestPipeline 工作行程）
+# ============================================================================
+
+def parse_sync_package_file(path: str, tables: Tuple[str, ...]) -> dict:
+    """
+    解析並驗證同步封包檔案（在 SyncIngestPipeline 的工作行程執行，不存取資料庫）
+
+    依檔頭自動判斷格式：二進位 (MSYN)、NDJSON 串流、JSON 上傳內容；
+    tables 為可套用的資料表（DatabaseManager.SYNC_APPLY_TABLES）。
+    回傳 import_verified_sync_package 所需的內容；無法匯入時只回傳 error。
+    """
+    started = perf_counter()
+    result = {"file": Path(path).name, "package_size": os.path.getsize(path)}
+    try:
+        with open(path, 'rb') as f:
+            prefix = f.read(64)
+            f.seek(0)
+            if prefix.startswith(SyncBinaryFormat.MAGIC):
+                reader = SyncBinaryReader(f)
+                changes = list(reader)
+                header, checksum, error, package_format = reader.header, reader.checksum, reader.error, "binary"
+            elif SyncNdjsonReader.FORMAT.encode('utf-8') in prefix:
+                reader = SyncNdjsonReader(f)
+                changes = list(reader)
+                header, checksum, error, package_format = reader.header, reader.checksum, reader.error, "ndjson"
+            else:
+                body = json.load(f)
+                changes = body['changes']
+                header = {"package_id": body['packageId'], "station_id": body.get('stationId')}
+                checksum, _ = sync_package_checksum(changes)
+                error = None if checksum == body['checksum'] else "校驗碼不符，封包可能已損毀"
+                package_format = "json"
+
+        if error is None:
+            for index, change in enumerate(changes):
+                if (not isinstance(change, dict) or change.get('table') not in tables
+                        or change.get('operation') not in ('INSERT', 'UPDATE', 'DELETE')
+                        or not isinstance(change.get('data'), dict)):
+                    error = f"第 {index + 1} 筆變更格式錯誤"
+                    break
+
+        result.update({
+            "format": package_format,
+            "package_id": header.get("package_id"),
+            "package_type": header.get("package_type"),
+            "station_id": header.get("station_id"),
+            "hospital_id": header.get("hospital_id"),
+            "checksum": checksum,
+            "changes_count": len(changes),
+            "error": error
+        })
+        if error is None:
+            result["changes"] = changes
+    except (OSError, ValueError, KeyError, TypeError, EOFError, zlib.error) as e:
+        result["error"] = f"封包無法解析: {e}"
+    result["parse_seconds"] = round(perf_counter() - started, 3)
+    return result
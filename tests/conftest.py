@@ -0,0 +1,74 @@
+"""
+測試共用設定
+
+main 匯入時會在工作目錄建立資料庫與日誌並讀取 config/station_config.json，
+所以先切換到暫存目錄再匯入；每個測試另以 tmp_path 下的獨立資料庫檔案執行。
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+WORKDIR = Path(tempfile.mkdtemp(prefix="medical-inventory-tests-"))
+shutil.copytree(ROOT / "config", WORKDIR / "config")
+os.chdir(WORKDIR)
+sys.path.insert(0, str(ROOT))
+
+import main  # noqa: E402
+
+
+def pytest_sessionfinish(session, exitstatus):
+    os.chdir(ROOT)
+    shutil.rmtree(WORKDIR, ignore_errors=True)
+
+
+@pytest.fixture
+def make_db(tmp_path):
+    """建立獨立資料庫：make_db("hospital")"""
+    def make(name: str = "station") -> main.DatabaseManager:
+        return main.DatabaseManager(str(tmp_path / f"{name}.db"))
+    return make
+
+
+@pytest.fixture
+def db(make_db):
+    return make_db()
+
+
+@pytest.fixture
+def client(db, monkeypatch):
+    """API 測試用戶端，路由使用 db fixture 的資料庫（不觸發啟動事件與背景排程）"""
+    from fastapi.testclient import TestClient
+    monkeypatch.setattr(main, "db", db)
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def receive():
+    """進貨（物品不存在時先建立）：receive(db, "ITEM-1", 10, stationId="TC-01")"""
+    def receive(database: main.DatabaseManager, item_code: str, quantity: int, **fields):
+        conn = database.get_connection()
+        conn.execute("INSERT OR IGNORE INTO items (code, name, category) VALUES (?, ?, '耗材')", (item_code, item_code))
+        conn.commit()
+        conn.close()
+        return database.receive_item(main.ReceiveRequest(itemCode=item_code, quantity=quantity, **fields))
+    return receive
+
+
+def rows(database: main.DatabaseManager, sql: str, params: tuple = ()) -> list:
+    """查詢結果轉為 tuple 清單"""
+    conn = database.get_connection()
+    try:
+        return [tuple(row) for row in conn.execute(sql, params)]
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def query():
+    return rows
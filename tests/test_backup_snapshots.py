@@ -0,0 +1,90 @@
+"""增量備份、保留政策與快照還原 (user-027)"""
+
+import json
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+import main
+
+
+@pytest.fixture
+def store(tmp_path):
+    return main.IncrementalBackupStore(str(tmp_path / "backups"), chunk_size=4096)
+
+
+def _item_codes(path) -> list:
+    conn = sqlite3.connect(str(path))
+    try:
+        return [row[0] for row in conn.execute("SELECT code FROM items ORDER BY code")]
+    finally:
+        conn.close()
+
+
+def test_restore_returns_each_point_in_time(db, receive, store, tmp_path):
+    receive(db, "GAUZE", 10)
+    first = store.create_backup(db)
+    receive(db, "TAPE", 1)
+    second = store.create_backup(db)
+
+    assert first["snapshot_id"] != second["snapshot_id"]
+    # 只有變動的頁面產生新區塊
+    assert 0 < second["new_chunks"] < len(store.load_manifest(second["snapshot_id"])["chunks"])
+
+    restored_first = store.restore(first["snapshot_id"], str(tmp_path / "first.db"))
+    restored_second = store.restore(second["snapshot_id"], str(tmp_path / "second.db"))
+    assert restored_first["integrity"] == "ok"
+    assert _item_codes(restored_first["path"]) == ["GAUZE"]
+    assert _item_codes(restored_second["path"]) == ["GAUZE", "TAPE"]
+
+
+def test_retention_removes_old_snapshots_and_unreferenced_chunks(db, receive, store):
+    receive(db, "GAUZE", 10)
+    old = store.create_backup(db)
+    for _ in range(20):
+        receive(db, "TAPE", 1)
+    kept = store.create_backup(db)
+    manifest_path = store._manifest_path(old["snapshot_id"])
+    manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    manifest["created_at"] = (datetime.now() - timedelta(days=10)).isoformat()
+    manifest_path.write_text(json.dumps(manifest), encoding="utf-8")
+
+    result = store.enforce_retention(max_days=7)
+
+    assert result["removed_snapshots"] == 1
+    assert result["removed_chunks"] > 0
+    assert [s["snapshot_id"] for s in store.list_snapshots()] == [kept["snapshot_id"]]
+    assert store.storage_stats()["snapshots"] == 1
+
+
+def test_restore_detects_corrupt_chunk(db, receive, store, tmp_path):
+    receive(db, "GAUZE", 10)
+    snapshot = store.create_backup(db)
+    digest = store.load_manifest(snapshot["snapshot_id"])["chunks"][0]
+    store._chunk_path(digest).write_bytes(main.zlib.compress(b"corrupt"))
+
+    with pytest.raises(RuntimeError):
+        store.restore(snapshot["snapshot_id"], str(tmp_path / "restored.db"))
+    assert not (tmp_path / "restored.db").exists()
+
+
+def test_restore_api_requires_post_with_confirm(client, db, store, monkeypatch):
+    monkeypatch.setattr(main, "backup_store", store)
+    snapshot_id = store.create_backup(db)["snapshot_id"]
+    url = f"/api/backup/snapshots/{snapshot_id}/restore"
+
+    assert client.get(url).status_code == 405
+    assert client.post(url, json={}).status_code == 422
+    assert client.post(url, json={"confirm": False}).status_code == 400
+    assert client.post("/api/backup/snapshots/19990101_000000/restore", json={"confirm": True}).status_code == 404
+
+    response = client.post(url, json={"confirm": True})
+    assert response.status_code == 200
+    assert response.headers["x-integrity-check"] == "ok"
+    assert response.content.startswith(b"SQLite format 3\x00")
+
+
+def test_shipped_config_enables_auto_backup():
+    assert main.Config.load_station_config(main.config.STATION_CONFIG_PATH)["system"]["auto_backup_enabled"] is True
+    assert main.config.AUTO_BACKUP_ENABLED is True
@@ -0,0 +1,126 @@
+"""跨站點相容血搜尋 (user-050)"""
+
+import pytest
+from fastapi import HTTPException
+
+import main
+
+Index = main.BloodAvailabilityIndex
+
+# 紅血球：受血者 → 可輸的供血者血型（ABO 相容且 Rh 陰性受血者只能輸 Rh 陰性）
+RBC_TABLE = {
+    "O-": {"O-"},
+    "O+": {"O+", "O-"},
+    "A-": {"A-", "O-"},
+    "A+": {"A+", "A-", "O+", "O-"},
+    "B-": {"B-", "O-"},
+    "B+": {"B+", "B-", "O+", "O-"},
+    "AB-": {"AB-", "A-", "B-", "O-"},
+    "AB+": {"AB+", "AB-", "A+", "A-", "B+", "B-", "O+", "O-"},
+}
+# 血漿：ABO 與紅血球相反，不考慮 Rh
+PLASMA_ABO = {"O": {"O", "A", "B", "AB"}, "A": {"A", "AB"}, "B": {"B", "AB"}, "AB": {"AB"}}
+
+
+@pytest.mark.parametrize("recipient", sorted(RBC_TABLE))
+def test_rbc_compatibility_table(recipient):
+    donors = Index.compatible_types(recipient, "RBC")
+
+    assert set(donors) == RBC_TABLE[recipient]
+    assert len(donors) == len(set(donors))
+    assert donors[0] == recipient
+    assert donors[-1] == "O-"
+
+
+@pytest.mark.parametrize("recipient", sorted(RBC_TABLE))
+def test_plasma_compatibility_table(recipient):
+    donors = Index.compatible_types(recipient, "FROZEN_PLASMA")
+
+    assert set(donors) == {abo + rh for abo in PLASMA_ABO[recipient[:-1]] for rh in "+-"}
+    assert donors[0] == recipient
+
+
+@pytest.fixture
+def index(db):
+    conn = db.get_connection()
+    conn.execute("UPDATE blood_inventory SET quantity = 3 WHERE station_id = 'TC-01' AND blood_type = 'O-'")
+    conn.execute("UPDATE blood_inventory SET quantity = 1 WHERE station_id = 'TC-01' AND blood_type = 'A+'")
+    conn.executemany(
+        "INSERT INTO blood_inventory (blood_type, quantity, station_id) VALUES (?, ?, 'TC-02')",
+        [("A+", 6), ("B+", 9)]
+    )
+    conn.commit()
+    conn.close()
+    db.register_emergency_blood_bags([
+        {"blood_type": blood_type, "product_type": product, "collection_date": collection_date,
+         "station_id": "TC-01", "operator": "tester"}
+        for blood_type, product, collection_date in [
+            ("A+", "WHOLE_BLOOD", "2099-01-01"),
+            ("A+", "FROZEN_PLASMA", "2099-01-01"),
+            ("AB+", "FROZEN_PLASMA", "2099-01-01"),
+            ("A+", "WHOLE_BLOOD", "2020-01-01"),  # 已過期
+        ]
+    ])
+    return Index(db.db_path)
+
+
+def test_search_ranks_sources_and_stations(index):
+    result = index.search("A+", min_units=2)
+
+    assert [(s["stationId"], s["bloodType"], s["units"], s["emergencyBags"]) for s in result["sources"]] == [
+        ("TC-02", "A+", 6, 0), ("TC-01", "A+", 1, 1), ("TC-01", "O-", 3, 0)
+    ]
+    # TC-02 同型血即足夠，排在合計較多但需動用 O- 的 TC-01 之前
+    assert [(s["stationId"], s["available"], s["sameType"]) for s in result["stations"]] == [
+        ("TC-02", 6, 6), ("TC-01", 5, 2)
+    ]
+    assert result["totalAvailable"] == 11
+
+
+def test_search_excludes_incompatible_and_filters_stations(index):
+    result = index.search("O-", min_units=4)
+
+    assert {s["bloodType"] for s in result["sources"]} == {"O-"}
+    assert result["stations"] == []
+    assert index.search("B+", station_id="TC-01")["sources"] == [
+        {"stationId": "TC-01", "bloodType": "O-", "rank": 3, "units": 3, "emergencyBags": 0, "available": 3}
+    ]
+
+
+def test_search_plasma_counts_only_plasma_bags(index):
+    result = index.search("A+", product="FROZEN_PLASMA")
+
+    assert [(s["bloodType"], s["units"], s["emergencyBags"]) for s in result["sources"]] == [("A+", 0, 1), ("AB+", 0, 1)]
+
+
+def test_search_sees_new_writes(db, index):
+    assert index.search("B-", station_id="TC-02")["totalAvailable"] == 0
+    reloads = index.reloads
+    index.search("B-", station_id="TC-02")
+    assert index.reloads == reloads
+
+    db.register_emergency_blood_bag({
+        "blood_type": "B-", "product_type": "RBC_CONCENTRATE", "collection_date": "2099-01-01",
+        "station_id": "TC-02", "operator": "tester"
+    })
+    assert index.search("B-", station_id="TC-02")["totalAvailable"] == 1
+
+    (bag,) = db.get_emergency_blood_bags(blood_type="B-", fields=["blood_bag_code"])["bags"]
+    db.use_emergency_blood_bag(bag["blood_bag_code"], "病患乙", "tester")
+    assert index.search("B-", station_id="TC-02")["totalAvailable"] == 0
+
+
+def test_search_rejects_unknown_blood_type_and_product(index):
+    for kwargs in ({"recipient": "C+"}, {"recipient": "A+", "product": "PLATELET"}):
+        with pytest.raises(HTTPException) as excinfo:
+            index.search(**kwargs)
+        assert excinfo.value.status_code == 400
+
+
+def test_compatible_api_accepts_unencoded_plus(client, index, monkeypatch):
+    monkeypatch.setattr(main, "blood_availability", index)
+
+    response = client.get("/api/blood/compatible?recipient=AB+")
+
+    assert response.status_code == 200
+    assert response.json()["recipient"] == "AB+"
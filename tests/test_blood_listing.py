@@ -0,0 +1,131 @@
+"""緊急血袋清單篩選與 keyset 分頁 (user-049)"""
+
+import pytest
+from fastapi import HTTPException
+
+BLOOD_TYPES = ["A+", "O-", "B+", "AB+"]
+DATES = ["2026-10-01", "2026-10-02", "2026-10-03"]
+
+
+@pytest.fixture
+def bags(db):
+    """3 個採集日期 x 4 種血型 x 5 袋，另把部分血袋標為已使用"""
+    db.register_emergency_blood_bags([
+        {
+            "blood_type": blood_type, "product_type": "WHOLE_BLOOD", "collection_date": date,
+            "station_id": "TC-01", "operator": "tester"
+        }
+        for date in DATES for blood_type in BLOOD_TYPES for _ in range(5)
+    ])
+    conn = db.get_connection()
+    conn.execute("UPDATE emergency_blood_bags SET status = 'USED' WHERE id % 4 = 0")
+    conn.commit()
+    expected = [
+        tuple(row) for row in conn.execute(
+            "SELECT blood_bag_code, status, blood_type FROM emergency_blood_bags ORDER BY collection_date DESC, blood_bag_code"
+        )
+    ]
+    conn.close()
+    return expected
+
+
+def _all_pages(db, limit, **filters):
+    codes, pages, cursor = [], 0, None
+    while True:
+        page = db.get_emergency_blood_bags(limit=limit, cursor_token=cursor, fields=["blood_bag_code"], **filters)
+        assert len(page["bags"]) <= limit
+        codes.extend(bag["blood_bag_code"] for bag in page["bags"])
+        pages += 1
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return codes, pages
+
+
+@pytest.mark.parametrize("limit", [1, 7, 20, 60, 100])
+def test_pages_cover_every_bag_once_in_order(db, bags, limit):
+    codes, pages = _all_pages(db, limit)
+
+    assert codes == [code for code, _, _ in bags]
+    assert pages == -(-len(bags) // limit)  # 剛好整除時不會多一頁空白頁
+
+
+@pytest.mark.parametrize("limit", [1, 4, 11])
+def test_filtered_pages_have_no_gaps_or_duplicates(db, bags, limit):
+    codes, _ = _all_pages(db, limit, status="AVAILABLE", blood_type="O-")
+
+    expected = [code for code, status, blood_type in bags if status == "AVAILABLE" and blood_type == "O-"]
+    assert expected
+    assert codes == expected
+
+
+def test_status_change_between_pages_does_not_shift_the_cursor(db, bags):
+    first = db.get_emergency_blood_bags(status="AVAILABLE", limit=10, fields=["blood_bag_code"])
+    seen = [bag["blood_bag_code"] for bag in first["bags"]]
+    db.use_emergency_blood_bag(seen[0], "病患甲", "tester")
+
+    rest = []
+    cursor = first["next_cursor"]
+    while cursor:
+        page = db.get_emergency_blood_bags(status="AVAILABLE", limit=10, cursor_token=cursor, fields=["blood_bag_code"])
+        rest.extend(bag["blood_bag_code"] for bag in page["bags"])
+        cursor = page["next_cursor"]
+
+    assert seen + rest == [code for code, status, _ in bags if status == "AVAILABLE"]
+
+
+def test_fields_limit_returned_columns(db, bags):
+    page = db.get_emergency_blood_bags(limit=2, fields=["blood_bag_code", "status"])
+
+    assert [set(bag) for bag in page["bags"]] == [{"blood_bag_code", "status"}] * 2
+
+
+def test_invalid_cursor_and_unknown_field_are_rejected(db, bags):
+    with pytest.raises(HTTPException) as excinfo:
+        db.get_emergency_blood_bags(cursor_token="not-a-cursor")
+    assert excinfo.value.status_code == 400
+
+    with pytest.raises(HTTPException) as excinfo:
+        db.get_emergency_blood_bags(fields=["blood_bag_code", "password"])
+    assert excinfo.value.status_code == 400
+
+
+def test_list_api_pages_with_next_cursor(client, bags):
+    response = client.get("/api/blood/emergency/list", params={"limit": 25, "fields": "blood_bag_code"})
+    body = response.json()
+    codes = [bag["blood_bag_code"] for bag in body["bloodBags"]]
+    while body["hasMore"]:
+        body = client.get("/api/blood/emergency/list", params={"limit": 25, "cursor": body["nextCursor"]}).json()
+        codes.extend(bag["blood_bag_code"] for bag in body["bloodBags"])
+
+    assert response.status_code == 200
+    assert codes == [code for code, _, _ in bags]
+
+
+@pytest.mark.parametrize("limit", [1, 6])
+def test_blood_type_filter_pages_through_its_own_index(db, bags, limit):
+    codes, _ = _all_pages(db, limit, blood_type="O-")
+
+    expected = [code for code, _, blood_type in bags if blood_type == "O-"]
+    assert expected
+    assert codes == expected
+    conn = db.get_connection()
+    plan = " ".join(row[3] for row in conn.execute("""
+        EXPLAIN QUERY PLAN SELECT blood_bag_code FROM emergency_blood_bags INDEXED BY idx_emergency_blood_type
+        WHERE blood_type = 'O-' ORDER BY collection_date DESC, blood_bag_code LIMIT 7
+    """))
+    conn.close()
+    assert "blood_type=?" in plan and "TEMP B-TREE" not in plan
+
+
+def test_old_blood_type_index_is_rebuilt(make_db, query):
+    db = make_db()
+    conn = db.get_connection()
+    conn.execute("DROP INDEX idx_emergency_blood_type")
+    conn.execute("CREATE INDEX idx_emergency_blood_type ON emergency_blood_bags(blood_type, status, collection_date DESC, blood_bag_code)")
+    conn.commit()
+    conn.close()
+
+    db = make_db()
+
+    (sql,), = query(db, "SELECT sql FROM sqlite_master WHERE name = 'idx_emergency_blood_type'")
+    assert "emergency_blood_bags(blood_type, collection_date DESC, blood_bag_code)" in sql
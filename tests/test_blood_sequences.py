@@ -0,0 +1,65 @@
+"""緊急血袋編號序號計數器 (user-047)"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi import HTTPException
+
+
+def _bag(blood_type="O+", collection_date="2026-10-01", **fields):
+    return {
+        "blood_type": blood_type, "product_type": "WHOLE_BLOOD", "collection_date": collection_date,
+        "station_id": "TC-01", "operator": "tester", **fields
+    }
+
+
+def test_concurrent_bulk_registrations_get_unique_contiguous_codes(make_db, query):
+    db = make_db()
+    threads, batches, batch_size = 8, 3, 25
+
+    def register(_):
+        return [
+            bag["blood_bag_code"]
+            for _ in range(batches)
+            for bag in db.register_emergency_blood_bags([_bag() for _ in range(batch_size)])["bags"]
+        ]
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        codes = [code for result in pool.map(register, range(threads)) for code in result]
+
+    total = threads * batches * batch_size
+    assert len(set(codes)) == total
+    assert sorted(codes) == [f"DNO-261001-OP-{seq:03d}" for seq in range(1, total + 1)]
+    assert query(db, "SELECT COUNT(DISTINCT blood_bag_code) FROM emergency_blood_bags") == [(total,)]
+
+
+def test_each_group_has_its_own_sequence(db):
+    result = db.register_emergency_blood_bags([
+        _bag("O+"), _bag("A-"), _bag("O+"), _bag("O+", "2026-10-02"), _bag("O+", org_code="RC")
+    ])
+
+    assert [bag["blood_bag_code"] for bag in result["bags"]] == [
+        "DNO-261001-OP-001", "DNO-261001-AN-001", "DNO-261001-OP-002", "DNO-261002-OP-001", "RC-261001-OP-001"
+    ]
+
+
+def test_counter_starts_after_existing_codes(db):
+    conn = db.get_connection()
+    conn.execute("""
+        INSERT INTO emergency_blood_bags
+        (blood_bag_code, blood_type, product_type, collection_date, expiry_date, station_id, operator)
+        VALUES ('DNO-261001-OP-007', 'O+', 'WHOLE_BLOOD', '2026-10-01', '2026-11-05', 'TC-01', 'legacy')
+    """)
+    conn.commit()
+    conn.close()
+
+    assert db.register_emergency_blood_bag(_bag())["blood_bag_code"] == "DNO-261001-OP-008"
+
+
+def test_invalid_batch_registers_nothing(db, query):
+    with pytest.raises(HTTPException) as excinfo:
+        db.register_emergency_blood_bags([_bag(), _bag(collection_date="2026/10/01")])
+
+    assert excinfo.value.status_code == 400
+    assert query(db, "SELECT COUNT(*) FROM emergency_blood_bags") == [(0,)]
+    assert db.register_emergency_blood_bag(_bag())["blood_bag_code"] == "DNO-261001-OP-001"
@@ -0,0 +1,39 @@
+"""緊急完整備份串流 (user-028)"""
+
+import io
+import zipfile
+from pathlib import Path
+
+import main
+
+
+def _snapshots(db) -> list:
+    return list(Path(db.db_path).parent.glob(".stream_snapshot_*"))
+
+
+def test_download_all_streams_a_verifiable_zip(db, client, receive):
+    receive(db, "ITEM-A", 12)
+    response = client.get("/api/emergency/download-all")
+    assert response.status_code == 200
+
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        names = archive.namelist()
+    assert f"database/{Path(main.config.DATABASE_PATH).name}" in names
+    assert "manifest.json" in names and any(name.startswith("exports/") for name in names)
+
+    verified = client.post("/api/emergency/verify-backup", content=response.content,
+                           headers={"Content-Type": "application/zip"})
+    assert verified.status_code == 200 and verified.json()["valid"] is True
+    assert _snapshots(db) == []
+
+
+def test_interrupted_stream_removes_the_snapshot(db):
+    snapshot_path = db.create_stream_snapshot()
+    stream = main.iter_emergency_backup_zip(snapshot_path)
+    next(stream)
+    assert snapshot_path.exists()
+
+    stream.close()
+
+    assert not snapshot_path.exists()
+    assert _snapshots(db) == []
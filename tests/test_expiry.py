@@ -0,0 +1,78 @@
+"""過期清掃與即將到期索引 (user-048)"""
+
+from datetime import datetime, timedelta
+
+LOTS_SQL = "SELECT item_code, batch_number, expiry_date, received_quantity, status FROM expiry_lots ORDER BY item_code, expiry_date"
+
+
+def _day(offset: int) -> str:
+    return (datetime.now() + timedelta(days=offset)).strftime('%Y-%m-%d')
+
+
+def _register_bag(db, collection_date: str, product_type: str = "PLATELET") -> str:
+    """血小板效期為採集後 5 天"""
+    return db.register_emergency_blood_bag({
+        "blood_type": "O+", "product_type": product_type, "collection_date": collection_date,
+        "station_id": "TC-01", "operator": "tester"
+    })["blood_bag_code"]
+
+
+def test_lots_are_aggregated_and_already_expired_lots_start_expired(db, receive, query):
+    receive(db, "SALINE", 10, batchNumber="S1", expiryDate=_day(30))
+    receive(db, "SALINE", 5, batchNumber="S1", expiryDate=_day(30))
+    receive(db, "GLOVES", 4, expiryDate=_day(-1))
+    receive(db, "TAPE", 2)  # 沒有效期不列入
+
+    assert query(db, LOTS_SQL) == [
+        ("GLOVES", "", _day(-1), 4, "EXPIRED"),
+        ("SALINE", "S1", _day(30), 15, "ACTIVE"),
+    ]
+
+
+def test_deleting_receive_events_updates_lots(db, receive, query):
+    receive(db, "SALINE", 10, batchNumber="S1", expiryDate=_day(30))
+    receive(db, "SALINE", 5, batchNumber="S1", expiryDate=_day(30))
+    conn = db.get_connection()
+    conn.execute("DELETE FROM inventory_events WHERE quantity = 10")
+    conn.commit()
+    assert query(db, LOTS_SQL) == [("SALINE", "S1", _day(30), 5, "ACTIVE")]
+
+    conn.execute("DELETE FROM inventory_events")
+    conn.commit()
+    conn.close()
+    assert query(db, LOTS_SQL) == []
+
+
+def test_sweep_marks_expired_bags_and_lots_once(db, receive, query):
+    receive(db, "SALINE", 10, expiryDate=_day(2))
+    expired_bag = _register_bag(db, _day(-7))
+    fresh_bag = _register_bag(db, _day(0))
+
+    result = db.sweep_expired(today=_day(3))
+
+    assert result["blood_bag_codes"] == [expired_bag]
+    assert result["lots_expired"] == 1
+    assert query(db, "SELECT blood_bag_code, status FROM emergency_blood_bags ORDER BY id") == [
+        (expired_bag, "EXPIRED"), (fresh_bag, "AVAILABLE")
+    ]
+    assert query(db, "SELECT status FROM expiry_lots") == [("EXPIRED",)]
+
+    again = db.sweep_expired(today=_day(3))
+    assert again["blood_bags_expired"] == 0 and again["lots_expired"] == 0
+
+
+def test_expiring_lists_only_available_items_within_window(db, receive):
+    receive(db, "SALINE", 10, batchNumber="S1", expiryDate=_day(0))
+    receive(db, "GAUZE", 3, expiryDate=_day(8))
+    today_bag = _register_bag(db, _day(-5))
+    used_bag = _register_bag(db, _day(-4))
+    _register_bag(db, _day(-6))  # 昨天到期
+    db.use_emergency_blood_bag(used_bag, "病患丙", "tester")
+
+    result = db.get_expiring(within_days=7)
+
+    assert [(bag["blood_bag_code"], bag["days_left"]) for bag in result["blood_bags"]] == [(today_bag, 0)]
+    assert [(lot["item_code"], lot["batch_number"], lot["days_left"]) for lot in result["consumable_lots"]] == [
+        ("SALINE", "S1", 0)
+    ]
+    assert db.get_expiring(within_days=8)["counts"] == {"blood_bags": 1, "consumable_lots": 2}
@@ -0,0 +1,50 @@
+"""醫院日報表彙總 (user-043)"""
+
+import logging
+from datetime import datetime
+
+
+def _execute(db, sql: str, params=()):
+    conn = db.get_connection()
+    conn.execute(sql, params)
+    conn.commit()
+    conn.close()
+
+
+def _receive_blood(db, station_id: str, quantity: int, today: str):
+    _execute(db, """
+        INSERT INTO blood_events (event_type, blood_type, quantity, station_id, timestamp)
+        VALUES ('RECEIVE', 'O+', ?, ?, ?)
+    """, (quantity, station_id, f"{today} 08:00:00"))
+
+
+def test_unregistered_stations_are_listed_but_not_totalled(db, query):
+    today = datetime.now().strftime('%Y-%m-%d')
+    registered = query(db, "SELECT station_id FROM stations WHERE hospital_id = 'HOSP-001'")[0][0]
+    _execute(db, """
+        INSERT INTO hospitals (hospital_id, hospital_name, hospital_type, command_level, network_access)
+        VALUES ('HOSP-002', '前線第二醫院', 'FIELD_HOSPITAL', 'LOCAL', 'MILITARY')
+    """)
+    _execute(db, """
+        INSERT INTO stations (station_id, station_name, hospital_id, station_type, network_access)
+        VALUES ('TC-05', '醫療站 TC-05', 'HOSP-002', 'SMALL', 'NONE')
+    """)
+    _receive_blood(db, registered, 4, today)
+    _receive_blood(db, "TC-05", 2, today)
+    # 同步匯入的其他站點資料，站點尚未登記於 stations
+    _receive_blood(db, "TC-09", 3, today)
+
+    first = db.get_hospital_daily_report("HOSP-001", today)
+    second = db.get_hospital_daily_report("HOSP-002", today)
+
+    assert first["unregistered_stations"] == second["unregistered_stations"] == ["TC-09"]
+    assert (first["blood_inventory"]["O+"]["quantity"], first["blood_units_in"]) == (4, 4)
+    assert (second["blood_inventory"]["O+"]["quantity"], second["blood_units_in"]) == (2, 2)
+
+
+def test_sync_from_unregistered_station_warns(db, query, caplog):
+    with caplog.at_level(logging.WARNING):
+        db._mark_station_synced("TC-09")
+
+    assert "TC-09" in caplog.text and "尚未登記" in caplog.text
+    assert query(db, "SELECT COUNT(*) FROM stations WHERE station_id = 'TC-09'") == [(0,)]
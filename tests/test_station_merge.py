@@ -0,0 +1,157 @@
+"""站點合併引擎衝突處理規則 (user-045，見 STATION_MERGE_GUIDE.md)"""
+
+import pytest
+from fastapi import HTTPException
+
+import main
+
+
+def _bag(station_id: str, blood_type: str = "O+"):
+    return {
+        "blood_type": blood_type, "product_type": "WHOLE_BLOOD", "collection_date": "2026-10-01",
+        "station_id": station_id, "operator": "tester"
+    }
+
+
+def _execute(db, sql: str, params: tuple = ()):
+    conn = db.get_connection()
+    conn.execute(sql, params)
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture
+def stations(make_db, receive):
+    """本站 TC-01 與撤收站點 TC-02 的資料庫"""
+    target, source = make_db("tc01"), make_db("tc02")
+    receive(target, "GAUZE", 10)
+    receive(target, "SPLINT", 2)
+    _execute(target, "UPDATE items SET name = '夾板' WHERE code = 'SPLINT'")
+    receive(target, "SPLINT-M", 1)
+    receive(target, "MASK", 7)
+
+    receive(source, "GAUZE", 4, stationId="TC-02")     # 同代碼同名稱：同一物品
+    receive(source, "SPLINT", 3, stationId="TC-02")    # 同代碼不同名稱，SPLINT-M 已被占用
+    receive(source, "MASK", 5, stationId="TC-02")
+    _execute(source, "UPDATE items SET name = 'N95 口罩' WHERE code = 'MASK'")  # → MASK-M
+    receive(source, "TAPE", 1, stationId="TC-02")      # 只有來源有
+
+    target.register_emergency_blood_bags([_bag("TC-01"), _bag("TC-01")])
+    source.register_emergency_blood_bags([_bag("TC-02"), _bag("TC-02"), _bag("TC-02"), _bag("TC-02", "A-")])
+
+    _execute(source, "INSERT INTO equipment (id, name, category) VALUES ('radio-1', '無線電', '通訊')")
+    _execute(source, "INSERT INTO equipment_checks (equipment_id, status, station_id) VALUES ('power-1', 'NORMAL', 'TC-02')")
+    return target, source
+
+
+def _merge(target, source):
+    return target.merge_station_database(source.db_path, "tester", source_station_id="TC-02")
+
+
+def test_item_codes_are_renamed_only_when_names_differ(stations, query):
+    target, source = stations
+    result = _merge(target, source)
+
+    renamed = {c["original"]: c["renamed"] for c in result["conflicts"] if c["type"] == "item_code"}
+    assert renamed == {"MASK": "MASK-M", "SPLINT": "SPLINT-M-TC02"}
+    assert query(target, "SELECT code, name FROM items ORDER BY code") == [
+        ("GAUZE", "GAUZE"), ("MASK", "MASK"), ("MASK-M", "N95 口罩"), ("SPLINT", "夾板"),
+        ("SPLINT-M", "SPLINT-M"), ("SPLINT-M-TC02", "SPLINT"), ("TAPE", "TAPE")
+    ]
+    assert query(target, """
+        SELECT item_code, SUM(quantity) FROM inventory_events WHERE station_id = 'TC-01'
+        GROUP BY item_code ORDER BY item_code
+    """) == [("GAUZE", 14), ("MASK", 7), ("MASK-M", 5), ("SPLINT", 2), ("SPLINT-M", 1), ("SPLINT-M-TC02", 3), ("TAPE", 1)]
+
+
+def test_events_move_to_target_station_and_keep_event_uid(stations, query):
+    target, source = stations
+    source_uids = query(source, "SELECT event_uid FROM inventory_events WHERE station_id = 'TC-02' ORDER BY event_uid")
+
+    _merge(target, source)
+
+    merged = query(target, "SELECT event_uid, station_id FROM inventory_events WHERE event_uid IN (%s) ORDER BY event_uid"
+                   % ",".join("?" * len(source_uids)), tuple(uid for (uid,) in source_uids))
+    assert merged == [(uid, "TC-01") for (uid,) in source_uids]
+
+
+def test_already_synced_events_are_not_duplicated(stations, query):
+    target, source = stations
+    (event_uid,) = query(source, "SELECT event_uid FROM inventory_events WHERE item_code = 'TAPE'")[0]
+    _execute(target, "INSERT OR IGNORE INTO items (code, name) VALUES ('TAPE', 'TAPE')")
+    _execute(target, """
+        INSERT INTO inventory_events (event_type, item_code, quantity, station_id, event_uid)
+        VALUES ('RECEIVE', 'TAPE', 1, 'TC-01', ?)
+    """, (event_uid,))
+
+    result = _merge(target, source)
+
+    assert result["tables"]["inventory_events"] == {"source": 4, "merged": 3}
+    assert query(target, "SELECT COUNT(*) FROM inventory_events WHERE event_uid = ?", (event_uid,)) == [(1,)]
+
+
+def test_colliding_blood_bag_codes_get_source_suffix(stations, query):
+    target, source = stations
+    result = _merge(target, source)
+
+    renamed = [(c["original"], c["renamed"]) for c in result["conflicts"] if c["type"] == "blood_bag_code"]
+    assert renamed == [
+        ("DNO-261001-OP-001", "DNO-261001-OP-001-TC02"),
+        ("DNO-261001-OP-002", "DNO-261001-OP-002-TC02"),
+    ]
+    assert query(target, "SELECT blood_bag_code, station_id FROM emergency_blood_bags ORDER BY blood_bag_code") == [
+        ("DNO-261001-AN-001", "TC-01"),
+        ("DNO-261001-OP-001", "TC-01"), ("DNO-261001-OP-001-TC02", "TC-01"),
+        ("DNO-261001-OP-002", "TC-01"), ("DNO-261001-OP-002-TC02", "TC-01"),
+        ("DNO-261001-OP-003", "TC-01"),
+    ]
+    # 序號計數器由合併後的最大編號續編
+    assert target.register_emergency_blood_bag(_bag("TC-01"))["blood_bag_code"] == "DNO-261001-OP-004"
+
+
+def test_already_synced_blood_bag_is_not_renamed(stations, query):
+    target, source = stations
+    (event_uid,) = query(source, "SELECT event_uid FROM emergency_blood_bags WHERE blood_bag_code = 'DNO-261001-OP-001'")[0]
+    _execute(target, "UPDATE emergency_blood_bags SET event_uid = ? WHERE blood_bag_code = 'DNO-261001-OP-001'", (event_uid,))
+
+    result = _merge(target, source)
+
+    assert [c["original"] for c in result["conflicts"] if c["type"] == "blood_bag_code"] == ["DNO-261001-OP-002"]
+    assert result["tables"]["emergency_blood_bags"] == {"source": 4, "merged": 3}
+
+
+def test_equipment_ids_get_source_prefix_and_checks_follow(stations, query):
+    target, source = stations
+    result = _merge(target, source)
+
+    renamed = {c["original"]: c["renamed"] for c in result["conflicts"] if c["type"] == "equipment_id"}
+    assert renamed == {equipment_id: f"TC02-{equipment_id}" for equipment_id in ("fridge-1", "photocatalyst-1", "power-1", "water-1")}
+    assert query(target, "SELECT id FROM equipment WHERE id = 'radio-1'") == [("radio-1",)]
+    assert query(target, "SELECT equipment_id, station_id FROM equipment_checks") == [("TC02-power-1", "TC-01")]
+
+
+def test_station_is_merged_only_once(stations):
+    target, source = stations
+    _merge(target, source)
+
+    with pytest.raises(HTTPException) as excinfo:
+        _merge(target, source)
+    assert excinfo.value.status_code == 409
+
+
+def test_failed_merge_leaves_target_untouched(stations, query, monkeypatch):
+    target, source = stations
+    before = query(target, "SELECT COUNT(*) FROM inventory_events")
+    original = main.DatabaseManager._merge_copy
+
+    def failing_copy(self, cursor, table, *args, **kwargs):
+        if table == 'equipment':
+            raise RuntimeError("模擬合併中途失敗")
+        return original(self, cursor, table, *args, **kwargs)
+
+    monkeypatch.setattr(main.DatabaseManager, "_merge_copy", failing_copy)
+    with pytest.raises(RuntimeError):
+        _merge(target, source)
+
+    assert query(target, "SELECT COUNT(*) FROM inventory_events") == before
+    assert query(target, "SELECT COUNT(*) FROM station_merge_history") == [(0,)]
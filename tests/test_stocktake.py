@@ -0,0 +1,102 @@
+"""盤點引擎 (user-046)"""
+
+import pytest
+from fastapi import HTTPException
+
+import main
+
+STOCK_SQL = """
+    SELECT item_code, SUM(CASE WHEN event_type = 'RECEIVE' THEN quantity ELSE -quantity END)
+    FROM inventory_events WHERE station_id = 'TC-01' GROUP BY item_code ORDER BY item_code
+"""
+
+
+@pytest.fixture
+def stocked(db, receive):
+    receive(db, "GAUZE", 10)
+    receive(db, "TAPE", 5)
+    receive(db, "MASK", 4)
+    receive(db, "GAUZE", 50, stationId="TC-02")  # 其他站點的庫存不列入
+    return db
+
+
+def _audit_events(db, query):
+    return query(db, """
+        SELECT event_type, item_code, quantity, station_id, operator FROM inventory_events
+        WHERE remarks LIKE '盤點調整 %' ORDER BY id
+    """)
+
+
+def test_complete_posts_receive_and_consume_adjustments(stocked, query):
+    audit = stocked.start_audit("ROUTINE", "alice", "TC-01")
+    recorded = stocked.record_audit_counts(audit["audit_id"], [
+        {"item_code": "GAUZE", "actual_quantity": 12},
+        {"item_code": "TAPE", "actual_quantity": 3},
+        {"item_code": "MASK", "actual_quantity": 4},
+    ], "alice")
+    assert [(item["item_code"], item["discrepancy"]) for item in recorded["items"]] == [
+        ("GAUZE", 2), ("TAPE", -2), ("MASK", 0)
+    ]
+
+    result = stocked.complete_audit(audit["audit_id"], "bob")
+
+    assert result["discrepancies"] == 2
+    assert result["adjusted_items"] == 2
+    assert result["net_adjustment"] == 0
+    assert _audit_events(stocked, query) == [
+        ("RECEIVE", "GAUZE", 2, "TC-01", "bob"),
+        ("CONSUME", "TAPE", 2, "TC-01", "bob"),
+    ]
+    assert query(stocked, STOCK_SQL) == [("GAUZE", 12), ("MASK", 4), ("TAPE", 3)]
+    assert stocked.get_audit(audit["audit_id"])["status"] == "COMPLETED"
+
+
+def test_complete_uses_stock_at_completion_time(stocked, query):
+    audit = stocked.start_audit("ROUTINE", "alice", "TC-01")
+    stocked.record_audit_counts(audit["audit_id"], [{"item_code": "GAUZE", "actual_quantity": 12}], "alice")
+    stocked.consume_item(main.ConsumeRequest(itemCode="GAUZE", quantity=1, purpose="換藥"))
+
+    stocked.complete_audit(audit["audit_id"], "bob")
+
+    assert _audit_events(stocked, query) == [("RECEIVE", "GAUZE", 3, "TC-01", "bob")]
+    assert query(stocked, STOCK_SQL)[0] == ("GAUZE", 12)
+
+
+def test_complete_without_auto_adjust_posts_nothing(stocked, query):
+    audit = stocked.start_audit("ROUTINE", "alice", "TC-01")
+    stocked.record_audit_counts(audit["audit_id"], [{"item_code": "TAPE", "actual_quantity": 0}], "alice")
+
+    result = stocked.complete_audit(audit["audit_id"], "bob", auto_adjust=False)
+
+    assert result["discrepancies"] == 1 and result["adjusted_items"] == 0
+    assert _audit_events(stocked, query) == []
+
+
+def test_counts_overwrite_or_accumulate_and_report_unknown_items(stocked):
+    audit = stocked.start_audit("ROUTINE", "alice", "TC-01")
+    stocked.record_audit_counts(audit["audit_id"], [{"item_code": "GAUZE", "actual_quantity": 4}], "alice")
+    stocked.record_audit_counts(audit["audit_id"], [{"item_code": "GAUZE", "actual_quantity": 6}], "alice")
+    result = stocked.record_audit_counts(audit["audit_id"], [
+        {"item_code": "GAUZE", "actual_quantity": 1},
+        {"item_code": "GAUZE", "actual_quantity": 2},
+        {"item_code": "NOPE", "actual_quantity": 1},
+    ], "alice", accumulate=True)
+
+    assert result["items"] == [{
+        "item_code": "GAUZE", "item_name": "GAUZE", "system_quantity": 10, "actual_quantity": 9, "discrepancy": -1
+    }]
+    assert result["unknown_items"] == ["NOPE"]
+
+
+def test_one_open_audit_per_station(stocked):
+    audit = stocked.start_audit("ROUTINE", "alice", "TC-01")
+    with pytest.raises(HTTPException) as excinfo:
+        stocked.start_audit("EMERGENCY", "bob", "TC-01")
+    assert excinfo.value.status_code == 409
+
+    assert stocked.start_audit("ROUTINE", "carol", "TC-02")["success"] is True
+
+    stocked.complete_audit(audit["audit_id"], "alice")
+    with pytest.raises(HTTPException) as excinfo:
+        stocked.record_audit_counts(audit["audit_id"], [{"item_code": "GAUZE", "actual_quantity": 1}], "alice")
+    assert excinfo.value.status_code == 409
@@ -0,0 +1,93 @@
+"""二進位同步封包格式 (user-031)"""
+
+import io
+
+import pytest
+
+import main
+
+EVENTS_SQL = "SELECT event_uid, event_type, item_code, quantity, batch_number, expiry_date FROM inventory_events ORDER BY event_uid"
+CODECS = ["none", "gzip", pytest.param("zstd", marks=pytest.mark.skipif(not main.ZSTD_AVAILABLE, reason="未安裝 zstandard"))]
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_binary_package_round_trip(make_db, receive, query, codec):
+    station, hospital = make_db("station"), make_db("hospital")
+    receive(station, "GAUZE", 10, batchNumber="B1", expiryDate="2099-01-01", remarks="紗布 10x10")
+    receive(station, "TAPE", 3)
+
+    data = b"".join(station.iter_sync_package_binary("TC-01", "HOSP-001", "FULL", codec=codec))
+    assert data.startswith(main.SyncBinaryFormat.MAGIC + bytes([main.SyncBinaryFormat.VERSION]))
+
+    result = hospital.import_sync_package_binary(io.BytesIO(data))
+
+    assert result["success"] is True
+    assert result["codec"] == codec
+    assert query(hospital, EVENTS_SQL) == query(station, EVENTS_SQL)
+
+
+def test_binary_decodes_to_same_changes_as_json(db, receive):
+    receive(db, "GAUZE", 10, batchNumber="B1", expiryDate="2099-01-01")
+    receive(db, "TAPE", 3)
+
+    package = db.generate_sync_package("TC-01", "HOSP-001", "FULL")
+    data = b"".join(db.iter_sync_package_binary("TC-01", "HOSP-001", "FULL"))
+    reader = main.SyncBinaryReader(io.BytesIO(data))
+    changes = list(reader)
+
+    assert reader.error is None
+    assert changes == package["changes"]
+
+
+def test_binary_delete_keeps_changelog_timestamp(make_db, receive, query):
+    station, hospital = make_db("station"), make_db("hospital")
+    receive(station, "GAUZE", 10)
+    receive(station, "TAPE", 3)
+    first = b"".join(station.iter_sync_package_binary("TC-01", "HOSP-001", "DELTA", since_seq=0))
+    assert hospital.import_sync_package_binary(io.BytesIO(first))["success"] is True
+
+    (event_uid,) = query(station, "SELECT event_uid FROM inventory_events WHERE item_code = 'TAPE'")[0]
+    (to_seq,) = query(station, "SELECT MAX(seq) FROM sync_changelog")[0]
+    conn = station.get_connection()
+    conn.execute("DELETE FROM inventory_events WHERE event_uid = ?", (event_uid,))
+    conn.commit()
+    conn.close()
+    (deleted_at,) = query(station, "SELECT changed_at FROM sync_changelog WHERE operation = 'DELETE'")[0]
+
+    delta = b"".join(station.iter_sync_package_binary("TC-01", "HOSP-001", "DELTA", since_seq=to_seq))
+    changes = list(main.SyncBinaryReader(io.BytesIO(delta)))
+    assert changes == [{
+        "table": "inventory_events", "operation": "DELETE",
+        "data": {"event_uid": event_uid}, "timestamp": deleted_at
+    }]
+
+    assert hospital.import_sync_package_binary(io.BytesIO(delta))["success"] is True
+    assert query(hospital, EVENTS_SQL) == query(station, EVENTS_SQL)
+
+
+def test_binary_corrupted_package_rolls_back(make_db, receive, query):
+    station, hospital = make_db("station"), make_db("hospital")
+    receive(station, "GAUZE", 10)
+    data = bytearray(b"".join(station.iter_sync_package_binary("TC-01", "HOSP-001", "FULL", codec="none")))
+    data[-1] ^= 0xFF
+
+    result = hospital.import_sync_package_binary(io.BytesIO(bytes(data)))
+
+    assert result["success"] is False
+    assert query(hospital, "SELECT COUNT(*) FROM inventory_events") == [(0,)]
+
+
+def test_binary_truncated_package_rolls_back(make_db, receive, query):
+    station, hospital = make_db("station"), make_db("hospital")
+    receive(station, "GAUZE", 10)
+    data = b"".join(station.iter_sync_package_binary("TC-01", "HOSP-001", "FULL"))
+
+    result = hospital.import_sync_package_binary(io.BytesIO(data[:-40]))
+
+    assert result["success"] is False
+    assert query(hospital, "SELECT COUNT(*) FROM inventory_events") == [(0,)]
+
+
+def test_binary_rejects_unknown_version():
+    with pytest.raises(ValueError):
+        main.SyncBinaryReader(io.BytesIO(main.SyncBinaryFormat.MAGIC + bytes([99, 0])))
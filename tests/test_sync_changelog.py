@@ -0,0 +1,59 @@
+"""觸發器維護的同步變更紀錄 (user-034)"""
+
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+
+@pytest.fixture
+def taipei_time(monkeypatch):
+    """站點本地時間 UTC+8，與 CURRENT_TIMESTAMP (UTC) 不同"""
+    monkeypatch.setenv("TZ", "Asia/Taipei")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def _changed_tables(db, **options):
+    package = db.generate_sync_package("TC-01", "HOSP-001", "DELTA", **options)
+    return sorted(change["table"] for change in package["changes"] if change["table"] != "equipment")
+
+
+def test_changelog_records_inserts_updates_and_deletes(db, receive, query):
+    (baseline,) = query(db, "SELECT MAX(seq) FROM sync_changelog")[0]  # 預設設備
+    receive(db, "GAUZE", 10)
+    conn = db.get_connection()
+    conn.execute("UPDATE items SET name = '紗布' WHERE code = 'GAUZE'")
+    conn.execute("DELETE FROM inventory_events")
+    conn.commit()
+    conn.close()
+
+    assert query(db, "SELECT table_name, operation FROM sync_changelog WHERE seq > ? ORDER BY seq", (baseline,)) == [
+        ("items", "INSERT"), ("inventory_events", "INSERT"), ("items", "UPDATE"), ("inventory_events", "DELETE")
+    ]
+    package = db.generate_sync_package("TC-01", "HOSP-001", "DELTA", since_seq=baseline)
+    assert [(c["table"], c["operation"]) for c in package["changes"]] == [("items", "INSERT"), ("inventory_events", "DELETE")]
+
+
+@pytest.mark.usefixtures("taipei_time")
+@pytest.mark.parametrize("since", [
+    lambda now: (now - timedelta(minutes=5)).isoformat(timespec="seconds"),                     # 本地時間
+    lambda now: (now - timedelta(minutes=5)).strftime("%Y-%m-%dT%H:%M"),                        # datetime-local
+    lambda now: (now.astimezone(timezone.utc) - timedelta(minutes=5)).isoformat().replace("+00:00", "Z"),
+])
+def test_since_timestamp_is_compared_in_utc(db, receive, since):
+    receive(db, "GAUZE", 10)
+
+    assert _changed_tables(db, since_timestamp=since(datetime.now().astimezone())) == ["inventory_events", "items"]
+    later = (datetime.now() + timedelta(minutes=5)).isoformat(timespec="seconds")
+    assert _changed_tables(db, since_timestamp=later) == []
+
+
+def test_since_timestamp_must_be_iso_8601(client):
+    response = client.post("/api/station/sync/generate", json={
+        "stationId": "TC-01", "hospitalId": "HOSP-001", "sinceTimestamp": "昨天"
+    })
+
+    assert response.status_code == 422
@@ -0,0 +1,96 @@
+"""布隆過濾器預先交換 (user-040)"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+EVENTS_SQL = "SELECT event_uid, item_code, quantity FROM inventory_events WHERE station_id = 'TC-01' ORDER BY event_uid"
+
+
+@pytest.fixture
+def station(make_db, receive):
+    station = make_db("station")
+    for index in range(200):
+        receive(station, f"ITEM-{index % 5}", index + 1)
+    return station
+
+
+@pytest.fixture
+def hospital(make_db, monkeypatch):
+    hospital = make_db("hospital")
+    monkeypatch.setattr(main, "db", hospital)
+    return hospital
+
+
+@pytest.fixture
+def remote(hospital):
+    client = TestClient(main.app)
+
+    def call(path: str, payload: dict) -> dict:
+        response = client.post(path, json=payload)
+        assert response.status_code == 200, response.text
+        return response.json()
+    return call
+
+
+def test_filter_membership_has_no_false_negatives(station, hospital):
+    package = station.generate_sync_package("TC-01", "HOSP-001", "FULL")
+    hospital.import_sync_package(package["package_id"], package["changes"], package["checksum"])
+
+    known = hospital.build_known_filter("TC-01", None, 0.01)
+    again = station.generate_sync_package("TC-01", "HOSP-001", "FULL", known_filter=known)
+
+    assert [change["table"] for change in again["changes"]] == ["items"] * 5  # 物品主檔不經過濾器
+    assert again["filter_excluded"] == 200
+
+
+def test_push_sends_only_unknown_events(station, hospital, remote, receive, query):
+    package = station.generate_sync_package("TC-01", "HOSP-001", "FULL")
+    hospital.import_sync_package(package["package_id"], package["changes"], package["checksum"])
+    for index in range(10):
+        receive(station, "ITEM-NEW", index + 1)
+
+    result = station.sync_push_with_filter("TC-01", "HOSP-001", remote, "FULL", error_rate=0.001)
+
+    assert result["success"] is True
+    assert result["filter_excluded"] + result["rows_reconciled"] >= 200
+    assert result["changes_sent"] < 40
+    assert query(hospital, EVENTS_SQL) == query(station, EVENTS_SQL)
+
+
+def test_false_positives_are_repaired_by_reconciliation(station, hospital, remote, receive, query):
+    package = station.generate_sync_package("TC-01", "HOSP-001", "FULL")
+    hospital.import_sync_package(package["package_id"], package["changes"], package["checksum"])
+    for index in range(100):
+        receive(station, "ITEM-NEW", index + 1)
+
+    # 誤判率極高的過濾器：新事件大多被誤判為已持有而漏送，由筆數檢查與 Merkle 對帳補齊
+    result = station.sync_push_with_filter("TC-01", "HOSP-001", remote, "FULL", error_rate=0.49)
+
+    assert result["success"] is True
+    assert result["filter_excluded"] > 200
+    assert result["reconciled_tables"] == ["inventory_events"]
+    assert result["rows_reconciled"] >= result["filter_excluded"] - 200
+    assert query(hospital, EVENTS_SQL) == query(station, EVENTS_SQL)
+
+
+def test_push_api_ignores_caller_supplied_hospital_url(client, monkeypatch):
+    body = {"stationId": "TC-01", "hospitalId": "HOSP-001", "hospitalUrl": "http://10.0.0.1:22"}
+    monkeypatch.setattr(main.config, "SYNC_HOSPITAL_URL", None)
+    assert client.post("/api/station/sync/push", json=body).status_code == 400
+
+    called = []
+
+    def fake_remote(base_url, timeout=120):
+        called.append(base_url)
+
+        def call(path, payload):
+            raise ConnectionError("unreachable")
+        return call
+
+    monkeypatch.setattr(main.config, "SYNC_HOSPITAL_URL", "http://hospital.local:8000")
+    monkeypatch.setattr(main, "http_json_remote", fake_remote)
+
+    assert client.post("/api/station/sync/push", json=body).status_code == 502
+    assert called == ["http://hospital.local:8000"]
@@ -0,0 +1,96 @@
+"""醫院層平行匯入管線 (user-037)"""
+
+import io
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+import main
+import sync_formats
+
+TABLES = main.DatabaseManager.SYNC_APPLY_TABLES
+
+
+@pytest.fixture
+def packages(make_db, receive, tmp_path):
+    """三個站點各以一種格式產生的封包檔案"""
+    paths = {}
+    for station_id, package_format in (("TC-02", "json"), ("TC-03", "ndjson"), ("TC-04", "binary")):
+        station = make_db(station_id)
+        receive(station, "GAUZE", 10, stationId=station_id)
+        receive(station, f"KIT-{station_id}", 2, stationId=station_id)
+        if package_format == "json":
+            package = station.generate_sync_package(station_id, "HOSP-001", "FULL")
+            data = json.dumps({
+                "stationId": station_id, "packageId": package["package_id"],
+                "changes": package["changes"], "checksum": package["checksum"]
+            }).encode("utf-8")
+        elif package_format == "ndjson":
+            data = b"".join(station.iter_sync_package_stream(station_id, "HOSP-001", "FULL"))
+        else:
+            data = b"".join(station.iter_sync_package_binary(station_id, "HOSP-001", "FULL"))
+        paths[package_format] = tmp_path / f"{station_id}.pkg"
+        paths[package_format].write_bytes(data)
+    return paths
+
+
+@pytest.mark.parametrize("package_format", ["json", "ndjson", "binary"])
+def test_parse_detects_format_and_verifies_checksum(packages, package_format):
+    parsed = sync_formats.parse_sync_package_file(str(packages[package_format]), TABLES)
+
+    assert parsed["error"] is None
+    assert parsed["format"] == package_format
+    assert parsed["changes_count"] == len(parsed["changes"]) == 4
+    assert {change["table"] for change in parsed["changes"]} <= set(TABLES)
+
+
+def test_parse_reports_corrupt_and_unknown_files(packages, tmp_path):
+    data = packages["ndjson"].read_bytes().replace(b'"quantity":10', b'"quantity":11')
+    corrupt = tmp_path / "corrupt.pkg"
+    corrupt.write_bytes(data)
+    garbage = tmp_path / "garbage.pkg"
+    garbage.write_bytes(b"not a package")
+
+    assert sync_formats.parse_sync_package_file(str(corrupt), TABLES)["error"] == "校驗碼不符，封包可能已損毀"
+    assert sync_formats.parse_sync_package_file(str(garbage), TABLES)["error"].startswith("封包無法解析")
+    assert "changes" not in sync_formats.parse_sync_package_file(str(garbage), TABLES)
+
+
+def test_parse_rejects_tables_outside_the_apply_list(packages):
+    parsed = sync_formats.parse_sync_package_file(str(packages["binary"]), ("inventory_events",))
+
+    assert parsed["error"] == "第 1 筆變更格式錯誤"
+
+
+def test_spawned_workers_do_not_import_main(packages):
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        parsed = pool.submit(sync_formats.parse_sync_package_file, str(packages["binary"]), TABLES).result()
+        imported = pool.submit(eval, "sorted(set(__import__('sys').modules) & {'main', 'fastapi', 'sync_formats'})").result()
+
+    assert parsed["error"] is None
+    assert imported == ["sync_formats"]
+
+
+def test_pipeline_applies_every_format_and_fails_bad_files(make_db, packages, tmp_path, query):
+    hospital = make_db("hospital")
+    pipeline = main.SyncIngestPipeline(hospital, str(tmp_path / "inbox"), workers=2)
+    jobs = [pipeline.submit_stream(io.BytesIO(path.read_bytes())) for path in packages.values()]
+    jobs.append(pipeline.submit_stream(io.BytesIO(b"not a package")))
+    pipeline.shutdown()
+
+    results = [pipeline.get_job(job["job_id"]) for job in jobs]
+    assert [(job["status"], job["format"], job["station_id"]) for job in results] == [
+        ("APPLIED", "json", "TC-02"), ("APPLIED", "ndjson", "TC-03"), ("APPLIED", "binary", "TC-04"),
+        ("FAILED", None, None)
+    ]
+    assert query(hospital, "SELECT station_id, SUM(quantity) FROM inventory_events GROUP BY station_id ORDER BY station_id") == [
+        ("TC-02", 12), ("TC-03", 12), ("TC-04", 12)
+    ]
+    status = pipeline.status()
+    assert {station: progress["packages_applied"] for station, progress in status["stations"].items()} == {
+        "TC-02": 1, "TC-03": 1, "TC-04": 1, "UNKNOWN": 0
+    }
+    assert len(list((tmp_path / "inbox" / "done").iterdir())) == 3
+    assert len(list((tmp_path / "inbox" / "failed").iterdir())) == 1
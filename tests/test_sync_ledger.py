@@ -0,0 +1,159 @@
+"""同步封包冪等匯入與已套用變更帳本 (user-039)"""
+
+import io
+import json
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import main
+
+COUNTS_SQL = "SELECT item_code, SUM(quantity) FROM inventory_events GROUP BY item_code ORDER BY item_code"
+
+
+@pytest.fixture
+def station(make_db, receive):
+    station = make_db("station")
+    receive(station, "GAUZE", 10)
+    receive(station, "TAPE", 3)
+    return station
+
+
+@pytest.fixture
+def hospital(make_db):
+    return make_db("hospital")
+
+
+def _import(hospital, package_format: str, data):
+    if package_format == "json":
+        return hospital.import_sync_package(data["package_id"], data["changes"], data["checksum"])
+    if package_format == "ndjson":
+        return hospital.import_sync_package_stream(io.BytesIO(data))
+    return hospital.import_sync_package_binary(io.BytesIO(data))
+
+
+def _generate(station, package_format: str, **options):
+    if package_format == "json":
+        return station.generate_sync_package("TC-01", "HOSP-001", **options)
+    if package_format == "ndjson":
+        return b"".join(station.iter_sync_package_stream("TC-01", "HOSP-001", **options))
+    return b"".join(station.iter_sync_package_binary("TC-01", "HOSP-001", **options))
+
+
+@pytest.mark.parametrize("package_format", ["json", "ndjson", "binary"])
+def test_replayed_package_is_skipped(station, hospital, query, package_format):
+    package = _generate(station, package_format, sync_type="FULL")
+
+    first = _import(hospital, package_format, package)
+    replay = _import(hospital, package_format, package)
+
+    assert first["success"] is True and first["changes_applied"] == 4
+    assert replay["duplicate_package"] is True
+    assert replay["changes_applied"] == 0
+    assert query(hospital, COUNTS_SQL) == [("GAUZE", 10), ("TAPE", 3)]
+    assert query(hospital, "SELECT COUNT(*) FROM sync_applied_packages") == [(1,)]
+
+
+@pytest.mark.parametrize("package_format", ["json", "ndjson", "binary"])
+def test_overlapping_changes_in_new_package_are_skipped(station, hospital, receive, query, package_format):
+    assert _import(hospital, package_format, _generate(station, package_format, sync_type="FULL"))["success"]
+    receive(station, "TAPE", 2)
+
+    result = _import(hospital, package_format, _generate(station, package_format, sync_type="FULL"))
+
+    assert result["success"] is True
+    assert result.get("duplicate_package") is None
+    assert result["changes_applied"] == 1
+    assert result["duplicates_skipped"] == 4
+    assert query(hospital, COUNTS_SQL) == [("GAUZE", 10), ("TAPE", 5)]
+
+
+def test_reused_package_id_with_different_content_is_rejected(station, hospital, receive, query):
+    first = station.generate_sync_package("TC-01", "HOSP-001", "FULL")
+    assert hospital.import_sync_package(first["package_id"], first["changes"], first["checksum"])["success"]
+    receive(station, "TAPE", 2)
+    second = station.generate_sync_package("TC-01", "HOSP-001", "FULL")
+
+    with pytest.raises(HTTPException) as excinfo:
+        hospital.import_sync_package(first["package_id"], second["changes"], second["checksum"])
+
+    assert excinfo.value.status_code == 409
+    assert query(hospital, COUNTS_SQL) == [("GAUZE", 10), ("TAPE", 3)]
+
+
+def test_reused_package_id_is_rejected_for_streams(station, hospital, receive, query):
+    first = _generate(station, "ndjson", sync_type="FULL")
+    assert hospital.import_sync_package_stream(io.BytesIO(first))["success"]
+    receive(station, "TAPE", 2)
+    header, body = _generate(station, "ndjson", sync_type="FULL").split(b"\n", 1)
+    header = json.loads(header)
+    header["package_id"] = json.loads(first.split(b"\n", 1)[0])["package_id"]
+    reused = json.dumps(header).encode("utf-8") + b"\n" + body
+
+    with pytest.raises(HTTPException) as excinfo:
+        hospital.import_sync_package_stream(io.BytesIO(reused))
+
+    assert excinfo.value.status_code == 409
+    assert query(hospital, COUNTS_SQL) == [("GAUZE", 10), ("TAPE", 3)]
+
+
+def test_replayed_delete_is_skipped(station, hospital, query):
+    assert hospital.import_sync_package_binary(io.BytesIO(_generate(station, "binary", sync_type="DELTA", since_seq=0)))["success"]
+    (to_seq,) = query(station, "SELECT MAX(seq) FROM sync_changelog")[0]
+    conn = station.get_connection()
+    conn.execute("DELETE FROM inventory_events WHERE item_code = 'TAPE'")
+    conn.commit()
+    conn.close()
+
+    delete = _generate(station, "binary", sync_type="DELTA", since_seq=to_seq)
+    repeated = _generate(station, "binary", sync_type="DELTA", since_seq=to_seq)
+
+    assert hospital.import_sync_package_binary(io.BytesIO(delete))["changes_applied"] == 1
+    result = hospital.import_sync_package_binary(io.BytesIO(repeated))
+    assert result["changes_applied"] == 0
+    assert result["duplicates_skipped"] == 1
+    assert query(hospital, COUNTS_SQL) == [("GAUZE", 10)]
+
+
+def _hospital_client(hospital, monkeypatch) -> TestClient:
+    monkeypatch.setattr(main, "db", hospital)
+    return TestClient(main.app)
+
+
+@pytest.mark.parametrize("path", ["/api/station/sync/import", "/api/hospital/sync/upload"])
+def test_api_rejects_reused_package_id_with_409(station, hospital, receive, query, monkeypatch, path):
+    client = _hospital_client(hospital, monkeypatch)
+    first = station.generate_sync_package("TC-01", "HOSP-001", "FULL")
+    receive(station, "TAPE", 2)
+    second = station.generate_sync_package("TC-01", "HOSP-001", "FULL")
+
+    def upload(package: dict, package_id: str):
+        return client.post(path, json={
+            "stationId": "TC-01", "packageId": package_id,
+            "changes": package["changes"], "checksum": package["checksum"]
+        })
+
+    assert upload(first, first["package_id"]).status_code == 200
+    assert upload(first, first["package_id"]).json()["duplicate_package"] is True
+    response = upload(second, first["package_id"])
+
+    assert response.status_code == 409
+    assert response.json()["detail"]
+    assert query(hospital, COUNTS_SQL) == [("GAUZE", 10), ("TAPE", 3)]
+
+
+def test_stream_api_rejects_reused_package_id_with_409(station, hospital, receive, query, monkeypatch):
+    client = _hospital_client(hospital, monkeypatch)
+    first = _generate(station, "ndjson", sync_type="FULL")
+    assert client.post("/api/station/sync/import/stream", content=first).status_code == 200
+    receive(station, "TAPE", 2)
+    header, body = _generate(station, "ndjson", sync_type="FULL").split(b"\n", 1)
+    header = json.loads(header)
+    header["package_id"] = json.loads(first.split(b"\n", 1)[0])["package_id"]
+
+    response = client.post("/api/station/sync/import/stream",
+                           content=json.dumps(header).encode("utf-8") + b"\n" + body)
+
+    assert response.status_code == 409
+    assert query(hospital, COUNTS_SQL) == [("GAUZE", 10), ("TAPE", 3)]
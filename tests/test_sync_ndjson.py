@@ -0,0 +1,73 @@
+"""NDJSON 串流同步封包 (user-030)"""
+
+import io
+import json
+
+import main
+
+EVENTS_SQL = "SELECT event_uid, event_type, item_code, quantity, batch_number, expiry_date FROM inventory_events ORDER BY event_uid"
+
+
+def test_json_package_round_trip(make_db, receive, query):
+    station, hospital = make_db("station"), make_db("hospital")
+    receive(station, "GAUZE", 10, batchNumber="B1", expiryDate="2099-01-01")
+    receive(station, "TAPE", 3)
+
+    package = station.generate_sync_package("TC-01", "HOSP-001", "FULL")
+    result = hospital.import_sync_package(package["package_id"], package["changes"], package["checksum"])
+
+    assert result["success"] is True
+    assert query(hospital, EVENTS_SQL) == query(station, EVENTS_SQL)
+
+
+def test_ndjson_package_round_trip(make_db, receive, query):
+    station, hospital = make_db("station"), make_db("hospital")
+    receive(station, "GAUZE", 10, batchNumber="B1", expiryDate="2099-01-01")
+    receive(station, "TAPE", 3)
+
+    data = b"".join(station.iter_sync_package_stream("TC-01", "HOSP-001", "FULL"))
+    lines = data.splitlines()
+    header, trailer = json.loads(lines[0]), json.loads(lines[-1])
+    assert header["format"] == main.SyncNdjsonReader.FORMAT
+    assert trailer["trailer"] is True and trailer["changes_count"] == len(lines) - 2
+
+    result = hospital.import_sync_package_stream(io.BytesIO(data))
+
+    assert result["success"] is True
+    assert result["source_station_id"] == "TC-01"
+    assert query(hospital, EVENTS_SQL) == query(station, EVENTS_SQL)
+    assert query(hospital, "SELECT code FROM items ORDER BY code") == [("GAUZE",), ("TAPE",)]
+
+
+def test_ndjson_truncated_package_rolls_back(make_db, receive, query):
+    station, hospital = make_db("station"), make_db("hospital")
+    receive(station, "GAUZE", 10)
+    data = b"".join(station.iter_sync_package_stream("TC-01", "HOSP-001", "FULL"))
+
+    truncated = b"\n".join(data.splitlines()[:-1]) + b"\n"
+    result = hospital.import_sync_package_stream(io.BytesIO(truncated))
+
+    assert result["success"] is False
+    assert query(hospital, "SELECT COUNT(*) FROM inventory_events") == [(0,)]
+
+
+def test_ndjson_tampered_change_fails_checksum(make_db, receive, query):
+    station, hospital = make_db("station"), make_db("hospital")
+    receive(station, "GAUZE", 10)
+    data = b"".join(station.iter_sync_package_stream("TC-01", "HOSP-001", "FULL"))
+
+    tampered = data.replace(b'"quantity":10', b'"quantity":99')
+    assert tampered != data
+    result = hospital.import_sync_package_stream(io.BytesIO(tampered))
+
+    assert result["success"] is False
+    assert result["expected"] != result["actual"]
+    assert query(hospital, "SELECT COUNT(*) FROM inventory_events") == [(0,)]
+
+
+def test_package_ids_are_unique_within_one_second():
+    ids = {main.DatabaseManager.new_sync_package_id("TC-01") for _ in range(1000)}
+
+    assert len(ids) == 1000
+    assert {main.DatabaseManager.sync_package_source(package_id) for package_id in ids} == {"TC-01"}
+    assert main.DatabaseManager.sync_package_source("PKG-20240101-080000-TC-02") == "TC-02"
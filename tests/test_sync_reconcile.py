@@ -0,0 +1,92 @@
+"""雜湊樹對帳 (user-035)"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+EVENTS_SQL = "SELECT event_uid, item_code, quantity FROM inventory_events WHERE station_id = 'TC-01' ORDER BY event_uid"
+
+
+@pytest.fixture
+def synced(make_db, receive):
+    """站點與醫院先以全量封包同步"""
+    station, hospital = make_db("station"), make_db("hospital")
+    for index in range(40):
+        receive(station, f"ITEM-{index % 7}", index + 1)
+    package = station.generate_sync_package("TC-01", "HOSP-001", "FULL")
+    assert hospital.import_sync_package(package["package_id"], package["changes"], package["checksum"])["success"]
+    return station, hospital
+
+
+@pytest.fixture
+def remote(synced, monkeypatch):
+    """以醫院資料庫回應的對方 API（remote(path, payload) 介面同 http_json_remote）"""
+    monkeypatch.setattr(main, "db", synced[1])
+    client = TestClient(main.app)
+
+    def call(path: str, payload: dict) -> dict:
+        response = client.post(path, json=payload)
+        assert response.status_code == 200, response.text
+        return response.json()
+    return call
+
+
+def _execute(db, sql: str):
+    conn = db.get_connection()
+    conn.execute(sql)
+    conn.commit()
+    conn.close()
+
+
+def test_in_sync_tables_cost_one_request(synced, remote, query):
+    station, hospital = synced
+    result = station.digest_reconcile("TC-01", remote, ["inventory_events"])
+
+    assert result["differing"] == []
+    assert result["tables"][0]["in_sync"] is True and result["tables"][0]["rounds"] == 0
+
+
+def test_push_repairs_lost_and_missing_rows_on_the_hospital(synced, remote, receive, query):
+    station, hospital = synced
+    _execute(hospital, "DELETE FROM inventory_events WHERE quantity IN (3, 17, 33)")
+    receive(station, "ITEM-0", 99)  # 尚未送出的新事件
+
+    result = station.digest_reconcile("TC-01", remote, ["inventory_events"], push=True)
+
+    assert result["differing"] == ["inventory_events"]
+    assert result["tables"][0]["rows_sent"] >= 4
+    assert query(hospital, EVENTS_SQL) == query(station, EVENTS_SQL)
+    assert station.digest_reconcile("TC-01", remote, ["inventory_events"])["differing"] == []
+
+
+def test_pull_repairs_the_station_from_the_hospital(synced, remote, query):
+    station, hospital = synced
+    expected = query(hospital, EVENTS_SQL)
+    _execute(station, "DELETE FROM inventory_events WHERE quantity > 30")
+
+    station.digest_reconcile("TC-01", remote, ["inventory_events"], push=False)
+
+    assert query(station, EVENTS_SQL) == expected
+
+
+def test_reconcile_api_only_calls_the_configured_hospital(client, monkeypatch):
+    body = {"stationId": "TC-01", "remoteUrl": "http://169.254.169.254/latest"}
+    monkeypatch.setattr(main.config, "SYNC_HOSPITAL_URL", None)
+    assert client.post("/api/sync/merkle/reconcile", json=body).status_code == 400
+
+    called = []
+
+    def fake_remote(base_url, timeout=120):
+        called.append(base_url)
+
+        def call(path, payload):
+            raise ConnectionError("unreachable")
+        return call
+
+    monkeypatch.setattr(main.config, "SYNC_HOSPITAL_URL", "http://hospital.local:8000")
+    monkeypatch.setattr(main, "http_json_remote", fake_remote)
+    response = client.post("/api/sync/merkle/reconcile", json=body)
+
+    assert response.status_code == 502
+    assert called == ["http://hospital.local:8000"]